@@ -2,38 +2,33 @@
 from __future__ import annotations
 
 import os
-import pickle
 import platform
+import sys
+from pathlib import Path
 from typing import Dict, Iterable, Tuple
-import joblib
 
-def load_model(model_path):
-    """載入模型並修正 XGBoost 相容性問題"""
-    model = None
-    
-    if model_path.endswith('.joblib'):
-        model = joblib.load(model_path)
-    elif model_path.endswith('.pkl'):
-        try:
-            model = joblib.load(model_path)
-        except Exception:
-            with open(model_path, 'rb') as f:
-                model = pickle.load(f)
-    else:
-        raise ValueError("不支援的模型副檔名，請使用 .pkl 或 .joblib")
-    
-    # 修正 XGBoost use_label_encoder 問題
-    if hasattr(model, '__class__') and 'XGB' in str(model.__class__):
-        # 移除已棄用的 use_label_encoder 屬性
-        if hasattr(model, 'use_label_encoder'):
-            delattr(model, 'use_label_encoder')
-    
-    return model
+# 添加 ui_shared 模組路徑
+_ROOT = Path(__file__).resolve().parents[2]
+if str(_ROOT / "ui_shared") not in sys.path:
+    sys.path.insert(0, str(_ROOT / "ui_shared"))
+
+import model_registry
+from cascade_inference import cascade_stats
+from dedup_inference import DedupStats, dedup_predictor
+from feature_alignment import FeatureMatrix, compile_plan, model_features
 import pandas as pd
 from matplotlib import pyplot as plt
 from matplotlib.font_manager import FontProperties
 from matplotlib.ticker import MaxNLocator
 
+
+def load_model(model_path):
+    """載入模型並修正 XGBoost 相容性問題（經行程共用快取，同一檔案只反序列化一次）"""
+    if not model_path.endswith(('.joblib', '.pkl')):
+        raise ValueError("不支援的模型副檔名，請使用 .pkl 或 .joblib")
+    return model_registry.load_model(model_path)
+
+
 FONT_CANDIDATES = [
     "C:/Windows/Fonts/msjh.ttc",
     "/System/Library/Fonts/PingFang.ttc",
@@ -91,21 +86,31 @@ def dflare_binary_predict(
     output_pie: str,
     output_bar: str,
     feat_cols: Iterable[str] | None = None,
+    feature_cache: Dict[str, object] | None = None,
 ) -> Tuple[Dict[str, object], pd.DataFrame]:
-    """執行二元模型預測並輸出圖表。"""
+    """執行二元模型預測並輸出圖表。
+
+    feature_cache 若提供，會存入本次的 float32 基底矩陣（"base"），供多元模型直接取列共用。
+    """
     _ensure_font()
     dataframe = pd.read_csv(input_csv, encoding="utf-8")
     model = load_model(binary_model_path)
 
-    if hasattr(model, "feature_names_in_"):
-        columns = list(model.feature_names_in_)
-    elif feat_cols is not None:
+    columns = model_features(model)
+    if columns is None and feat_cols is not None:
         columns = list(feat_cols)
-    else:  # pragma: no cover - 非預期模型格式
+    if columns is None:  # pragma: no cover - 非預期模型格式
         raise RuntimeError("二元模型未包含特徵欄位資訊")
 
-    df_model = dataframe.reindex(columns=columns, fill_value=-1).fillna(-1).astype(int)
-    dataframe["is_attack"] = model.predict(df_model)
+    # 缺值與缺欄補 -1、截成整數（與 reindex().fillna(-1).astype(int) 相同），一次轉成 float32 基底
+    base = FeatureMatrix.from_frame(dataframe, na_value=-1, integer=True)
+    if feature_cache is not None:
+        feature_cache["base"] = base
+    df_model = compile_plan(columns, base.columns, fill_value=-1).align(base)
+    # 重複的特徵向量只推論一次，結果以 inverse 索引散回各列
+    dedup = DedupStats()
+    cascade = cascade_stats(model)  # 串接模型（gate + 完整集成）本次的分流統計
+    dataframe["is_attack"] = dedup_predictor(model).predict(df_model, dedup, cascade)
     dataframe.to_csv(output_csv, index=False, encoding="utf-8")
 
     distribution = dataframe["is_attack"].value_counts().sort_index().reindex([0, 1], fill_value=0)
@@ -147,6 +152,8 @@ def dflare_binary_predict(
             "count_all": int(dataframe.shape[0]),
             "count_attack": int(distribution[1]),
             "count_normal": int(distribution[0]),
+            "dedup": dedup.to_dict(),
+            "cascade": cascade.to_dict() if cascade is not None else None,
         },
         dataframe,
     )
@@ -159,19 +166,25 @@ def dflare_multiclass_predict(
     output_pie: str,
     output_bar: str,
     feat_cols: Iterable[str] | None = None,
+    feature_cache: Dict[str, object] | None = None,
 ) -> Dict[str, object]:
-    """針對攻擊流量執行多元分級模型。"""
+    """針對攻擊流量執行多元分級模型（feature_cache 帶有二元階段的基底時直接取列，不重新轉換）。"""
     _ensure_font()
     model = load_model(multiclass_model_path)
-    if hasattr(model, "feature_names_in_"):
-        columns = list(model.feature_names_in_)
-    elif feat_cols is not None:
+    columns = model_features(model)
+    if columns is None and feat_cols is not None:
         columns = list(feat_cols)
-    else:  # pragma: no cover
+    if columns is None:  # pragma: no cover
         raise RuntimeError("多元模型未包含特徵欄位資訊")
 
-    df_model = df_attack.reindex(columns=columns, fill_value=-1).fillna(-1).astype(int)
-    df_attack["Severity"] = model.predict(df_model)
+    shared = (feature_cache or {}).get("base")
+    base = shared.select_index(df_attack.index) if isinstance(shared, FeatureMatrix) else None
+    if base is None:
+        base = FeatureMatrix.from_frame(df_attack, na_value=-1, integer=True)
+    df_model = compile_plan(columns, base.columns, fill_value=-1).align(base)
+    dedup = DedupStats()
+    cascade = cascade_stats(model)
+    df_attack["Severity"] = dedup_predictor(model).predict(df_model, dedup, cascade)
     df_attack.to_csv(output_csv, index=False, encoding="utf-8")
 
     severity_map = {1: "危險", 2: "高", 3: "中", 4: "低"}
@@ -211,5 +224,7 @@ def dflare_multiclass_predict(
         "output_bar": output_bar,
         "severity_distribution": distribution.to_dict(),
         "count_all": int(df_attack.shape[0]),
+        "dedup": dedup.to_dict(),
+        "cascade": cascade.to_dict() if cascade is not None else None,
         "message": "多元分級結果已產生",
     }
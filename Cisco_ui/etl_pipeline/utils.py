@@ -1,6 +1,7 @@
 """Cisco ETL Pipeline 共用工具模組。"""
 from __future__ import annotations
 
+import contextlib
 import gc
 import os
 import tempfile
@@ -44,6 +45,54 @@ def detect_encoding(file_path: str) -> str:
     return guess or "utf-8"
 
 
+# all_results.csv 的跨行程鎖：以 O_CREAT|O_EXCL 建立 <檔名>.lock，超過 RESULTS_LOCK_STALE_SECONDS 視為殘留鎖
+RESULTS_LOCK_TIMEOUT_SECONDS = 120.0
+RESULTS_LOCK_STALE_SECONDS = 600.0
+
+
+@contextlib.contextmanager
+def results_lock(all_results_path: str, timeout: float = RESULTS_LOCK_TIMEOUT_SECONDS):
+    """取得 all_results.csv 的獨占鎖（同資料夾的多個工作行程／主機依序取得 batch_id 與附加結果）。"""
+    lock_path = f"{all_results_path}.lock"
+    deadline = time.time() + timeout
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > RESULTS_LOCK_STALE_SECONDS:
+                    os.remove(lock_path)  # 持有者已中止留下的鎖
+                    continue
+            except OSError:
+                continue
+            if time.time() >= deadline:
+                raise TimeoutError(f"等待 {lock_path} 逾時")
+            time.sleep(0.05)
+    try:
+        os.write(fd, str(os.getpid()).encode("ascii"))
+        os.close(fd)
+        yield
+    finally:
+        with contextlib.suppress(OSError):
+            os.remove(lock_path)
+
+
+def reserve_batch_id(all_results_path: str) -> int:
+    """在鎖內配發新的 batch_id：同時執行的工作不會拿到相同編號（已配發的最大值記在 <檔名>.batch）。"""
+    counter_path = f"{all_results_path}.batch"
+    with results_lock(all_results_path):
+        batch_id = get_next_batch_id(all_results_path)
+        try:
+            with open(counter_path, encoding="ascii") as handle:
+                batch_id = max(batch_id, int(handle.read().strip() or 0) + 1)
+        except (OSError, ValueError):
+            pass
+        with open(counter_path, "w", encoding="ascii") as handle:
+            handle.write(str(batch_id))
+    return batch_id
+
+
 def get_next_batch_id(all_results_path: str) -> int:
     """根據歷史輸出檔決定新的 batch_id。"""
     if not os.path.exists(all_results_path):
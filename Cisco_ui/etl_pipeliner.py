@@ -8,7 +8,7 @@ from typing import Dict, Tuple
 import pandas as pd
 
 from .etl_pipeline import feature_engineering, log_cleaning, log_mapping
-from .etl_pipeline.utils import get_next_batch_id
+from .etl_pipeline.utils import reserve_batch_id, results_lock
 
 
 @dataclass(slots=True)
@@ -34,7 +34,7 @@ def run_etl_pipeline(
     step1_out = os.path.join(output_dir, "processed_logs.csv")
     step2_out = os.path.join(output_dir, "preprocessed_data.csv")
     all_results_path = os.path.join(output_dir, "all_results.csv")
-    batch_id = get_next_batch_id(all_results_path)
+    batch_id = reserve_batch_id(all_results_path)
 
     processed_count, _ = log_cleaning.step1_process_logs(
         raw_log_path=raw_log_path,
@@ -58,6 +58,18 @@ def run_etl_pipeline(
     )
 
 
+def append_all_results(etl_outputs: EtlOutputs, df_binary: pd.DataFrame, output_dir: str) -> str:
+    """將本批結果追加到 all_results.csv（持有檔案鎖，同資料夾的多個工作不會交錯寫入或重複表頭）。"""
+    all_results_path = os.path.join(output_dir, "all_results.csv")
+    dataframe = df_binary.copy()
+    dataframe["batch_id"] = etl_outputs.batch_id
+    with results_lock(all_results_path):
+        write_header = not os.path.exists(all_results_path) or os.path.getsize(all_results_path) == 0
+        with open(all_results_path, "a", newline="", encoding="utf-8") as handle:
+            dataframe.to_csv(handle, header=write_header, index=False)
+    return all_results_path
+
+
 def run_models(
     etl_outputs: EtlOutputs,
     binary_model_path: str,
@@ -76,6 +88,8 @@ def run_models(
     multi_bar = os.path.join(output_dir, "multiclass_bar.png")
 
     import traceback
+    # 二元與多元模型共用同一個 float32 基底矩陣
+    feature_cache: Dict[str, object] = {}
     try:
         binary_result, df_binary = feature_engineering.dflare_binary_predict(
             input_csv=etl_outputs.step2_csv,
@@ -84,6 +98,7 @@ def run_models(
             output_pie=binary_pie,
             output_bar=binary_bar,
             feat_cols=bin_feat_cols,
+            feature_cache=feature_cache,
         )
         attack_df = df_binary[df_binary["is_attack"] == 1].copy()
         if attack_df.empty:
@@ -109,6 +124,7 @@ def run_models(
             output_pie=multi_pie,
             output_bar=multi_bar,
             feat_cols=multi_feat_cols,
+            feature_cache=feature_cache,
         )
         return (
             {
@@ -26,12 +26,14 @@ def run_gpu_pipeline(
     if not is_gpu_available():
         return GpuPipelineResult(available=False, detail={"message": "目前環境無 GPU，改用 CPU 流程"}), pd.DataFrame()
 
+    feature_cache: dict = {}  # 二元與多元模型共用同一個基底矩陣
     binary_result, df_binary = gpu_feature.dflare_binary_predict(
         input_csv=etl_outputs.step2_csv,
         binary_model_path=binary_model_path,
         output_csv="gpu_binary.csv",
         output_pie="gpu_binary_pie.png",
         output_bar="gpu_binary_bar.png",
+        feature_cache=feature_cache,
     )
     attack_df = df_binary[df_binary["is_attack"] == 1].copy()
     if attack_df.empty:
@@ -43,6 +45,7 @@ def run_gpu_pipeline(
         output_csv="gpu_multi.csv",
         output_pie="gpu_multi_pie.png",
         output_bar="gpu_multi_bar.png",
+        feature_cache=feature_cache,
     )
     return GpuPipelineResult(
         available=True,
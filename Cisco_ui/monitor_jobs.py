@@ -0,0 +1,62 @@
+"""Cisco Log 監控的背景工作。
+
+LogMonitor 只負責偵測檔案並排入工作佇列，實際的清洗與推論由此模組的
+``run_auto_clean_job`` 在工作行程中執行（不依賴 Streamlit），回傳的結果
+字典與 ``execute_pipeline`` 相同，由監控端輪詢後記錄日誌與觸發通知。
+多主機共用資料夾時 payload 帶 ``output_subdir``，結果寫到各檔案自己的子資料夾，
+避免多台主機同時覆寫 binary_result.csv 等固定檔名。
+"""
+from __future__ import annotations
+
+import os
+import sys
+from pathlib import Path
+from typing import Dict
+
+from .training_pipeline.config import PipelineConfig
+from .training_pipeline.trainer import execute_pipeline
+
+# 添加 ui_shared 模組路徑
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT / "ui_shared") not in sys.path:
+    sys.path.insert(0, str(_ROOT / "ui_shared"))
+
+from job_queue import PermanentJobError
+
+# 工作佇列資料庫（與 cisco_notifications.db 相同放在工作目錄）
+JOB_DB_PATH = "cisco_monitor_jobs.db"
+
+
+def run_auto_clean_job(payload: Dict[str, str]) -> Dict[str, object]:
+    """工作佇列 handler：對 payload["path"] 執行完整的清洗與推論流程。"""
+    file_path = payload.get("path", "")
+    binary_model = payload.get("binary_model_path", "")
+    multi_model = payload.get("model_path", "")
+    output_dir = payload.get("clean_csv_dir", "")
+    if output_dir and payload.get("output_subdir"):
+        output_dir = os.path.join(output_dir, payload["output_subdir"])
+
+    missing = []
+    if not binary_model:
+        missing.append("二元模型")
+    if not multi_model:
+        missing.append("多元模型")
+    if not output_dir:
+        missing.append("清洗輸出資料夾")
+    if not file_path or not os.path.exists(file_path):
+        missing.append("log 檔案")
+    if missing:
+        raise PermanentJobError(f"自動分析缺少必要項目：{'、'.join(missing)}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    config = PipelineConfig(
+        raw_log_path=file_path,
+        binary_model_path=binary_model,
+        multiclass_model_path=multi_model,
+        output_dir=output_dir,
+        show_progress=False,
+    )
+    return execute_pipeline(config)
+
+
+__all__ = ["JOB_DB_PATH", "run_auto_clean_job"]
@@ -4,8 +4,11 @@ from __future__ import annotations
 import json
 import os
 import re
+import shutil
+import sys
 import time
 import joblib
+from pathlib import Path
 from typing import Any, Dict, Tuple
 import pandas as pd
 from sklearn.model_selection import train_test_split
@@ -20,6 +23,14 @@ from .model_builder import ModelBuilder
 from .evaluator import Evaluator
 from .combo_optimizer import ComboOptimizer
 
+# 添加 ui_shared 模組路徑（串流讀取工具與另一個介面共用）
+_ROOT = Path(__file__).resolve().parents[2]
+if str(_ROOT / "ui_shared") not in sys.path:
+    sys.path.insert(0, str(_ROOT / "ui_shared"))
+
+from archive_stream import ensure_supported, is_compressed, open_source, read_head_lines  # noqa: E402
+from csv_ingest import StreamingCsvReader  # noqa: E402
+
 
 class CiscoTrainingPipeline:
     """Cisco ASA 機器學習訓練管線"""
@@ -53,6 +64,7 @@ class CiscoTrainingPipeline:
         
         # 輸出目錄
         self.out_dir = None
+        self.ingest_report = None
         
     def _prepare_artifacts_dir(self) -> str:
         """建立輸出目錄"""
@@ -66,19 +78,20 @@ class CiscoTrainingPipeline:
     def _load_data(self, csv_path: str) -> pd.DataFrame:
         """載入訓練資料 - 支持格式自動偵測"""
         print(f"📂 載入資料：{csv_path}")
+        # .7z / .rar 無法串流：直接回報不支援
+        ensure_supported(csv_path)
         
         # 偵測資料格式
         data_format = self._detect_data_format(csv_path)
         print(f"🔍 偵測到資料格式：{data_format}")
         
         if data_format == "compressed":
-            print("📦 偵測到壓縮檔案，先解壓縮...")
-            extracted_file = self._extract_compressed_file(csv_path)
-            if extracted_file:
-                # 遞迴檢測解壓後的檔案格式
-                return self._load_data(extracted_file)
+            # 不解壓到暫存目錄：以解壓串流偵測內容格式，CSV 直接串流讀取
+            inner_format = self._sniff_format(read_head_lines(csv_path, 10))
+            print(f"📦 偵測到壓縮檔案，串流讀取（內容格式：{inner_format}）...")
+            if inner_format == "cisco_asa_log":
+                df = self._process_cisco_logs(csv_path)
             else:
-                print("❌ 壓縮檔案解壓失敗，嘗試直接解析...")
                 df = self._load_csv_with_fallback(csv_path)
         elif data_format == "cisco_asa_log":
             print("🔄 偵測到 Cisco ASA Log 格式，執行 ETL 前處理...")
@@ -97,123 +110,56 @@ class CiscoTrainingPipeline:
     
     def _detect_data_format(self, file_path: str) -> str:
         """偵測輸入檔案的資料格式，支援壓縮檔案"""
-        import os
-        
         # 檢查是否為壓縮檔案
-        file_extension = os.path.splitext(file_path)[1].lower()
-        if file_extension in ['.gz', '.zip', '.7z', '.rar', '.tar', '.bz2']:
+        if is_compressed(file_path):
             return "compressed"
         
         try:
             with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
                 sample_lines = [f.readline().strip() for _ in range(10)]
-            
-            # 移除空行
-            sample_lines = [line for line in sample_lines if line]
-            if not sample_lines:
-                return "empty"
-            
-            # 檢查是否為 Cisco ASA log 格式
-            cisco_patterns = [
-                r'%ASA-\d+-\d+:',           # ASA syslog 格式
-                r'Connection\s+\w+',        # Connection built/teardown
-                r'Deny\s+\w+',              # Deny 規則
-                r'Built\s+\w+',             # Built connection
-                r'Teardown\s+\w+',          # Teardown connection
-            ]
-            
-            cisco_matches = 0
-            for line in sample_lines:
-                for pattern in cisco_patterns:
-                    if re.search(pattern, line):
-                        cisco_matches += 1
-                        break
-            
-            # 如果超過30%的行匹配 Cisco 模式
-            if cisco_matches / len(sample_lines) > 0.3:
-                return "cisco_asa_log"
-            
-            # 檢查是否為標準 CSV（有逗號且第一行像標題）
-            first_line = sample_lines[0]
-            if ',' in first_line and not first_line.startswith('%'):
-                # 嘗試解析 CSV 標題
-                potential_headers = [h.strip() for h in first_line.split(',')]
-                if (len(potential_headers) >= 3 and 
-                    all(h.isalnum() or '_' in h for h in potential_headers[:3])):
-                    return "csv"
-            
-            return "unknown"
-            
+            return self._sniff_format(sample_lines)
         except Exception as e:
             print(f"⚠️ 格式偵測失敗：{e}")
             return "unknown"
     
-    def _extract_compressed_file(self, file_path: str) -> str | None:
-        """解壓縮檔案並返回解壓後的檔案路徑"""
-        import os
-        import tempfile
-        import zipfile
-        import gzip
-        import tarfile
-        import shutil
-        
-        file_extension = os.path.splitext(file_path)[1].lower()
-        temp_dir = tempfile.mkdtemp()
+    @staticmethod
+    def _sniff_format(sample_lines) -> str:
+        """依開頭幾行判斷 cisco_asa_log / csv / unknown（一般檔案與解壓串流共用）"""
+        # 移除空行
+        sample_lines = [line for line in sample_lines if line]
+        if not sample_lines:
+            return "empty"
+        
+        # 檢查是否為 Cisco ASA log 格式
+        cisco_patterns = [
+            r'%ASA-\d+-\d+:',           # ASA syslog 格式
+            r'Connection\s+\w+',        # Connection built/teardown
+            r'Deny\s+\w+',              # Deny 規則
+            r'Built\s+\w+',             # Built connection
+            r'Teardown\s+\w+',          # Teardown connection
+        ]
         
-        try:
-            if file_extension == '.gz':
-                # 處理 .gz 檔案
-                output_path = os.path.join(temp_dir, 'extracted_file.txt')
-                with gzip.open(file_path, 'rt', encoding='utf-8', 
-                               errors='ignore') as gz_file:
-                    with open(output_path, 'w', encoding='utf-8') as out_file:
-                        shutil.copyfileobj(gz_file, out_file)
-                print(f"✅ 成功解壓 .gz 檔案到: {output_path}")
-                return output_path
-                
-            elif file_extension == '.zip':
-                # 處理 .zip 檔案
-                with zipfile.ZipFile(file_path, 'r') as zip_file:
-                    # 取得第一個檔案
-                    file_list = zip_file.namelist()
-                    if not file_list:
-                        print("❌ ZIP 檔案為空")
-                        return None
-                    
-                    first_file = file_list[0]
-                    extracted_path = zip_file.extract(first_file, temp_dir)
-                    print(f"✅ 成功解壓 .zip 檔案到: {extracted_path}")
-                    return extracted_path
-                    
-            elif file_extension in ['.tar', '.tar.gz', '.tgz']:
-                # 處理 .tar 相關檔案
-                with tarfile.open(file_path, 'r:*') as tar_file:
-                    members = tar_file.getmembers()
-                    if not members:
-                        print("❌ TAR 檔案為空")
-                        return None
-                    
-                    first_member = members[0]
-                    if first_member.isfile():
-                        tar_file.extract(first_member, temp_dir)
-                        extracted_path = os.path.join(
-                            temp_dir, first_member.name
-                        )
-                        print(f"✅ 成功解壓 .tar 檔案到: {extracted_path}")
-                        return extracted_path
-                        
-            else:
-                print(f"⚠️ 不支援的壓縮格式: {file_extension}")
-                return None
-                
-        except Exception as e:
-            print(f"❌ 解壓縮失敗: {e}")
-            # 清理暫存目錄
-            try:
-                shutil.rmtree(temp_dir)
-            except Exception:
-                pass
-            return None
+        cisco_matches = 0
+        for line in sample_lines:
+            for pattern in cisco_patterns:
+                if re.search(pattern, line):
+                    cisco_matches += 1
+                    break
+        
+        # 如果超過30%的行匹配 Cisco 模式
+        if cisco_matches / len(sample_lines) > 0.3:
+            return "cisco_asa_log"
+        
+        # 檢查是否為標準 CSV（有逗號且第一行像標題）
+        first_line = sample_lines[0]
+        if ',' in first_line and not first_line.startswith('%'):
+            # 嘗試解析 CSV 標題
+            potential_headers = [h.strip() for h in first_line.split(',')]
+            if (len(potential_headers) >= 3 and 
+                all(h.isalnum() or '_' in h for h in potential_headers[:3])):
+                return "csv"
+        
+        return "unknown"
     
     def _process_cisco_logs(self, log_path: str) -> pd.DataFrame:
         """處理 Cisco ASA 日誌檔案，轉換為結構化資料"""
@@ -239,6 +185,13 @@ class CiscoTrainingPipeline:
             mappings_json = os.path.join(temp_dir, "mappings.json")
             
             try:
+                if is_compressed(log_path):
+                    # step1 以路徑讀檔並需偵測編碼：把解壓串流直接寫進本次 ETL 的暫存目錄（隨之清除）
+                    raw_log = os.path.join(temp_dir, "raw.log")
+                    with open_source(log_path) as src, open(raw_log, "wb") as dst:
+                        shutil.copyfileobj(src, dst, 1024 * 1024)
+                    log_path = raw_log
+                
                 # Step 1: 清洗原始日誌
                 print("  📋 Step 1: 清洗原始日誌...")
                 step1_process_logs(log_path, step1_out, unique_json, batch_id=1, show_progress=False)
@@ -252,7 +205,7 @@ class CiscoTrainingPipeline:
                 step3_generate_features(step2_out, step3_out, mappings_json, show_progress=False)
                 
                 # 載入最終結果
-                df = pd.read_csv(step3_out)
+                df = self._load_csv_with_fallback(step3_out)
                 print(f"  ✅ ETL 處理完成，產生 {len(df)} 筆結構化資料")
                 return df
                 
@@ -262,29 +215,25 @@ class CiscoTrainingPipeline:
                 return self._load_csv_with_fallback(log_path)
     
     def _load_csv_with_fallback(self, csv_path: str) -> pd.DataFrame:
-        """使用多種方法載入 CSV 檔案"""
-        try:
-            # 方法 1: 標準讀取
-            return pd.read_csv(csv_path)
-        except pd.errors.ParserError:
-            try:
-                # 方法 2: 使用 Python 引擎，跳過錯誤行
-                print("⚠️ CSV 解析錯誤，使用 Python 引擎重試...")
-                return pd.read_csv(
-                    csv_path, engine='python', 
-                    error_bad_lines=False, warn_bad_lines=False
-                )
-            except Exception:
-                try:
-                    # 方法 3: 更寬鬆的解析
-                    print("⚠️ 使用更寬鬆的 CSV 解析...")
-                    return pd.read_csv(
-                        csv_path, sep=None, engine='python', 
-                        encoding='utf-8', on_bad_lines='skip'
-                    )
-                except Exception as e:
-                    print(f"❌ 所有 CSV 解析方法都失敗：{e}")
-                    raise
+        """單趟容錯讀取 CSV：欄位數不符的行寫入 reports/ 下的 quarantine 檔（含行號），其餘照常載入"""
+        qdir = os.path.join(self.out_dir, "reports") if self.out_dir else os.path.dirname(os.path.abspath(csv_path))
+        base = os.path.splitext(os.path.basename(csv_path))[0]
+        reader = StreamingCsvReader(quarantine_path=os.path.join(qdir, f"{base}_quarantine.tsv"))
+        with open_source(csv_path) as src:
+            df = reader.read(src)
+        self.ingest_report = reader.report.to_dict()
+        if reader.report.coerced_cells:
+            print(f"⚠️ {reader.report.coerced_cells} 個非數值儲存格已轉為缺值：{reader.report.coerced_columns}")
+        if reader.report.bad_rows or reader.report.coerced_cells:
+            if reader.report.bad_rows:
+                print(f"⚠️ 略過 {reader.report.bad_rows} 行格式錯誤資料"
+                      f"（行號示例 {reader.report.bad_line_numbers[:5]}），已寫入 {reader.report.quarantine_path}")
+            if self.out_dir:
+                with open(os.path.join(self.out_dir, "reports", "ingest_report.json"), "w", encoding="utf-8") as f:
+                    json.dump(self.ingest_report, f, ensure_ascii=False, indent=2)
+        if df.empty and reader.report.bad_rows:
+            raise RuntimeError(f"❌ 所有資料行的欄位數都與標題不符：{reader.report.quarantine_path}")
+        return df
     
     def _apply_basic_etl_transforms(self, df: pd.DataFrame) -> pd.DataFrame:
         """應用基本的 ETL 轉換"""
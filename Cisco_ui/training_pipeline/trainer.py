@@ -20,20 +20,21 @@ for path in [parent_dir, root_dir]:
 
 # 嘗試各種 import 方式
 EtlOutputs = None
+append_all_results = None
 run_etl_pipeline = None
 run_models = None
 
 try:
     # 優先嘗試絕對路徑
-    from Cisco_ui.etl_pipeliner import EtlOutputs, run_etl_pipeline, run_models
+    from Cisco_ui.etl_pipeliner import EtlOutputs, append_all_results, run_etl_pipeline, run_models
 except ImportError:
     try:
         # 嘗試相對路徑
-        from ..etl_pipeliner import EtlOutputs, run_etl_pipeline, run_models  # type: ignore[no-redef]
+        from ..etl_pipeliner import EtlOutputs, append_all_results, run_etl_pipeline, run_models  # type: ignore[no-redef]
     except ImportError:
         try:
             # 嘗試直接 import（當前目錄已在 sys.path 中）
-            from etl_pipeliner import EtlOutputs, run_etl_pipeline, run_models  # type: ignore[no-redef]
+            from etl_pipeliner import EtlOutputs, append_all_results, run_etl_pipeline, run_models  # type: ignore[no-redef]
         except ImportError:
             # 最後備案：動態載入
             import importlib.util
@@ -43,6 +44,7 @@ except ImportError:
                 etl_pipeliner = importlib.util.module_from_spec(spec)
                 spec.loader.exec_module(etl_pipeliner)
                 EtlOutputs = etl_pipeliner.EtlOutputs
+                append_all_results = etl_pipeliner.append_all_results
                 run_etl_pipeline = etl_pipeliner.run_etl_pipeline
                 run_models = etl_pipeliner.run_models
             else:
@@ -55,13 +57,7 @@ def _append_all_results(etl_outputs: EtlOutputs, df_binary, output_dir: str) ->
     """將本批結果追加到 all_results.csv。"""
     if df_binary is None:
         raise ValueError("模型推論結果為 None，請檢查模型與輸入資料格式是否正確。")
-    all_results_path = os.path.join(output_dir, "all_results.csv")
-    write_header = not os.path.exists(all_results_path)
-    dataframe = df_binary.copy()
-    dataframe["batch_id"] = etl_outputs.batch_id
-    with open(all_results_path, "a", newline="", encoding="utf-8") as handle:
-        dataframe.to_csv(handle, header=write_header, index=False)
-    return all_results_path
+    return append_all_results(etl_outputs, df_binary, output_dir)
 
 
 def execute_pipeline(config: PipelineConfig) -> Dict[str, object]:
@@ -6,6 +6,7 @@
 """
 from __future__ import annotations
 
+import functools
 import html
 import os
 import shutil
@@ -15,7 +16,7 @@ import tempfile
 import threading
 import time
 from pathlib import Path
-from typing import Dict, List, Optional, Set, Tuple
+from typing import Dict, List, Optional, Set
 
 import pandas as pd
 import streamlit as st
@@ -39,6 +40,7 @@ append_log, load_json, save_json = None, None, None
 try:  # First try: package-relative imports when available
     from ..training_pipeline.config import PipelineConfig
     from ..training_pipeline.trainer import execute_pipeline
+    from ..monitor_jobs import JOB_DB_PATH, run_auto_clean_job
     from ..notifier import notification_pipeline
     from .utils_labels import append_log, load_json, save_json
     from ..notification_storage import get_notification_storage
@@ -46,12 +48,14 @@ except (ImportError, ValueError):
     try:  # Second try: direct imports from package directory
         from training_pipeline.config import PipelineConfig  # type: ignore[no-redef]
         from training_pipeline.trainer import execute_pipeline  # type: ignore[no-redef]
+        from monitor_jobs import JOB_DB_PATH, run_auto_clean_job  # type: ignore[no-redef]
         from notifier import notification_pipeline  # type: ignore[no-redef]
         from utils_labels import append_log, load_json, save_json  # type: ignore[no-redef]
     except ImportError:
         try:  # Third try: absolute imports from Cisco_ui
             from Cisco_ui.training_pipeline.config import PipelineConfig  # type: ignore[no-redef]
             from Cisco_ui.training_pipeline.trainer import execute_pipeline  # type: ignore[no-redef]
+            from Cisco_ui.monitor_jobs import JOB_DB_PATH, run_auto_clean_job  # type: ignore[no-redef]
             from Cisco_ui.notifier import notification_pipeline  # type: ignore[no-redef]
             from Cisco_ui.utils_labels import append_log, load_json, save_json  # type: ignore[no-redef]
         except ImportError:
@@ -70,6 +74,11 @@ except (ImportError, ValueError):
             def notification_pipeline(*args, **kwargs):  # type: ignore[no-redef]
                 st.warning("Notification pipeline not available")
                 return None
+
+            JOB_DB_PATH = "cisco_monitor_jobs.db"
+
+            def run_auto_clean_job(*args, **kwargs):  # type: ignore[no-redef]
+                return None
             
             def append_log(*args, **kwargs):  # type: ignore[no-redef]
                 return None
@@ -87,6 +96,17 @@ except (ImportError, ValueError):
                 with open(file_path, 'w', encoding='utf-8') as f:
                     json.dump(data, f, ensure_ascii=False, indent=2)
 
+# 添加 ui_shared 模組路徑
+_ROOT = Path(__file__).resolve().parents[2]
+if str(_ROOT / "ui_shared") not in sys.path:
+    sys.path.insert(0, str(_ROOT / "ui_shared"))
+
+import file_lease
+import file_ledger
+import file_stability
+import job_queue
+import tail_follow
+
 # 設定檔路徑與預設值定義
 LOG_SETTINGS_FILE = "logfetcher_settings.json"
 NOTIFIER_SETTINGS_FILE = "notifier_settings.txt"
@@ -95,7 +115,13 @@ DEFAULT_LOG_SETTINGS = {
     "binary_model_path": "",
     "model_path": "",
     "clean_csv_dir": "",
+    "tail_mode": "",
+    "shared_mode": "",
 }
+# 增量追蹤（tail）：每個檔案已處理的位元組位置
+TAIL_STATE_FILE = "cisco_tail_offsets.json"
+# 已處理檔案帳本（SQLite）：重啟後不重新處理、不重複推播
+LEDGER_DB_PATH = "cisco_file_ledger.db"
 DEFAULT_NOTIFIER_SETTINGS = {
     "gemini_api_key": "",
     "line_channel_secret": "",
@@ -135,13 +161,15 @@ class CiscoFileMonitorHandler(FileSystemEventHandler):
         super().__init__()
         self.log_monitor = log_monitor
         self.events = []
-        self.processed_files = set()  # 已處理的檔案（檔案路徑+修改時間）
         self.ignore_patterns = set()  # 要忽略的檔案模式
+        # 佇列已滿未能排入的檔案：不受事件時間窗限制，直到排入、處理完成或檔案消失
+        self.deferred: Set[str] = set()
         
     def on_created(self, event):
         """檔案建立事件處理。"""
         if not event.is_directory and self._should_process_file(event.src_path):
             self.events.append(('created', event.src_path, time.time()))
+            self.log_monitor.stability.observe(event.src_path)
             append_log(self.log_monitor.log_messages, 
                       f"🆕 偵測到新檔案：{event.src_path}")
     
@@ -149,6 +177,7 @@ class CiscoFileMonitorHandler(FileSystemEventHandler):
         """檔案修改事件處理。"""
         if not event.is_directory and self._should_process_file(event.src_path):
             self.events.append(('modified', event.src_path, time.time()))
+            self.log_monitor.stability.observe(event.src_path)
             append_log(self.log_monitor.log_messages, 
                       f"📝 檔案已修改：{event.src_path}")
     
@@ -171,7 +200,7 @@ class CiscoFileMonitorHandler(FileSystemEventHandler):
         if filename.startswith('.') or filename.startswith('~'):
             return False
             
-        # 檢查檔案是否已被處理過（基於檔案路徑+修改時間）
+        # 檢查檔案是否已被處理過（帳本中有這個檔案版本的紀錄）
         if self._is_already_processed(path):
             return False
         
@@ -190,24 +219,14 @@ class CiscoFileMonitorHandler(FileSystemEventHandler):
         return False
     
     def _is_already_processed(self, path: str) -> bool:
-        """檢查檔案是否已被處理過（基於檔案路徑和修改時間）"""
-        try:
-            stat = os.stat(path)
-            file_key = f"{path}_{stat.st_mtime}_{stat.st_size}"
-            return file_key in self.processed_files
-        except OSError:
-            return False
+        """檢查檔案是否已被處理過（依帳本中的路徑、inode、大小、修改時間與內容指紋）"""
+        return self.log_monitor.ledger.is_processed(path)
     
     def _mark_as_processed(self, path: str) -> None:
         """標記檔案為已處理"""
-        try:
-            stat = os.stat(path)
-            file_key = f"{path}_{stat.st_mtime}_{stat.st_size}"
-            self.processed_files.add(file_key)
+        if self.log_monitor.ledger.mark(path, file_ledger.DONE):
             append_log(self.log_monitor.log_messages, 
                       f"✅ 標記為已處理：{os.path.basename(path)}")
-        except OSError:
-            pass
     
     def get_pending_files(self) -> List[str]:
         """取得待處理的檔案清單。"""
@@ -224,8 +243,19 @@ class CiscoFileMonitorHandler(FileSystemEventHandler):
             if os.path.exists(file_path):  # 確保檔案仍然存在
                 if file_path not in file_events or timestamp > file_events[file_path][1]:
                     file_events[file_path] = (event_type, timestamp)
+
+        # 佇列持續滿載時事件會超過 60 秒時間窗，延後的檔案另外保留
+        for file_path in list(self.deferred):
+            if not os.path.exists(file_path) or self._is_already_processed(file_path):
+                self.deferred.discard(file_path)
+            elif file_path not in file_events:
+                file_events[file_path] = ("deferred", now)
         
         return list(file_events.keys())
+
+    def defer(self, file_path: str) -> None:
+        """佇列已滿未能排入：保留檔案，下一輪再排入。"""
+        self.deferred.add(file_path)
     
     def mark_processed(self, file_path: str):
         """標記檔案為已處理。"""
@@ -240,10 +270,8 @@ class CiscoFileMonitorHandler(FileSystemEventHandler):
             if now - event[2] < 86400  # 24 hours
         ]
         
-        # 清理處理記錄（保留最近 1000 個）
-        if len(self.processed_files) > 1000:
-            processed_list = list(self.processed_files)
-            self.processed_files = set(processed_list[-1000:])
+        # 淘汰超過保留期限的帳本紀錄（依最後更新時間）
+        self.log_monitor.ledger.evict()
 
 
 class LogMonitor:
@@ -256,13 +284,19 @@ class LogMonitor:
         self.stop_event = threading.Event()
         self.monitor_thread: Optional[threading.Thread] = None
         self.socket_process: Optional[subprocess.Popen[str]] = None
-        self.processed_files: Set[Tuple[str, int, float]] = set()
+        self.ledger = file_ledger.get_ledger(LEDGER_DB_PATH)
+        # 檔案穩定度（事件驅動、不阻塞）與輪詢模式的資料夾快照
+        self.stability = file_stability.StabilityTracker()
+        self._dir_index: Optional[file_stability.DirectoryIndex] = None
         self.notified_multiclass_files: Set[str] = set()
         self.last_file_checked = ""
         self.last_file_size = 0
         self.file_stable_count = 0
         self.last_processed_file = ""
-        self.cleaning_lock = threading.Lock()
+        # 排入背景工作佇列、尚未處理完成結果的工作：{工作編號: 檔案路徑}
+        self.active_jobs: Dict[int, str] = {}
+        self._job_attempts: Dict[int, int] = {}
+        self._jobs_lock = threading.Lock()
         self.latest_result: Optional[Dict[str, object]] = None
         self.paused = False
         self._last_folder_error: Optional[str] = None
@@ -273,6 +307,58 @@ class LogMonitor:
         self.use_watchdog = WATCHDOG_AVAILABLE
 
     # ==== 狀態管理 ====
+    @property
+    def tail_mode(self) -> bool:
+        """是否以增量追蹤處理持續寫入的 log（只處理新增的完整列）。
+
+        讀取位置只存在本機，多主機共用資料夾時停用以免重複處理。
+        """
+        return self.settings.get("tail_mode", "") == "1" and not self.shared_mode
+
+    @property
+    def shared_mode(self) -> bool:
+        """多台主機共用同一個監控資料夾：處理前以租約檔認領，避免重複處理與重複推播。"""
+        return self.settings.get("shared_mode", "") == "1"
+
+    def _leases(self) -> "file_lease.LeaseManager":
+        """監控資料夾的租約管理器（租約檔放在 <資料夾>/.dflare_leases/）。"""
+        return file_lease.get_manager(self.settings.get("save_dir", "").strip())
+
+    def output_dir_for(self, file_path: Optional[str]) -> str:
+        """檔案的結果資料夾：共用資料夾模式寫在清洗輸出資料夾下以檔名命名的子資料夾，否則就是清洗輸出資料夾。"""
+        output_dir = self.settings.get("clean_csv_dir", "").strip()
+        if output_dir and file_path and self.shared_mode:
+            return os.path.join(output_dir, os.path.splitext(os.path.basename(file_path))[0])
+        return output_dir
+
+    def latest_output_dir(self) -> str:
+        """最近一次分析結果所在的資料夾（供圖表與推論頁讀取 binary_result.csv 等固定檔名）。
+
+        優先採用本行程最近完成的工作；沒有時在清洗輸出資料夾與其第一層子資料夾中
+        找 binary_result.csv 最新的那一個。
+        """
+        output_csv = (self.latest_result or {}).get("binary_output_csv")
+        if isinstance(output_csv, str) and os.path.exists(output_csv):
+            return os.path.dirname(output_csv)
+        output_dir = self.settings.get("clean_csv_dir", "").strip()
+        if not output_dir or not os.path.isdir(output_dir):
+            return output_dir
+        candidates = [output_dir]
+        try:
+            with os.scandir(output_dir) as entries:
+                candidates.extend(entry.path for entry in entries if entry.is_dir(follow_symlinks=False))
+        except OSError:
+            return output_dir
+        latest, latest_mtime = output_dir, -1.0
+        for folder in candidates:
+            try:
+                mtime = os.path.getmtime(os.path.join(folder, "binary_result.csv"))
+            except OSError:
+                continue
+            if mtime > latest_mtime:
+                latest, latest_mtime = folder, mtime
+        return latest
+
     def update_settings(self, **kwargs: str) -> None:
         """更新監控設定並立即寫入設定檔。"""
         self.settings.update({k: v.strip() for k, v in kwargs.items()})
@@ -322,6 +408,11 @@ class LogMonitor:
                     self.observer = None
                 self.file_handler = None
 
+        # 淘汰過期的帳本紀錄；保留期限內已處理的檔案不會因重啟而重新分析
+        self.ledger.evict()
+        if self.shared_mode:
+            self._leases().purge()
+
         # 啟動監控執行緒（輪詢模式 或 watchdog事件處理）
         self.monitor_thread = threading.Thread(target=self._monitor_loop, daemon=True)
         self.monitor_thread.start()
@@ -399,11 +490,22 @@ class LogMonitor:
         
         while not self.stop_event.is_set():
             try:
+                self.collect_jobs()
                 if not self.paused:
+                    if self.shared_mode:
+                        # 共用資料夾：接回重啟前排入工作的租約；其他主機的租約過期（可能已當機）時接手
+                        self._reattach_leases()
+                        self._retry_expired_leases()
+                    else:
+                        # 帳本中失敗的檔案到了重試時間（指數退避，有次數上限）時重新排入
+                        self._retry_failed_files()
+                    if self.tail_mode:
+                        # 增量追蹤：持續寫入的檔案只處理新增的完整列
+                        self._tail_folder()
                     if self.use_watchdog and self.file_handler:
                         # 使用watchdog時，處理待處理的檔案
                         self._process_watchdog_events()
-                    else:
+                    elif not self.tail_mode:
                         # 傳統輪詢模式
                         self._inspect_folder()
                 
@@ -438,44 +540,44 @@ class LogMonitor:
             self._cleanup_counter = 0
             
         pending_files = self.file_handler.get_pending_files()
+        # 已處理（帳本擋下）、已刪除或事件過期的路徑不再追蹤穩定度，避免追蹤表無限成長
+        waiting = set(pending_files)
+        for tracked in self.stability.pending():
+            if tracked not in waiting:
+                self.stability.discard(tracked)
         
         if pending_files:
             append_log(self.log_messages, f"📋 發現 {len(pending_files)} 個待處理檔案")
             
         for file_path in pending_files:
+            if self.tail_mode and tail_follow.is_tailable(file_path):
+                continue  # 由 _tail_folder 依位元組位置處理
+            if self.shared_mode and self._leases().is_waiting(file_path):
+                continue  # 其他執行個體處理中，租約過期時由 _retry_expired_leases 接手
             if os.path.exists(file_path) and not self.file_handler._is_already_processed(file_path):
-                # 檢查檔案是否穩定（大小不再變化）
+                # 檢查檔案是否穩定（大小與修改時間維持一段安靜期）
                 if self._is_file_stable(file_path):
                     self.last_processed_file = file_path
                     filename = os.path.basename(file_path)
-                    append_log(self.log_messages, f"🚀 開始處理檔案：{filename}")
                     
-                    # 先標記為處理中，避免重複處理
-                    self.file_handler.mark_processed(file_path)
-                    
-                    # 啟動處理
+                    # 排入工作佇列成功時記入帳本；佇列已滿時保留在延後清單，下一輪再排入
                     try:
-                        self._launch_auto_clean(file_path)
-                        append_log(self.log_messages, f"✅ 檔案處理完成：{filename}")
+                        if self._launch_auto_clean(file_path):
+                            self.stability.discard(file_path)
+                            self.file_handler.deferred.discard(file_path)
+                        else:
+                            self.file_handler.defer(file_path)
                     except Exception as e:
-                        append_log(self.log_messages, f"❌ 檔案處理失敗：{filename} - {str(e)}")
+                        append_log(self.log_messages, f"❌ 檔案排入失敗：{filename} - {str(e)}")
                 else:
                     append_log(self.log_messages, f"⏳ 等待檔案穩定：{os.path.basename(file_path)}")
             elif self.file_handler._is_already_processed(file_path):
                 # 檔案已處理過，從待處理清單中移除
                 continue
     
-    def _is_file_stable(self, file_path: str, stable_seconds: int = 3) -> bool:
-        """檢查檔案是否在指定時間內大小保持穩定。"""
-        try:
-            initial_size = os.path.getsize(file_path)
-            time.sleep(stable_seconds)
-            if self.stop_event.is_set():
-                return False
-            final_size = os.path.getsize(file_path)
-            return initial_size == final_size
-        except (OSError, FileNotFoundError):
-            return False
+    def _is_file_stable(self, file_path: str) -> bool:
+        """檢查檔案大小與修改時間是否已維持一段安靜期（只 stat 一次，不阻塞監控執行緒）。"""
+        return self.stability.is_ready(file_path)
 
     def _inspect_folder(self, manual: bool = False) -> None:
         """掃描資料夾，若找到穩定的最新檔案便啟動自動清洗。"""
@@ -491,32 +593,39 @@ class LogMonitor:
             return
         self._last_folder_error = None
 
+        # 資料夾快照：只有資料夾 mtime 變動（新增／刪除檔案）時才重新列出並 stat
+        if self._dir_index is None or self._dir_index.root != os.path.abspath(folder):
+            self._dir_index = file_stability.DirectoryIndex(folder, recursive=False)
         try:
-            files = [
-                f
-                for f in os.listdir(folder)
-                if f.endswith(".csv") and f.startswith("asa_logs_") and "_result" not in f
-            ]
+            self._dir_index.scan()
+            snapshot = self._dir_index.files(folder)
         except Exception as exc:
             append_log(self.log_messages, f"❌ 無法讀取資料夾：{exc}")
             return
+        # 快照只提供檔名清單：原地追加不會改變資料夾 mtime，大小與修改時間要對候選檔重新 stat
+        versions = {}
+        for path in snapshot:
+            name = os.path.basename(path)
+            if not (name.endswith(".csv") and name.startswith("asa_logs_") and "_result" not in name):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            versions[path] = (stat.st_mtime_ns, stat.st_size)
 
-        if not files:
+        if not versions:
             if manual:
                 append_log(self.log_messages, "ℹ️ 目前資料夾沒有新的 log 檔案")
             return
 
-        files.sort(key=lambda name: os.path.getmtime(os.path.join(folder, name)), reverse=True)
-        latest_file = os.path.join(folder, files[0])
-        current_size = os.path.getsize(latest_file) if os.path.exists(latest_file) else 0
-        now = time.time()
+        latest_file = max(versions, key=lambda path: versions[path][0])
+        current_size = versions[latest_file][1]
 
-        # 移除超過一小時的紀錄
-        self.processed_files = {
-            item for item in self.processed_files if now - item[2] < 3600
-        }
-        if any(item[0] == latest_file and item[1] == current_size for item in self.processed_files):
+        if self.ledger.is_processed(latest_file):
             return
+        if self.shared_mode and self._leases().is_waiting(latest_file):
+            return  # 其他執行個體處理中，租約過期時由 _retry_expired_leases 接手
 
         if latest_file != self.last_file_checked:
             self.last_file_checked = latest_file
@@ -536,71 +645,231 @@ class LogMonitor:
 
         if self.file_stable_count >= 2:
             self.last_processed_file = latest_file
-            self.processed_files.add((latest_file, current_size, now))
             append_log(self.log_messages, f"🚀 檔案穩定，準備自動分析：{latest_file}")
             self._launch_auto_clean(latest_file)
 
+    def _tail_folder(self) -> None:
+        """增量追蹤：把每個 log 檔新增的完整列切成微批次（帶 CSV 表頭）排入工作佇列。"""
+        folder = self.settings.get("save_dir", "").strip()
+        output_dir = self.settings.get("clean_csv_dir", "").strip()
+        if not folder or not output_dir or not os.path.isdir(folder):
+            return
+        reader = tail_follow.get_reader(TAIL_STATE_FILE)
+        batch_dir = os.path.join(output_dir, "tail_batches")
+        try:
+            names = sorted(os.listdir(folder))
+        except OSError as exc:
+            append_log(self.log_messages, f"❌ 無法讀取資料夾：{exc}")
+            return
+        for name in names:
+            path = os.path.join(folder, name)
+            lower = name.lower()
+            if (
+                not os.path.isfile(path)
+                or name.startswith((".", "~"))
+                or lower == "all_results.csv"
+                or not tail_follow.is_tailable(path)
+                or any(suffix in lower for suffix in CiscoFileMonitorHandler.ETL_SUFFIXES)
+            ):
+                continue
+            stem, ext = os.path.splitext(name)
+            for _ in range(int(reader.settings["MAX_BATCHES_PER_POLL"])):
+                batch = reader.poll(path)
+                if batch is None:
+                    break
+                target = batch.write(os.path.join(batch_dir, f"{stem}_{batch.tag}{ext}"))
+                # 同一來源的微批次依序執行，結果依序附加到 all_results.csv 並各自推播
+                if not self._launch_auto_clean(target, key=f"tail|{batch.key}|{batch.tag}", group=batch.key):
+                    break  # 佇列已滿：不推進位置，下一輪重讀同一段
+                reader.commit(batch)
+                self.last_processed_file = path
+                append_log(
+                    self.log_messages,
+                    f"🧩 增量批次：{name} 新增 {batch.lines} 列（位元組 {batch.start}-{batch.end}）",
+                )
+
+    def _reattach_leases(self) -> None:
+        """接回重啟前排入、尚未結束的工作所持有的租約（恢復心跳與完成標記）；租約已被接手時取消工作。"""
+        queue = self._get_job_queue()
+        for job in queue.jobs(limit=int(queue.settings["MAX_PENDING"]), statuses=job_queue.ACTIVE_STATUSES):
+            info = job["payload"].get("lease")
+            if not info:
+                continue
+            manager = file_lease.get_manager(info["root"])
+            if any(held.lease_path == info["lease_path"] for held in manager.held()):
+                continue
+            lease = manager.adopt(
+                job["path"], info["lease_path"], info["owner"], watch=functools.partial(queue.outcome, job["id"])
+            )
+            if lease is not None:
+                append_log(self.log_messages, f"🔗 已接回工作 #{job['id']} 的租約：{os.path.basename(job['path'])}")
+            elif queue.cancel(job["id"], "lease was taken over by another instance"):
+                append_log(self.log_messages, f"🤝 租約已由其他執行個體接手，取消工作 #{job['id']}")
+
+    def _retry_expired_leases(self) -> None:
+        """重新排入租約已過期或被放棄的檔案（原本由其他執行個體認領）。"""
+        for file_path in self._leases().takeover_candidates():
+            append_log(self.log_messages, f"♻️ 租約已過期，接手處理：{os.path.basename(file_path)}")
+            self._launch_auto_clean(file_path)
+
+    def _retry_failed_files(self) -> None:
+        """重新排入帳本中已到重試時間的失敗檔案（共用資料夾模式的失敗由租約標記決定，不在此重試）。"""
+        folder = self.settings.get("save_dir", "").strip()
+        if not folder or not os.path.isdir(folder):
+            return
+        for file_path in self.ledger.retry_candidates(folder):
+            append_log(self.log_messages, f"🔁 重新嘗試先前失敗的檔案：{os.path.basename(file_path)}")
+            if not self._launch_auto_clean(file_path):
+                break  # 佇列已滿：下一輪再試
+
     def scan_once(self) -> None:
         """供 UI 手動觸發一次資料夾掃描。"""
         append_log(self.log_messages, "🔍 手動觸發資料夾掃描")
         self._inspect_folder(manual=True)
 
     # ==== 自動清洗與推論 ====
-    def _launch_auto_clean(self, file_path: str) -> None:
-        if self.cleaning_lock.locked():
-            append_log(self.log_messages, "⏳ 前一次自動分析尚未完成，略過本次觸發")
-            return
-        threading.Thread(target=self._run_auto_clean, args=(file_path,), daemon=True).start()
-
-    def _run_auto_clean(self, file_path: str) -> None:
-        with self.cleaning_lock:
-            append_log(self.log_messages, "⚙️ 開始執行自動清洗與推論流程")
-            binary_model = self.settings.get("binary_model_path", "").strip()
-            multi_model = self.settings.get("model_path", "").strip()
-            output_dir = self.settings.get("clean_csv_dir", "").strip()
-
-            missing = []
-            if not binary_model:
-                missing.append("二元模型")
-            if not multi_model:
-                missing.append("多元模型")
-            if not output_dir:
-                missing.append("清洗輸出資料夾")
-            if not os.path.exists(file_path):
-                missing.append("log 檔案")
-            if missing:
-                append_log(self.log_messages, f"❌ 自動分析缺少必要項目：{'、'.join(missing)}")
-                return
-
-            os.makedirs(output_dir, exist_ok=True)
-
-            try:
-                config = PipelineConfig(
-                    raw_log_path=file_path,
-                    binary_model_path=binary_model,
-                    multiclass_model_path=multi_model,
-                    output_dir=output_dir,
-                    show_progress=False,
-                )
-                result = execute_pipeline(config)
-                self.latest_result = result
-                append_log(
-                    self.log_messages,
-                    f"✅ 自動分析完成，輸出 CSV：{result.get('binary_output_csv', '-')}",
-                )
-                if result.get("binary_output_pie"):
-                    append_log(
-                        self.log_messages,
-                        f"📊 二元圓餅圖：{result.get('binary_output_pie')}",
-                    )
-                if result.get("multiclass_output_csv"):
+    def _get_job_queue(self) -> "job_queue.JobQueue":
+        """行程共用的背景工作佇列（清洗與推論在工作行程中執行）。"""
+        return job_queue.get_queue(JOB_DB_PATH, run_auto_clean_job)
+
+    def _launch_auto_clean(self, file_path: str, key: Optional[str] = None, group: Optional[str] = None) -> bool:
+        """將檔案排入背景工作佇列；佇列已滿時回傳 False，由呼叫端保留檔案稍後再排入。
+
+        整檔工作（未指定 group）同時以 queued 記入帳本，工作完成或失敗時由 collect_jobs 更新狀態。
+        共用資料夾模式下先取得租約：已由其他執行個體認領時不排入（回傳 True），
+        結果寫到以檔名命名的子資料夾，租約在工作結束時改寫為完成標記。
+        其餘工作都寫入同一個清洗輸出資料夾（processed_logs.csv、binary_result.csv 等固定檔名），
+        因此以該資料夾為 group 依排入順序逐一執行，不會互相覆寫。
+        """
+        payload = {
+            "path": file_path,
+            "binary_model_path": self.settings.get("binary_model_path", "").strip(),
+            "model_path": self.settings.get("model_path", "").strip(),
+            "clean_csv_dir": self.settings.get("clean_csv_dir", "").strip(),
+        }
+        filename = os.path.basename(file_path)
+        lease = None
+        if group is None and self.shared_mode:
+            leases = self._leases()
+            was_waiting = leases.is_waiting(file_path)
+            lease = leases.acquire(file_path)
+            if lease is None:
+                record = leases.status(file_path) or {}
+                if record.get("status") in file_lease.FINISHED_STATUSES:
+                    self.ledger.mark(file_path, file_ledger.DONE)
+                    append_log(self.log_messages, f"🤝 已由其他執行個體處理：{filename}")
+                elif not was_waiting:
+                    append_log(self.log_messages, f"🔒 其他執行個體處理中（{record.get('owner') or '-'}）：{filename}")
+                return True
+            payload["output_subdir"] = os.path.basename(self.output_dir_for(file_path))
+            # 行程重啟後由 _reattach_leases 依此接回租約
+            payload["lease"] = {"root": leases.root, "lease_path": lease.lease_path, "owner": lease.owner}
+        queue_group = group
+        if "output_subdir" not in payload:
+            queue_group = f"output|{os.path.abspath(payload['clean_csv_dir'] or '.')}"
+        queue = self._get_job_queue()
+        try:
+            job_id = queue.submit(file_path, payload, key=key, group=queue_group)
+        except job_queue.QueueFull as exc:
+            if lease is not None:
+                self._leases().release(lease)
+            append_log(self.log_messages, f"⏳ {exc}，{filename} 稍後再排入")
+            return False
+        if lease is not None:
+            lease.watch = functools.partial(queue.outcome, job_id)
+        if group is None:
+            self.ledger.mark(file_path, file_ledger.QUEUED, job_id)
+        with self._jobs_lock:
+            if job_id not in self.active_jobs:
+                self.active_jobs[job_id] = file_path
+                append_log(self.log_messages, f"📥 已排入工作佇列 #{job_id}：{os.path.basename(file_path)}")
+        return True
+
+    def collect_jobs(self) -> None:
+        """輪詢工作佇列資料庫：記錄重試，交付已結束但尚未處理的工作（含行程重啟前排入的工作）。
+
+        在 _jobs_lock 內只取出工作（take_finished 標記為已交付，同一工作只會交付一次），
+        結果處理與推播在釋放鎖之後執行，不會卡住排入工作的監控執行緒。
+        """
+        queue = self._get_job_queue()
+        with self._jobs_lock:
+            in_flight = queue.jobs(limit=int(queue.settings["MAX_PENDING"]),
+                                   statuses=(job_queue.RUNNING, job_queue.RETRY))
+            for job in in_flight:
+                job_id = job["id"]
+                if job["status"] == job_queue.RUNNING:
+                    self.ledger.update_job(job_id, file_ledger.RUNNING)
+                elif self._job_attempts.get(job_id) != job["attempts"]:
+                    self._job_attempts[job_id] = job["attempts"]
                     append_log(
                         self.log_messages,
-                        f"📊 多元結果：{result.get('multiclass_output_csv')}",
+                        f"🔁 工作 #{job_id} 第 {job['attempts']} 次失敗，稍後重試：{job['error']}",
                     )
-                self._handle_auto_notification(result)
+            finished = queue.take_finished()
+            for job in finished:
+                self.active_jobs.pop(job["id"], None)
+                self._job_attempts.pop(job["id"], None)
+                self.ledger.update_job(job["id"], job["status"])
+                info = job["payload"].get("lease")
+                if info:
+                    # 重啟前排入、結束前未接回的租約：補寫完成標記（心跳已寫過時 adopt 回傳 None）
+                    manager = file_lease.get_manager(info["root"])
+                    lease = manager.adopt(job["path"], info["lease_path"], info["owner"])
+                    if lease is not None:
+                        manager.release(lease, job["status"])
+            # 帳本中仍為 queued／running、但工作已結束或已被佇列清除的紀錄（例如行程重啟前的工作）
+            self.ledger.reconcile(queue.outcome)
+
+        for job in finished:
+            if job["status"] == job_queue.FAILED:
+                append_log(self.log_messages, f"❌ 自動分析失敗（#{job['id']}）：{job['error']}")
+                continue
+            try:
+                self._on_job_done(job["result"] or {})
             except Exception as exc:  # pragma: no cover - 盡量避免中斷
-                append_log(self.log_messages, f"❌ 自動分析失敗：{exc}")
+                append_log(self.log_messages, f"❌ 自動分析結果處理失敗：{exc}")
+
+    def _on_job_done(self, result: Dict[str, object]) -> None:
+        self.latest_result = result
+        append_log(
+            self.log_messages,
+            f"✅ 自動分析完成，輸出 CSV：{result.get('binary_output_csv', '-')}",
+        )
+        if result.get("binary_output_pie"):
+            append_log(
+                self.log_messages,
+                f"📊 二元圓餅圖：{result.get('binary_output_pie')}",
+            )
+        if result.get("multiclass_output_csv"):
+            append_log(
+                self.log_messages,
+                f"📊 多元結果：{result.get('multiclass_output_csv')}",
+            )
+        self._log_inference_stats(result)
+        self._handle_auto_notification(result)
+
+    def _log_inference_stats(self, result: Dict[str, object]) -> None:
+        """記錄去重推論的命中率與串接模型的分流比例。"""
+        for key, label in (("binary", "二元"), ("multiclass", "多元")):
+            stage = result.get(key)
+            if not isinstance(stage, dict):
+                continue
+            cascade = stage.get("cascade")
+            if cascade and cascade.get("rows"):
+                append_log(
+                    self.log_messages,
+                    f"🚦 {label}串接推論：gate 直接判定 {cascade['gated_ratio']:.1%}，"
+                    f"{cascade['heavy']}/{cascade['rows']} 列送完整集成",
+                )
+            dedup = stage.get("dedup")
+            if not dedup or not dedup.get("rows"):
+                continue
+            append_log(
+                self.log_messages,
+                f"♻️ {label}去重推論：{dedup['rows']} 列 → 唯一 {dedup['unique']}，"
+                f"LRU 命中 {dedup['lru_hits']}，實際推論 {dedup['predicted']}"
+                f"（省下 {dedup['saved_ratio']:.1%}）",
+            )
 
     def _handle_auto_notification(self, result: Dict[str, object]) -> None:
         """根據多元結果啟動通知模組。"""
@@ -932,6 +1201,25 @@ def render_folder_monitoring(monitor: LogMonitor) -> None:
     
     # 監控控制按鈕
     if current_save_dir and os.path.isdir(current_save_dir):
+        tail_enabled = st.checkbox(
+            "📈 增量追蹤模式 (tail)",
+            value=monitor.tail_mode,
+            disabled=monitor.shared_mode,
+            help="持續寫入的 log 只處理新增的完整列：記住每個檔案的讀取位置（支援輪替與截斷），"
+                 "以微批次推論並附加到 all_results.csv，不必等檔案停止成長",
+        )
+        if tail_enabled != monitor.tail_mode:
+            monitor.update_settings(tail_mode="1" if tail_enabled else "")
+
+        shared_enabled = st.checkbox(
+            "🤝 多主機共用資料夾 (lease)",
+            value=monitor.shared_mode,
+            help="多台主機監控同一個資料夾時，處理前先在 .dflare_leases/ 建立租約檔認領檔案，"
+                 "其他主機略過；主機當機、租約過期後由其他主機接手。結果寫到以檔名命名的子資料夾（增量追蹤會停用）",
+        )
+        if shared_enabled != monitor.shared_mode:
+            monitor.update_settings(shared_mode="1" if shared_enabled else "")
+
         col1, col2, col3 = st.columns(3)
         
         with col1:
@@ -1033,6 +1321,9 @@ def render_status_and_logs(monitor: LogMonitor) -> None:
     """
     渲染狀態顯示和日誌區域
     """
+    # 先套用已完成的背景工作結果
+    monitor.collect_jobs()
+
     # 詳細監控狀態顯示
     st.subheader("📊 詳細監控狀態")
     
@@ -1063,7 +1354,7 @@ def render_status_and_logs(monitor: LogMonitor) -> None:
             
             # 顯示處理統計
             if monitor.file_handler:
-                processed_count = len(monitor.file_handler.processed_files)
+                processed_count = monitor.ledger.counts()["total"]
                 pending_count = len(monitor.file_handler.get_pending_files())
                 st.markdown(f"**已處理**: {processed_count} 個檔案")
                 if pending_count > 0:
@@ -1094,6 +1385,8 @@ def render_status_and_logs(monitor: LogMonitor) -> None:
         else:
             st.markdown("**最新結果**: 📋 無")
 
+    render_job_queue_status(monitor)
+
     st.subheader("📝 執行日誌")
     if monitor.log_messages:
         recent_logs = monitor.log_messages[-20:]  # 顯示最近20條日誌
@@ -1117,6 +1410,36 @@ def render_status_and_logs(monitor: LogMonitor) -> None:
         st.info("暫無執行日誌")
 
 
+def render_job_queue_status(monitor: LogMonitor) -> None:
+    """顯示背景工作佇列的各狀態數量與最近的工作。"""
+    queue = monitor._get_job_queue()
+    counts = queue.counts()
+    st.subheader("🧵 背景工作佇列")
+    cols = st.columns(4)
+    cols[0].metric("排隊中", counts[job_queue.QUEUED] + counts[job_queue.RETRY])
+    cols[1].metric("執行中", counts[job_queue.RUNNING])
+    cols[2].metric("已完成", counts[job_queue.DONE])
+    cols[3].metric("失敗", counts[job_queue.FAILED])
+    if counts["active"] >= counts["capacity"]:
+        st.warning(f"⚠️ 工作佇列已滿（{counts['active']}/{counts['capacity']}），新檔案將稍後排入")
+
+    recent = queue.jobs(limit=10)
+    if recent:
+        st.dataframe(
+            pd.DataFrame(
+                {
+                    "工作": [f"#{job['id']}" for job in recent],
+                    "檔案": [os.path.basename(job["path"]) for job in recent],
+                    "狀態": [job["status"] for job in recent],
+                    "嘗試次數": [job["attempts"] for job in recent],
+                    "進度／錯誤": [job["error"] or job["progress"] or "" for job in recent],
+                }
+            ),
+            use_container_width=True,
+            hide_index=True,
+        )
+
+
 def app() -> None:
     """Streamlit 版的 Log 擷取頁面 - 重構版本，清楚分離單檔案分析和資料夾監控功能。"""
     monitor = get_log_monitor()
@@ -1163,3 +1486,7 @@ def app() -> None:
                 # 定期重新整理檢查新檔案
                 time.sleep(3)
                 st.rerun()
+        elif monitor.active_jobs:
+            # 未監聽但仍有排入的工作（例如手動分析）：輪詢工作狀態
+            time.sleep(2)
+            st.rerun()
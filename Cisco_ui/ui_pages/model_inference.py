@@ -104,8 +104,9 @@ def app() -> None:
     st.markdown("可手動選擇原始 log 檔與模型，立即執行 Cisco ASA 全流程分析。")
 
     monitor = get_log_monitor()
-    default_output = monitor.settings.get("clean_csv_dir", "")
     saved_log = monitor.last_processed_file
+    # 共用資料夾模式下，監控結果寫在以檔名命名的子資料夾
+    default_output = monitor.output_dir_for(saved_log)
     saved_binary = st.session_state.get("cisco_binary_model_path", monitor.settings.get("binary_model_path", ""))
     saved_multi = st.session_state.get("cisco_multi_model_path", monitor.settings.get("model_path", ""))
 
@@ -19,7 +19,7 @@ CHART_FILES: Dict[str, str] = {
 def _get_folder() -> str:
     if "cisco_visual_folder" not in st.session_state:
         monitor = get_log_monitor()
-        st.session_state["cisco_visual_folder"] = monitor.settings.get("clean_csv_dir", "")
+        st.session_state["cisco_visual_folder"] = monitor.latest_output_dir()
     return st.session_state["cisco_visual_folder"]
 
 
@@ -31,6 +31,8 @@ def app() -> None:
     # 檢查是否需要自動同步更新
     if st.session_state.get("cisco_visualization_needs_update", False):
         st.session_state.cisco_visualization_needs_update = False
+        # 新結果可能寫在共用資料夾模式的子資料夾：改看最近一次結果所在的資料夾
+        st.session_state["cisco_visual_folder"] = get_log_monitor().latest_output_dir()
         if st.session_state.get("cisco_visualization_last_update"):
             st.success("🔄 視覺化已自動同步更新")
 
@@ -40,7 +42,7 @@ def app() -> None:
     center_cols = st.columns([1, 0.6, 1])
     if center_cols[1].button("同步自動清洗輸出路徑", use_container_width=True):
         monitor = get_log_monitor()
-        st.session_state["cisco_visual_folder"] = monitor.settings.get("clean_csv_dir", "")
+        st.session_state["cisco_visual_folder"] = monitor.latest_output_dir()
         st.experimental_rerun()
 
     col1, col2, col3, col4 = st.columns(4)
@@ -171,6 +171,13 @@ def _reorder_keep_only(df):
             df[col] = "" if col != "datetime" else pd.NaT
     return df[COLUMN_ORDER]
 
+def clean_frame(df):
+    """單一 chunk 的清洗收尾（時間、標籤、去重、重排）；clean_logs 與串流 ETL 共用。"""
+    df = _finalize_datetime(df)
+    df = _set_is_attack(df)
+    df.drop_duplicates(inplace=True)
+    return _reorder_keep_only(df)
+
 def _choose_mode_interactive():
     print(f"{Fore.CYAN}請選擇操作模式：")
     print("  1. 預先設定抽樣（處理時同步輸出未抽樣+抽樣）")
@@ -290,10 +297,7 @@ def clean_logs(
     def _process_df(df):
         nonlocal first_clean, first_sample, tot_clean, tot_sample
         # 完成時間、標籤、去重、重排
-        df = _finalize_datetime(df)
-        df = _set_is_attack(df)
-        df.drop_duplicates(inplace=True)
-        df = _reorder_keep_only(df)
+        df = clean_frame(df)
         # [1] 寫清洗檔
         df.to_csv(clean_csv, mode="w" if first_clean else "a",
                   header=first_clean, index=False, encoding="utf-8")
@@ -16,10 +16,11 @@ CLI： python pipeline_controller.py
 UI / 程式化：from pipeline_controller import run_pipeline
 """
 
+import io
 import os
 import json
 import pandas as pd
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterable, Iterator
 from tqdm import tqdm
 from colorama import Fore, Style, init as colorama_init
 
@@ -85,6 +86,104 @@ def _resolve_out_path(in_csv: str, out_csv: str) -> str:
     base_dir = os.path.dirname(os.path.abspath(in_csv)) if in_csv else os.getcwd()
     return os.path.join(base_dir, out_csv)
 
+# ------------------------- 單一 chunk 的映射 / 特徵工程（檔案版與串流版共用） -------------------------
+def map_chunk(chunk: pd.DataFrame, uniq_map: dict, missing: Optional[dict] = None) -> pd.DataFrame:
+    """字典映射 + 欄位排序；missing 不為 None 時同時做唯一值覆蓋檢查。"""
+    if "raw_log" in chunk.columns:
+        chunk.drop(columns=["raw_log"], inplace=True)
+    chunk = _ensure_datetime(chunk)
+
+    # 覆蓋檢查要在映射前（service 還是字串）
+    if missing is not None:
+        LM._check_coverage(chunk, uniq_map, missing)
+
+    # 這裡把 uniq_map 傳進去，確保 service 穩定映射
+    chunk = LM._apply_mappings(chunk, uniq_map)
+
+    if "is_attack" not in chunk.columns:
+        if "crscore" in chunk.columns:
+            chunk["is_attack"] = (pd.to_numeric(chunk["crscore"], errors="coerce")
+                                .fillna(0).astype(int) > 0).astype(int)
+        else:
+            chunk["is_attack"] = 0
+
+    chunk.drop_duplicates(inplace=True)
+    return LM._reorder_preserve(chunk)
+
+def engineer_chunk(chunk: pd.DataFrame, state: Dict[str, Any],
+                   topk_src_port: Optional[dict] = None, topk_pair: Optional[dict] = None) -> pd.DataFrame:
+    """依 FE 模組開關追加特徵；state 為時間窗特徵跨 chunk 的小狀態。"""
+    # 時間欄位型別保險
+    chunk = _ensure_datetime(chunk)
+
+    # 1) 流量統計
+    if FE.ENABLE_TRAFFIC_STATS:
+        chunk = FE.add_traffic_stats(chunk)
+
+    # 2) 協定/端口
+    if FE.ENABLE_PROTO_PORT_FEATS:
+        chunk = FE.add_proto_port_feats(chunk)
+
+    # 3) 時間窗口（可選）
+    if FE.ENABLE_WINDOWED_FEATS:
+        chunk = FE.add_windowed_feats(chunk, state)
+
+    # 4) 關係特徵
+    if FE.ENABLE_RELATIONAL_BASE:
+        chunk = FE.add_relational_basic(chunk)
+    if FE.ENABLE_RELATIONAL_TOPK:
+        chunk = FE.add_relational_topk(chunk, topk_src_port, topk_pair)
+
+    # 5) 異常指標
+    if FE.ENABLE_ANOMALY_INDIC:
+        chunk = FE.add_anomaly_indicators(chunk)
+
+    # 6) 工程後類別欄位數值化（若有）
+    if getattr(FE, "ENCODE_ENGINEERED_CATS", False) and hasattr(FE, "encode_engineered_categoricals"):
+        chunk = FE.encode_engineered_categoricals(chunk)
+    
+    # 核心在前，新特徵附在後；去重
+    chunk = FE._reorder_append(chunk)
+    chunk.drop_duplicates(inplace=True)
+    return chunk
+
+def iter_engineered_chunks(
+    lines: Iterable[str],
+    chunk_lines: int = CSV_CHUNK_SIZE,
+    unique_json: Optional[str] = DEFAULT_UNIQUE_JSON,
+) -> Iterator[pd.DataFrame]:
+    """
+    串流版 清洗 → 映射 → 特徵工程：逐 chunk 產出與檔案版 run_pipeline 相同欄位的 DataFrame，
+    不寫中間 CSV、也不把整份日誌留在記憶體（供訓練端直接讀原始日誌）。
+    清洗後以記憶體內 CSV 往返一次，讓型別推斷與推論端讀 processed_logs.csv 時一致；
+    chunk 大小預設同 CSV_CHUNK_SIZE，使「以 chunk 估計」的特徵（分位數、Z-score）與推論端相同。
+    """
+    uniq_map = {}
+    if unique_json and os.path.exists(unique_json):
+        uniq_map, _ = LM._load_unique_values(unique_json)
+    topk_src_port = FE._load_json_if_exists(FE.TOPK_SRC_PORT_JSON)
+    topk_pair     = FE._load_json_if_exists(FE.TOPK_PAIR_JSON)
+    state: Dict[str, Any] = {}
+
+    def _run(records):
+        df = LC.clean_frame(pd.DataFrame(records))
+        df = pd.read_csv(io.StringIO(df.to_csv(index=False)), encoding=CSV_ENCODING)
+        df = map_chunk(df, uniq_map)
+        return engineer_chunk(df, state, topk_src_port, topk_pair)
+
+    buf = []
+    for line in lines:
+        if not line.strip():
+            continue
+        rec = LC.parse_log_line(line.strip())
+        if rec:
+            buf.append(rec)
+        if len(buf) >= chunk_lines:
+            yield _run(buf)
+            buf = []
+    if buf:
+        yield _run(buf)
+
 # ------------------------- S2：映射（非互動，供 UI 用） -------------------------
 def run_mapping_noninteractive(
     in_csv: str,
@@ -111,26 +210,7 @@ def run_mapping_noninteractive(
 
     for chunk in tqdm(pd.read_csv(in_csv, chunksize=CSV_CHUNK_SIZE, encoding=CSV_ENCODING),
                     desc="映射分塊", unit="chunk"):
-        if "raw_log" in chunk.columns:
-            chunk.drop(columns=["raw_log"], inplace=True)
-        chunk = _ensure_datetime(chunk)
-
-        # 覆蓋檢查要在映射前（service 還是字串）
-        if do_check:
-            LM._check_coverage(chunk, uniq_map, missing)
-
-        # 這裡把 uniq_map 傳進去，確保 service 穩定映射
-        chunk = LM._apply_mappings(chunk, uniq_map)
-
-        if "is_attack" not in chunk.columns:
-            if "crscore" in chunk.columns:
-                chunk["is_attack"] = (pd.to_numeric(chunk["crscore"], errors="coerce")
-                                    .fillna(0).astype(int) > 0).astype(int)
-            else:
-                chunk["is_attack"] = 0
-
-        chunk.drop_duplicates(inplace=True)
-        chunk = LM._reorder_preserve(chunk)
+        chunk = map_chunk(chunk, uniq_map, missing if do_check else None)
 
         chunk.to_csv(out_csv, mode="w" if first else "a", header=first,
                     index=False, encoding=CSV_ENCODING)
@@ -194,38 +274,7 @@ def run_feature_engineering_noninteractive(
 
     for chunk in tqdm(pd.read_csv(in_csv, chunksize=CSV_CHUNK_SIZE, encoding=CSV_ENCODING),
                       desc="工程分塊", unit="chunk"):
-        # 時間欄位型別保險
-        chunk = _ensure_datetime(chunk)
-
-        # 1) 流量統計
-        if FE.ENABLE_TRAFFIC_STATS:
-            chunk = FE.add_traffic_stats(chunk)
-
-        # 2) 協定/端口
-        if FE.ENABLE_PROTO_PORT_FEATS:
-            chunk = FE.add_proto_port_feats(chunk)
-
-        # 3) 時間窗口（可選）
-        if FE.ENABLE_WINDOWED_FEATS:
-            chunk = FE.add_windowed_feats(chunk, state)
-
-        # 4) 關係特徵
-        if FE.ENABLE_RELATIONAL_BASE:
-            chunk = FE.add_relational_basic(chunk)
-        if FE.ENABLE_RELATIONAL_TOPK:
-            chunk = FE.add_relational_topk(chunk, topk_src_port, topk_pair)
-
-        # 5) 異常指標
-        if FE.ENABLE_ANOMALY_INDIC:
-            chunk = FE.add_anomaly_indicators(chunk)
-
-        # 6) 工程後類別欄位數值化（若有）
-        if getattr(FE, "ENCODE_ENGINEERED_CATS", False) and hasattr(FE, "encode_engineered_categoricals"):
-            chunk = FE.encode_engineered_categoricals(chunk)
-        
-        # 核心在前，新特徵附在後；去重
-        chunk = FE._reorder_append(chunk)
-        chunk.drop_duplicates(inplace=True)
+        chunk = engineer_chunk(chunk, state, topk_src_port, topk_pair)
 
         # 寫出
         chunk.to_csv(out_csv, mode="w" if first else "a", header=first,
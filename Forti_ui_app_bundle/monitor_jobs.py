@@ -0,0 +1,458 @@
+"""
+資料夾監控的背景工作（在工作佇列的工作行程中執行，不依賴 Streamlit）：
+- process_monitored_file(payload)：清洗 → ETL → 串流二元／多元推論 → 通知，回傳可 JSON 化的摘要
+- 模型以檔案路徑傳入，經 model_registry 載入（每個工作行程只反序列化一次）
+- UI 只負責排入工作與輪詢狀態，完成後依摘要更新畫面與視覺化資料
+- 增量追蹤（tail）的微批次另帶 append_report：本批報告推播後附加到來源檔的累積報告
+"""
+
+from __future__ import annotations
+
+import contextlib
+import io
+import itertools
+import json
+import os
+import re
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .etl_pipeliner import run_pipeline
+from .etl_pipeline import log_cleaning as LC
+from .notifier import notify_from_csv
+
+# 添加 ui_shared 模組路徑
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT / "ui_shared") not in sys.path:
+    sys.path.insert(0, str(_ROOT / "ui_shared"))
+
+import model_registry
+from cascade_inference import cascade_stats
+from dedup_inference import DedupStats, dedup_predictor
+from feature_alignment import FeatureMatrix, plan_for
+from job_queue import PermanentJobError, report_progress
+
+ANSI_RE = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+
+# 串流推論：工程特徵檔與清洗檔以相同列數分塊讀取，記憶體只與 chunk 大小有關
+INFER_CHUNK_ROWS = 50_000
+# idseq 串流對齊時清洗檔端最多暫存幾個 chunk 的未對上列（超過改走分桶合併）
+ALIGN_PENDING_CHUNKS = 4
+# 通知憑證（webhook／Gemini／LINE）只存在這個權限 0600 的設定檔，工作 payload 與佇列資料庫不含憑證
+NOTIFY_SETTINGS_PATH = "forti_monitor_notify.json"
+NOTIFY_SECRET_KEYS = ("webhook", "gemini_key", "line_token")
+# 視覺化頁的高風險明細只保留最近的筆數（另存 *_critical.csv 供 UI 讀取）
+CRITICAL_ROWS_LIMIT = 5_000
+
+
+def _fill_raw_na(chunk: pd.DataFrame) -> pd.DataFrame:
+    """清洗資料（通知內容用）的缺值：數值欄補 0、其餘補空字串。"""
+    if chunk.isna().values.any():
+        fill_values = {
+            col: 0 if pd.api.types.is_numeric_dtype(chunk[col]) else ""
+            for col in chunk.columns
+        }
+        chunk = chunk.fillna(value=fill_values)
+    return chunk
+
+
+def save_notify_settings(secrets: Dict[str, str], path: str = NOTIFY_SETTINGS_PATH) -> None:
+    """UI 端：把通知憑證寫入設定檔（內容未變時不重寫；先寫暫存檔再取代，權限 0600）。"""
+    data = {key: str(secrets.get(key) or "") for key in NOTIFY_SECRET_KEYS}
+    if load_notify_settings(path) == data:
+        return
+    tmp = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as fh:
+        json.dump(data, fh)
+    os.replace(tmp, path)
+
+
+def load_notify_settings(path: str = NOTIFY_SETTINGS_PATH) -> Dict[str, str]:
+    """工作行程端：讀取目前的通知憑證（檔案不存在或損毀時回傳空值）。"""
+    try:
+        with open(path, encoding="utf-8") as fh:
+            data = json.load(fh)
+    except (OSError, ValueError):
+        data = {}
+    return {key: str(data.get(key) or "") for key in NOTIFY_SECRET_KEYS}
+
+
+def _count_rows(csv_path: str, chunk_rows: int) -> int:
+    return sum(len(c) for c in pd.read_csv(csv_path, chunksize=chunk_rows, usecols=[0]))
+
+
+def _spill_buckets(frames, folder: str, prefix: str, n_buckets: int) -> None:
+    """依 idseq 雜湊把各塊列附加寫入 n_buckets 個暫存 CSV（同一 idseq 必落在同一桶）。"""
+    for frame in frames:
+        if frame.empty:
+            continue
+        bucket = pd.util.hash_pandas_object(frame["idseq"], index=False).to_numpy() % n_buckets
+        for b in np.unique(bucket):
+            out = os.path.join(folder, f"{prefix}_{b}.csv")
+            frame.loc[bucket == b].to_csv(out, mode="a", header=not os.path.exists(out), index=False)
+
+
+def _partition_join(fe_frames, raw_frames, folder: str, n_buckets: int, stats: Dict[str, int]):
+    """兩邊先依 idseq 分桶落地，再逐桶以 idseq 合併；記憶體只與單一桶大小有關。"""
+    dtype = {"idseq": str}
+    _spill_buckets(raw_frames, folder, "raw", n_buckets)
+    _spill_buckets(fe_frames, folder, "fe", n_buckets)
+    for b in range(n_buckets):
+        fe_path = os.path.join(folder, f"fe_{b}.csv")
+        raw_path = os.path.join(folder, f"raw_{b}.csv")
+        raw = pd.read_csv(raw_path, dtype=dtype) if os.path.exists(raw_path) else None
+        if not os.path.exists(fe_path):
+            stats["unmatched_raw"] += 0 if raw is None else len(raw)
+            continue
+        fe = pd.read_csv(fe_path, dtype=dtype)
+        if raw is None:
+            stats["unmatched_features"] += len(fe)
+            continue
+        dup = raw["idseq"].duplicated()
+        stats["unmatched_raw"] += int(dup.sum())
+        raw = raw.loc[~dup].set_index("idseq", drop=False)
+        matched = fe["idseq"].isin(raw.index) & ~fe["idseq"].duplicated()
+        stats["unmatched_features"] += int((~matched).sum())
+        fe = fe.loc[matched].reset_index(drop=True)
+        stats["unmatched_raw"] += len(raw) - len(fe)
+        if not fe.empty:
+            yield fe, raw.loc[fe["idseq"]].reset_index(drop=True)
+
+
+def _aligned_chunks(fe_csv: str, clean_csv: str, chunk_rows: int = INFER_CHUNK_ROWS,
+                    stats: Optional[Dict[str, int]] = None):
+    """Yield ``(features, raw)`` chunk pairs aligned row-for-row.
+
+    兩邊都有 idseq 時以 idseq 為鍵對齊（與列順序無關；工程特徵檔可能因去重少列）：
+    先以串流方式對齊，清洗檔只暫存尚未對上的列；暫存超過 ALIGN_PENDING_CHUNKS 個 chunk
+    （兩檔順序差異太大）時，剩餘的列改為依 idseq 雜湊分桶落地後逐桶合併，不會因此漏配。
+    對不上的列數記在 stats（unmatched_features／unmatched_raw）。
+    沒有 idseq 時依列順序對齊，兩檔列數不同則拋出 ValueError（不做錯位配對）。
+    """
+    stats = stats if stats is not None else {}
+    stats.update(unmatched_features=0, unmatched_raw=0)
+    dtype = {"idseq": str}
+    fe_cols = pd.read_csv(fe_csv, nrows=0).columns
+    raw_cols = pd.read_csv(clean_csv, nrows=0).columns
+    fe_iter = pd.read_csv(fe_csv, chunksize=chunk_rows, dtype=dtype)
+    raw_iter = pd.read_csv(clean_csv, chunksize=chunk_rows, dtype=dtype)
+
+    if "idseq" not in fe_cols or "idseq" not in raw_cols:
+        n_fe, n_raw = _count_rows(fe_csv, chunk_rows), _count_rows(clean_csv, chunk_rows)
+        if n_fe != n_raw:
+            raise ValueError(
+                f"Feature rows ({n_fe}) and cleaned rows ({n_raw}) differ and there is no idseq column; "
+                "refusing to pair rows by position"
+            )
+        for fe_chunk, raw_chunk in zip(fe_iter, raw_iter):
+            yield fe_chunk.reset_index(drop=True), raw_chunk.reset_index(drop=True)
+        return
+
+    max_pending = int(chunk_rows) * ALIGN_PENDING_CHUNKS
+    pending = pd.DataFrame(columns=raw_cols).set_index("idseq", drop=False)
+    raw_iter = iter(raw_iter)
+    fe_iter = iter(fe_iter)
+    raw_done = False
+
+    def _pull() -> bool:
+        nonlocal pending, raw_done
+        if raw_done or len(pending) > max_pending:
+            return False
+        nxt = next(raw_iter, None)
+        if nxt is None:
+            raw_done = True
+            return False
+        dup = nxt["idseq"].duplicated() | nxt["idseq"].isin(pending.index)
+        stats["unmatched_raw"] += int(dup.sum())
+        pending = pd.concat([pending, nxt.loc[~dup].set_index("idseq", drop=False)])
+        return True
+
+    for fe_chunk in fe_iter:
+        ids = pd.Index(fe_chunk["idseq"])
+        while not ids.isin(pending.index).all() and _pull():
+            pass
+        if not raw_done and not ids.isin(pending.index).all():
+            # 順序差異超出暫存上限：剩餘部分改走分桶合併
+            n_buckets = max(1, -(-os.path.getsize(clean_csv) // (64 * 1024 * 1024)))
+            with tempfile.TemporaryDirectory(prefix="align_") as folder:
+                yield from _partition_join(
+                    itertools.chain([fe_chunk], fe_iter),
+                    itertools.chain([pending.reset_index(drop=True)], raw_iter),
+                    folder, n_buckets, stats,
+                )
+            return
+        matched = ids.isin(pending.index) & ~ids.duplicated()
+        stats["unmatched_features"] += int((~matched).sum())
+        fe_chunk = fe_chunk.loc[matched].reset_index(drop=True)
+        if fe_chunk.empty:
+            continue
+        raw_chunk = pending.loc[fe_chunk["idseq"]].reset_index(drop=True)
+        pending = pending.drop(fe_chunk["idseq"])
+        yield fe_chunk, raw_chunk
+
+    stats["unmatched_raw"] += len(pending) + sum(len(c) for c in raw_iter)
+
+
+def _stream_infer(
+    fe_csv: str,
+    clean_csv: str,
+    report_path: str,
+    bin_model,
+    mul_model,
+    log: Callable[[str], None],
+    chunk_rows: int = INFER_CHUNK_ROWS,
+) -> dict:
+    """逐塊執行二元 → 多元推論並附加寫入報告；回傳累計計數與高風險明細。"""
+    attack_counts = pd.Series(0, index=[0, 1], dtype="int64")
+    level_counts = pd.Series(0, index=[0, 1, 2, 3, 4], dtype="int64")
+    critical_parts = []
+    critical_rows = 0
+    warned = set()
+    first = True
+    total_rows = 0
+    # 每個唯一特徵向量只推論一次（同一模型跨檔案共用 LRU）
+    bin_predictor, mul_predictor = dedup_predictor(bin_model), dedup_predictor(mul_model)
+    bin_stats, mul_stats = DedupStats(), DedupStats()
+    # 模型是串接模型（gate + 完整集成）時，記錄本檔案的分流統計
+    bin_cascade, mul_cascade = cascade_stats(bin_model), cascade_stats(mul_model)
+
+    def _warn_once(key: str, msg: str) -> None:
+        if key not in warned:
+            warned.add(key)
+            log(msg)
+
+    align_stats: Dict[str, int] = {}
+    chunks = _aligned_chunks(fe_csv, clean_csv, chunk_rows, align_stats)
+    for index, (df, raw_df) in enumerate(chunks, start=1):
+        # 一次轉成 float32 基底矩陣，二元／多元模型以預先編譯的對齊計畫從同一基底取欄
+        base = FeatureMatrix.from_frame(df, na_value=0.0)
+        if base.had_na:
+            _warn_once("nan", "Detected NaNs; filling with 0")
+        result = _fill_raw_na(raw_df)
+        features = [c for c in df.columns if c not in {"is_attack", "crlevel"}]
+
+        bin_plan = plan_for(bin_model, base, fill_value=0.0, fallback=features)
+        if bin_plan.missing:
+            _warn_once(
+                "bin", f"Missing features for binary model: {bin_plan.missing}; filling with 0"
+            )
+        report_progress(
+            f"Running binary classification (chunk {index}, {total_rows + len(df)} rows)..."
+        )
+        result["is_attack"] = bin_predictor.predict(bin_plan.align(base), bin_stats, bin_cascade)
+        result["crlevel"] = 0
+        mask = (result["is_attack"] == 1).to_numpy()
+        if mask.any():
+            mul_plan = plan_for(mul_model, base, fill_value=0.0, fallback=features)
+            if mul_plan.missing:
+                _warn_once(
+                    "mul",
+                    f"Missing features for multiclass model: {mul_plan.missing}; filling with 0",
+                )
+            df_mul = mul_plan.align(base, rows=mask)
+            result.loc[mask, "crlevel"] = mul_predictor.predict(df_mul, mul_stats, mul_cascade)
+
+        result.to_csv(report_path, mode="w" if first else "a", header=first, index=False)
+        first = False
+        total_rows += len(result)
+
+        attack_counts += result["is_attack"].value_counts().reindex([0, 1], fill_value=0)
+        level_counts += result["crlevel"].value_counts().reindex([0, 1, 2, 3, 4], fill_value=0)
+        critical = result[result["crlevel"] >= 4]
+        if not critical.empty:
+            critical_parts.append(critical)
+            critical_rows += len(critical)
+            # 只保留最近 CRITICAL_ROWS_LIMIT 筆
+            while critical_rows - len(critical_parts[0]) >= CRITICAL_ROWS_LIMIT:
+                critical_rows -= len(critical_parts.pop(0))
+
+    if first:  # 沒有任何可推論的列：仍輸出只有表頭的報告
+        header = pd.read_csv(clean_csv, nrows=0)
+        header["is_attack"] = pd.Series(dtype="int64")
+        header["crlevel"] = pd.Series(dtype="int64")
+        header.to_csv(report_path, index=False)
+
+    critical_df = (
+        pd.concat(critical_parts, ignore_index=True).tail(CRITICAL_ROWS_LIMIT)
+        if critical_parts
+        else pd.DataFrame()
+    )
+    return {
+        "rows": total_rows,
+        "is_attack": attack_counts,
+        "crlevel": level_counts,
+        "critical": critical_df,
+        "dedup": {"binary": bin_stats, "multiclass": mul_stats},
+        "alignment": align_stats,
+        "cascade": {
+            "binary": bin_cascade.to_dict() if bin_cascade is not None else None,
+            "multiclass": mul_cascade.to_dict() if mul_cascade is not None else None,
+        },
+    }
+
+
+def _append_report(batch_report: str, target: str) -> None:
+    """把微批次報告附加到累積報告（已有內容時略過表頭，一次寫入）。"""
+    with open(batch_report, "rb") as fh:
+        data = fh.read()
+    if Path(target).exists() and Path(target).stat().st_size > 0:
+        newline = data.find(b"\n")
+        data = data[newline + 1:] if newline >= 0 else b""
+    if data:
+        with open(target, "ab") as fh:
+            fh.write(data)
+
+
+def process_monitored_file(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """工作佇列 handler：對 payload["path"] 執行 ETL 與推論。
+
+    payload 欄位：path、binary_model／multi_model（模型檔路徑）、
+    notify（通知選項 dict，例如 convergence；None 表示不推播，憑證由 load_notify_settings 讀取）、
+    append_report（增量追蹤時的累積報告路徑，可省略）。
+    回傳報告路徑、計數、產生的檔案與處理日誌，供 UI 輪詢後套用。
+    """
+    path = payload["path"]
+    bin_path, mul_path = payload.get("binary_model"), payload.get("multi_model")
+    if not (bin_path and mul_path):
+        raise PermanentJobError("Models not uploaded; skipping")
+    if not Path(path).exists():
+        raise PermanentJobError(f"File no longer exists: {path}")
+
+    log_lines: List[str] = []
+
+    def _log(msg: str) -> None:
+        log_lines.append(msg)
+        report_progress(msg)
+
+    bin_model = model_registry.load_model(bin_path)
+    mul_model = model_registry.load_model(mul_path)
+
+    p = Path(path)
+    while p.suffix in {".gz", ".zip"}:
+        p = p.with_suffix("")
+
+    ext = p.suffix.lower()
+    stem = p.stem.lower()
+
+    clean_csv = path
+    do_map = True
+    do_fe = True
+
+    if ext in {".txt", ".log"}:
+        clean_csv = str(p.with_name(p.stem + "_clean.csv"))
+
+        _log("Running cleaning for raw log")
+        LC.clean_logs(quiet=True, paths=[path], clean_csv=clean_csv)
+    else:
+        clean_csv = path
+        if stem.endswith("_engineered"):
+            do_map = False
+            do_fe = False
+        elif stem.endswith("_preprocessed"):
+            do_map = False
+            do_fe = True
+
+    base = p.with_suffix("")
+    pre_csv = clean_csv if not do_map else f"{base}_preprocessed.csv"
+    fe_csv = pre_csv if not do_fe else f"{base}_engineered.csv"
+
+    _log(f"Detected new file: {path}")
+    buf = io.StringIO()
+    report_progress("Running ETL pipeline...")
+    with contextlib.redirect_stdout(buf):
+        run_pipeline(
+            do_clean=False,
+            do_map=do_map,
+            do_fe=do_fe,
+            clean_out=clean_csv,
+            preproc_out=pre_csv,
+            fe_out=fe_csv,
+        )
+    for line in ANSI_RE.sub("", buf.getvalue()).splitlines():
+        if line.strip():
+            log_lines.append(line.strip())
+
+    # 串流推論：分塊對齊工程特徵與清洗資料，逐塊預測並附加寫入報告
+    report_path = f"{base}_report.csv"
+    _log("Running binary classification")
+    summary = _stream_infer(fe_csv, clean_csv, report_path, bin_model, mul_model, _log)
+    attack_rows = int(summary["is_attack"].get(1, 0))
+    _log(f"Binary classification found {attack_rows} attack rows out of {summary['rows']}")
+    alignment = summary["alignment"]
+    if alignment.get("unmatched_features") or alignment.get("unmatched_raw"):
+        _log(
+            f"idseq alignment skipped {alignment['unmatched_features']} feature rows and "
+            f"{alignment['unmatched_raw']} cleaned rows without a match"
+        )
+    dedup = summary["dedup"]
+    log_lines.append(f"Binary dedup: {dedup['binary'].summary()}")
+    if attack_rows:
+        _log("Ran multiclass classification for attack rows")
+        log_lines.append(f"Multiclass dedup: {dedup['multiclass'].summary()}")
+    else:
+        _log("No attacks detected; skipping multiclass classification")
+    for stage, gated in summary["cascade"].items():
+        if gated and gated["rows"]:
+            log_lines.append(
+                f"Cascade {stage}: gate decided {gated['gated_ratio']:.1%}, "
+                f"{gated['heavy']} of {gated['rows']} rows sent to the full ensemble"
+            )
+
+    gen_files = [report_path]
+    for f in (clean_csv, pre_csv, fe_csv):
+        if f != path and f not in gen_files:
+            gen_files.append(f)
+    critical_path = None
+    if not summary["critical"].empty:
+        critical_path = f"{base}_critical.csv"
+        summary["critical"].to_csv(critical_path, index=False)
+        gen_files.append(critical_path)
+
+    notify = payload.get("notify")
+    if notify is not None:
+        secrets = load_notify_settings()
+        notify_from_csv(
+            report_path,
+            secrets["webhook"],
+            secrets["gemini_key"],
+            risk_levels={"3", "4"},
+            ui_log=log_lines.append,
+            line_token=secrets["line_token"],
+            convergence=notify.get("convergence"),
+        )
+
+    append_to = payload.get("append_report")
+    if append_to:
+        _append_report(report_path, append_to)
+        _log(f"Appended {summary['rows']} rows to {append_to}")
+
+    _log(f"Processed {path} -> {report_path}")
+    return {
+        "path": path,
+        "report_path": append_to or report_path,
+        "batch_report_path": report_path,
+        "critical_path": critical_path,
+        "rows": summary["rows"],
+        "is_attack": {int(k): int(v) for k, v in summary["is_attack"].items()},
+        "crlevel": {int(k): int(v) for k, v in summary["crlevel"].items()},
+        "generated_files": gen_files,
+        "log_lines": log_lines,
+        "dedup": {stage: stats.to_dict() for stage, stats in dedup.items()},
+        "cascade": summary["cascade"],
+    }
+
+
+__all__ = [
+    "CRITICAL_ROWS_LIMIT",
+    "INFER_CHUNK_ROWS",
+    "NOTIFY_SETTINGS_PATH",
+    "load_notify_settings",
+    "process_monitored_file",
+    "save_notify_settings",
+]
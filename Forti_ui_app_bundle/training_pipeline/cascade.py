@@ -0,0 +1,176 @@
+# training_pipeline/cascade.py
+"""
+串接推論（cascade）的 gate 模型訓練與校準：
+- gate：淺層 LightGBM（"TREE"）或標準化 + LogisticRegression（"LR"），與集成使用同一份訓練資料
+- 在驗證集上以「完整集成的預測」為基準校準分流門檻，使召回率損失 ≤ MAX_RECALL_LOSS：
+    二元：low 取最大可行值（gate 機率 < low 直接判 0，只會損失召回率），
+          high 取最小可行值（gate 機率 >= high 直接判 1，另限制精確率損失 ≤ MAX_PRECISION_LOSS）
+    多元：confidence 取最小可行值（gate 最大機率 >= confidence 直接採用 gate 類別；以 macro recall 計）
+- 產出 ui_shared.cascade_inference.CascadeClassifier（gate + 完整集成），兩個品牌的監控流程皆可直接載入
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+import numpy as np
+from sklearn.metrics import precision_score, recall_score
+
+from .distillation import measure_throughput
+
+# ui_shared 模組以頂層名稱匯入（CascadeClassifier 與推論端共用，序列化後的模組名稱一致）；路徑統一由 shared_path 設定
+from .shared_path import ensure_ui_shared_path
+
+ensure_ui_shared_path()
+
+from cascade_inference import CascadeClassifier  # noqa: E402
+
+DEFAULT_CASCADE_SETTINGS: Dict[str, Any] = {
+    "ENABLED": False,
+    "GATE": "TREE",                  # "TREE"（淺層 LightGBM）或 "LR"
+    "MAX_DEPTH": 3,
+    "N_ESTIMATORS": 50,
+    "MAX_RECALL_LOSS": 0.001,        # 相對完整集成的召回率損失上限（0.1%）
+    "MAX_PRECISION_LOSS": 0.001,     # 二元 high 門檻的精確率損失上限
+    "CANDIDATES": 200,               # 門檻候選數（取 gate 機率分位數）
+    "PROBE_ROWS": 5000,
+    "REPEATS": 3,
+}
+
+
+def resolve_cascade_settings(config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    user = (config or {}).get("CASCADE") or {}
+    out = dict(DEFAULT_CASCADE_SETTINGS)
+    if isinstance(user, dict):
+        out.update({k: v for k, v in user.items() if k in DEFAULT_CASCADE_SETTINGS})
+    return out
+
+
+def build_gate(settings: Dict[str, Any], task_type: str, seed: int = 42):
+    if str(settings["GATE"]).upper() == "LR":
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.pipeline import make_pipeline
+        from sklearn.preprocessing import StandardScaler
+        return make_pipeline(StandardScaler(), LogisticRegression(max_iter=1000))
+    from lightgbm import LGBMClassifier
+    depth = int(settings["MAX_DEPTH"])
+    return LGBMClassifier(n_estimators=int(settings["N_ESTIMATORS"]), max_depth=depth,
+                          num_leaves=max(2, 2 ** depth), learning_rate=0.1, random_state=seed, verbose=-1,
+                          objective="multiclass" if task_type != "binary" else "binary")
+
+
+def _candidates(values: np.ndarray, n: int) -> np.ndarray:
+    return np.unique(np.quantile(values, np.linspace(0.0, 1.0, max(2, int(n)) + 1)))
+
+
+def _binary_rates(y: np.ndarray, pred: np.ndarray, positive) -> Dict[str, float]:
+    return {
+        "recall": float(recall_score(y, pred, pos_label=positive, zero_division=0)),
+        "precision": float(precision_score(y, pred, pos_label=positive, zero_division=0)),
+    }
+
+
+def calibrate_binary(gate_proba: np.ndarray, heavy: np.ndarray, y: np.ndarray, classes: np.ndarray,
+                     settings: Dict[str, Any], positive=1) -> Dict[str, Any]:
+    pos = gate_proba[:, list(classes).index(positive)]
+    negative = classes[classes != positive][0]
+    base = _binary_rates(y, heavy, positive)
+    budget_r, budget_p = float(settings["MAX_RECALL_LOSS"]), float(settings["MAX_PRECISION_LOSS"])
+    cands = _candidates(pos, settings["CANDIDATES"])
+
+    # low：由小到大，召回率損失單調不減 → 取最後一個可行值
+    low = 0.0
+    for c in cands:
+        pred = np.where(pos < c, negative, heavy)
+        if base["recall"] - _binary_rates(y, pred, positive)["recall"] > budget_r:
+            break
+        low = float(c)
+    # high：由大到小，取最小的可行值（召回率只會增加，限制精確率損失）
+    high = float("inf")
+    for c in cands[::-1]:
+        if c <= low:
+            break
+        pred = np.where(pos >= c, positive, np.where(pos < low, negative, heavy))
+        rates = _binary_rates(y, pred, positive)
+        if base["recall"] - rates["recall"] > budget_r or base["precision"] - rates["precision"] > budget_p:
+            break
+        high = float(c)
+
+    band = (pos >= low) & (pos < high)
+    final = np.where(pos >= high, positive, np.where(pos < low, negative, heavy))
+    return {"low": low, "high": high, "heavy_ratio": float(band.mean()),
+            "full": base, "cascade": _binary_rates(y, final, positive)}
+
+
+def _macro_recall(y: np.ndarray, pred: np.ndarray) -> float:
+    return float(recall_score(y, pred, average="macro", zero_division=0))
+
+
+def calibrate_multiclass(gate_proba: np.ndarray, heavy: np.ndarray, y: np.ndarray, classes: np.ndarray,
+                         settings: Dict[str, Any]) -> Dict[str, Any]:
+    conf = gate_proba.max(axis=1)
+    gate_label = classes[np.argmax(gate_proba, axis=1)]
+    base = _macro_recall(y, heavy)
+    budget = float(settings["MAX_RECALL_LOSS"])
+    confidence = float("inf")
+    # macro recall 對門檻不一定單調：掃過全部候選，取可行的最小值
+    for c in _candidates(conf, settings["CANDIDATES"])[::-1]:
+        pred = np.where(conf >= c, gate_label, heavy)
+        if base - _macro_recall(y, pred) <= budget:
+            confidence = float(c)
+    band = conf < confidence
+    final = np.where(band, heavy, gate_label)
+    return {"confidence": confidence, "heavy_ratio": float(band.mean()),
+            "full": {"macro_recall": base}, "cascade": {"macro_recall": _macro_recall(y, final)}}
+
+
+def build_cascade(model, X_train, y_train, X_valid, y_valid, task_type: str, settings: Dict[str, Any],
+                  sample_weight=None, heavy_valid_labels: Optional[np.ndarray] = None,
+                  seed: int = 42) -> Dict[str, Any]:
+    """
+    訓練 gate、在驗證集校準門檻，回傳 {"cascade": CascadeClassifier, "report": {...}}。
+    heavy_valid_labels：完整集成在 X_valid 上的預測（由評估情境快取傳入則不重算）。
+    """
+    gate = build_gate(settings, task_type, seed)
+    if sample_weight is None:
+        gate.fit(X_train, np.asarray(y_train).reshape(-1))
+    else:
+        fit_key = "logisticregression__sample_weight" if str(settings["GATE"]).upper() == "LR" else "sample_weight"
+        gate.fit(X_train, np.asarray(y_train).reshape(-1), **{fit_key: sample_weight})
+
+    y = np.asarray(y_valid).reshape(-1)
+    heavy = np.asarray(heavy_valid_labels if heavy_valid_labels is not None else model.predict(X_valid)).reshape(-1)
+    gate_proba = np.asarray(gate.predict_proba(X_valid), dtype=np.float64)
+    classes = np.asarray(gate.classes_)
+    if task_type == "binary":
+        calib = calibrate_binary(gate_proba, heavy, y, classes, settings)
+        cascade = CascadeClassifier(gate, model, task="binary", low=calib["low"], high=calib["high"])
+        print(f"🚦 串接推論：low={calib['low']:.4f} high={calib['high']:.4f}｜送完整集成 "
+              f"{calib['heavy_ratio']:.1%}｜Recall {calib['full']['recall']:.4f} → {calib['cascade']['recall']:.4f}")
+    else:
+        calib = calibrate_multiclass(gate_proba, heavy, y, classes, settings)
+        cascade = CascadeClassifier(gate, model, task="multiclass", confidence=calib["confidence"])
+        print(f"🚦 串接推論：confidence={calib['confidence']:.4f}｜送完整集成 {calib['heavy_ratio']:.1%}｜"
+              f"Macro recall {calib['full']['macro_recall']:.4f} → {calib['cascade']['macro_recall']:.4f}")
+
+    probe = X_valid.iloc[: int(settings["PROBE_ROWS"])] if hasattr(X_valid, "iloc") else X_valid[: int(settings["PROBE_ROWS"])]
+    full_speed = measure_throughput(model.predict, probe, settings["REPEATS"])
+    cascade_speed = measure_throughput(cascade.predict, probe, settings["REPEATS"])
+    report = {
+        "settings": settings,
+        "calibration": calib,
+        "throughput": {"full": full_speed, "cascade": cascade_speed,
+                       "speedup": cascade_speed["rows_per_sec"] / max(full_speed["rows_per_sec"], 1e-12)},
+    }
+    print(f"🚦 推論吞吐量 ×{report['throughput']['speedup']:.1f}（{cascade_speed['rows_per_sec']:.0f} 列/秒）")
+    return {"cascade": cascade, "report": report}
+
+
+__all__ = [
+    "DEFAULT_CASCADE_SETTINGS",
+    "build_cascade",
+    "build_gate",
+    "calibrate_binary",
+    "calibrate_multiclass",
+    "resolve_cascade_settings",
+]
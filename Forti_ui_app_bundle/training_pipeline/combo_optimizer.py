@@ -4,13 +4,12 @@ from __future__ import annotations
 import os
 import json
 import itertools
-from typing import Any, Dict, List, Sequence, Tuple, Optional
+from typing import Any, Callable, Dict, List, Sequence, Tuple, Optional
 import warnings
 import numpy as np
 
-from sklearn.ensemble import StackingClassifier, VotingClassifier
+from sklearn.ensemble import VotingClassifier
 from sklearn.linear_model import LogisticRegression
-from sklearn.model_selection import StratifiedKFold
 from sklearn.metrics import (
     accuracy_score,
     f1_score,
@@ -21,9 +20,13 @@ from sklearn.metrics import (
     confusion_matrix,
 )
 from sklearn.base import clone
+from sklearn.utils.validation import check_is_fitted
 from joblib import parallel_backend, dump
 
 from .ensemble_optuna import OptunaEnsembler
+from .eval_context import EvalContext
+from .oof_cache import CachedStackingClassifier, OOFCache
+from .parallel_folds import resolve_parallel_fold_settings
 
 try:
     from sklearn.exceptions import UndefinedMetricWarning
@@ -48,6 +51,11 @@ def _as_cpu_estimator(est):
     e = clone(est)
     name = e.__class__.__name__.lower()
 
+    # 包裝器（例如 PriorCorrectedClassifier）：轉換內部模型
+    if "priorcorrected" in name and getattr(e, "estimator", None) is not None:
+        e.set_params(estimator=_as_cpu_estimator(e.estimator))
+        return e
+
     # Sklearn 常見模型：若有 n_jobs → 設 1
     if hasattr(e, "get_params") and "n_jobs" in e.get_params():
         _set_if_has(e, n_jobs=1)
@@ -120,7 +128,7 @@ class ComboOptimizer:
     2) 將基模型 clone 成「CPU＋單執行緒版」以避免單卡 GPU 衝突。
     3) 建立集成器：
        - VotingClassifier(voting='soft' 或 'hard')
-       - 或 StackingClassifier(cv=K, final_est=LogisticRegression)
+       - 或 Stacking：基模型沿用已訓練好的模型，LogisticRegression 只在 OOF 快取機率上訓練
     4) 可選：Voting 子集排列組合搜尋，列出 Top-K 並保存最佳（Optuna 或固定枚舉）。
     5) 驗證：輸出 ACC/AUC/F1、分類報告、混淆矩陣與預測分佈。
     6) 額外回傳/印出「🧩 Ensemble 組成」：Voting 權重或 Stacking 係數。
@@ -143,6 +151,9 @@ class ComboOptimizer:
         logger: Any = None,
         out_dir: Optional[str] = None,
         use_optuna: bool = False,   # ★ 與 pipeline 串接
+        sample_weight=None,         # 重複列壓縮後的出現次數（對應 X_train）
+        eval_context: Optional[EvalContext] = None,   # 與單模型評估共用的 X_valid 機率快取
+        progress_callback: Optional[Callable[[int, int, str], None]] = None,  # OOF 折進度 (done, total, label)
     ) -> None:
         self.base_estimators = list(estimators)
         self.X_train = X_train
@@ -154,6 +165,11 @@ class ComboOptimizer:
         self.logger = logger
         self.out_dir = out_dir or "./artifacts"
         self.use_optuna = bool(use_optuna)
+        self.sample_weight = None if sample_weight is None else np.asarray(sample_weight)
+        if eval_context is None or not eval_context.matches(X_valid):
+            eval_context = EvalContext(X_valid, y_valid)
+        self.eval_ctx = eval_context
+        self.progress_callback = progress_callback
 
         ens = (self.config.get("ENSEMBLE_SETTINGS") or {}).copy()
         ens.setdefault("STACK_CV", 5)
@@ -178,6 +194,20 @@ class ComboOptimizer:
 
         # 供 Stacking 組成解讀用的類別列表（保持決定式）
         self.classes_ = np.unique(self.y_train)
+        # 基模型 OOF 機率快取（Optuna 搜尋與 Stacking 共用；首次使用時建立）
+        self.oof_cache: Optional[OOFCache] = None
+
+    def _get_oof_cache(self) -> OOFCache:
+        if self.oof_cache is None:
+            self.oof_cache = OOFCache(
+                self.X_train, self.y_train,
+                n_splits=int(self.ens.get("STACK_CV", 5)),
+                seed=int(self.ens.get("SEED", 42)),
+                sample_weight=self.sample_weight,
+                n_jobs=resolve_parallel_fold_settings(self.config)["N_JOBS"],
+                progress=self.progress_callback,
+            )
+        return self.oof_cache
 
     def optimize(self) -> Dict[str, Any]:
         print(f"⚙️  Ensemble 設定載入完成：{self.ens}")
@@ -242,7 +272,7 @@ class ComboOptimizer:
             self._save_ensemble(final_model)
             metrics, composition = self._eval_and_compose(final_model, kind="stacking", estimators=cpu_estimators)
             self._write_final_txt(kind="stacking", metrics=metrics, composition=composition)
-            kind_desc = f"StackingClassifier（cv={stack_cv}）"
+            kind_desc = f"CachedStackingClassifier（OOF cv={stack_cv}）"
             return self._finalize(kind_desc, final_model, metrics, composition)
 
     # ============ Optuna 搜尋（Voting 子集＋權重） ============
@@ -261,9 +291,11 @@ class ComboOptimizer:
             direction=self.ens.get("DIRECTION", "maximize"),
             seed=int(self.ens.get("SEED", 42)),
             report_dir=os.path.join(self.out_dir, "reports"),
+            oof_cache=self._get_oof_cache(),
         )
-        info = ens.fit(est_dict, self.X_train, self.y_train, self.X_valid, self.y_valid)
-        proba = ens.predict_proba(self.X_valid)
+        info = ens.fit(est_dict, self.X_train, self.y_train, self.X_valid, self.y_valid,
+                       sample_weight=self.sample_weight)
+        proba = self.eval_ctx.proba(ens)
         y_pred = np.argmax(proba, axis=1)
         metrics = _compute_metrics(self.task_type, self.y_valid, y_pred, proba)
         composition = {
@@ -333,26 +365,49 @@ class ComboOptimizer:
     def _fit_voting(self, estimators: List[Tuple[str, Any]], mode: str):
         model = VotingClassifier(estimators=estimators, voting=mode, n_jobs=None)
         with parallel_backend("threading", n_jobs=1):
-            model.fit(self.X_train, self.y_train)
+            model.fit(self.X_train, self.y_train, sample_weight=self.sample_weight)
         return model
 
     def _fit_stacking(self, estimators: List[Tuple[str, Any]], cv: int = 5):
-        skf = StratifiedKFold(n_splits=cv, shuffle=True, random_state=42)
-        final_est = LogisticRegression(max_iter=1000, n_jobs=1, multi_class="auto")
-        model = StackingClassifier(estimators=estimators, final_estimator=final_est, cv=skf, n_jobs=None, passthrough=False)
-        with parallel_backend("threading", n_jobs=1):
-            model.fit(self.X_train, self.y_train)
+        """
+        免重訓 Stacking：OOF 機率取自快取（每個模型 cv 次折內訓練，僅一次），
+        meta-learner 在 OOF 機率上訓練；推論時直接使用已訓練好的基模型。
+        """
+        cache = self._get_oof_cache()
+        if not cache.matches(cv, cache.seed, len(cache.y)):
+            cache = self.oof_cache = OOFCache(
+                self.X_train, self.y_train, n_splits=cv, seed=cache.seed,
+                sample_weight=self.sample_weight, n_jobs=cache.n_jobs, progress=self.progress_callback,
+            )
+        cache.compute(dict(estimators))
+        fitted = dict(self.base_estimators)
+        base = [(n, self._fitted_or_fit(fitted.get(n), est)) for n, est in estimators]
+        final_est = LogisticRegression(max_iter=1000, n_jobs=1)
+        model = CachedStackingClassifier(estimators=base, final_estimator=final_est)
+        model.fit_from_oof([cache.oof_matrix(n) for n, _ in estimators], self.y_train,
+                           sample_weight=self.sample_weight)
+        print(f"🧱 Stacking：OOF 快取共 {cache.fits} 次折內訓練，meta-learner 於 OOF 機率上訓練")
         return model
 
-    def _eval_and_compose(self, model, kind: str, estimators: List[Tuple[str, Any]]):
-        # 評估集成模型整體成績
-        y_pred = model.predict(self.X_valid)
-        proba = None
-        if hasattr(model, "predict_proba"):
+    def _fitted_or_fit(self, fitted, est):
+        """優先沿用 Trainer 已訓練好的模型；未訓練（或不存在）時才以訓練集 fit 一次。"""
+        if fitted is not None:
             try:
-                proba = model.predict_proba(self.X_valid)
+                check_is_fitted(fitted)
+                return fitted
             except Exception:
-                proba = None
+                pass
+        model = clone(est)
+        if self.sample_weight is None:
+            model.fit(self.X_train, self.y_train)
+        else:
+            model.fit(self.X_train, self.y_train, sample_weight=self.sample_weight)
+        return model
+
+    def _eval_and_compose(self, model, kind: str, estimators: List[Tuple[str, Any]]):
+        # 評估集成模型整體成績（子模型機率由評估情境快取，集成與子模型評估共用）
+        proba = self.eval_ctx.proba(model)
+        y_pred = self.eval_ctx.labels(model)
         metrics = _compute_metrics(self.task_type, self.y_valid, y_pred, proba)
         
         # 評估個別子模型成績
@@ -380,14 +435,8 @@ class ComboOptimizer:
     def _evaluate_single_model(self, model, name: str) -> Dict[str, Any]:
         """評估單一模型的成績。"""
         try:
-            y_pred = model.predict(self.X_valid)
-            proba = None
-            if hasattr(model, "predict_proba"):
-                try:
-                    proba = model.predict_proba(self.X_valid)
-                except Exception:
-                    proba = None
-            
+            proba = self.eval_ctx.proba(model)
+            y_pred = self.eval_ctx.labels(model)
             return _compute_metrics(self.task_type, self.y_valid, y_pred, proba)
             
         except Exception as e:
@@ -406,10 +455,11 @@ class ComboOptimizer:
         # stacking：列出 meta LR 係數 top-k
         names = [n for n, _ in estimators]
         n_classes = len(self.classes_)
-        feat_names = []
-        for n in names:
-            for k in range(n_classes):
-                feat_names.append(f"{n}::class_{k}")
+        feat_names = list(getattr(model, "meta_feature_names_", []))
+        if not feat_names:
+            for n in names:
+                for k in range(n_classes):
+                    feat_names.append(f"{n}::class_{k}")
         clf = model.final_estimator_
         coef = getattr(clf, "coef_", None)
         topk_map = {}
@@ -419,7 +469,10 @@ class ComboOptimizer:
                 coefs = coef[c_idx, :]
                 order = np.argsort(-np.abs(coefs))[:K]
                 tops = [(feat_names[j], float(coefs[j])) for j in order]
-                cls_label = self.classes_[c_idx] if c_idx < len(self.classes_) else f"idx_{c_idx}"
+                if coef.shape[0] == 1 and len(self.classes_) == 2:
+                    cls_label = self.classes_[1]   # 二元 LR 只有一組係數，對應正類
+                else:
+                    cls_label = self.classes_[c_idx] if c_idx < len(self.classes_) else f"idx_{c_idx}"
                 topk_map[cls_label] = tops
         return {
             "type": "stacking",
@@ -531,6 +584,7 @@ class ComboOptimizer:
             import numpy as np
             if isinstance(v, (np.floating, np.integer)): return v.item()
             if isinstance(v, np.ndarray): return v.tolist()
+            if isinstance(v, dict): return {(k.item() if isinstance(k, np.generic) else k): _conv(x) for k, x in v.items()}
             return v
         return {k: _conv(v) for k, v in d.items()}
 
@@ -593,6 +647,7 @@ def run_ensemble(
     X_valid=None,
     y_valid=None,
     cfg: Optional[Dict[str, Any]] = None,
+    sample_weight=None,
 ):
     """Convenience wrapper around :class:`OptunaEnsembler`.
 
@@ -608,6 +663,8 @@ def run_ensemble(
     cfg: Dict[str, Any], optional
         Configuration dictionary. Keys mirror ``OptunaEnsembler`` init
         arguments.
+    sample_weight: array-like, optional
+        Per-row weights for ``X`` (e.g. duplicate counts after row compression).
     """
 
     cfg = cfg or {}
@@ -625,4 +682,4 @@ def run_ensemble(
         seed=cfg.get("SEED", 42),
         report_dir=cfg.get("REPORT_DIR", "./reports"),
     )
-    return ens.fit(estimators, X, y, X_valid, y_valid)
+    return ens.fit(estimators, X, y, X_valid, y_valid, sample_weight=sample_weight)
@@ -45,6 +45,78 @@ CONFIG_BINARY = {
         "VOTING": "soft",
         "THRESHOLD": 0.33,
         "SEARCH": "none"
+    },
+    # Optuna 基模型尋參的 multi-fidelity 模式（子樣本 rung + early stopping + Hyperband）
+    "MULTI_FIDELITY": {
+        "ENABLED": False,
+        "MIN_FRACTION": 0.05,
+        "REDUCTION_FACTOR": 3,
+        "EVAL_SIZE": 0.2,
+        "EARLY_STOPPING_SHARE": 0.5,
+        "EARLY_STOPPING_ROUNDS": 50,
+        "MAX_ESTIMATORS": 2000,
+        "PRUNER": "hyperband"
+    },
+    # 自 OUTPUT_DIR 內最近一次相容產出（同任務＋同特徵集）warm-start 基模型尋參
+    "WARM_START": {
+        "ENABLED": False,
+        "TRIALS": 8,
+        "N_NEIGHBOURS": 3,
+        "SHRINK": 0.25,
+        "JITTER": 0.3
+    },
+    # 資料大於記憶體時：逐 chunk 讀取、XGB/LGB 外部記憶體訓練、RF/ET/CAT 與集成改用 reservoir 樣本
+    "OUT_OF_CORE": {
+        "ENABLED": False,
+        "CHUNK_ROWS": 200000,
+        "SAMPLE_ROWS": 100000,
+        "HOLDOUT_KEY": "idseq",
+        "HOLDOUT_MAX_ROWS": 500000,
+        "RESERVOIR_ROWS": 500000,
+        "EXTERNAL_MODELS": ["XGB", "LGB"],
+        "SAMPLE_MODELS": ["RF", "ET", "CAT"],
+        "KEEP_CACHE": False
+    },
+    # 增量續訓：在上次產出的 XGB/LGB/CAT 上追加樹，以最新資料做 hold-out，退步即回滾
+    "CONTINUE_TRAINING": {
+        "ENABLED": False,
+        "SOURCE_DIR": None,
+        "MODELS": ["XGB", "LGB", "CAT"],
+        "EXTRA_TREES": 50,
+        "METRIC": None,
+        "TOLERANCE": 0.002
+    },
+    # 訓練前合併特徵＋標籤完全相同的列，以出現次數作為 sample_weight
+    "DEDUP": {
+        "ENABLED": False,
+        "MIN_RATIO": 1.05
+    },
+    # 負樣本降採樣（僅二元；只作用在訓練集）：prior=機率修正回原始先驗、weight=importance weight
+    "NEG_DOWNSAMPLING": {
+        "ENABLED": False,
+        "RATE": 0.1,
+        "MODE": "prior",
+        "NEGATIVE_LABEL": 0,
+        "COMPARE_FULL": False
+    },
+    # OOF 權重初始化（DMW／DWB）的「模型 × 折」平行訓練：N_JOBS 個行程，1 = 依序執行，-1 = CPU 數（平行時折模型改用 CPU）
+    "PARALLEL_FOLDS": {
+        "N_JOBS": 1
+    },
+    # 集成蒸餾：以集成的軟標籤訓練單一 LGB/XGB 學生，樹數／深度依推論延遲預算挑選，另存 student_*.joblib
+    "DISTILLATION": {
+        "ENABLED": False,
+        "STUDENT": "LGB",
+        "MAX_LATENCY_MS_PER_1K": 5.0,
+        "DEPTHS": [4, 6, 8],
+        "MAX_TREES": 400
+    },
+    # 串接推論：淺層 gate 先分流，只有不確定帶送完整集成；門檻在驗證集校準（召回率損失 ≤ 0.1%），另存 cascade.joblib
+    "CASCADE": {
+        "ENABLED": False,
+        "GATE": "TREE",
+        "MAX_DEPTH": 3,
+        "MAX_RECALL_LOSS": 0.001
     }
 }
 
@@ -96,5 +168,77 @@ CONFIG_MULTICLASS = {
         "VOTING": "soft",
         "THRESHOLD": 0.33,
         "SEARCH": "none"
+    },
+    # Optuna 基模型尋參的 multi-fidelity 模式（子樣本 rung + early stopping + Hyperband）
+    "MULTI_FIDELITY": {
+        "ENABLED": False,
+        "MIN_FRACTION": 0.05,
+        "REDUCTION_FACTOR": 3,
+        "EVAL_SIZE": 0.2,
+        "EARLY_STOPPING_SHARE": 0.5,
+        "EARLY_STOPPING_ROUNDS": 50,
+        "MAX_ESTIMATORS": 2000,
+        "PRUNER": "hyperband"
+    },
+    # 自 OUTPUT_DIR 內最近一次相容產出（同任務＋同特徵集）warm-start 基模型尋參
+    "WARM_START": {
+        "ENABLED": False,
+        "TRIALS": 8,
+        "N_NEIGHBOURS": 3,
+        "SHRINK": 0.25,
+        "JITTER": 0.3
+    },
+    # 資料大於記憶體時：逐 chunk 讀取、XGB/LGB 外部記憶體訓練、RF/ET/CAT 與集成改用 reservoir 樣本
+    "OUT_OF_CORE": {
+        "ENABLED": False,
+        "CHUNK_ROWS": 200000,
+        "SAMPLE_ROWS": 100000,
+        "HOLDOUT_KEY": "idseq",
+        "HOLDOUT_MAX_ROWS": 500000,
+        "RESERVOIR_ROWS": 500000,
+        "EXTERNAL_MODELS": ["XGB", "LGB"],
+        "SAMPLE_MODELS": ["RF", "ET", "CAT"],
+        "KEEP_CACHE": False
+    },
+    # 增量續訓：在上次產出的 XGB/LGB/CAT 上追加樹，以最新資料做 hold-out，退步即回滾
+    "CONTINUE_TRAINING": {
+        "ENABLED": False,
+        "SOURCE_DIR": None,
+        "MODELS": ["XGB", "LGB", "CAT"],
+        "EXTRA_TREES": 50,
+        "METRIC": None,
+        "TOLERANCE": 0.002
+    },
+    # 訓練前合併特徵＋標籤完全相同的列，以出現次數作為 sample_weight
+    "DEDUP": {
+        "ENABLED": False,
+        "MIN_RATIO": 1.05
+    },
+    # 負樣本降採樣（僅二元；只作用在訓練集）：prior=機率修正回原始先驗、weight=importance weight
+    "NEG_DOWNSAMPLING": {
+        "ENABLED": False,
+        "RATE": 0.1,
+        "MODE": "prior",
+        "NEGATIVE_LABEL": 0,
+        "COMPARE_FULL": False
+    },
+    # OOF 權重初始化（DMW／DWB）的「模型 × 折」平行訓練：N_JOBS 個行程，1 = 依序執行，-1 = CPU 數（平行時折模型改用 CPU）
+    "PARALLEL_FOLDS": {
+        "N_JOBS": 1
+    },
+    # 集成蒸餾：以集成的軟標籤訓練單一 LGB/XGB 學生，樹數／深度依推論延遲預算挑選，另存 student_*.joblib
+    "DISTILLATION": {
+        "ENABLED": False,
+        "STUDENT": "LGB",
+        "MAX_LATENCY_MS_PER_1K": 5.0,
+        "DEPTHS": [4, 6, 8],
+        "MAX_TREES": 400
+    },
+    # 串接推論：淺層 gate 先分流，只有不確定帶送完整集成；門檻在驗證集校準（召回率損失 ≤ 0.1%），另存 cascade.joblib
+    "CASCADE": {
+        "ENABLED": False,
+        "GATE": "TREE",
+        "MAX_DEPTH": 3,
+        "MAX_RECALL_LOSS": 0.001
     }
 }
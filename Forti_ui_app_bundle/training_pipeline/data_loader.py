@@ -1,37 +1,68 @@
 # training_pipeline/data_loader.py
+import io
+import os
+
 import numpy as np
 import pandas as pd
-from typing import Dict, Tuple
+from typing import Dict, List, Optional, Tuple
+
+# ui_shared 模組以頂層名稱匯入（串流讀取工具與另一個介面共用）；路徑統一由 shared_path 設定
+from .shared_path import ensure_ui_shared_path
+
+ensure_ui_shared_path()
+
+from archive_stream import ensure_supported, is_compressed, open_source, read_head_lines  # noqa: E402
+from csv_ingest import DEFAULT_CHUNK_BYTES, StreamingCsvReader  # noqa: E402
+
+# 型別投影載入時，讀檔前用來推斷欄位型別的樣本列數
+SCHEMA_SAMPLE_ROWS = 5000
 
 
 class DataLoader:
     def __init__(self, config: dict):
         self.config = config
+        self.ingest_report: Optional[Dict] = None
 
     def load_data(self, file_path: str) -> pd.DataFrame:
         """智能載入數據，支持自動格式偵測和 ETL 預處理"""
-        
+        # .7z / .rar 無法串流：直接回報不支援，避免被當成 CSV 或在格式偵測時拋出未處理的例外
+        ensure_supported(file_path)
+
                 # 偵測資料格式
         data_format = self._detect_data_format(file_path)
         print(f"🔍 偵測到資料格式：{data_format}")
         
         if data_format == "compressed":
-            print("📦 偵測到壓縮檔案，先解壓縮...")
-            extracted_file = self._extract_compressed_file(file_path)
-            if extracted_file:
-                # 遞迴檢測解壓後的檔案格式
-                return self.load_data(extracted_file)
-            else:
-                print("❌ 壓縮檔案解壓失敗，嘗試直接處理...")
-                return self._load_with_fallback_methods(file_path)
+            # 不解壓到暫存目錄：直接以解壓串流偵測內容格式並交給串流讀取器
+            inner_format = self._sniff_format(read_head_lines(file_path, 5))
+            print(f"📦 偵測到壓縮檔案，串流讀取（內容格式：{inner_format}）...")
+            if inner_format == "fortinet_log":
+                return self._process_fortinet_logs(file_path)
+            if inner_format == "csv" and self.config.get("TYPED_LOADING", True):
+                try:
+                    return self._load_projected(file_path, "csv")
+                except Exception as e:
+                    print(f"⚠️ 型別投影載入失敗（{e}），改用完整讀取...")
+            return self._load_csv_streaming(file_path)
         elif data_format == "fortinet_log":
             print("🔄 偵測到 Fortinet 日誌格式，執行 ETL 前處理...")
             return self._process_fortinet_logs(file_path)
-        elif data_format == "csv":
-            return self._load_with_fallback_methods(file_path)
+        elif data_format in ("csv", "parquet", "arrow"):
+            if self.config.get("TYPED_LOADING", True):
+                try:
+                    return self._load_projected(file_path, data_format)
+                except Exception as e:
+                    if data_format != "csv":
+                        raise
+                    print(f"⚠️ 型別投影載入失敗（{e}），改用完整讀取...")
+            if data_format == "parquet":
+                return pd.read_parquet(file_path)
+            if data_format == "arrow":
+                return pd.read_feather(file_path)
+            return self._load_csv_streaming(file_path)
         else:
             print("⚠️ 未知格式，嘗試各種載入方法...")
-            return self._load_with_fallback_methods(file_path)
+            return self._load_csv_streaming(file_path)
     
     def _detect_data_format(self, file_path: str) -> str:
         """偵測數據格式，支援壓縮檔案"""
@@ -39,237 +70,219 @@ class DataLoader:
         
         # 檢查是否為壓縮檔案
         file_extension = os.path.splitext(file_path)[1].lower()
-        if file_extension in ['.gz', '.zip', '.7z', '.rar', '.tar', '.bz2']:
+        if is_compressed(file_path):
             return "compressed"
+        if file_extension in ['.parquet', '.pq']:
+            return "parquet"
+        if file_extension in ['.arrow', '.feather', '.ipc']:
+            return "arrow"
         
         try:
             # 嘗試以文本方式讀取
             with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
                 first_lines = [f.readline().strip() for _ in range(5)]
-                first_lines = [line for line in first_lines if line]  # 移除空行
-            
-            # 檢查是否為 Fortinet 日誌格式 (key=value 對)
-            fortinet_indicators = 0
-            for line in first_lines:
-                if not line:
-                    continue
-                # 檢查 Fortinet 日誌的特徵
-                if ('logver=' in line and 'idseq=' in line and 
-                    'devid=' in line and 'type=' in line):
-                    fortinet_indicators += 1
-                # 檢查 key=value 模式
-                import re
-                kv_pattern = re.compile(r'(\w+)=(".*?"|\'.*?\'|[^"\',\s]+)')
-                if len(kv_pattern.findall(line)) > 5:  # 超過5個 key=value 對
-                    fortinet_indicators += 1
-            
-            if fortinet_indicators >= 2:
-                return "fortinet_log"
-            
-            # 檢查是否為 CSV 格式
-            try:
-                pd.read_csv(file_path, nrows=1)
-                return "csv"
-            except:
-                pass
-                
-            return "unknown"
-            
+            return self._sniff_format(first_lines)
         except Exception as e:
             print(f"格式偵測失敗: {e}")
             return "unknown"
-    
-    def _extract_compressed_file(self, file_path: str) -> str | None:
-        """解壓縮檔案並返回解壓後的檔案路徑"""
-        import os
-        import tempfile
-        import zipfile
-        import gzip
-        import tarfile
-        import shutil
+
+    @staticmethod
+    def _sniff_format(first_lines: List[str]) -> str:
+        """依開頭幾行判斷 fortinet_log / csv / unknown（一般檔案與解壓串流共用）"""
+        import re
+
+        first_lines = [line for line in first_lines if line]  # 移除空行
         
-        file_extension = os.path.splitext(file_path)[1].lower()
-        temp_dir = tempfile.mkdtemp()
+        # 檢查是否為 Fortinet 日誌格式 (key=value 對)
+        fortinet_indicators = 0
+        kv_pattern = re.compile(r'(\w+)=(".*?"|\'.*?\'|[^"\',\s]+)')
+        for line in first_lines:
+            # 檢查 Fortinet 日誌的特徵
+            if ('logver=' in line and 'idseq=' in line and 
+                'devid=' in line and 'type=' in line):
+                fortinet_indicators += 1
+            # 檢查 key=value 模式
+            if len(kv_pattern.findall(line)) > 5:  # 超過5個 key=value 對
+                fortinet_indicators += 1
         
-        try:
-            if file_extension == '.gz':
-                # 處理 .gz 檔案
-                output_path = os.path.join(temp_dir, 'extracted_file.txt')
-                with gzip.open(file_path, 'rt', encoding='utf-8', errors='ignore') as gz_file:
-                    with open(output_path, 'w', encoding='utf-8') as out_file:
-                        shutil.copyfileobj(gz_file, out_file)
-                print(f"✅ 成功解壓 .gz 檔案到: {output_path}")
-                return output_path
-                
-            elif file_extension == '.zip':
-                # 處理 .zip 檔案
-                with zipfile.ZipFile(file_path, 'r') as zip_file:
-                    # 取得第一個檔案
-                    file_list = zip_file.namelist()
-                    if not file_list:
-                        print("❌ ZIP 檔案為空")
-                        return None
-                    
-                    first_file = file_list[0]
-                    extracted_path = zip_file.extract(first_file, temp_dir)
-                    print(f"✅ 成功解壓 .zip 檔案到: {extracted_path}")
-                    return extracted_path
-                    
-            elif file_extension in ['.tar', '.tar.gz', '.tgz']:
-                # 處理 .tar 相關檔案
-                with tarfile.open(file_path, 'r:*') as tar_file:
-                    # 取得第一個檔案
-                    members = tar_file.getmembers()
-                    if not members:
-                        print("❌ TAR 檔案為空")
-                        return None
-                    
-                    first_member = members[0]
-                    if first_member.isfile():
-                        tar_file.extract(first_member, temp_dir)
-                        extracted_path = os.path.join(temp_dir, first_member.name)
-                        print(f"✅ 成功解壓 .tar 檔案到: {extracted_path}")
-                        return extracted_path
-                        
-            else:
-                print(f"⚠️ 不支援的壓縮格式: {file_extension}")
-                return None
-                
-        except Exception as e:
-            print(f"❌ 解壓縮失敗: {e}")
-            # 清理暫存目錄
+        if fortinet_indicators >= 2:
+            return "fortinet_log"
+        
+        # 檢查是否為 CSV 格式
+        if first_lines:
             try:
-                shutil.rmtree(temp_dir)
+                pd.read_csv(io.StringIO("\n".join(first_lines)), nrows=1)
+                return "csv"
             except Exception:
                 pass
-            return None
+            
+        return "unknown"
     
+    # === 型別投影載入：只讀需要的欄位、直接以窄型別解析 ===
+    def _plan_projection(self, columns: List[str], kinds: Dict[str, str]) -> Tuple[List[str], Dict[str, str], Dict]:
+        """
+        kinds：欄位 → "numeric" / "bool" / "other"（由樣本或檔案 schema 推得）
+        回傳 (要讀的欄位, dtype 指定, 投影資訊)；
+        DROP_COLUMNS 與非數值欄在讀檔階段就略過，數值特徵直接讀為 float32。
+        """
+        target_col = self.config.get("TARGET_COLUMN")
+        drop_cols = set(self.config.get("DROP_COLUMNS", [])) - {target_col}
+        usecols, dtypes = [], {}
+        skipped_drop, skipped_type = [], []
+        for c in columns:
+            kind = kinds.get(c, "other")
+            if c == target_col:
+                usecols.append(c)
+                if kind == "numeric":
+                    dtypes[c] = "float32"
+            elif c in drop_cols:
+                skipped_drop.append(c)
+            elif kind == "numeric":
+                usecols.append(c)
+                dtypes[c] = "float32"
+            elif kind == "bool":
+                usecols.append(c)
+            else:
+                skipped_type.append(c)
+        projection = {
+            "source_columns": list(columns),
+            "skipped_by_dropcols": skipped_drop,
+            "skipped_by_type": skipped_type,
+        }
+        return usecols, dtypes, projection
+
+    def _load_projected(self, file_path: str, data_format: str) -> pd.DataFrame:
+        """依 schema 只讀必要欄位並以 float32 解析；CSV 以樣本推斷型別，Parquet/Arrow 直接讀 schema。"""
+        if data_format == "csv":
+            n_sample = int(self.config.get("SCHEMA_SAMPLE_ROWS", SCHEMA_SAMPLE_ROWS))
+            with open_source(file_path) as src:
+                sample = StreamingCsvReader(chunk_bytes=1024 * 1024, nrows=n_sample).read(src)
+            kinds = {c: _dtype_kind(sample[c].dtype) for c in sample.columns}
+            usecols, dtypes, projection = self._plan_projection(list(sample.columns), kinds)
+            del sample
+            df = self._stream_csv(file_path, usecols=usecols, dtype=dtypes)
+        else:
+            import pyarrow as pa
+
+            if data_format == "parquet":
+                import pyarrow.parquet as pq
+
+                schema = pq.read_schema(file_path)
+            else:
+                source = pa.memory_map(file_path, "r")
+                reader = pa.ipc.open_file(source)
+                schema = reader.schema
+            kinds = {f.name: _arrow_kind(f.type) for f in schema}
+            usecols, dtypes, projection = self._plan_projection(list(schema.names), kinds)
+            if data_format == "parquet":
+                table = pq.read_table(file_path, columns=usecols)
+            else:
+                # memory-mapped：只有被選取的欄位會實際讀入
+                table = reader.read_all().select(usecols)
+            table = table.cast(pa.schema([
+                pa.field(f.name, pa.float32()) if f.name in dtypes else f for f in table.schema
+            ]))
+            df = table.to_pandas(self_destruct=True, split_blocks=True)
+            del table
+
+        df.attrs["projection"] = projection
+        n_skipped = len(projection["skipped_by_dropcols"]) + len(projection["skipped_by_type"])
+        print(f"✅ 型別投影載入完成：{df.shape[0]} 筆，讀入 {df.shape[1]} 欄（略過 {n_skipped} 欄）")
+        return df
+
     def _process_fortinet_logs(self, file_path: str) -> pd.DataFrame:
-        """處理 Fortinet 原始日誌格式"""
-        print("🔄 偵測到 Fortinet 日誌格式，開始 ETL 處理...")
+        """
+        串流處理 Fortinet 原始日誌：逐 chunk 走與推論端相同的 清洗 → 映射 → 特徵工程，
+        每個 chunk 依型別投影只保留數值欄並以 float32 寫入欄式緩衝，記憶體只隨數值欄成長。
+        """
+        print("🔄 偵測到 Fortinet 日誌格式，開始串流 ETL（清洗 → 映射 → 特徵工程）...")
         
         try:
             # 導入 ETL 模組
-            from ..etl_pipeline.log_cleaning import parse_log_line
-            import tempfile
-            import os
-            
-            processed_records = []
-            
-            # 讀取並解析原始日誌
-            with open(file_path, 'r', encoding='utf-8') as f:
-                for line_num, line in enumerate(f, 1):
-                    if line.strip():
-                        record = parse_log_line(line.strip())
-                        if record:
-                            processed_records.append(record)
-                        if line_num % 10000 == 0:
-                            print(f"📈 已處理 {line_num} 行，成功解析 {len(processed_records)} 條記錄")
-            
-            print(f"✅ ETL 處理完成：共解析 {len(processed_records)} 條記錄")
-            
-            # 轉換為 DataFrame
-            df = pd.DataFrame(processed_records)
-            
-            # 基本數據清理和轉換
-            df = self._apply_basic_etl_transforms(df)
-            
-            print(f"📊 最終數據形狀: {df.shape}")
-            return df
-            
+            from ..etl_pipeliner import iter_engineered_chunks
         except ImportError as e:
             print(f"❌ 無法導入 ETL 模組: {e}")
             raise RuntimeError("ETL 模組不可用，無法處理 Fortinet 日誌格式")
+
+        typed = self.config.get("TYPED_LOADING", True)
+        etl_kwargs = {"chunk_lines": int(self.config["ETL_CHUNK_LINES"])} if self.config.get("ETL_CHUNK_LINES") else {}
+        buffers: Dict[str, List[np.ndarray]] = {}
+        frames: List[pd.DataFrame] = []
+        usecols, dtypes, projection = None, {}, None
+        n_rows = 0
+
+        try:
+            with io.TextIOWrapper(open_source(file_path), encoding='utf-8', errors='replace') as f:
+                for chunk in iter_engineered_chunks(f, **etl_kwargs):
+                    n_rows += len(chunk)
+                    print(f"📈 已處理 {n_rows} 筆記錄")
+                    if not typed:
+                        frames.append(chunk)
+                        continue
+                    if usecols is None:
+                        # 以第一個 chunk 的欄位型別決定投影；之後的 chunk 依同一計畫轉型
+                        kinds = {c: _dtype_kind(chunk[c].dtype) for c in chunk.columns}
+                        usecols, dtypes, projection = self._plan_projection(list(chunk.columns), kinds)
+                        buffers = {c: [] for c in usecols}
+                    for c in usecols:
+                        col = chunk[c] if c in chunk.columns else pd.Series(np.nan, index=chunk.index)
+                        if c in dtypes:
+                            buffers[c].append(pd.to_numeric(col, errors="coerce").to_numpy(np.float32))
+                        else:
+                            buffers[c].append(col.to_numpy())
+                    del chunk
         except Exception as e:
             print(f"❌ ETL 處理失敗: {e}")
             raise RuntimeError(f"ETL 處理失敗: {str(e)}")
-    
-    def _apply_basic_etl_transforms(self, df: pd.DataFrame) -> pd.DataFrame:
-        """應用基本的 ETL 轉換"""
-        try:
-            # 處理日期時間
-            if 'date' in df.columns and 'time' in df.columns:
-                df['datetime'] = pd.to_datetime(
-                    df['date'] + ' ' + df['time'], 
-                    errors='coerce'
-                )
-            
-            # 處理數值欄位
-            numeric_cols = ['srcport', 'dstport', 'sentpkt', 'rcvdpkt', 'duration', 'crscore']
-            for col in numeric_cols:
-                if col in df.columns:
-                    df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-            
-            # 設定攻擊標籤
-            if 'crscore' in df.columns:
-                df['is_attack'] = (pd.to_numeric(df['crscore'], errors='coerce') > 0).astype(int)
-            else:
-                df['is_attack'] = 0
-            
-            # 設定風險等級
-            if 'crlevel' not in df.columns:
-                df['crlevel'] = 'none'
-            
-            print("✅ 基本 ETL 轉換完成")
-            return df
-            
-        except Exception as e:
-            print(f"⚠️ ETL 轉換部分失敗: {e}")
-            return df
-    
-    def _load_csv_with_fallback(self, file_path: str) -> pd.DataFrame:
-        """使用容錯機制載入 CSV 文件"""
-        try:
-            df = pd.read_csv(file_path)
-            print(f"✅ CSV 載入完成：{df.shape[0]} 筆，欄位 {df.shape[1]}")
-            return df
-        except pd.errors.ParserError as e:
-            print(f"⚠️ CSV 格式問題：{str(e)}")
-            return self._load_with_fallback_methods(file_path)
-    
-    def _load_with_fallback_methods(self, file_path: str) -> pd.DataFrame:
-        """使用多種容錯方法載入文件"""
-        print("🔄 嘗試使用容錯模式重新讀取...")
-        
-        # 容錯方法列表
-        fallback_methods = [
-            {
-                "name": "容錯模式",
-                "params": {
-                    "error_bad_lines": False,
-                    "warn_bad_lines": True,
-                    "on_bad_lines": 'warn'
-                }
-            },
-            {
-                "name": "Python 引擎",
-                "params": {
-                    "sep": None,
-                    "engine": 'python',
-                    "quoting": 3,
-                    "skipinitialspace": True
-                }
-            }
-        ]
-        
-        for method in fallback_methods:
-            try:
-                df = pd.read_csv(file_path, **method["params"])
-                print(f"✅ {method['name']}載入完成：{df.shape[0]} 筆，欄位 {df.shape[1]}")
-                return df
-            except Exception as e:
-                print(f"❌ {method['name']}失敗: {e}")
-                continue
-        
-        # 所有方法都失敗
-        raise RuntimeError(
-            f"無法載入文件：{file_path}\n"
-            f"已嘗試所有載入方法都失敗。\n"
-            f"請檢查：\n"
-            f"1. 文件是否為有效的 CSV 格式\n"
-            f"2. 或者是否為 Fortinet 日誌但格式不正確\n"
-            f"3. 文件編碼是否正確（建議使用 UTF-8）"
+
+        if n_rows == 0:
+            raise RuntimeError(f"ETL 處理失敗: {file_path} 中沒有可解析的日誌記錄")
+        if typed:
+            df = pd.DataFrame({c: np.concatenate(parts) for c, parts in buffers.items()})
+            df.attrs["projection"] = projection
+        else:
+            df = pd.concat(frames, ignore_index=True)
+        print(f"✅ ETL 處理完成：{df.shape[0]} 筆，{df.shape[1]} 欄")
+        return df
+
+    def _quarantine_path(self, file_path: str) -> str:
+        """格式錯誤行的隔離檔：預設放在 QUARANTINE_DIR（pipeline 設為 reports/），否則與原檔同目錄。"""
+        qdir = self.config.get("QUARANTINE_DIR") or os.path.dirname(os.path.abspath(file_path))
+        base = os.path.splitext(os.path.basename(file_path))[0]
+        return os.path.join(qdir, f"{base}_quarantine.tsv")
+
+    def _stream_csv(self, file_path: str, **kwargs) -> pd.DataFrame:
+        """單趟容錯讀取：格式錯誤行寫入 quarantine（含行號），統計存於 self.ingest_report。"""
+        reader = StreamingCsvReader(
+            chunk_bytes=int(self.config.get("CSV_CHUNK_BYTES", DEFAULT_CHUNK_BYTES)),
+            quarantine_path=self._quarantine_path(file_path),
+            **kwargs,
         )
+        with open_source(file_path) as src:
+            df = reader.read(src)
+        self.ingest_report = reader.report.to_dict()
+        if reader.report.bad_rows:
+            print(f"⚠️ 略過 {reader.report.bad_rows} 行格式錯誤資料"
+                  f"（行號示例 {reader.report.bad_line_numbers[:5]}），已寫入 {reader.report.quarantine_path}")
+        if reader.report.coerced_cells:
+            print(f"⚠️ {reader.report.coerced_cells} 個非數值儲存格已轉為缺值：{reader.report.coerced_columns}")
+        return df
+
+    def _load_csv_streaming(self, file_path: str) -> pd.DataFrame:
+        """完整讀取 CSV（不做型別投影）；讀不到任何有效列時才視為失敗。"""
+        df = self._stream_csv(file_path)
+        report = self.ingest_report or {}
+        if df.empty and report.get("bad_rows"):
+            raise RuntimeError(
+                f"無法載入文件：{file_path}\n"
+                f"所有資料行的欄位數都與標題不符（詳見 {report.get('quarantine_path')}）。\n"
+                f"請檢查：\n"
+                f"1. 文件是否為有效的 CSV 格式\n"
+                f"2. 或者是否為 Fortinet 日誌但格式不正確\n"
+                f"3. 文件編碼是否正確（建議使用 UTF-8）"
+            )
+        print(f"✅ CSV 載入完成：{df.shape[0]} 筆，欄位 {df.shape[1]}")
+        return df
 
     # === 新增：帶報告版本（不破壞舊介面） ===
     @staticmethod
@@ -286,41 +299,49 @@ class DataLoader:
         if target_col not in df.columns:
             raise KeyError(f"找不到目標欄位 {target_col}")
 
+        # 型別投影載入時部分欄位未讀入，以 attrs 還原原始欄位清單，報告內容與完整讀取一致
+        projection = df.attrs.get("projection") or {}
+        present = set(df.columns)
+
         report: Dict = {}
-        init_cols = list(df.columns)
+        init_cols = list(projection.get("source_columns") or df.columns)
         report["initial_count"] = len(init_cols)
         report["initial_cols"] = init_cols
 
         y = df[target_col]
-        # 1) 丟掉 DROP_COLUMNS
-        X1 = df.drop(columns=list(drop_cols & set(df.columns)), errors="ignore")
-        report["dropped_by_dropcols"] = sorted(list(set(init_cols) - set(X1.columns) - {target_col}))
-        report["after_drop_cols"] = list(X1.columns)
+        # 1) 丟掉 DROP_COLUMNS（只計算欄位清單，不複製資料）
+        after_drop = [c for c in init_cols if c not in drop_cols]
+        report["dropped_by_dropcols"] = sorted(list(set(init_cols) - set(after_drop) - {target_col}))
+        report["after_drop_cols"] = after_drop
 
         # 2) 僅保留 numeric/bool
         keep_cols = []
-        for c in X1.columns:
-            if c == target_col:
+        for c in after_drop:
+            if c == target_col or c not in present:
                 continue
-            dt = X1[c].dtype
+            dt = df[c].dtype
             if pd.api.types.is_bool_dtype(dt) or pd.api.types.is_numeric_dtype(dt):
                 keep_cols.append(c)
-        X2 = X1[keep_cols].copy()
-        report["dropped_by_type"] = sorted(list(set(X1.columns) - set(X2.columns)))
-        report["after_type_filter"] = list(X2.columns)
-
-        # 3) 補值 + 型別統一
-        for c in X2.columns:
-            if pd.api.types.is_bool_dtype(X2[c].dtype):
-                X2[c] = X2[c].fillna(False).astype(np.int8, copy=False)
-            else:
-                X2[c] = X2[c].fillna(0).astype(np.float32, copy=False)
+        report["dropped_by_type"] = sorted(list(set(after_drop) - set(keep_cols)))
+        report["after_type_filter"] = list(keep_cols)
 
-        # 4) 去常數欄（含全 NaN/單一值）
-        nunique = X2.nunique(dropna=False)
-        const_cols = nunique[nunique <= 1].index.tolist()
-        X3 = X2.drop(columns=const_cols, errors="ignore")
+        # 3) 去常數欄（含全 NaN/單一值；以補值後的結果判斷）—— 逐欄 min/max，不做 nunique
+        const_cols = [c for c in keep_cols if _is_constant_after_fill(df[c])]
         report["dropped_constant"] = const_cols
+        final_cols = [c for c in keep_cols if c not in set(const_cols)]
+
+        # 4) 只對最終欄位複製一次，再逐欄補值 + 型別統一
+        X3 = df[final_cols].copy()
+        for c in final_cols:
+            col = X3[c]
+            if pd.api.types.is_bool_dtype(col.dtype):
+                X3[c] = col.fillna(False).astype(np.int8, copy=False)
+            else:
+                if col.dtype != np.float32:
+                    col = col.astype(np.float32)
+                if col.hasnans:
+                    col = col.fillna(0)
+                X3[c] = col
 
         report["final_cols"] = list(X3.columns)
         report["final_count"] = int(X3.shape[1])
@@ -338,3 +359,32 @@ class DataLoader:
     def prepare_xy(df: pd.DataFrame, config: dict, task: str):
         X, y, _ = DataLoader.prepare_xy_with_report(df, config, task)
         return X, y
+
+
+def _dtype_kind(dtype) -> str:
+    if pd.api.types.is_bool_dtype(dtype):
+        return "bool"
+    if pd.api.types.is_numeric_dtype(dtype):
+        return "numeric"
+    return "other"
+
+
+def _arrow_kind(arrow_type) -> str:
+    import pyarrow as pa
+
+    if pa.types.is_boolean(arrow_type):
+        return "bool"
+    if pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type):
+        return "numeric"
+    return "other"
+
+
+def _is_constant_after_fill(col: pd.Series) -> bool:
+    """等同 col.fillna(0/False).nunique(dropna=False) <= 1，但不建立補值後的副本。"""
+    n_nan = int(col.isna().sum())
+    if n_nan == len(col):
+        return True
+    lo, hi = col.min(), col.max()
+    if lo != hi:
+        return False
+    return n_nan == 0 or lo == 0
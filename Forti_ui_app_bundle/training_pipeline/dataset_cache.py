@@ -0,0 +1,119 @@
+# training_pipeline/dataset_cache.py
+"""
+BinnedDatasetCache — Optuna CV 用的「分箱後資料集」快取
+- XGBoost：每折建一次 QuantileDMatrix（驗證折以 ref= 共用切點），依 max_bin 分組
+- LightGBM：每折只以訓練列建 Dataset 分箱（驗證折不參與分箱），依分箱參數分組；建構後釋放原始矩陣，
+  每組參數每折只多留一份分箱結果，不保留訓練矩陣的副本
+- 同一組分箱參數的所有 trial 共用，不再每次 fit 都重做 quantile sketch / histogram 分箱
+- sample_weight（重複列壓縮的出現次數）同時用於訓練與各折準確率
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# LightGBM 中會影響 Dataset 建構（分箱）的參數；其餘參數可在 trial 間自由變動
+LGB_BIN_PARAMS = ("max_bin", "min_data_in_bin", "bin_construct_sample_cnt", "use_missing", "zero_as_missing")
+
+# sklearn 風格參數 → 原生 train() 不接受或名稱不同者
+_XGB_SKLEARN_ONLY = ("n_estimators", "early_stopping_rounds", "enable_categorical", "callbacks")
+
+
+class BinnedDatasetCache:
+    def __init__(self, X, y, folds: Sequence[Tuple[np.ndarray, np.ndarray]], sample_weight=None) -> None:
+        self.X = np.ascontiguousarray(np.asarray(X, dtype=np.float32))
+        self.y = np.asarray(y).reshape(-1)
+        self.w = None if sample_weight is None else np.asarray(sample_weight, dtype=np.float32).reshape(-1)
+        self.folds = [(np.asarray(tr), np.asarray(va)) for tr, va in folds]
+        self._xgb: Dict[Tuple[int, int], Tuple[Any, Any]] = {}
+        self._lgb: Dict[Tuple[int, Tuple], Any] = {}
+
+    @property
+    def n_folds(self) -> int:
+        return len(self.folds)
+
+    # ---------------- XGBoost ----------------
+    def xgb_fold(self, fold: int, max_bin: int = 256):
+        key = (fold, int(max_bin))
+        if key not in self._xgb:
+            import xgboost as xgb
+
+            tr, va = self.folds[fold]
+            dtrain = xgb.QuantileDMatrix(self.X[tr], self.y[tr], weight=self._w(tr), max_bin=int(max_bin))
+            dvalid = xgb.QuantileDMatrix(self.X[va], self.y[va], weight=self._w(va), ref=dtrain,
+                                         max_bin=int(max_bin))
+            self._xgb[key] = (dtrain, dvalid)
+        return self._xgb[key]
+
+    def xgb_cv_accuracy(self, params: Dict[str, Any]) -> List[float]:
+        """以快取的 QuantileDMatrix 跑原生 xgb.train，回傳各折準確率。"""
+        import xgboost as xgb
+
+        p = {k: v for k, v in params.items() if k not in _XGB_SKLEARN_ONLY}
+        num_round = int(params.get("n_estimators", 100))
+        if "n_jobs" in p:
+            p["nthread"] = p.pop("n_jobs")
+        if "random_state" in p:
+            p["seed"] = p.pop("random_state")
+        p.setdefault("verbosity", 0)
+        # booster 的 max_bin 必須與 QuantileDMatrix 一致
+        p["max_bin"] = int(p.get("max_bin", 256))
+
+        scores = []
+        for fold in range(self.n_folds):
+            dtrain, dvalid = self.xgb_fold(fold, p["max_bin"])
+            booster = xgb.train(p, dtrain, num_boost_round=num_round)
+            proba = booster.predict(dvalid)
+            va = self.folds[fold][1]
+            scores.append(_accuracy(self.y[va], proba, self._w(va)))
+        return scores
+
+    # ---------------- LightGBM ----------------
+    def _lgb_bin_key(self, params: Dict[str, Any]) -> Tuple:
+        return tuple((k, params[k]) for k in LGB_BIN_PARAMS if k in params)
+
+    def lgb_fold(self, fold: int, params: Dict[str, Any]):
+        """該折訓練列的已分箱 Dataset（建構後釋放原始矩陣，快取中只留分箱結果）。"""
+        bin_key = self._lgb_bin_key(params)
+        key = (fold, bin_key)
+        if key not in self._lgb:
+            import lightgbm as lgb
+
+            tr = np.sort(self.folds[fold][0])
+            # 分箱切點只由訓練列決定，驗證折不可洩漏到 bin 邊界；驗證折直接以原始矩陣預測，不必建 Dataset
+            # feature_pre_filter=False：允許 min_data_in_leaf 在 trial 間變動而不必重建 Dataset
+            ds_params = {**dict(bin_key), "feature_pre_filter": False, "verbosity": -1}
+            self._lgb[key] = lgb.Dataset(self.X[tr], label=self.y[tr], weight=self._w(tr), params=ds_params,
+                                         free_raw_data=True).construct()
+        return self._lgb[key]
+
+    def lgb_cv_accuracy(self, params: Dict[str, Any]) -> List[float]:
+        """以快取的分箱 Dataset 跑原生 lgb.train，回傳各折準確率。"""
+        import lightgbm as lgb
+
+        p = {k: v for k, v in params.items() if k != "n_estimators"}
+        num_round = int(params.get("n_estimators", 100))
+        scores = []
+        for fold in range(self.n_folds):
+            booster = lgb.train(p, self.lgb_fold(fold, p), num_boost_round=num_round)
+            va = self.folds[fold][1]
+            proba = booster.predict(self.X[va])
+            scores.append(_accuracy(self.y[va], proba, self._w(va)))
+        return scores
+
+    def _w(self, idx: np.ndarray) -> Optional[np.ndarray]:
+        return None if self.w is None else self.w[idx]
+
+
+def _accuracy(y_true: np.ndarray, proba: np.ndarray, weight: Optional[np.ndarray] = None) -> float:
+    proba = np.asarray(proba)
+    if proba.ndim == 1:
+        pred = (proba > 0.5).astype(y_true.dtype)
+    else:
+        pred = proba.argmax(axis=1)
+    return float(np.average(pred == y_true, weights=weight))
+
+
+__all__ = ["BinnedDatasetCache", "LGB_BIN_PARAMS"]
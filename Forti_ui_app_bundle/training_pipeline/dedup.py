@@ -0,0 +1,77 @@
+# training_pipeline/dedup.py
+"""
+重複列壓縮（訓練前）：
+- 特徵工程後完全相同的列（同標籤）合併為一列，sample_weight = 出現次數
+- 以 float32 位元組做精確比對（np.unique over void view），不依賴雜湊、不會誤合併
+- 加權後的 loss 與原資料相同（每列 loss 乘上次數），因此模型不變、訓練列數大幅下降
+- 只壓縮訓練資料；驗證集保持原樣，評估數字與未壓縮時可直接比較
+注意：以「列數」為單位的限制（LightGBM min_data_in_leaf、RF bootstrap 抽樣）作用在壓縮後的唯一列上，
+唯一列很少時行為會與未壓縮不同，必要時調整這些參數或關閉 DEDUP。
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_DEDUP_SETTINGS: Dict[str, Any] = {
+    "ENABLED": False,
+    "MIN_RATIO": 1.05,   # 壓縮倍率（原列數／壓縮後列數）低於此值時不套用，避免無謂的權重開銷
+}
+
+
+def resolve_dedup_settings(config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    user = (config or {}).get("DEDUP") or {}
+    out = dict(DEFAULT_DEDUP_SETTINGS)
+    if isinstance(user, dict):
+        out.update({k: v for k, v in user.items() if k in DEFAULT_DEDUP_SETTINGS})
+    return out
+
+
+def compress_duplicates(X, y, sample_weight=None) -> Tuple[Any, Any, np.ndarray, Dict[str, Any]]:
+    """
+    回傳 (X_c, y_c, sample_weight, stats)；保留每組第一次出現的列、維持原順序。
+    X 為 DataFrame 時回傳 DataFrame（欄名不變），y 為 Series 時回傳 Series。
+    已有 sample_weight（例如負樣本降採樣的 importance weight）時，合併後權重為組內加總。
+    """
+    X_np = X.to_numpy(dtype=np.float32) if hasattr(X, "to_numpy") else np.asarray(X, dtype=np.float32)
+    y_np = y.to_numpy().reshape(-1) if hasattr(y, "to_numpy") else np.asarray(y).reshape(-1)
+    n = len(y_np)
+
+    # 標籤併入最後一欄 → 只合併「特徵與標籤都相同」的列；-0.0 與 0.0 統一
+    M = np.empty((n, X_np.shape[1] + 1), dtype=np.float32)
+    M[:, :-1] = X_np
+    M[:, -1] = y_np.astype(np.float32)
+    M += np.float32(0.0)
+    rows = np.ascontiguousarray(M).view(np.dtype((np.void, M.dtype.itemsize * M.shape[1]))).reshape(-1)
+    _, first, inverse, counts = np.unique(rows, return_index=True, return_inverse=True, return_counts=True)
+    del M, rows
+
+    order = np.argsort(first, kind="stable")
+    keep = first[order]
+    if sample_weight is None:
+        weight = counts[order].astype(np.float32)
+    else:
+        sums = np.bincount(inverse.reshape(-1), weights=np.asarray(sample_weight, dtype=np.float64).reshape(-1))
+        weight = sums[order].astype(np.float32)
+
+    if hasattr(X, "iloc"):
+        X_c = X.iloc[keep].reset_index(drop=True)
+    else:
+        X_c = np.asarray(X)[keep]
+    if hasattr(y, "iloc"):
+        y_c = y.iloc[keep].reset_index(drop=True)
+    else:
+        y_c = y_np[keep]
+
+    stats = {
+        "rows_before": int(n),
+        "rows_after": int(len(keep)),
+        "ratio": float(n / max(len(keep), 1)),
+        "max_weight": int(counts.max()) if len(counts) else 0,
+    }
+    return X_c, y_c, weight, stats
+
+
+__all__ = ["DEFAULT_DEDUP_SETTINGS", "compress_duplicates", "resolve_dedup_settings"]
@@ -0,0 +1,222 @@
+# training_pipeline/distillation.py
+"""
+集成蒸餾（ensemble → 單一 GBDT 學生模型）：
+- 老師：集成階段選出的最終模型（Voting / Stacking / OptunaEnsembler …）
+- 軟標籤：老師在訓練集上的 predict_proba；每列依類別展開成 K 列、sample_weight = 機率
+  （加權交叉熵 = 以軟標籤訓練；二元／多類別、LGB／XGB 皆適用）
+- 容量依延遲預算決定：每種深度只訓練一次最大樹數，再以前 n 棵樹量測推論延遲，
+  取「每千列延遲 ≤ MAX_LATENCY_MS_PER_1K」的最大樹數；各深度中以驗證集指標最佳者為學生
+- 報告老師／學生的驗證指標差異與推論吞吐量，學生另存為可部署的替代產出
+"""
+
+from __future__ import annotations
+
+import time
+import warnings
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.metrics import accuracy_score, f1_score, roc_auc_score
+
+DEFAULT_DISTILLATION_SETTINGS: Dict[str, Any] = {
+    "ENABLED": False,
+    "STUDENT": "LGB",                   # "LGB" 或 "XGB"
+    "MAX_LATENCY_MS_PER_1K": 5.0,       # 推論延遲預算（每千列毫秒，單批 predict_proba）
+    "DEPTHS": [4, 6, 8],
+    "MAX_TREES": 400,
+    "TREE_STEPS": [400, 300, 200, 150, 100, 50, 25],
+    "LEARNING_RATE": 0.1,
+    "MIN_PROBA": 1e-3,                  # 軟標籤展開時略過機率過小的 (列, 類別)
+    "PROBE_ROWS": 5000,                 # 量測吞吐量用的列數（取自驗證集）
+    "REPEATS": 3,
+}
+
+
+def resolve_distillation_settings(config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    user = (config or {}).get("DISTILLATION") or {}
+    out = dict(DEFAULT_DISTILLATION_SETTINGS)
+    if isinstance(user, dict):
+        out.update({k: v for k, v in user.items() if k in DEFAULT_DISTILLATION_SETTINGS})
+    return out
+
+
+class DistilledClassifier(ClassifierMixin, BaseEstimator):
+    """學生模型包裝：內部以類別索引 0..K-1 訓練，對外回傳老師的類別標籤；保留 feature_names_in_ 供欄位對齊。"""
+
+    def __init__(self, model=None, classes=None, n_trees: Optional[int] = None) -> None:
+        self.model = model
+        self.classes = classes
+        self.n_trees = n_trees
+
+    def _finish(self, feature_names: Optional[Sequence[str]]) -> "DistilledClassifier":
+        self.classes_ = np.asarray(self.classes)
+        if feature_names is not None:
+            self.feature_names_in_ = np.asarray(list(feature_names), dtype=object)
+            self.n_features_in_ = len(self.feature_names_in_)
+        return self
+
+    def predict_proba(self, X) -> np.ndarray:
+        X_np = X.to_numpy(dtype=np.float32) if hasattr(X, "to_numpy") else np.asarray(X, dtype=np.float32)
+        return _predict_proba(self.model, X_np, self.n_trees, len(self.classes_))
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def _predict_proba(model, X: np.ndarray, n_trees: Optional[int], n_classes: int) -> np.ndarray:
+    mod = type(model).__module__
+    if mod.startswith("lightgbm"):
+        p = model.predict_proba(X, num_iteration=n_trees)
+    else:
+        p = model.predict_proba(X, iteration_range=(0, int(n_trees)) if n_trees else None)
+    p = np.asarray(p, dtype=np.float64)
+    seen = np.asarray(getattr(model, "classes_", np.arange(p.shape[1]))).astype(np.int64)
+    if p.shape[1] == n_classes and np.array_equal(seen, np.arange(n_classes)):
+        return p
+    # 學生沒看過的類別（軟標籤全被略過）為 0：依學生的 classes_（類別索引）放回對應欄位，避免欄位錯位
+    out = np.zeros((p.shape[0], n_classes), dtype=np.float64)
+    out[:, seen] = p
+    return out
+
+
+def soft_label_expand(X: np.ndarray, proba: np.ndarray, sample_weight=None, min_proba: float = 1e-3):
+    """把 (n, K) 軟標籤展開成 (列索引, 類別, 權重)，加權多類別交叉熵即等於軟標籤交叉熵。"""
+    rows, cls = np.nonzero(proba >= float(min_proba))
+    w = proba[rows, cls].astype(np.float32)
+    if sample_weight is not None:
+        w *= np.asarray(sample_weight, dtype=np.float32)[rows]
+    return X[rows], cls.astype(np.int32), w
+
+
+def _make_student(kind: str, depth: int, n_trees: int, lr: float, n_classes: int, seed: int):
+    if kind == "XGB":
+        from xgboost import XGBClassifier
+        return XGBClassifier(n_estimators=n_trees, max_depth=depth, learning_rate=lr, tree_method="hist",
+                             random_state=seed, verbosity=0,
+                             objective="multi:softprob" if n_classes > 2 else "binary:logistic")
+    from lightgbm import LGBMClassifier
+    return LGBMClassifier(n_estimators=n_trees, max_depth=depth, num_leaves=min(2 ** depth, 255),
+                          learning_rate=lr, random_state=seed, verbose=-1,
+                          objective="multiclass" if n_classes > 2 else "binary")
+
+
+def measure_throughput(predict, X, repeats: int = 3) -> Dict[str, float]:
+    """單批 predict_proba 的最佳耗時；回傳每千列毫秒與每秒列數。"""
+    best = np.inf
+    for _ in range(max(1, int(repeats))):
+        t0 = time.perf_counter()
+        predict(X)
+        best = min(best, time.perf_counter() - t0)
+    n = max(len(X), 1)
+    return {"ms_per_1k": best * 1000.0 * 1000.0 / n, "rows_per_sec": n / max(best, 1e-12)}
+
+
+def _metrics(task: str, y, proba: np.ndarray, classes: np.ndarray) -> Dict[str, float]:
+    y = np.asarray(y).reshape(-1)
+    pred = classes[np.argmax(proba, axis=1)]
+    out = {"acc": float(accuracy_score(y, pred))}
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        if task == "binary":
+            out["f1"] = float(f1_score(y, pred, average="binary", zero_division=0))
+            try:
+                out["auc"] = float(roc_auc_score(y, proba[:, 1]))
+            except Exception:
+                out["auc"] = float("nan")
+        else:
+            out["f1"] = float(f1_score(y, pred, average="macro", zero_division=0))
+            try:
+                out["auc"] = float(roc_auc_score(y, proba, multi_class="ovr", labels=list(classes)))
+            except Exception:
+                out["auc"] = float("nan")
+    return out
+
+
+def distill(teacher, X_train, y_train, X_valid, y_valid, task_type: str, settings: Dict[str, Any],
+            sample_weight=None, teacher_valid_proba: Optional[np.ndarray] = None,
+            seed: int = 42) -> Dict[str, Any]:
+    """
+    回傳 {"student": DistilledClassifier, "report": {...}}。
+    teacher_valid_proba：老師在 X_valid 上的機率（由評估情境快取傳入則不重算）。
+    """
+    kind = str(settings["STUDENT"]).upper()
+    feature_names = list(X_train.columns) if hasattr(X_train, "columns") else None
+    X_tr = X_train.to_numpy(dtype=np.float32) if hasattr(X_train, "to_numpy") else np.asarray(X_train, dtype=np.float32)
+    X_va = X_valid.to_numpy(dtype=np.float32) if hasattr(X_valid, "to_numpy") else np.asarray(X_valid, dtype=np.float32)
+    classes = np.asarray(getattr(teacher, "classes_", np.unique(np.asarray(y_train))))
+    n_classes = len(classes)
+
+    # 1) 軟標籤
+    soft = np.asarray(teacher.predict_proba(X_train), dtype=np.float64)
+    X_soft, y_soft, w_soft = soft_label_expand(X_tr, soft, sample_weight, settings["MIN_PROBA"])
+    print(f"🎓 蒸餾：軟標籤 {len(X_tr)} 列 → 展開 {len(X_soft)} 列（{kind} 學生）")
+
+    # 2) 吞吐量量測資料與老師基準
+    probe = X_valid.iloc[: int(settings["PROBE_ROWS"])] if hasattr(X_valid, "iloc") else X_valid[: int(settings["PROBE_ROWS"])]
+    teacher_speed = measure_throughput(teacher.predict_proba, probe, settings["REPEATS"])
+    if teacher_valid_proba is None:
+        teacher_valid_proba = np.asarray(teacher.predict_proba(X_valid))
+    teacher_m = _metrics(task_type, y_valid, teacher_valid_proba, classes)
+    teacher_pred = classes[np.argmax(teacher_valid_proba, axis=1)]
+
+    # 3) 每種深度訓練一次最大樹數，再依延遲預算截斷樹數
+    budget = float(settings["MAX_LATENCY_MS_PER_1K"])
+    steps = sorted({int(s) for s in settings["TREE_STEPS"] if int(s) <= int(settings["MAX_TREES"])}, reverse=True)
+    probe_np = X_va[: int(settings["PROBE_ROWS"])]
+    candidates: List[Dict[str, Any]] = []
+    fitted: Dict[int, Any] = {}
+    for depth in settings["DEPTHS"]:
+        model = _make_student(kind, int(depth), int(settings["MAX_TREES"]), float(settings["LEARNING_RATE"]),
+                              n_classes, seed)
+        t0 = time.perf_counter()
+        model.fit(X_soft, y_soft, sample_weight=w_soft)
+        fit_seconds = time.perf_counter() - t0
+        fitted[int(depth)] = model
+        for n in steps:
+            speed = measure_throughput(lambda X, m=model, k=n: _predict_proba(m, X, k, n_classes),
+                                       probe_np, settings["REPEATS"])
+            if speed["ms_per_1k"] > budget:
+                continue
+            proba = _predict_proba(model, X_va, n, n_classes)
+            m = _metrics(task_type, y_valid, proba, classes)
+            m["agreement"] = float(np.mean(classes[np.argmax(proba, axis=1)] == teacher_pred))
+            candidates.append({"depth": int(depth), "n_trees": n, "fit_seconds": fit_seconds,
+                               "metrics": m, "throughput": speed})
+            break   # 此深度符合預算的最大樹數
+
+    if not candidates:
+        print(f"⚠️  蒸餾：沒有學生模型符合延遲預算（{budget} ms／千列），略過")
+        return {"student": None, "report": {"settings": settings, "teacher": {"metrics": teacher_m,
+                                                                              "throughput": teacher_speed},
+                                            "candidates": [], "selected": None}}
+
+    key = "auc" if task_type == "binary" else "f1"
+    best = max(candidates, key=lambda c: (np.nan_to_num(c["metrics"][key], nan=-1.0), c["metrics"]["agreement"]))
+    student = DistilledClassifier(model=fitted[best["depth"]], classes=classes, n_trees=best["n_trees"])
+    student._finish(feature_names)
+
+    delta = {k: best["metrics"][k] - teacher_m[k] for k in teacher_m}
+    speedup = best["throughput"]["rows_per_sec"] / max(teacher_speed["rows_per_sec"], 1e-12)
+    print(f"🎓 學生模型：{kind} depth={best['depth']} trees={best['n_trees']}｜"
+          f"{key.upper()} {teacher_m[key]:.4f} → {best['metrics'][key]:.4f}｜"
+          f"吞吐量 ×{speedup:.1f}（{best['throughput']['rows_per_sec']:.0f} 列/秒）")
+    report = {
+        "settings": settings,
+        "teacher": {"metrics": teacher_m, "throughput": teacher_speed},
+        "selected": best,
+        "delta": delta,
+        "speedup": speedup,
+        "candidates": candidates,
+    }
+    return {"student": student, "report": report}
+
+
+__all__ = [
+    "DEFAULT_DISTILLATION_SETTINGS",
+    "DistilledClassifier",
+    "distill",
+    "measure_throughput",
+    "resolve_distillation_settings",
+    "soft_label_expand",
+]
@@ -7,6 +7,8 @@ from sklearn.model_selection import StratifiedKFold
 from sklearn.metrics import roc_auc_score, recall_score, confusion_matrix
 from sklearn.base import clone
 
+from .parallel_folds import ProgressCallback, run_folds
+
 def _sigmoid(x: np.ndarray) -> np.ndarray:
     return 1.0 / (1.0 + np.exp(-x))
 
@@ -44,20 +46,22 @@ def _ensure_proba(est, X) -> np.ndarray:
     return proba
 
 
-def _per_class_auc(y_true: np.ndarray, proba: np.ndarray, labels: np.ndarray) -> np.ndarray:
+def _per_class_auc(y_true: np.ndarray, proba: np.ndarray, labels: np.ndarray,
+                   sample_weight: Optional[np.ndarray] = None) -> np.ndarray:
     K = len(labels)
     scores = np.zeros(K, dtype=float)
     for idx, c in enumerate(labels):
         y_bin = (y_true == c).astype(int)
         try:
-            scores[idx] = roc_auc_score(y_bin, proba[:, idx])
+            scores[idx] = roc_auc_score(y_bin, proba[:, idx], sample_weight=sample_weight)
         except Exception:
             scores[idx] = 0.5
     return scores
 
-def _per_class_recall(y_true: np.ndarray, y_pred: np.ndarray, labels: np.ndarray) -> np.ndarray:
+def _per_class_recall(y_true: np.ndarray, y_pred: np.ndarray, labels: np.ndarray,
+                      sample_weight: Optional[np.ndarray] = None) -> np.ndarray:
     try:
-        cm = confusion_matrix(y_true, y_pred, labels=labels)
+        cm = confusion_matrix(y_true, y_pred, labels=labels, sample_weight=sample_weight)
         denom = cm.sum(axis=1)
         with np.errstate(divide="ignore", invalid="ignore"):
             rec = np.where(denom > 0, np.diag(cm) / denom, 0.0)
@@ -135,6 +139,32 @@ def _finalize_single_estimator(est):
         est = _set_params_if_supported(est, n_jobs=1)
     return est
 
+def _align_proba(proba: np.ndarray, n_labels: int) -> np.ndarray:
+    # 對齊類別欄寬
+    if proba.shape[1] > n_labels:
+        return proba[:, :n_labels]
+    if proba.shape[1] < n_labels:
+        pad = np.zeros((proba.shape[0], n_labels - proba.shape[1]))
+        return np.hstack([proba, pad])
+    return proba
+
+
+def _oof_fold_scores(est_fold, X, y, tr, va, sample_weight, extra) -> np.ndarray:
+    """單一 (模型, 折) 的 per-class 分數；於 worker 行程內執行。"""
+    labels, init_metric = extra
+    w_tr = None if sample_weight is None else sample_weight[tr]
+    w_va = None if sample_weight is None else sample_weight[va]
+    if w_tr is None:
+        est_fold.fit(X[tr], y[tr])
+    else:
+        est_fold.fit(X[tr], y[tr], sample_weight=w_tr)
+    proba = _align_proba(_ensure_proba(est_fold, X[va]), len(labels))
+    if init_metric == "auc":
+        return _per_class_auc(y[va], proba, labels, w_va)
+    y_pred = labels[np.argmax(proba, axis=1)]
+    return _per_class_recall(y[va], y_pred, labels, w_va)
+
+
 class DynamicSoftVoter(VotingClassifier):
     """
     - voting='soft'
@@ -142,6 +172,8 @@ class DynamicSoftVoter(VotingClassifier):
     - 最終 fit 前遞迴「硬化」：處理巢狀結構並統一併行設定
     - 可在視窗資料上用指數權重更新 (Hedge) 做線上微調
     - 自動處理 DataFrame 欄位名：訓練若用 DataFrame，之後收到 ndarray 會自動補回欄位名
+    - OOF 的「模型 × 折」以 fold_n_jobs 個行程平行訓練；fit(progress_callback=...) 以 (done, total, label) 回報進度
+      （callback 只在 fit 期間使用、不存成屬性，模型仍可序列化）
     """
     def __init__(
         self,
@@ -151,7 +183,8 @@ class DynamicSoftVoter(VotingClassifier):
         init_cv: int = 5,
         eta: float = 0.2,
         verbose: bool = False,
-        n_jobs: Optional[int] = None
+        n_jobs: Optional[int] = None,
+        fold_n_jobs: Optional[int] = 1,
     ):
         super().__init__(estimators=estimators, voting="soft", weights=None, n_jobs=n_jobs, flatten_transform=False)
         self.class_importance = class_importance
@@ -159,6 +192,7 @@ class DynamicSoftVoter(VotingClassifier):
         self.init_cv = init_cv
         self.eta = eta
         self.verbose = verbose
+        self.fold_n_jobs = fold_n_jobs
         self.model_names_: List[str] = [n for n, _ in estimators]
         self.weights_: Optional[np.ndarray] = None
         self.labels_: Optional[np.ndarray] = None
@@ -172,32 +206,24 @@ class DynamicSoftVoter(VotingClassifier):
         return X
 
     # --- OOF 初始化（僅用 numpy，避免小切片不穩） ---
-    def _init_weights_via_oof(self, X: np.ndarray, y: np.ndarray) -> np.ndarray:
+    def _init_weights_via_oof(self, X: np.ndarray, y: np.ndarray,
+                              sample_weight: Optional[np.ndarray] = None,
+                              progress_callback: Optional[ProgressCallback] = None) -> np.ndarray:
         skf = StratifiedKFold(n_splits=self.init_cv, shuffle=True, random_state=42)
         labels = np.unique(y)
         self.labels_ = labels
-        per_model_scores: Dict[str, np.ndarray] = {}
-
+        folds = list(skf.split(X, y))
+        tasks, task_labels = [], []
         for n, est in self.estimators:
-            fold_scores = []
-            for tr, va in skf.split(X, y):
-                est_fold = _clone_for_oof(est)
-                est_fold.fit(X[tr], y[tr])
-                proba = _ensure_proba(est_fold, X[va])
-                # 對齊類別欄寬
-                if proba.shape[1] != len(labels):
-                    if proba.shape[1] > len(labels):
-                        proba = proba[:, :len(labels)]
-                    else:
-                        pad = np.zeros((proba.shape[0], len(labels) - proba.shape[1]))
-                        proba = np.hstack([proba, pad])
-                if self.init_metric == "auc":
-                    s = _per_class_auc(y[va], proba, labels)
-                else:
-                    y_pred = labels[np.argmax(proba, axis=1)]
-                    s = _per_class_recall(y[va], y_pred, labels)
-                fold_scores.append(s)
-            per_model_scores[n] = np.array(fold_scores).mean(axis=0)
+            for k, (tr, va) in enumerate(folds, start=1):
+                tasks.append((_clone_for_oof(est), tr, va, (labels, self.init_metric)))
+                task_labels.append(f"OOF {n} fold {k}/{len(folds)}")
+        scores = run_folds(_oof_fold_scores, tasks, X, y, sample_weight,
+                           n_jobs=self.fold_n_jobs, progress=progress_callback, labels=task_labels)
+
+        per_model_scores: Dict[str, np.ndarray] = {}
+        for i, (n, _) in enumerate(self.estimators):
+            per_model_scores[n] = np.array(scores[i * len(folds):(i + 1) * len(folds)]).mean(axis=0)
 
         names, w = init_soft_weights(per_class_scores=per_model_scores, class_importance=self.class_importance)
         if self.verbose:
@@ -208,11 +234,14 @@ class DynamicSoftVoter(VotingClassifier):
         return w
 
     # --- sklearn 介面 ---
-    def fit(self, X, y, sample_weight=None):
+    def fit(self, X, y, sample_weight=None, progress_callback: Optional[ProgressCallback] = None):
         # 1) 記錄訓練欄位名（若是 DataFrame）
         self.feature_columns_ = list(X.columns) if hasattr(X, "columns") else None
         # 2) OOF 初始化權重（使用 numpy）
-        w0 = self._init_weights_via_oof(np.asarray(X), np.asarray(y))
+        w0 = self._init_weights_via_oof(
+            np.asarray(X), np.asarray(y), None if sample_weight is None else np.asarray(sample_weight),
+            progress_callback=progress_callback,
+        )
         self.weights_ = w0
         self.weights = w0.tolist()
         # 3) 最終 fit 前，遞迴硬化所有 estimator（統一處理堆疊結構）
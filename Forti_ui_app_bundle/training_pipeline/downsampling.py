@@ -0,0 +1,154 @@
+# training_pipeline/downsampling.py
+"""
+二元分類多數類（is_attack=0）負樣本降採樣：
+- 只作用在訓練資料；驗證集保持原分布
+- 負樣本以 RATE 機率保留（正樣本全留）
+- MODE="prior"：不加權訓練，輸出機率以解析式修正回原始先驗
+      p = q / (q + (1 - q) / RATE)
+  （q 為降採樣資料上的機率）；模型包成 PriorCorrectedClassifier，THRESHOLD 維持原意
+- MODE="weight"：保留的負樣本 sample_weight = 1 / RATE（importance weight），
+  加權 loss 的期望值等於全量資料，機率本身即在原始尺度，不需修正
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin, clone
+from sklearn.metrics import f1_score, log_loss, precision_score, recall_score, roc_auc_score
+
+DEFAULT_DOWNSAMPLING_SETTINGS: Dict[str, Any] = {
+    "ENABLED": False,
+    "RATE": 0.1,                 # 負樣本保留比例
+    "MODE": "prior",             # "prior"（機率修正）或 "weight"（importance weight）
+    "NEGATIVE_LABEL": 0,
+    "COMPARE_FULL": False,       # 另以全量訓練資料訓練一次，記錄加速倍率與指標差異（耗時）
+}
+
+
+def resolve_downsampling_settings(config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    user = (config or {}).get("NEG_DOWNSAMPLING") or {}
+    out = dict(DEFAULT_DOWNSAMPLING_SETTINGS)
+    if isinstance(user, dict):
+        out.update({k: v for k, v in user.items() if k in DEFAULT_DOWNSAMPLING_SETTINGS})
+    return out
+
+
+def downsample_negatives(X, y, rate: float, seed: int = 42, mode: str = "prior",
+                         negative_label: int = 0) -> Tuple[Any, Any, Optional[np.ndarray], Dict[str, Any]]:
+    """回傳 (X_ds, y_ds, sample_weight, stats)；mode="prior" 時 sample_weight 為 None。"""
+    rate = float(rate)
+    if not 0.0 < rate <= 1.0:
+        raise ValueError(f"NEG_DOWNSAMPLING.RATE 必須介於 (0, 1]：{rate}")
+    y_np = y.to_numpy().reshape(-1) if hasattr(y, "to_numpy") else np.asarray(y).reshape(-1)
+    neg = y_np == negative_label
+    rng = np.random.default_rng(seed)
+    keep = ~neg | (rng.random(len(y_np)) < rate)
+    idx = np.flatnonzero(keep)
+
+    X_ds = X.iloc[idx].reset_index(drop=True) if hasattr(X, "iloc") else np.asarray(X)[idx]
+    y_ds = y.iloc[idx].reset_index(drop=True) if hasattr(y, "iloc") else y_np[idx]
+    weight = None
+    if mode == "weight":
+        weight = np.where(neg[idx], 1.0 / rate, 1.0).astype(np.float32)
+
+    stats = {
+        "mode": mode,
+        "rate": rate,
+        "rows_before": int(len(y_np)),
+        "rows_after": int(len(idx)),
+        "negatives_before": int(neg.sum()),
+        "negatives_after": int(neg[idx].sum()),
+        "positives": int((~neg).sum()),
+    }
+    return X_ds, y_ds, weight, stats
+
+
+def correct_proba(proba: np.ndarray, rate: float, negative_index: int = 0) -> np.ndarray:
+    """把降採樣資料上的二元機率修正回原始先驗（兩欄 predict_proba 格式）。"""
+    proba = np.asarray(proba, dtype=np.float64)
+    pos_index = 1 - negative_index
+    q = proba[:, pos_index]
+    p = q / (q + (1.0 - q) / float(rate))
+    out = np.empty_like(proba)
+    out[:, pos_index] = p
+    out[:, negative_index] = 1.0 - p
+    return out
+
+
+def binary_metrics(model, X, y, threshold: float = 0.5) -> Dict[str, float]:
+    """以 THRESHOLD 切點計算的指標＋校準檢查（平均預測機率 vs 實際正例率）。"""
+    y_np = np.asarray(y).reshape(-1)
+    X_eval = X.to_numpy() if hasattr(X, "to_numpy") else np.asarray(X)
+    proba = np.asarray(model.predict_proba(X_eval))
+    cls = list(getattr(model, "classes_", [0, 1]))
+    p = proba[:, cls.index(1) if 1 in cls else -1]
+    pred = (p >= float(threshold)).astype(int)
+    return {
+        "auc": float(roc_auc_score(y_np, p)) if len(np.unique(y_np)) > 1 else float("nan"),
+        "f1": float(f1_score(y_np, pred, zero_division=0)),
+        "precision": float(precision_score(y_np, pred, zero_division=0)),
+        "recall": float(recall_score(y_np, pred, zero_division=0)),
+        "logloss": float(log_loss(y_np, np.clip(p, 1e-7, 1 - 1e-7), labels=[0, 1])),
+        "mean_proba": float(p.mean()),
+        "positive_rate": float(y_np.mean()),
+    }
+
+
+class PriorCorrectedClassifier(ClassifierMixin, BaseEstimator):
+    """
+    包裝在「負樣本降採樣資料」上訓練的二元分類器，predict_proba 輸出原始先驗下的機率；
+    predict 以修正後機率 0.5 為界。可被 clone／重新 fit（集成階段會以同樣的降採樣資料重訓）。
+    """
+
+    def __init__(self, estimator=None, rate: float = 1.0, negative_label: int = 0) -> None:
+        self.estimator = estimator
+        self.rate = rate
+        self.negative_label = negative_label
+
+    @classmethod
+    def from_fitted(cls, estimator, rate: float, negative_label: int = 0) -> "PriorCorrectedClassifier":
+        wrapper = cls(estimator=estimator, rate=rate, negative_label=negative_label)
+        wrapper.estimator_ = estimator
+        wrapper.classes_ = np.asarray(estimator.classes_)
+        return wrapper
+
+    def fit(self, X, y, sample_weight=None):
+        est = clone(self.estimator)
+        if sample_weight is None:
+            est.fit(X, y)
+        else:
+            est.fit(X, y, sample_weight=sample_weight)
+        self.estimator_ = est
+        self.classes_ = np.asarray(est.classes_)
+        return self
+
+    def _negative_index(self) -> int:
+        cls = list(self.classes_)
+        return cls.index(self.negative_label) if self.negative_label in cls else 0
+
+    def predict_proba(self, X) -> np.ndarray:
+        return correct_proba(self.estimator_.predict_proba(X), self.rate, self._negative_index())
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def __getattr__(self, name: str):
+        # 讓 feature_importances_ 等屬性透傳到內部模型（報告與組成解讀用）
+        if name.startswith("_") or name in ("estimator_", "estimator"):
+            raise AttributeError(name)
+        inner = self.__dict__.get("estimator_")
+        if inner is None:
+            raise AttributeError(name)
+        return getattr(inner, name)
+
+
+__all__ = [
+    "DEFAULT_DOWNSAMPLING_SETTINGS",
+    "PriorCorrectedClassifier",
+    "binary_metrics",
+    "correct_proba",
+    "downsample_negatives",
+    "resolve_downsampling_settings",
+]
@@ -3,6 +3,8 @@ import numpy as np
 from sklearn.base import BaseEstimator, ClassifierMixin, clone
 from sklearn.model_selection import StratifiedKFold
 
+from .parallel_folds import run_folds
+
 def class_weights(y, beta=0.5, eps=1e-6):
     y = np.asarray(y)
     classes, counts = np.unique(y, return_counts=True)
@@ -36,27 +38,40 @@ def build_weights(y, pt, cw, rarity=None, cost=None, disagree=None,
         w = w / (w.mean() if w.mean() > 0 else 1.0)
     return np.clip(w, wmin, wmax)
 
+def _oof_fold_proba(est, X, y, tr, va, sample_weight, extra):
+    # 單一折：類別權重訓練後回傳驗證折機率（於 worker 行程內執行）
+    cw, n_classes = extra
+    sw = np.array([cw[int(c)] for c in y[tr]], float)
+    est.fit(X[tr], y[tr], sample_weight=sw)
+    p = est.predict_proba(X[va]) if hasattr(est, "predict_proba") else np.full((len(va), n_classes), 1/n_classes)
+    return p[:, :n_classes] if p.shape[1]>=n_classes else np.pad(p, ((0,0),(0,n_classes-p.shape[1])))
+
 class DWBWrapper(BaseEstimator, ClassifierMixin):
-    """通用包裝器：先用類別權重做 OOF 得到 pt，再以 DWB 權重全量重訓"""
+    """
+    通用包裝器：先用類別權重做 OOF 得到 pt，再以 DWB 權重全量重訓（k 折以 n_jobs 個行程平行）。
+    fit(progress_callback=...) 以 (done, total, label) 回報折進度；callback 不存成屬性，模型仍可序列化。
+    """
     def __init__(self, base_estimator, k=5, beta=0.5, gamma=1.5, delta=0.5, alpha=0.5,
-                 wmin=0.2, wmax=5.0, random_state=42):
+                 wmin=0.2, wmax=5.0, random_state=42, n_jobs=1):
         self.base_estimator = base_estimator
         self.k = k; self.beta=beta; self.gamma=gamma
         self.delta=delta; self.alpha=alpha; self.wmin=wmin; self.wmax=wmax
         self.random_state=random_state
+        self.n_jobs=n_jobs
 
-    def fit(self, X, y, rarity=None, cost=None, disagree=None):
+    def fit(self, X, y, rarity=None, cost=None, disagree=None, progress_callback=None):
         X = np.asarray(X); y = np.asarray(y)
         cw = class_weights(y, beta=self.beta)
         # 1) OOF 取得 pt
         skf = StratifiedKFold(n_splits=self.k, shuffle=True, random_state=self.random_state)
-        proba_oof = np.zeros((len(y), len(np.unique(y))))
-        for tr, va in skf.split(X, y):
-            est = clone(self.base_estimator)
-            sw = np.array([cw[int(c)] for c in y[tr]], float)
-            est.fit(X[tr], y[tr], sample_weight=sw)
-            p = est.predict_proba(X[va]) if hasattr(est, "predict_proba") else np.full((len(va), len(np.unique(y))), 1/len(np.unique(y)))
-            proba_oof[va] = p[:, :proba_oof.shape[1]] if p.shape[1]>=proba_oof.shape[1] else np.pad(p, ((0,0),(0,proba_oof.shape[1]-p.shape[1])))
+        n_classes = len(np.unique(y))
+        proba_oof = np.zeros((len(y), n_classes))
+        folds = list(skf.split(X, y))
+        tasks = [(self.base_estimator, tr, va, (cw, n_classes)) for tr, va in folds]
+        probas = run_folds(_oof_fold_proba, tasks, X, y, n_jobs=self.n_jobs, progress=progress_callback,
+                           labels=[f"DWB fold {i}/{len(folds)}" for i in range(1, len(folds) + 1)])
+        for (_, va), p in zip(folds, probas):
+            proba_oof[va] = p
 
         pt = true_class_proba(y, proba_oof)
         # 2) 建 w 後全量重訓
@@ -6,7 +6,7 @@ from dataclasses import dataclass
 import json
 import os
 import itertools
-from typing import Dict, List, Optional, Sequence
+from typing import Dict, List, Optional, Sequence, Tuple
 
 import numpy as np
 import pandas as pd
@@ -21,14 +21,28 @@ import optuna
 # Utility functions
 # ---------------------------------------------------------------------------
 
-def auc(task: str, y_true, proba: np.ndarray) -> float:
+def auc(task: str, y_true, proba: np.ndarray, sample_weight=None) -> float:
     """Compute AUC for binary or multiclass tasks."""
     if proba.ndim == 1:
         proba = proba.reshape(-1, 1)
     if task == "binary":
         pos_idx = 1 if proba.shape[1] > 1 else 0
-        return float(roc_auc_score(y_true, proba[:, pos_idx]))
-    return float(roc_auc_score(y_true, proba, multi_class="ovr"))
+        return float(roc_auc_score(y_true, proba[:, pos_idx], sample_weight=sample_weight))
+    return float(roc_auc_score(y_true, proba, multi_class="ovr", sample_weight=sample_weight))
+
+
+def _fit(est: BaseEstimator, X, y, sample_weight=None) -> BaseEstimator:
+    if sample_weight is None:
+        return est.fit(X, y)
+    return est.fit(X, y, sample_weight=sample_weight)
+
+
+def _fit_full(est: BaseEstimator, X, y, sample_weight, seed: int) -> BaseEstimator:
+    """Clone and fit on all training rows with the study seed."""
+    est = clone(est)
+    if hasattr(est, "get_params") and "random_state" in est.get_params():
+        est.set_params(random_state=seed)
+    return _fit(est, X, y, sample_weight)
 
 
 def _normalize(weights: Sequence[float]) -> np.ndarray:
@@ -61,9 +75,21 @@ def score_combo(
     trial: Optional[optuna.trial.Trial] = None,
     X_valid=None,
     y_valid=None,
+    sample_weight=None,
+    oof_cache=None,
+    full_fit_cache: Optional[Dict[str, Tuple[BaseEstimator, np.ndarray]]] = None,
 ) -> float:
-    """Evaluate a weighted combination using CV and optional hold-out validation."""
+    """Evaluate a weighted combination using CV and optional hold-out validation.
+
+    ``sample_weight`` weights the training rows (fits and CV fold AUC); the
+    hold-out set is scored unweighted. ``oof_cache`` (an ``OOFCache`` built
+    with the same ``n_splits``/``seed``) supplies per-fold probabilities so
+    base models are fitted once per fold instead of once per trial.
+    ``full_fit_cache`` keeps each model's full-data fit and its hold-out
+    probabilities, so the hold-out branch fits every model once per study.
+    """
     X_np, y_np = _ensure_numpy_xy(X, y)
+    w_np = None if sample_weight is None else np.asarray(sample_weight).reshape(-1)
     Xv_np = yv_np = None
     if X_valid is not None and y_valid is not None:
         Xv_np, yv_np = _ensure_numpy_xy(X_valid, y_valid)
@@ -72,13 +98,16 @@ def score_combo(
     for fold, (tr_idx, va_idx) in enumerate(cv.split(X_np, y_np)):
         preds = []
         for name in names:
+            if oof_cache is not None:
+                preds.append(oof_cache.fold_proba(name, fold, estimators[name]))
+                continue
             est = clone(estimators[name])
             if hasattr(est, "get_params") and "random_state" in est.get_params():
                 est.set_params(random_state=seed + fold)
-            est.fit(X_np[tr_idx], y_np[tr_idx])
+            _fit(est, X_np[tr_idx], y_np[tr_idx], None if w_np is None else w_np[tr_idx])
             preds.append(est.predict_proba(X_np[va_idx]))
         proba = np.average(preds, axis=0, weights=weights)
-        fold_score = auc(task, y_np[va_idx], proba)
+        fold_score = auc(task, y_np[va_idx], proba, None if w_np is None else w_np[va_idx])
         fold_scores.append(fold_score)
         if trial is not None:
             trial.report(fold_score, fold)
@@ -89,11 +118,14 @@ def score_combo(
     if Xv_np is not None and yv_np is not None:
         preds_v = []
         for name in names:
-            est = clone(estimators[name])
-            if hasattr(est, "get_params") and "random_state" in est.get_params():
-                est.set_params(random_state=seed)
-            est.fit(X_np, y_np)
-            preds_v.append(est.predict_proba(Xv_np))
+            cached = full_fit_cache.get(name) if full_fit_cache is not None else None
+            if cached is None:
+                # 以原始 X（保留欄位名）訓練，與最終模型相同，快取後可直接沿用
+                est = _fit_full(estimators[name], X, y, w_np, seed)
+                cached = (est, np.asarray(est.predict_proba(X_valid)))
+                if full_fit_cache is not None:
+                    full_fit_cache[name] = cached
+            preds_v.append(cached[1])
         proba_v = np.average(preds_v, axis=0, weights=weights)
         valid_score = auc(task, yv_np, proba_v)
         return 0.3 * cv_score + 0.7 * valid_score
@@ -120,6 +152,7 @@ class OptunaEnsembler:
     direction: str = "maximize"
     seed: int = 42
     report_dir: Optional[str] = None
+    oof_cache: Optional[object] = None   # OOFCache：各折機率只算一次，trial 之間共用
 
     def fit(
         self,
@@ -128,19 +161,21 @@ class OptunaEnsembler:
         y,
         X_valid=None,
         y_valid=None,
+        sample_weight=None,
     ) -> Dict[str, object]:
         self.estimators = estimators
         names = list(estimators.keys())
 
         # Validate predict_proba and class counts
+        # 全量 fit 與其 hold-out 機率只算一次：檢查、各 trial 與最終模型共用
+        full_fits: Dict[str, Tuple[BaseEstimator, Optional[np.ndarray]]] = {}
         n_classes = None
         for name, est in estimators.items():
             if not hasattr(est, "predict_proba"):
                 raise ValueError(f"Estimator '{name}' lacks predict_proba")
-            tmp = clone(est)
-            if hasattr(tmp, "get_params") and "random_state" in tmp.get_params():
-                tmp.set_params(random_state=self.seed)
-            tmp.fit(X, y)
+            tmp = _fit_full(est, X, y, sample_weight, self.seed)
+            has_valid = X_valid is not None and y_valid is not None
+            full_fits[name] = (tmp, np.asarray(tmp.predict_proba(X_valid)) if has_valid else None)
             proba = tmp.predict_proba(X[:2])
             if n_classes is None:
                 n_classes = proba.shape[1]
@@ -148,6 +183,12 @@ class OptunaEnsembler:
                 raise ValueError("Inconsistent number of classes among estimators")
         self.n_classes_ = n_classes
 
+        cache = self.oof_cache
+        if cache is not None and not cache.matches(self.n_splits, self.seed, len(y)):
+            cache = None
+        if cache is not None:
+            cache.compute(estimators)
+
         sampler = optuna.samplers.TPESampler(seed=self.seed)
         pruner = optuna.pruners.MedianPruner() if self.pruning else optuna.pruners.NopPruner()
         study = optuna.create_study(direction=self.direction, sampler=sampler, pruner=pruner)
@@ -178,6 +219,9 @@ class OptunaEnsembler:
                     trial if self.pruning else None,
                     X_valid,
                     y_valid,
+                    sample_weight,
+                    cache,
+                    full_fits,
                 )
 
         else:  # fixed
@@ -208,6 +252,9 @@ class OptunaEnsembler:
                     trial if self.pruning else None,
                     X_valid,
                     y_valid,
+                    sample_weight,
+                    cache,
+                    full_fits,
                 )
 
         study.optimize(objective, n_trials=self.n_trials, show_progress_bar=False)
@@ -232,12 +279,11 @@ class OptunaEnsembler:
         self.best_score_ = float(best.value)
         self.strategy_ = f"optuna-{self.mode}"
         self.fitted_: List[BaseEstimator] = []
-        for i, name in enumerate(best_names):
-            est = clone(estimators[name])
-            if hasattr(est, "get_params") and "random_state" in est.get_params():
-                est.set_params(random_state=self.seed)
-            est.fit(X, y)
-            self.fitted_.append(est)
+        for name in best_names:
+            if name in full_fits:
+                self.fitted_.append(full_fits[name][0])
+            else:
+                self.fitted_.append(_fit_full(estimators[name], X, y, sample_weight, self.seed))
 
         if self.report_dir:
             os.makedirs(self.report_dir, exist_ok=True)
@@ -269,6 +315,12 @@ class OptunaEnsembler:
             "strategy": self.strategy_,
         }
 
+    def __getstate__(self):
+        # OOFCache 只在 fit 期間使用（含訓練資料與 UI 的進度 callback）；保存集成模型時不帶出
+        state = dict(self.__dict__)
+        state["oof_cache"] = None
+        return state
+
     # ------------------------------------------------------------------
     def predict_proba(self, X) -> np.ndarray:
         """Aggregate各子模型的機率預測並依權重加總。"""
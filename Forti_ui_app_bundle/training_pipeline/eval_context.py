@@ -0,0 +1,112 @@
+# training_pipeline/eval_context.py
+"""
+驗證集評估情境（每個 X_valid 一個）：
+- 每個已訓練模型對 X_valid 的機率矩陣只計算一次（以模型 id 為鍵、弱參照確認身分；模型釋放後自動移除）
+- 預測標籤由機率 argmax（或二元 threshold）推得，不再另外呼叫 predict
+- 集成模型（Voting / CachedStacking / OptunaEnsembler / PriorCorrected）由子模型的快取機率組合，
+  子模型不會因為「集成評估 + 子模型評估 + 報告」被重複推論
+- Evaluator、ComboOptimizer 與報告輸出共用同一個情境
+"""
+
+from __future__ import annotations
+
+import weakref
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+from sklearn.ensemble import VotingClassifier
+
+from .downsampling import PriorCorrectedClassifier, correct_proba
+from .oof_cache import CachedStackingClassifier
+
+
+class EvalContext:
+    def __init__(self, X, y=None) -> None:
+        self.X = X
+        self.X_np = X.to_numpy() if hasattr(X, "to_numpy") else np.asarray(X)
+        self.y = None if y is None else (y.to_numpy().reshape(-1) if hasattr(y, "to_numpy") else np.asarray(y).reshape(-1))
+        self._proba: Dict[int, Tuple[weakref.ref, Optional[np.ndarray]]] = {}
+        self._pred: Dict[int, Tuple[weakref.ref, np.ndarray]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def matches(self, X) -> bool:
+        return X is self.X or X is self.X_np
+
+    def _X_for(self, model):
+        # 以 DataFrame 訓練的模型收 DataFrame（避免欄名警告），其餘收 ndarray
+        if hasattr(model, "feature_names_in_") and hasattr(self.X, "columns"):
+            return self.X
+        return self.X_np
+
+    def _memo(self, store: Dict[int, Tuple[weakref.ref, Any]], model, compute: Callable[[Any], Any]):
+        key = id(model)
+        entry = store.get(key)
+        if entry is not None and entry[0]() is model:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        value = compute(model)
+        try:
+            ref = weakref.ref(model, lambda _r, k=key, s=store: s.pop(k, None))
+        except TypeError:   # 不可弱參照的物件：不快取
+            return value
+        store[key] = (ref, value)
+        return value
+
+    # ---------------- 機率 ----------------
+    def proba(self, model) -> Optional[np.ndarray]:
+        """模型在 X 上的機率矩陣；模型不支援機率輸出時回傳 None。"""
+        return self._memo(self._proba, model, self._compute_proba)
+
+    def _compute_proba(self, model) -> Optional[np.ndarray]:
+        try:
+            if isinstance(model, VotingClassifier) and hasattr(model, "estimators_"):
+                if model.voting != "soft":
+                    return None
+                subs = [self.proba(e) for e in model.estimators_]
+                return np.average(subs, axis=0, weights=getattr(model, "_weights_not_none", None))
+            if isinstance(model, CachedStackingClassifier):
+                return model.predict_proba_from([self.proba(e) for e in model.estimators_])
+            if isinstance(model, PriorCorrectedClassifier):
+                return correct_proba(self.proba(model.estimator_), model.rate, model._negative_index())
+            if hasattr(model, "fitted_") and hasattr(model, "weights_"):   # OptunaEnsembler
+                return np.average([self.proba(e) for e in model.fitted_], axis=0, weights=model.weights_)
+            if not hasattr(model, "predict_proba"):
+                return None
+            p = np.asarray(model.predict_proba(self._X_for(model)))
+            if p.ndim == 1:
+                p = np.vstack([1.0 - p, p]).T
+            return p
+        except Exception:
+            return None
+
+    # ---------------- 標籤 ----------------
+    def labels(self, model, threshold: Optional[float] = None) -> np.ndarray:
+        """由快取機率推得預測標籤；threshold 僅用於二元（None 表示 argmax，與 predict 一致）。"""
+        if isinstance(model, VotingClassifier) and hasattr(model, "estimators_") and model.voting == "hard":
+            return self._hard_vote(model)
+        p = self.proba(model)
+        if p is None:
+            return self._predict(model)
+        classes = getattr(model, "classes_", None)
+        classes = np.arange(p.shape[1]) if classes is None else np.asarray(classes)
+        if threshold is not None and p.shape[1] == 2:
+            return np.where(p[:, 1] >= float(threshold), classes[1], classes[0])
+        return classes[np.argmax(p, axis=1)]
+
+    def _predict(self, model) -> np.ndarray:
+        return self._memo(self._pred, model, lambda m: np.asarray(m.predict(self._X_for(m))).reshape(-1))
+
+    def _hard_vote(self, model: VotingClassifier) -> np.ndarray:
+        # 與 VotingClassifier(voting="hard") 相同：子模型輸出的是編碼後標籤，多數決後再反編碼
+        votes = np.asarray([self.labels(e) for e in model.estimators_]).T.astype(int)
+        weights = getattr(model, "_weights_not_none", None)
+        maj = np.apply_along_axis(lambda x: np.argmax(np.bincount(x, weights=weights)), axis=1, arr=votes)
+        return model.le_.inverse_transform(maj)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+__all__ = ["EvalContext"]
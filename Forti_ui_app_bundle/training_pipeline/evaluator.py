@@ -19,6 +19,8 @@ try:
 except Exception:
     UndefinedMetricWarning = Warning  # 兼容舊版
 
+from .eval_context import EvalContext
+
 class Evaluator:
     """
     保留原輸出風格：
@@ -27,20 +29,24 @@ class Evaluator:
     📋 分類報告：
     📝 混淆矩陣：
     新增：統一 zero_division=0 並靜音 UndefinedMetricWarning（例如少數類別完全無預測時）
+    新增：context（EvalContext）共用同一驗證集的機率快取；每個模型只做一次 predict_proba
     """
 
     def __init__(self, task: str = "binary") -> None:
         self.task = task
 
-    def evaluate(self, model: Any, X, y_true, name: Optional[str] = None) -> Dict[str, Any]:
+    def evaluate(self, model: Any, X, y_true, name: Optional[str] = None,
+                 context: Optional[EvalContext] = None) -> Dict[str, Any]:
         if name:
             print(f"\n==================== [ {name} 評估結果 ] ====================")
 
-        X_eval = X.to_numpy() if hasattr(X, "to_numpy") else np.asarray(X)
+        if context is None or not context.matches(X):
+            context = EvalContext(X)
         y_true_np = y_true.to_numpy().reshape(-1) if hasattr(y_true, "to_numpy") else np.asarray(y_true).reshape(-1)
 
-        # 預測
-        y_pred = model.predict(X_eval)
+        # 預測：一次 predict_proba，標籤由 argmax 推得
+        proba = context.proba(model)
+        y_pred = context.labels(model)
 
         # ====== 分類報告與基本指標（靜音 UndefinedMetricWarning） ======
         with warnings.catch_warnings():
@@ -60,8 +66,7 @@ class Evaluator:
         # ====== AUC（binary / multiclass OVR） ======
         auc = np.nan
         try:
-            if hasattr(model, "predict_proba"):
-                proba = model.predict_proba(X_eval)
+            if proba is not None:
                 if self.task == "binary":
                     # 取正類索引為 1；若 classes_ 不含 1，用最後一類
                     pos_idx = 1
@@ -0,0 +1,222 @@
+# training_pipeline/incremental.py
+"""
+增量續訓（continue-training）：
+- 每次訓練把基模型存成 models/base_<NAME>.joblib
+- 下一次訓練自 OUTPUT_DIR 找出「最近一次、同任務、同特徵集、且有基模型」的產出
+- XGB / LGB / CAT 在上次的 booster 上再加 EXTRA_TREES 棵樹（xgb_model= / init_model=）
+- 以滾動 hold-out（資料最後 VALID_SIZE 比例，即最新的記錄）比較續訓前後；
+  指標退步超過 TOLERANCE 即回滾為上次的模型
+- 其餘模型（RF / ET）沿用上次產出，不重訓
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import warnings
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from joblib import dump, load
+from sklearn.base import clone
+from sklearn.metrics import f1_score, recall_score, roc_auc_score
+
+from .downsampling import PriorCorrectedClassifier
+from .warm_start import RUN_META_FILE
+
+BASE_MODEL_PREFIX = "base_"
+_MODEL_ORDER = ("XGB", "LGB", "CAT", "RF", "ET")
+
+DEFAULT_CONTINUE_TRAINING_SETTINGS: Dict[str, Any] = {
+    "ENABLED": False,
+    "SOURCE_DIR": None,             # 指定上次產出目錄；None 則自 OUTPUT_DIR 自動尋找
+    "MODELS": ["XGB", "LGB", "CAT"],
+    "EXTRA_TREES": 50,              # 每個模型新增的樹數（CatBoost 為 iterations）
+    "METRIC": None,                 # None → binary 用 auc、multiclass 用 macro f1；亦可設 "recall"
+    "TOLERANCE": 0.002,             # 容許的指標退步量，超過即回滾
+}
+
+
+def resolve_continue_training_settings(config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    user = (config or {}).get("CONTINUE_TRAINING") or {}
+    out = dict(DEFAULT_CONTINUE_TRAINING_SETTINGS)
+    if isinstance(user, dict):
+        out.update({k: v for k, v in user.items() if k in DEFAULT_CONTINUE_TRAINING_SETTINGS})
+    return out
+
+
+# ---------------- 產出存取 ----------------
+def save_base_models(out_dir: str, trained: Dict[str, Any]) -> Dict[str, str]:
+    paths = {}
+    models_dir = os.path.join(out_dir, "models")
+    os.makedirs(models_dir, exist_ok=True)
+    for name, model in trained.items():
+        path = os.path.join(models_dir, f"{BASE_MODEL_PREFIX}{name}.joblib")
+        dump(model, path)
+        paths[name] = path
+    return paths
+
+
+def load_base_models(run_dir: str) -> Dict[str, Any]:
+    models_dir = os.path.join(run_dir, "models")
+    out = {}
+    for fn in sorted(os.listdir(models_dir)):
+        if fn.startswith(BASE_MODEL_PREFIX) and fn.endswith(".joblib"):
+            out[fn[len(BASE_MODEL_PREFIX):-len(".joblib")]] = load(os.path.join(models_dir, fn))
+    # 依 ModelBuilder 的建模順序排列（影響集成階段的估計器順序）
+    order = {n: i for i, n in enumerate(_MODEL_ORDER)}
+    return dict(sorted(out.items(), key=lambda kv: order.get(kv[0].upper(), len(order))))
+
+
+def _has_base_models(run_dir: str) -> bool:
+    models_dir = os.path.join(run_dir, "models")
+    return os.path.isdir(models_dir) and any(
+        fn.startswith(BASE_MODEL_PREFIX) and fn.endswith(".joblib") for fn in os.listdir(models_dir)
+    )
+
+
+def find_continue_source(root: str, task_type: str, feature_hash: str,
+                         exclude_dir: Optional[str] = None) -> Optional[str]:
+    """由新到舊尋找同任務、同特徵集、且存有基模型的產出目錄。"""
+    if not root or not os.path.isdir(root):
+        return None
+    exclude = os.path.abspath(exclude_dir) if exclude_dir else None
+    for name in sorted(os.listdir(root), reverse=True):
+        run_dir = os.path.join(root, name)
+        if exclude and os.path.abspath(run_dir) == exclude:
+            continue
+        if not check_compatible(run_dir, task_type, feature_hash):
+            continue
+        if _has_base_models(run_dir):
+            return run_dir
+    return None
+
+
+def check_compatible(run_dir: str, task_type: str, feature_hash: str) -> bool:
+    meta_path = os.path.join(run_dir, "optuna", RUN_META_FILE)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except Exception:
+        return False
+    return meta.get("task_type") == task_type and meta.get("feature_hash") == feature_hash
+
+
+# ---------------- 續訓 ----------------
+def _kind(model: Any) -> str:
+    if isinstance(model, PriorCorrectedClassifier):
+        model = model.estimator_
+    mod = type(model).__module__
+    if mod.startswith("xgboost"):
+        return "XGB"
+    if mod.startswith("lightgbm"):
+        return "LGB"
+    if mod.startswith("catboost"):
+        return "CAT"
+    return ""
+
+
+def continue_fit(prev: Any, X, y, extra_trees: int, sample_weight=None):
+    """在 prev 的 booster 上新增 extra_trees 棵樹；prev 本身不被修改（失敗時可直接回滾）。"""
+    if isinstance(prev, PriorCorrectedClassifier):
+        # 降採樣訓練的模型：續訓內部模型，沿用原本的機率修正
+        inner = continue_fit(prev.estimator_, X, y, extra_trees, sample_weight)
+        return PriorCorrectedClassifier.from_fitted(inner, prev.rate, prev.negative_label)
+    kind = _kind(prev)
+    est = clone(prev)
+    if kind == "XGB":
+        est.set_params(n_estimators=int(extra_trees))
+        est.fit(X, y, sample_weight=sample_weight, xgb_model=prev.get_booster(), verbose=False)
+        est.set_params(n_estimators=int(est.get_booster().num_boosted_rounds()))
+    elif kind == "LGB":
+        est.set_params(n_estimators=int(extra_trees))
+        est.fit(X, y, sample_weight=sample_weight, init_model=prev.booster_)
+        est.set_params(n_estimators=int(est.booster_.current_iteration()))
+    elif kind == "CAT":
+        est.set_params(iterations=int(extra_trees))
+        est.fit(X, y, sample_weight=sample_weight, init_model=prev, verbose=False)
+        # CatBoost 已訓練的模型不允許 set_params：直接改寫 get_params() 讀取的參數表
+        est._init_params["iterations"] = int(est.tree_count_)
+    else:
+        raise ValueError(f"{type(prev).__name__} 不支援續訓")
+    # 參數改回總樹數：集成階段 clone 後重訓（OOF、Voting／Stacking）的模型與續訓後的模型同樣大小，
+    # 而不是只有 extra_trees 棵樹的新模型
+    return est
+
+
+def score(model: Any, X, y, task_type: str, metric: Optional[str] = None) -> float:
+    """安靜版指標（不印報告），供續訓前後比較。"""
+    X_eval = X.to_numpy() if hasattr(X, "to_numpy") else np.asarray(X)
+    y_np = np.asarray(y).reshape(-1)
+    metric = metric or ("auc" if task_type == "binary" else "f1")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        if metric == "auc":
+            proba = model.predict_proba(X_eval)
+            if task_type == "binary":
+                return float(roc_auc_score(y_np, proba[:, -1]))
+            return float(roc_auc_score(y_np, proba, multi_class="ovr", labels=list(model.classes_)))
+        y_pred = model.predict(X_eval)
+        avg = "binary" if task_type == "binary" else "macro"
+        if metric == "recall":
+            return float(recall_score(y_np, y_pred, average=avg, zero_division=0))
+        return float(f1_score(y_np, y_pred, average=avg, zero_division=0))
+
+
+def continue_training(previous: Dict[str, Any], X_train, y_train, X_valid, y_valid,
+                      task_type: str, settings: Dict[str, Any],
+                      sample_weight=None) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    回傳 (trained, decisions)：
+    - trained：續訓（或回滾／沿用）後的模型
+    - decisions：每個模型的 baseline / candidate 指標與採用結果
+    """
+    targets = {m.upper() for m in settings["MODELS"]}
+    metric = settings.get("METRIC")
+    tol = float(settings["TOLERANCE"])
+    trained: Dict[str, Any] = {}
+    decisions: List[Dict[str, Any]] = []
+    for name, prev in previous.items():
+        row: Dict[str, Any] = {"model": name}
+        if name.upper() not in targets or not _kind(prev):
+            trained[name] = prev
+            row["action"] = "reused"
+            decisions.append(row)
+            print(f"♻️  {name}：沿用上次模型")
+            continue
+
+        base = score(prev, X_valid, y_valid, task_type, metric)
+        print(f"🔁 續訓 {name}：+{settings['EXTRA_TREES']} 棵樹（{len(X_train)} 筆新資料）")
+        try:
+            cand = continue_fit(prev, X_train, y_train, settings["EXTRA_TREES"], sample_weight)
+            new = score(cand, X_valid, y_valid, task_type, metric)
+        except Exception as e:
+            print(f"⚠️  {name} 續訓失敗，回滾為上次模型：{e}")
+            trained[name] = prev
+            row.update(action="rolled_back", baseline=base, error=str(e))
+            decisions.append(row)
+            continue
+
+        row.update(baseline=base, candidate=new)
+        if new + tol < base:
+            trained[name] = prev
+            row["action"] = "rolled_back"
+            print(f"↩️  {name} 指標退步（{base:.6f} → {new:.6f}），回滾為上次模型")
+        else:
+            trained[name] = cand
+            row["action"] = "continued"
+            print(f"✅ {name} 續訓採用（{base:.6f} → {new:.6f}）")
+        decisions.append(row)
+    return trained, decisions
+
+
+__all__ = [
+    "DEFAULT_CONTINUE_TRAINING_SETTINGS",
+    "continue_fit",
+    "continue_training",
+    "find_continue_source",
+    "load_base_models",
+    "resolve_continue_training_settings",
+    "save_base_models",
+    "score",
+]
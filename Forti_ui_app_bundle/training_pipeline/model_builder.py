@@ -4,6 +4,14 @@ ModelBuilder — 根據 config 超參數建模，支援 Optuna 超參數搜尋
   - build_models(X, y, task="binary", params=None)
   - build_models(best_params)   # 先 run_optuna 再建模的舊用法
   - run_optuna(X, y, task)
+Multi-fidelity（config["MULTI_FIDELITY"]["ENABLED"]）：
+  - boosting 模型以 early stopping 決定樹數，不搜尋 n_estimators / iterations
+  - trial 以逐步放大的子樣本評估，搭配 Hyperband/SuccessiveHalving 提早淘汰
+分箱快取（config["CACHE_BINNED_DATASETS"]，預設開啟）：
+  - XGB/LGB 的 CV 每折只建一次 QuantileDMatrix / lightgbm.Dataset，同分箱參數的 trial 共用
+  - LGB 的 max_bin 搜尋改為 127／191／255 三個值（step=64），讓 trial 真的能共用分箱結果
+sample_weight（重複列壓縮後的出現次數）：
+  - 傳入 build_models / run_optuna 後，CV 的訓練與計分一律加權（加權準確率 = 未壓縮資料的準確率）
 """
 
 from __future__ import annotations
@@ -15,13 +23,27 @@ import pandas as pd
 import optuna
 from optuna.pruners import MedianPruner
 
+from sklearn.base import clone
 from sklearn.model_selection import StratifiedKFold, cross_val_score
 from sklearn.ensemble import RandomForestClassifier, ExtraTreesClassifier
 
 from xgboost import XGBClassifier
 from lightgbm import LGBMClassifier
+from lightgbm.basic import LightGBMError
 from catboost import CatBoostClassifier
 
+from .dataset_cache import BinnedDatasetCache
+from .warm_start import WarmSearchSpace, resolve_warm_start_settings
+from .multi_fidelity import (
+    BEST_N_TREES_ATTR,
+    FidelityPlan,
+    best_tree_count,
+    fit_with_early_stopping,
+    make_fidelity_pruner,
+    resolve_fidelity_settings,
+    summarize_study,
+)
+
 try:  # optional GPU arrays
     import cupy as cp  # type: ignore
 
@@ -33,6 +55,20 @@ except Exception:  # pragma: no cover - cupy may not be installed
 
     CUPY_AVAILABLE = False
 
+# 各模型實際交給 optuna 搜尋的參數（warm-start 只 enqueue 這些；樹數量在 multi-fidelity 下改由 early stopping 決定）
+SEARCH_PARAMS: Dict[str, tuple] = {
+    "XGB": ("n_estimators", "max_depth", "learning_rate", "subsample", "colsample_bytree"),
+    "LGB": (
+        "n_estimators", "max_depth", "num_leaves", "learning_rate", "min_data_in_leaf",
+        "min_sum_hessian_in_leaf", "min_gain_to_split", "feature_fraction", "bagging_fraction",
+        "bagging_freq", "max_bin", "lambda_l1", "lambda_l2",
+    ),
+    "CAT": ("iterations", "depth", "learning_rate"),
+    "RF": ("n_estimators", "max_depth"),
+    "ET": ("n_estimators", "max_depth"),
+}
+_FIDELITY_TREE_PARAMS = {"XGB": "n_estimators", "LGB": "n_estimators", "CAT": "iterations"}
+
 def _to_numpy(X, y):
     X_np = X.to_numpy() if hasattr(X, 'to_numpy') else np.asarray(X)
     y_np = y.to_numpy().reshape(-1) if hasattr(y, 'to_numpy') else np.asarray(y).reshape(-1)
@@ -48,12 +84,22 @@ class ModelBuilder:
         max_trials_xgb: int = 15,
         max_trials_others: int = 10,
         enable_pruner: bool = True,
+        multi_fidelity: Optional[bool] = None,
+        warm_start: Optional[Dict[str, dict]] = None,
     ) -> None:
         self.config = config
         self.use_optuna = use_optuna
         self.max_trials_xgb = max_trials_xgb
         self.max_trials_others = max_trials_others
         self.pruner = MedianPruner() if enable_pruner else None
+        self.fidelity = resolve_fidelity_settings(config)
+        self.multi_fidelity = bool(self.fidelity["ENABLED"] if multi_fidelity is None else multi_fidelity)
+        # warm_start：上次相容產出的最佳參數 {"XGB": {...}, ...}，用來 enqueue 並縮小搜尋範圍
+        self.warm_start = warm_start or {}
+        self.warm_settings = resolve_warm_start_settings(config)
+        self.best_params_: Optional[Dict[str, dict]] = None
+        # 只含 study 實際產出的參數（不含 config 後備值與固定參數），供 run_meta / warm-start 使用
+        self.study_params_: Dict[str, dict] = {}
 
         # -------- 降噪（不影響錯誤拋出）---------
         warnings.filterwarnings("ignore", category=UserWarning, module="xgboost")
@@ -70,6 +116,7 @@ class ModelBuilder:
         y=None,
         task: str = "binary",
         params: Optional[Dict[str, dict]] = None,
+        sample_weight=None,
     ) -> Dict[str, object]:
         """
         1) build_models(best_params)  # 若第一參數就是 dict 則視為 tuned params
@@ -84,7 +131,7 @@ class ModelBuilder:
         else:
             # 新用法：內部決定是否要 run_optuna
             if self.use_optuna and X is not None and y is not None:
-                tuned_params = self.run_optuna(X, y, task)
+                tuned_params = self.run_optuna(X, y, task, sample_weight=sample_weight)
             else:
                 tuned_params = params
 
@@ -105,23 +152,98 @@ class ModelBuilder:
 
         return models
 
-    def run_optuna(self, X, y, task_type: str = "binary") -> Dict[str, dict]:
+    def run_optuna(self, X, y, task_type: str = "binary", sample_weight=None) -> Dict[str, dict]:
         """
         對所有模型進行尋參。任何單折失敗不會中止整個 study（以 NaN 計分→當作低分）。
         """
         best_params: Dict[str, dict] = {}
+        self.study_params_ = {}
         rng = self.config.get("RANDOM_STATE", 42)
         X, y = _to_numpy(X, y)
         y = y.astype("int32")
+        w = None if sample_weight is None else np.asarray(sample_weight, dtype=np.float32).reshape(-1)
         cv = StratifiedKFold(n_splits=5, shuffle=True, random_state=rng)
         pruner = self.pruner
 
+        # Multi-fidelity：固定 eval fold + 巢狀子樣本 rung，pruner 改為 Hyperband/SH
+        plan: Optional[FidelityPlan] = None
+        if self.use_optuna and self.multi_fidelity:
+            plan = FidelityPlan(X, y, self.fidelity, seed=rng, sample_weight=w)
+            pruner = make_fidelity_pruner(self.fidelity)
+            print(f"🪜 Multi-fidelity 已啟用：rung {plan.describe()}｜early stopping={plan.rounds}")
+
+        spaces = {
+            name: WarmSearchSpace(
+                self.warm_start.get(name), self.warm_settings, seed=rng,
+                names=[p for p in names if plan is None or p != _FIDELITY_TREE_PARAMS.get(name)],
+            )
+            for name, names in SEARCH_PARAMS.items()
+        }
+        if self.use_optuna and any(sp.active for sp in spaces.values()):
+            warm_models = [n for n, sp in spaces.items() if sp.active]
+            print(f"♨️  Warm-start：沿用上次最佳參數 {warm_models}，每模型最多 {self.warm_settings['TRIALS']} 個 trial")
+
+        def _optimize(study, objective, n_trials: int, space: WarmSearchSpace) -> None:
+            callbacks = []
+            if space.active:
+                space.enqueue_center(study)
+                callbacks.append(space.enqueue_neighbours_callback)
+                n_trials = min(n_trials, int(self.warm_settings["TRIALS"]))
+            study.optimize(objective, n_trials=n_trials, show_progress_bar=True, callbacks=callbacks)
+
         # 為避免多進程把裝置警告刷爆，CV 階段固定 n_jobs=1（模型內仍可 n_jobs=-1）
         cv_n_jobs = 1
 
+        # XGB/LGB 的 CV 共用分箱後資料集（每折建一次，同分箱參數的 trial 直接重用）
+        cache: Optional[BinnedDatasetCache] = None
+        if self.use_optuna and bool(self.config.get("CACHE_BINNED_DATASETS", True)):
+            cache = BinnedDatasetCache(X, y, list(cv.split(X, y)), sample_weight=w)
+
+        def _cached_cv_score(name: str, fit_folds, params: dict, make_model) -> float:
+            """
+            以快取資料集計分；LightGBM GPU 失敗時比照 Trainer 改用 CPU 重試一次。
+            仍失敗（例如 xgboost 版本不支援 QuantileDMatrix）時印出原因，改以 make_model() 走一般 CV 計分。
+            """
+            error: Optional[Exception] = None
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                try:
+                    scores = fit_folds(params)
+                except LightGBMError as e:
+                    error = e
+                    if params.get("device_type") == "gpu":
+                        try:
+                            scores = fit_folds({**params, "device_type": "cpu"})
+                            error = None
+                        except Exception as e_cpu:
+                            error = e_cpu
+                except Exception as e:
+                    error = e
+            if error is not None:
+                print(f"⚠️  {name} 分箱快取計分失敗，改用一般 CV：{type(error).__name__}: {error}")
+                return _safe_cv_score(make_model())
+            m = np.nanmean(scores)
+            return 0.0 if np.isnan(m) else float(m)
+
+        def _weighted_cv_scores(model) -> list:
+            """cross_val_score 的加權版：各折以 sample_weight 訓練並計算加權準確率。"""
+            scores = []
+            for tr_idx, va_idx in cv.split(X, y):
+                try:
+                    est = clone(model)
+                    est.fit(X[tr_idx], y[tr_idx], sample_weight=w[tr_idx])
+                    pred = np.asarray(est.predict(X[va_idx])).reshape(-1)
+                    scores.append(float(np.average(pred == y[va_idx], weights=w[va_idx])))
+                except Exception:
+                    scores.append(np.nan)
+            return scores
+
         def _safe_cv_score(model) -> float:
             with warnings.catch_warnings():
                 warnings.simplefilter("ignore")
+                if w is not None:
+                    m = np.nanmean(_weighted_cv_scores(model))
+                    return 0.0 if np.isnan(m) else float(m)
                 # 修正點：error_score 必須是 float（或 'raise'），給 np.nan
                 scores = cross_val_score(
                     model,
@@ -135,16 +257,36 @@ class ModelBuilder:
             m = np.nanmean(scores)
             return 0.0 if np.isnan(m) else float(m)
 
+        def _fidelity_score(trial, make_model) -> float:
+            """逐 rung 訓練（boosting 以 early stopping slice 決定樹數）並以評分 slice 的準確率回報。"""
+
+            def _fit_and_score(X_tr, y_tr, X_es, y_es, X_ev, y_ev, w_tr=None, w_es=None, w_ev=None):
+                try:
+                    with warnings.catch_warnings():
+                        warnings.simplefilter("ignore")
+                        model, n_trees = fit_with_early_stopping(
+                            make_model(), X_tr, y_tr, X_es, y_es, plan.rounds, w_tr=w_tr, w_ev=w_es
+                        )
+                        pred = np.asarray(model.predict(X_ev)).reshape(-1)
+                    return float(np.average(pred == y_ev, weights=w_ev)), n_trees
+                except Exception:
+                    return 0.0, None
+
+            return plan.evaluate(trial, _fit_and_score)
+
         # ============== XGBoost =================
         def xgb_objective(trial):
             with warnings.catch_warnings():
                 warnings.simplefilter("ignore")
                 params = {
-                    "n_estimators": trial.suggest_int("n_estimators", 80, 220),
-                    "max_depth": trial.suggest_int("max_depth", 3, 12),
-                    "learning_rate": trial.suggest_float("learning_rate", 1e-3, 0.3, log=True),
-                    "subsample": trial.suggest_float("subsample", 0.6, 1.0),
-                    "colsample_bytree": trial.suggest_float("colsample_bytree", 0.5, 1.0),
+                    "n_estimators": (
+                        plan.max_estimators if plan is not None
+                        else spaces["XGB"].suggest_int(trial, "n_estimators", 80, 220)
+                    ),
+                    "max_depth": spaces["XGB"].suggest_int(trial, "max_depth", 3, 12),
+                    "learning_rate": spaces["XGB"].suggest_float(trial, "learning_rate", 1e-3, 0.3, log=True),
+                    "subsample": spaces["XGB"].suggest_float(trial, "subsample", 0.6, 1.0),
+                    "colsample_bytree": spaces["XGB"].suggest_float(trial, "colsample_bytree", 0.5, 1.0),
                     "tree_method": "hist",
                     "device": "cuda",
                     "random_state": rng,
@@ -161,6 +303,12 @@ class ModelBuilder:
                         }
                     )
 
+                if plan is not None:
+                    return _fidelity_score(trial, lambda: XGBClassifier(**params))
+                if cache is not None:
+                    return _cached_cv_score("XGBoost", cache.xgb_cv_accuracy, params,
+                                            lambda: XGBClassifier(**params))
+
                 skf_xgb = StratifiedKFold(n_splits=5, shuffle=True, random_state=rng)
                 scores = []
                 for tr_idx, va_idx in skf_xgb.split(X, y):
@@ -178,23 +326,31 @@ class ModelBuilder:
                         y_tr_np = y_tr_arr
                         y_va_np = y_va_arr
                     clf = XGBClassifier(**params)
-                    clf.fit(X_tr_np, y_tr_np)
+                    clf.fit(X_tr_np, y_tr_np, sample_weight=None if w is None else w[tr_idx])
                     pred = clf.predict(X_va_np)
                     if gpu_enabled:
                         pred = cp.asnumpy(pred)
                         y_va_eval = cp.asnumpy(y_va_np)
                     else:
                         y_va_eval = y_va_np
-                    scores.append(np.mean(pred == y_va_eval))
+                    scores.append(np.average(pred == y_va_eval, weights=None if w is None else w[va_idx]))
                 return float(np.mean(scores))
 
         if self.use_optuna:
             print("🔍 Optuna 搜尋 XGBoost ...")
             study_xgb = optuna.create_study(direction="maximize", pruner=pruner)
-            study_xgb.optimize(xgb_objective, n_trials=self.max_trials_xgb, show_progress_bar=True)
+            _optimize(study_xgb, xgb_objective, self.max_trials_xgb, spaces["XGB"])
+            if plan is not None:
+                print(f"   ↳ XGBoost trial：{summarize_study(study_xgb)}")
             device_setting = "cuda" if CUPY_AVAILABLE else "cpu"
+            # early stopping 樹數另存 best_n_trees：不是搜尋結果，不可被 warm-start 當中心點 enqueue（可能超出搜尋範圍）
+            self.study_params_["XGB"] = {
+                **study_xgb.best_params,
+                **(best_tree_count(study_xgb, BEST_N_TREES_ATTR) if plan is not None else {}),
+            }
             best_params["XGB"] = {
                 **study_xgb.best_params,
+                **(best_tree_count(study_xgb, "n_estimators") if plan is not None else {}),
                 "tree_method": "hist",
                 "device": device_setting,
                 "n_jobs": -1,
@@ -216,22 +372,26 @@ class ModelBuilder:
         def lgb_objective(trial):
             with warnings.catch_warnings():
                 warnings.simplefilter("ignore")
-                max_depth = trial.suggest_int("max_depth", 4, 12)
+                max_depth = spaces["LGB"].suggest_int(trial, "max_depth", 4, 12)
                 max_leaves = (1 << max_depth) - 1
                 params = {
-                    "n_estimators": trial.suggest_int("n_estimators", 150, 500),
+                    "n_estimators": (
+                        plan.max_estimators if plan is not None
+                        else spaces["LGB"].suggest_int(trial, "n_estimators", 150, 500)
+                    ),
                     "max_depth": max_depth,
-                    "num_leaves": min(trial.suggest_int("num_leaves", 31, 255), max_leaves),
-                    "learning_rate": trial.suggest_float("learning_rate", 1e-3, 0.2, log=True),
-                    "min_data_in_leaf": trial.suggest_int("min_data_in_leaf", 50, 500),
-                    "min_sum_hessian_in_leaf": trial.suggest_float("min_sum_hessian_in_leaf", 1e-2, 1.0, log=True),
-                    "min_gain_to_split": trial.suggest_float("min_gain_to_split", 1e-3, 1.0, log=True),
-                    "feature_fraction": trial.suggest_float("feature_fraction", 0.7, 1.0),
-                    "bagging_fraction": trial.suggest_float("bagging_fraction", 0.7, 1.0),
-                    "bagging_freq": trial.suggest_int("bagging_freq", 0, 5),
-                    "max_bin": trial.suggest_int("max_bin", 127, 255),
-                    "lambda_l1": trial.suggest_float("lambda_l1", 0.0, 5.0),
-                    "lambda_l2": trial.suggest_float("lambda_l2", 0.0, 5.0),
+                    "num_leaves": min(spaces["LGB"].suggest_int(trial, "num_leaves", 31, 255), max_leaves),
+                    "learning_rate": spaces["LGB"].suggest_float(trial, "learning_rate", 1e-3, 0.2, log=True),
+                    "min_data_in_leaf": spaces["LGB"].suggest_int(trial, "min_data_in_leaf", 50, 500),
+                    "min_sum_hessian_in_leaf": spaces["LGB"].suggest_float(trial, "min_sum_hessian_in_leaf", 1e-2, 1.0, log=True),
+                    "min_gain_to_split": spaces["LGB"].suggest_float(trial, "min_gain_to_split", 1e-3, 1.0, log=True),
+                    "feature_fraction": spaces["LGB"].suggest_float(trial, "feature_fraction", 0.7, 1.0),
+                    "bagging_fraction": spaces["LGB"].suggest_float(trial, "bagging_fraction", 0.7, 1.0),
+                    "bagging_freq": spaces["LGB"].suggest_int(trial, "bagging_freq", 0, 5),
+                    # 以 64 為間距（127／191／255）：分箱快取依 max_bin 分組，逐一取值會讓幾乎每個 trial 都重建 Dataset
+                    "max_bin": spaces["LGB"].suggest_int(trial, "max_bin", 127, 255, step=64),
+                    "lambda_l1": spaces["LGB"].suggest_float(trial, "lambda_l1", 0.0, 5.0),
+                    "lambda_l2": spaces["LGB"].suggest_float(trial, "lambda_l2", 0.0, 5.0),
                     "device_type": "gpu",  # 新版參數名
                     "verbosity": -1,
                     "n_jobs": -1,
@@ -246,15 +406,27 @@ class ModelBuilder:
                             "num_class": int(np.unique(y).shape[0]),
                         }
                     )
+                if plan is not None:
+                    return _fidelity_score(trial, lambda: LGBMClassifier(**params))
+                if cache is not None:
+                    return _cached_cv_score("LightGBM", cache.lgb_cv_accuracy, params,
+                                            lambda: LGBMClassifier(**params))
                 return _safe_cv_score(LGBMClassifier(**params))
 
         if self.use_optuna:
             print("🔍 Optuna 搜尋 LightGBM ...")
             try:
                 study_lgb = optuna.create_study(direction="maximize", pruner=pruner)
-                study_lgb.optimize(lgb_objective, n_trials=self.max_trials_others, show_progress_bar=True)
+                _optimize(study_lgb, lgb_objective, self.max_trials_others, spaces["LGB"])
+                if plan is not None:
+                    print(f"   ↳ LightGBM trial：{summarize_study(study_lgb)}")
+                self.study_params_["LGB"] = {
+                    **study_lgb.best_params,
+                    **(best_tree_count(study_lgb, BEST_N_TREES_ATTR) if plan is not None else {}),
+                }
                 best_params["LGB"] = {
                     **study_lgb.best_params,
+                    **(best_tree_count(study_lgb, "n_estimators") if plan is not None else {}),
                     "device_type": "gpu",
                     "verbosity": -1,
                     "n_jobs": -1,
@@ -279,23 +451,35 @@ class ModelBuilder:
             with warnings.catch_warnings():
                 warnings.simplefilter("ignore")
                 params = {
-                    "iterations": trial.suggest_int("iterations", 200, 500),
-                    "depth": trial.suggest_int("depth", 4, 10),
-                    "learning_rate": trial.suggest_float("learning_rate", 1e-3, 0.3, log=True),
+                    "iterations": (
+                        plan.max_estimators if plan is not None
+                        else spaces["CAT"].suggest_int(trial, "iterations", 200, 500)
+                    ),
+                    "depth": spaces["CAT"].suggest_int(trial, "depth", 4, 10),
+                    "learning_rate": spaces["CAT"].suggest_float(trial, "learning_rate", 1e-3, 0.3, log=True),
                     "task_type": "GPU",
                     "devices": "0",
                     "verbose": 0,
                 }
                 if task_type != "binary":
                     params["loss_function"] = "MultiClass"
+                if plan is not None:
+                    return _fidelity_score(trial, lambda: CatBoostClassifier(**params))
                 return _safe_cv_score(CatBoostClassifier(**params))
 
         if self.use_optuna:
             print("🔍 Optuna 搜尋 CatBoost ...")
             study_cat = optuna.create_study(direction="maximize", pruner=pruner)
-            study_cat.optimize(cat_objective, n_trials=self.max_trials_others, show_progress_bar=True)
+            _optimize(study_cat, cat_objective, self.max_trials_others, spaces["CAT"])
+            if plan is not None:
+                print(f"   ↳ CatBoost trial：{summarize_study(study_cat)}")
+            self.study_params_["CAT"] = {
+                **study_cat.best_params,
+                **(best_tree_count(study_cat, BEST_N_TREES_ATTR) if plan is not None else {}),
+            }
             best_params["CAT"] = {
                 **study_cat.best_params,
+                **(best_tree_count(study_cat, "iterations") if plan is not None else {}),
                 "task_type": "GPU",
                 "devices": "0",
                 "verbose": 0,
@@ -309,16 +493,19 @@ class ModelBuilder:
             with warnings.catch_warnings():
                 warnings.simplefilter("ignore")
                 params = {
-                    "n_estimators": trial.suggest_int("n_estimators", 120, 300),
-                    "max_depth": trial.suggest_int("max_depth", 4, 12),
+                    "n_estimators": spaces["RF"].suggest_int(trial, "n_estimators", 120, 300),
+                    "max_depth": spaces["RF"].suggest_int(trial, "max_depth", 4, 12),
                     "n_jobs": -1,
                 }
+                if plan is not None:
+                    return _fidelity_score(trial, lambda: RandomForestClassifier(**params))
                 return _safe_cv_score(RandomForestClassifier(**params))
 
         if self.use_optuna:
             print("🔍 Optuna 搜尋 RandomForest ...")
             study_rf = optuna.create_study(direction="maximize", pruner=pruner)
-            study_rf.optimize(rf_objective, n_trials=self.max_trials_others, show_progress_bar=True)
+            _optimize(study_rf, rf_objective, self.max_trials_others, spaces["RF"])
+            self.study_params_["RF"] = dict(study_rf.best_params)
             best_params["RF"] = {**study_rf.best_params, "n_jobs": -1}
         else:
             best_params["RF"] = self.config.get("MODEL_PARAMS", {}).get("RF", {})
@@ -328,20 +515,24 @@ class ModelBuilder:
             with warnings.catch_warnings():
                 warnings.simplefilter("ignore")
                 params = {
-                    "n_estimators": trial.suggest_int("n_estimators", 120, 300),
-                    "max_depth": trial.suggest_int("max_depth", 4, 12),
+                    "n_estimators": spaces["ET"].suggest_int(trial, "n_estimators", 120, 300),
+                    "max_depth": spaces["ET"].suggest_int(trial, "max_depth", 4, 12),
                     "n_jobs": -1,
                 }
+                if plan is not None:
+                    return _fidelity_score(trial, lambda: ExtraTreesClassifier(**params))
                 return _safe_cv_score(ExtraTreesClassifier(**params))
 
         if self.use_optuna:
             print("🔍 Optuna 搜尋 ExtraTrees ...")
             study_et = optuna.create_study(direction="maximize", pruner=pruner)
-            study_et.optimize(et_objective, n_trials=self.max_trials_others, show_progress_bar=True)
+            _optimize(study_et, et_objective, self.max_trials_others, spaces["ET"])
+            self.study_params_["ET"] = dict(study_et.best_params)
             best_params["ET"] = {**study_et.best_params, "n_jobs": -1}
         else:
             best_params["ET"] = self.config.get("MODEL_PARAMS", {}).get("ET", {})
 
+        self.best_params_ = best_params
         return best_params
 
     # ============================================================
@@ -0,0 +1,215 @@
+# training_pipeline/multi_fidelity.py
+"""
+Multi-fidelity 尋參工具（ModelBuilder.run_optuna / optuna_tuner 共用）
+- 以「逐步放大的分層子樣本」評估 trial，每個 rung 透過 trial.report 回報
+- 搭配 Hyperband / SuccessiveHalving pruner，差的組合在看過 5~10% 資料時即被淘汰
+- Boosting 模型（XGB/LGB/CAT）改以 early stopping 決定樹數，
+  不再把 n_estimators / iterations 當成超參數搜尋
+- eval fold 再切成「early stopping 用」與「評分用」兩份，樹數不會在評分資料上挑選
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import optuna
+from sklearn.model_selection import train_test_split
+
+# trial.user_attrs 中記錄 early stopping 後的最佳樹數
+BEST_N_TREES_ATTR = "best_n_trees"
+
+DEFAULT_FIDELITY_SETTINGS: Dict[str, Any] = {
+    "ENABLED": False,
+    "MIN_FRACTION": 0.05,          # 第一個 rung 看到的訓練資料比例
+    "REDUCTION_FACTOR": 3,         # 每個 rung 資料量放大倍數（亦為 pruner 的 η）
+    "EVAL_SIZE": 0.2,              # eval fold 比例（early stopping + 評分）
+    "EARLY_STOPPING_SHARE": 0.5,   # eval fold 中保留給 early stopping 的比例，其餘用於評分
+    "EARLY_STOPPING_ROUNDS": 50,
+    "MAX_ESTIMATORS": 2000,        # early stopping 的樹數上限
+    "PRUNER": "hyperband",         # "hyperband" | "successive_halving"
+}
+
+
+def resolve_fidelity_settings(config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """以預設值補齊 config["MULTI_FIDELITY"]（亦接受直接傳入該子 dict）。"""
+    cfg = config or {}
+    user = cfg.get("MULTI_FIDELITY", cfg) if isinstance(cfg, dict) else {}
+    out = dict(DEFAULT_FIDELITY_SETTINGS)
+    if isinstance(user, dict):
+        out.update({k: v for k, v in user.items() if k in DEFAULT_FIDELITY_SETTINGS})
+    return out
+
+
+def fidelity_schedule(min_fraction: float, reduction_factor: float) -> List[float]:
+    """由 min_fraction 起每次乘上 reduction_factor，最後一個 rung 固定為 1.0。"""
+    min_fraction = float(min(max(min_fraction, 1e-4), 1.0))
+    eta = float(max(reduction_factor, 1.5))
+    fractions: List[float] = []
+    f = min_fraction
+    while f < 1.0:
+        fractions.append(f)
+        f *= eta
+    fractions.append(1.0)
+    return fractions
+
+
+def make_fidelity_pruner(settings: Dict[str, Any]) -> optuna.pruners.BasePruner:
+    """依 rung 數量建立 Hyperband（預設）或 SuccessiveHalving pruner。"""
+    n_rungs = len(fidelity_schedule(settings["MIN_FRACTION"], settings["REDUCTION_FACTOR"]))
+    eta = max(int(settings["REDUCTION_FACTOR"]), 2)
+    if str(settings.get("PRUNER", "hyperband")).lower() == "successive_halving":
+        return optuna.pruners.SuccessiveHalvingPruner(min_resource=1, reduction_factor=eta)
+    return optuna.pruners.HyperbandPruner(min_resource=1, max_resource=n_rungs, reduction_factor=eta)
+
+
+def stratified_prefix_order(y: np.ndarray, seed: int) -> np.ndarray:
+    """
+    產生一組索引排列，使得任意前綴都近似分層抽樣；
+    因此各 rung 的子樣本彼此巢狀（小 rung ⊂ 大 rung），且類別比例一致。
+    """
+    rng = np.random.default_rng(seed)
+    y = np.asarray(y).reshape(-1)
+    key = np.empty(len(y), dtype=np.float64)
+    for c in np.unique(y):
+        idx = rng.permutation(np.flatnonzero(y == c))
+        key[idx] = (np.arange(len(idx)) + rng.random()) / len(idx)
+    return np.argsort(key, kind="stable")
+
+
+def fit_with_early_stopping(est, X_tr, y_tr, X_ev, y_ev, rounds: int,
+                            w_tr=None, w_ev=None) -> Tuple[Any, Optional[int]]:
+    """
+    對 boosting 模型以 (X_ev, y_ev) 做 early stopping，回傳 (est, 最佳樹數)；
+    這份資料只用來決定樹數，不應再拿來評分（見 FidelityPlan 的 X_es）；
+    非 boosting 模型（RF/ET 等）直接 fit，樹數回傳 None。
+    w_tr / w_ev：重複列壓縮後的樣本權重（None 表示不加權）。
+    """
+    name = est.__class__.__name__.lower()
+    best_iter = None
+    if "xgb" in name:
+        est.set_params(early_stopping_rounds=int(rounds))
+        est.fit(X_tr, y_tr, sample_weight=w_tr, eval_set=[(X_ev, y_ev)],
+                sample_weight_eval_set=None if w_ev is None else [w_ev], verbose=False)
+        best_iter = getattr(est, "best_iteration", None)
+    elif "lgbm" in name:
+        import lightgbm
+
+        est.fit(
+            X_tr,
+            y_tr,
+            sample_weight=w_tr,
+            eval_set=[(X_ev, y_ev)],
+            eval_sample_weight=None if w_ev is None else [w_ev],
+            callbacks=[lightgbm.early_stopping(int(rounds), verbose=False)],
+        )
+        best_iter = getattr(est, "best_iteration_", None)
+        # LightGBM 的 best_iteration_ 從 1 起算
+        best_iter = None if not best_iter else int(best_iter) - 1
+    elif "catboost" in name:
+        from catboost import Pool
+
+        est.fit(X_tr, y_tr, sample_weight=w_tr, eval_set=Pool(X_ev, y_ev, weight=w_ev),
+                early_stopping_rounds=int(rounds), verbose=False)
+        best_iter = est.get_best_iteration()
+    else:
+        est.fit(X_tr, y_tr, sample_weight=w_tr)
+        return est, None
+    return est, (int(best_iter) + 1 if best_iter is not None else None)
+
+
+def _split(X, y, w, test_size: float, seed: int):
+    """分層切分；類別太少無法分層時退回隨機切分。"""
+    try:
+        return train_test_split(X, y, w, test_size=test_size, random_state=seed, stratify=y)
+    except ValueError:
+        return train_test_split(X, y, w, test_size=test_size, random_state=seed)
+
+
+class FidelityPlan:
+    """
+    固定一組 (訓練, early stopping, 評分) 切分與巢狀子樣本 rung：
+    - evaluate(trial, fit_and_score) 逐 rung 呼叫
+      fit_and_score(X_tr, y_tr, X_es, y_es, X_ev, y_ev, w_tr, w_es, w_ev) → (score, n_trees)；
+      X_es 只用來決定樹數，分數必須在 X_ev 上計算，兩者互不重疊
+    - 以 trial.report / should_prune 交給 pruner 決定是否提早淘汰
+    - sample_weight 為 None 時 w_tr / w_es / w_ev 皆為 None
+    """
+
+    def __init__(self, X, y, settings: Dict[str, Any], seed: int = 42, sample_weight=None) -> None:
+        X = np.asarray(X)
+        y = np.asarray(y).reshape(-1)
+        self.settings = settings
+        w = np.ones(len(y), dtype=np.float32) if sample_weight is None else np.asarray(sample_weight).reshape(-1)
+        self.X_tr, X_hold, self.y_tr, y_hold, w_tr, w_hold = _split(X, y, w, float(settings["EVAL_SIZE"]), seed)
+        es_share = float(settings.get("EARLY_STOPPING_SHARE", DEFAULT_FIDELITY_SETTINGS["EARLY_STOPPING_SHARE"]))
+        self.X_ev, self.X_es, self.y_ev, self.y_es, w_ev, w_es = _split(X_hold, y_hold, w_hold, es_share, seed)
+        self.w_tr, self.w_es, self.w_ev = (None, None, None) if sample_weight is None else (w_tr, w_es, w_ev)
+        self.order = stratified_prefix_order(self.y_tr, seed)
+        self.fractions = fidelity_schedule(settings["MIN_FRACTION"], settings["REDUCTION_FACTOR"])
+
+        # 每個 rung 至少要讓每個類別出現數筆，避免小樣本時單一類別無法訓練
+        n = len(self.y_tr)
+        min_rows = min(n, 10 * int(np.unique(self.y_tr).shape[0]))
+        self.sizes = [max(min_rows, int(round(f * n))) for f in self.fractions]
+        self.rounds = int(settings["EARLY_STOPPING_ROUNDS"])
+        self.max_estimators = int(settings["MAX_ESTIMATORS"])
+
+    @property
+    def n_rungs(self) -> int:
+        return len(self.sizes)
+
+    def describe(self) -> str:
+        parts = [f"{f:.0%}({s})" for f, s in zip(self.fractions, self.sizes)]
+        return " → ".join(parts)
+
+    def evaluate(
+        self,
+        trial: optuna.trial.Trial,
+        fit_and_score: Callable[..., Tuple[float, Optional[int]]],
+    ) -> float:
+        score = 0.0
+        n_trees = None
+        for step, size in enumerate(self.sizes):
+            idx = self.order[:size]
+            w_tr = None if self.w_tr is None else self.w_tr[idx]
+            score, n_trees = fit_and_score(
+                self.X_tr[idx], self.y_tr[idx], self.X_es, self.y_es, self.X_ev, self.y_ev,
+                w_tr, self.w_es, self.w_ev,
+            )
+            trial.report(float(score), step)
+            if trial.should_prune():
+                raise optuna.TrialPruned()
+        if n_trees is not None:
+            trial.set_user_attr(BEST_N_TREES_ATTR, int(n_trees))
+        return float(score)
+
+
+def best_tree_count(study: optuna.study.Study, param_name: str) -> Dict[str, int]:
+    """取最佳 trial 的 early stopping 樹數，轉成對應模型的參數名（n_estimators / iterations）。"""
+    try:
+        n_trees = study.best_trial.user_attrs.get(BEST_N_TREES_ATTR)
+    except ValueError:
+        return {}
+    return {param_name: int(n_trees)} if n_trees else {}
+
+
+def summarize_study(study: optuna.study.Study) -> str:
+    states = [t.state for t in study.trials]
+    n_pruned = sum(s == optuna.trial.TrialState.PRUNED for s in states)
+    n_complete = sum(s == optuna.trial.TrialState.COMPLETE for s in states)
+    return f"完成 {n_complete}、提早淘汰 {n_pruned}"
+
+
+__all__ = [
+    "BEST_N_TREES_ATTR",
+    "DEFAULT_FIDELITY_SETTINGS",
+    "FidelityPlan",
+    "best_tree_count",
+    "fidelity_schedule",
+    "fit_with_early_stopping",
+    "make_fidelity_pruner",
+    "resolve_fidelity_settings",
+    "stratified_prefix_order",
+    "summarize_study",
+]
@@ -0,0 +1,138 @@
+# training_pipeline/oof_cache.py
+"""
+OOF（out-of-fold）機率快取與免重訓 Stacking：
+- OOFCache：同一組 StratifiedKFold 下，每個基模型的各折機率只計算一次
+  （折內模型 random_state = seed + fold，與 ensemble_optuna.score_combo 相同，可直接共用）
+- Optuna 集成搜尋的每個 trial、Stacking 的 meta-learner 都從快取取 OOF 機率，不再重訓基模型
+- CachedStackingClassifier：已訓練好的基模型 + 在 OOF 機率上訓練的 LogisticRegression；
+  特徵排列與 sklearn StackingClassifier(stack_method="predict_proba") 相同（二元只取正類欄）
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin, clone
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import StratifiedKFold
+
+from .parallel_folds import run_folds
+
+
+def _to_numpy(X):
+    return X.to_numpy() if hasattr(X, "to_numpy") else np.asarray(X)
+
+
+def _fold_proba(est, X, y, tr, va, sample_weight, extra):
+    seed = extra
+    if hasattr(est, "get_params") and "random_state" in est.get_params():
+        est.set_params(random_state=seed)
+    if sample_weight is None:
+        est.fit(X[tr], y[tr])
+    else:
+        est.fit(X[tr], y[tr], sample_weight=sample_weight[tr])
+    return np.asarray(est.predict_proba(X[va]), dtype=np.float64)
+
+
+class OOFCache:
+    """以 (模型名稱) 為鍵快取各折的驗證機率；同一個 ComboOptimizer 內共用。"""
+
+    def __init__(self, X, y, n_splits: int = 5, seed: int = 42, sample_weight=None,
+                 n_jobs: Optional[int] = 1, progress=None) -> None:
+        self.X = _to_numpy(X)
+        self.y = _to_numpy(y).reshape(-1)
+        self.sample_weight = None if sample_weight is None else np.asarray(sample_weight).reshape(-1)
+        self.n_splits = int(n_splits)
+        self.seed = int(seed)
+        self.n_jobs = n_jobs
+        self.progress = progress
+        skf = StratifiedKFold(n_splits=self.n_splits, shuffle=True, random_state=self.seed)
+        self.folds: List[Tuple[np.ndarray, np.ndarray]] = list(skf.split(self.X, self.y))
+        self._proba: Dict[str, List[np.ndarray]] = {}
+        self.fits = 0   # 實際執行的折內 fit 次數（報告用）
+
+    def matches(self, n_splits: int, seed: int, n_rows: int) -> bool:
+        return self.n_splits == int(n_splits) and self.seed == int(seed) and len(self.y) == int(n_rows)
+
+    def compute(self, estimators: Dict[str, Any]) -> None:
+        """一次計算所有尚未快取的模型（模型 × 折 可平行）。"""
+        todo = [n for n in estimators if n not in self._proba]
+        if not todo:
+            return
+        tasks, labels = [], []
+        for n in todo:
+            for k, (tr, va) in enumerate(self.folds):
+                tasks.append((estimators[n], tr, va, self.seed + k))
+                labels.append(f"OOF {n} fold {k + 1}/{self.n_splits}")
+        results = run_folds(_fold_proba, tasks, self.X, self.y, self.sample_weight,
+                            n_jobs=self.n_jobs, progress=self.progress, labels=labels)
+        self.fits += len(tasks)
+        for i, n in enumerate(todo):
+            self._proba[n] = results[i * self.n_splits:(i + 1) * self.n_splits]
+
+    def fold_proba(self, name: str, fold: int, est=None) -> np.ndarray:
+        if name not in self._proba:
+            if est is None:
+                raise KeyError(f"OOF 快取中沒有 {name}")
+            self.compute({name: est})
+        return self._proba[name][fold]
+
+    def oof_matrix(self, name: str, est=None) -> np.ndarray:
+        """依原列順序組回完整 OOF 機率矩陣 (n_samples, n_classes)。"""
+        first = self.fold_proba(name, 0, est)
+        out = np.zeros((len(self.y), first.shape[1]), dtype=np.float64)
+        for k, (_, va) in enumerate(self.folds):
+            out[va] = self._proba[name][k]
+        return out
+
+
+def _meta_features(probas: Sequence[np.ndarray]) -> np.ndarray:
+    # 與 StackingClassifier 相同：二元時只保留正類欄，避免共線
+    cols = [p[:, 1:] if p.shape[1] == 2 else p for p in probas]
+    return np.hstack(cols)
+
+
+class CachedStackingClassifier(ClassifierMixin, BaseEstimator):
+    """推論用 Stacking：基模型為已訓練好的模型，只有 final_estimator_ 在 OOF 機率上訓練。"""
+
+    def __init__(self, estimators: Sequence[Tuple[str, Any]], final_estimator=None) -> None:
+        self.estimators = estimators
+        self.final_estimator = final_estimator
+
+    def fit_from_oof(self, oof_probas: Sequence[np.ndarray], y, sample_weight=None) -> "CachedStackingClassifier":
+        final = clone(self.final_estimator) if self.final_estimator is not None else LogisticRegression(max_iter=1000)
+        Z = _meta_features(oof_probas)
+        if sample_weight is None:
+            final.fit(Z, np.asarray(y).reshape(-1))
+        else:
+            final.fit(Z, np.asarray(y).reshape(-1), sample_weight=sample_weight)
+        self.final_estimator_ = final
+        self.estimators_ = [est for _, est in self.estimators]
+        self.named_estimators_ = dict(self.estimators)
+        self.classes_ = final.classes_
+        self.meta_feature_names_ = self._meta_feature_names(oof_probas)
+        return self
+
+    def _meta_feature_names(self, oof_probas: Sequence[np.ndarray]) -> List[str]:
+        names = []
+        for (n, _), p in zip(self.estimators, oof_probas):
+            ks = [1] if p.shape[1] == 2 else range(p.shape[1])
+            names.extend(f"{n}::class_{k}" for k in ks)
+        return names
+
+    def transform(self, X) -> np.ndarray:
+        return _meta_features([np.asarray(est.predict_proba(X)) for est in self.estimators_])
+
+    def predict_proba_from(self, base_probas: Sequence[np.ndarray]) -> np.ndarray:
+        """以已算好的基模型機率（順序同 estimators_）組合輸出，供評估情境共用推論結果。"""
+        return self.final_estimator_.predict_proba(_meta_features(base_probas))
+
+    def predict_proba(self, X) -> np.ndarray:
+        return self.final_estimator_.predict_proba(self.transform(X))
+
+    def predict(self, X) -> np.ndarray:
+        return self.final_estimator_.predict(self.transform(X))
+
+
+__all__ = ["CachedStackingClassifier", "OOFCache"]
@@ -3,7 +3,7 @@ from __future__ import annotations
 import argparse
 import json
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 import numpy as np
 import optuna
@@ -22,7 +22,21 @@ except Exception:  # pragma: no cover - cupy is optional
     cp = None  # type: ignore[assignment]
 
 
+# ui_shared 模組以頂層名稱匯入（串流讀取工具與另一個介面共用）；路徑統一由 shared_path 設定
+from .shared_path import ensure_ui_shared_path
+
+ensure_ui_shared_path()
+
+from csv_ingest import read_csv_tolerant  # noqa: E402
+
 from .feature_policy import FeaturePolicy
+from .multi_fidelity import (
+    BEST_N_TREES_ATTR,
+    FidelityPlan,
+    fit_with_early_stopping,
+    make_fidelity_pruner,
+    resolve_fidelity_settings,
+)
 
 # -------------------------
 # 讀取資料（你可改為實際的 data_loader）
@@ -30,31 +44,9 @@ from .feature_policy import FeaturePolicy
 def load_dataset(csv_path: str) -> pd.DataFrame:
     if not os.path.exists(csv_path):
         raise FileNotFoundError(f"找不到資料檔：{csv_path}")
-    
-    try:
-        df = pd.read_csv(csv_path)
-        return df
-    except pd.errors.ParserError as e:
-        print(f"⚠️ CSV 格式問題：{str(e)}")
-        print("🔄 嘗試使用容錯模式重新讀取...")
-        
-        try:
-            df = pd.read_csv(
-                csv_path,
-                error_bad_lines=False,
-                warn_bad_lines=True,
-                on_bad_lines='warn'
-            )
-            return df
-        except Exception:
-            df = pd.read_csv(
-                csv_path,
-                sep=None,
-                engine='python',
-                quoting=3,
-                skipinitialspace=True
-            )
-            return df
+    # 單趟容錯讀取：格式錯誤行寫入 <檔名>_quarantine.tsv（含行號）
+    quarantine = os.path.splitext(csv_path)[0] + "_quarantine.tsv"
+    return read_csv_tolerant(csv_path, quarantine_path=quarantine)
 
 # -------------------------
 # 目標函式：與正式訓練共用 FeaturePolicy
@@ -65,7 +57,14 @@ def build_objective(
     n_splits: int = 3,
     use_gpu: bool = True,
     metric: str = "roc_auc",   # "roc_auc" | "f1"
+    multi_fidelity: bool = False,
+    fidelity: Optional[Dict[str, Any]] = None,
 ) -> optuna.trial.Trial:
+    """
+    multi_fidelity=True 時：
+    - 不搜尋 n_estimators，改以 eval fold early stopping 決定樹數
+    - 以巢狀子樣本 rung 評估並 trial.report，study 需搭配 make_fidelity_pruner()
+    """
     skf = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=42)
 
     # 先在「整體」上凍結欄位集，確保每折一致
@@ -75,10 +74,33 @@ def build_objective(
         # 再 align 一次（雖然 _X_all 本身就是來源）
         _ = policy.align_like(_X_all)
 
+    def _score_proba(y_true, proba) -> float:
+        if policy.task_type == "binary":
+            if metric == "roc_auc":
+                return roc_auc_score(y_true, proba[:, 1])
+            if metric == "f1":
+                return f1_score(y_true, (proba[:, 1] >= 0.5).astype(int))
+        else:
+            if metric == "roc_auc":
+                return roc_auc_score(y_true, proba, multi_class="ovr")
+            if metric == "f1":
+                return f1_score(y_true, proba.argmax(axis=1), average="macro")
+        raise ValueError(f"未知 metric: {metric}")
+
+    plan: Optional[FidelityPlan] = None
+    if multi_fidelity:
+        fidelity = resolve_fidelity_settings(fidelity)
+        X_plan = policy.align_like(_X_all).to_numpy(dtype=np.float32)
+        plan = FidelityPlan(X_plan, np.asarray(_y_all), fidelity, seed=42)
+        print(f"🪜 Multi-fidelity 已啟用：rung {plan.describe()}｜early stopping={plan.rounds}")
+
     def objective(trial: optuna.trial.Trial) -> float:
         # ---- 取超參數 ----
         params = dict(
-            n_estimators=trial.suggest_int("n_estimators", 200, 1200, step=100),
+            n_estimators=(
+                plan.max_estimators if plan is not None
+                else trial.suggest_int("n_estimators", 200, 1200, step=100)
+            ),
             max_depth=trial.suggest_int("max_depth", 3, 10),
             learning_rate=trial.suggest_float("learning_rate", 1e-3, 3e-1, log=True),
             subsample=trial.suggest_float("subsample", 0.6, 1.0),
@@ -109,6 +131,16 @@ def build_objective(
                 "eval_metric": "mlogloss",  # AUC 由外部 sklearn 計算
             })
 
+        # ---- Multi-fidelity：子樣本 rung + early stopping ----
+        if plan is not None:
+            def _fit_and_score(X_tr, y_tr, X_es, y_es, X_ev, y_ev, w_tr=None, w_es=None, w_ev=None):
+                clf, n_trees = fit_with_early_stopping(
+                    XGBClassifier(**params, random_state=42), X_tr, y_tr, X_es, y_es, plan.rounds
+                )
+                return _score_proba(y_ev, clf.predict_proba(X_ev)), n_trees
+
+            return plan.evaluate(trial, _fit_and_score)
+
         # ---- 交叉驗證 ----
         scores = []
         for tr_idx, va_idx in skf.split(_X_all, _y_all):
@@ -142,32 +174,13 @@ def build_objective(
             )
 
             # ---- 評分 ----
-            if policy.task_type == "binary":
-                pred = clf.predict_proba(X_va_arr)[:, 1]
-                if gpu_enabled:
-                    pred = cp.asnumpy(pred)
-                    y_va_eval = cp.asnumpy(y_va_arr)
-                else:
-                    y_va_eval = y_va_arr
-                if metric == "roc_auc":
-                    sc = roc_auc_score(y_va_eval, pred)
-                elif metric == "f1":
-                    sc = f1_score(y_va_eval, (pred >= 0.5).astype(int))
-                else:
-                    raise ValueError(f"未知 metric: {metric}")
+            proba = clf.predict_proba(X_va_arr)
+            if gpu_enabled:
+                proba = cp.asnumpy(proba)
+                y_va_eval = cp.asnumpy(y_va_arr)
             else:
-                pred = clf.predict_proba(X_va_arr)
-                if gpu_enabled:
-                    pred = cp.asnumpy(pred)
-                    y_va_eval = cp.asnumpy(y_va_arr)
-                else:
-                    y_va_eval = y_va_arr
-                if metric == "roc_auc":
-                    sc = roc_auc_score(y_va_eval, pred, multi_class="ovr")
-                elif metric == "f1":
-                    sc = f1_score(y_va_eval, pred.argmax(axis=1), average="macro")
-                else:
-                    raise ValueError(f"未知 metric: {metric}")
+                y_va_eval = y_va_arr
+            sc = _score_proba(y_va_eval, np.asarray(proba))
 
             scores.append(sc)
 
@@ -191,6 +204,9 @@ def main():
     ap.add_argument("--use_gpu", type=int, default=1, help="1=使用 GPU（若可用）")
     ap.add_argument("--trials", type=int, default=30, help="Optuna 試驗次數")
     ap.add_argument("--study_name", default="xgb_tuning", help="Optuna Study 名稱")
+    ap.add_argument("--multi_fidelity", type=int, default=0,
+                    help="1=子樣本 rung + early stopping + Hyperband 提早淘汰")
+    ap.add_argument("--min_fraction", type=float, default=0.05, help="multi-fidelity 第一個 rung 的資料比例")
     args = ap.parse_args()
 
     df = load_dataset(args.csv)
@@ -211,15 +227,19 @@ def main():
         freeze_feature_list_path=features_json,
     )
 
+    fidelity = resolve_fidelity_settings({"ENABLED": bool(args.multi_fidelity), "MIN_FRACTION": args.min_fraction})
     objective = build_objective(
         df=df,
         policy=policy,
         n_splits=args.splits,
         use_gpu=bool(args.use_gpu),
         metric=args.metric,
+        multi_fidelity=bool(args.multi_fidelity),
+        fidelity=fidelity,
     )
 
-    study = optuna.create_study(direction="maximize", study_name=args.study_name)
+    pruner = make_fidelity_pruner(fidelity) if args.multi_fidelity else None
+    study = optuna.create_study(direction="maximize", study_name=args.study_name, pruner=pruner)
     study.optimize(objective, n_trials=args.trials)
 
     print("\n===== Optuna 最佳結果 =====")
@@ -227,12 +247,16 @@ def main():
     print("Best Params:")
     for k, v in study.best_trial.params.items():
         print(f"  - {k}: {v}")
+    best_params = dict(study.best_trial.params)
+    if BEST_N_TREES_ATTR in study.best_trial.user_attrs:
+        best_params["n_estimators"] = int(study.best_trial.user_attrs[BEST_N_TREES_ATTR])
+        print(f"  - n_estimators (early stopping): {best_params['n_estimators']}")
 
     # 若有凍結欄位，保存一份結果摘要
     if features_json:
         out = {
             "best_value": study.best_value,
-            "best_params": study.best_trial.params,
+            "best_params": best_params,
             "features_json": features_json,
         }
         with open(os.path.splitext(features_json)[0] + "_optuna_best.json", "w", encoding="utf-8") as f:
@@ -0,0 +1,456 @@
+# training_pipeline/out_of_core.py
+"""
+Out-of-core 訓練（資料大於記憶體時）
+- 逐 chunk 串流讀取 engineered 檔（CSV / 壓縮 CSV、Parquet、Arrow、.npy memmap）
+- 以 idseq 雜湊決定 hold-out（與類別無關的雜湊 → 各類別 hold-out 比例期望值相同；同一筆資料每次都落在同側）
+- 訓練側 chunk 以 float32 .npy 落地一次，之後：
+    XGB：DataIter → ExtMemQuantileDMatrix（舊版 xgboost 退為外部記憶體 DMatrix）
+    LGB：lgb.Sequence（memmap）→ Dataset，只保留分箱後資料
+- 無法增量訓練的 RF/ET/CAT 與集成階段改用 reservoir 抽樣（上限 RESERVOIR_ROWS）
+- 每個模型訓練期間以背景執行緒取樣 RSS，回報峰值
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, ClassifierMixin, clone
+
+# ui_shared 模組以頂層名稱匯入（串流讀取工具與另一個介面共用）；路徑統一由 shared_path 設定
+from .shared_path import ensure_ui_shared_path
+
+ensure_ui_shared_path()
+
+from archive_stream import open_source  # noqa: E402
+from csv_ingest import DEFAULT_CHUNK_BYTES, StreamingCsvReader  # noqa: E402
+
+DEFAULT_OUT_OF_CORE_SETTINGS: Dict[str, Any] = {
+    "ENABLED": False,
+    "CHUNK_ROWS": 200_000,          # Parquet / Arrow / npy 每個 chunk 的列數（CSV 以 CSV_CHUNK_BYTES 切塊）
+    "SAMPLE_ROWS": 100_000,         # 決定特徵欄位用的開頭樣本列數
+    "HOLDOUT_KEY": "idseq",         # 雜湊切分依據；檔案中沒有此欄時改以整列內容雜湊
+    "HOLDOUT_MAX_ROWS": 500_000,    # 留在記憶體中的 hold-out 上限（超過則 reservoir 抽樣）
+    "RESERVOIR_ROWS": 500_000,      # RF/ET/CAT、尋參與集成階段的訓練樣本上限
+    "EXTERNAL_MODELS": ["XGB", "LGB"],
+    "SAMPLE_MODELS": ["RF", "ET", "CAT"],  # 設為 [] 則只訓練外部記憶體模型
+    "KEEP_CACHE": False,            # 保留落地的訓練 chunk（除錯用）
+}
+
+# LGBMClassifier 參數中 lgb.train 不接受者
+_LGB_SKLEARN_ONLY = ("n_estimators", "importance_type", "class_weight", "silent")
+
+
+def resolve_out_of_core_settings(config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    user = (config or {}).get("OUT_OF_CORE") or {}
+    out = dict(DEFAULT_OUT_OF_CORE_SETTINGS)
+    if isinstance(user, dict):
+        out.update({k: v for k, v in user.items() if k in DEFAULT_OUT_OF_CORE_SETTINGS})
+    return out
+
+
+# ---------------- 記憶體量測 ----------------
+class PeakRSS:
+    """with 區段內以背景執行緒取樣行程 RSS，結束後 peak_mb 為區段內峰值。"""
+
+    def __init__(self, interval: float = 0.05) -> None:
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def current_mb() -> float:
+        try:
+            import psutil
+
+            return psutil.Process().memory_info().rss / 2 ** 20
+        except Exception:
+            import resource
+
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    def _poll(self) -> None:
+        while not self._stop.is_set():
+            self.peak_mb = max(self.peak_mb, self.current_mb())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "PeakRSS":
+        self.peak_mb = self.current_mb()
+        self._thread = threading.Thread(target=self._poll, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.peak_mb = max(self.peak_mb, self.current_mb())
+
+
+# ---------------- 讀取 ----------------
+def iter_frame_chunks(path: str, columns: Optional[Sequence[str]] = None,
+                      dtype: Optional[Dict[str, Any]] = None, chunk_rows: int = 200_000,
+                      chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> Iterator[pd.DataFrame]:
+    """依副檔名逐 chunk 讀取；columns 為 None 時讀全部欄位。"""
+    lower = str(path).lower()
+    if lower.endswith((".parquet", ".pq")):
+        import pyarrow.parquet as pq
+
+        pf = pq.ParquetFile(path)
+        for batch in pf.iter_batches(batch_size=int(chunk_rows), columns=list(columns) if columns else None):
+            yield _cast(batch.to_pandas(), dtype)
+    elif lower.endswith((".arrow", ".feather", ".ipc")):
+        import pyarrow as pa
+
+        reader = pa.ipc.open_file(pa.memory_map(path, "r"))
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            if columns:
+                batch = batch.select(list(columns))
+            yield _cast(batch.to_pandas(), dtype)
+    elif lower.endswith(".npy"):
+        # memmap：欄名放在同名 .columns.json
+        with open(path + ".columns.json", "r", encoding="utf-8") as f:
+            names = json.load(f)
+        arr = np.load(path, mmap_mode="r")
+        idx = [names.index(c) for c in columns] if columns else list(range(len(names)))
+        sel = [names[i] for i in idx]
+        for start in range(0, arr.shape[0], int(chunk_rows)):
+            block = np.asarray(arr[start:start + int(chunk_rows)][:, idx])
+            yield _cast(pd.DataFrame(block, columns=sel), dtype)
+    else:
+        reader = StreamingCsvReader(chunk_bytes=chunk_bytes, usecols=columns, dtype=dtype)
+        with open_source(path) as src:
+            yield from reader.iter_chunks(src)
+
+
+def _cast(df: pd.DataFrame, dtype: Optional[Dict[str, Any]]) -> pd.DataFrame:
+    if dtype:
+        for c, dt in dtype.items():
+            if c in df.columns:
+                df[c] = pd.to_numeric(df[c], errors="coerce").astype(dt)
+    return df
+
+
+def read_head(path: str, n_rows: int) -> pd.DataFrame:
+    """讀取開頭 n_rows 列（CSV 只讀到足夠的位元組即停）。"""
+    parts, got = [], 0
+    for chunk in iter_frame_chunks(path, chunk_rows=n_rows, chunk_bytes=4 * 1024 * 1024):
+        parts.append(chunk)
+        got += len(chunk)
+        if got >= n_rows:
+            break
+    df = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+    return df.iloc[:n_rows]
+
+
+# ---------------- 切分與抽樣 ----------------
+def holdout_mask(chunk: pd.DataFrame, key: Optional[str], frac: float, seed: int) -> np.ndarray:
+    """以 key 欄（預設 idseq）的雜湊決定 hold-out；結果只取決於該列本身，與 chunk 切法無關。"""
+    hash_key = f"{int(seed):016d}"[-16:]
+    if key and key in chunk.columns:
+        h = pd.util.hash_pandas_object(chunk[key].astype(str), index=False, hash_key=hash_key)
+    else:
+        h = pd.util.hash_pandas_object(chunk, index=False, hash_key=hash_key)
+    u = (h.to_numpy(dtype=np.uint64) >> np.uint64(11)).astype(np.float64) / float(2 ** 53)
+    return u < float(frac)
+
+
+class Reservoir:
+    """固定容量的均勻抽樣（Algorithm R，逐 chunk 向量化）。"""
+
+    def __init__(self, capacity: int, n_features: int, seed: int = 42) -> None:
+        self.capacity = int(capacity)
+        self.X = np.empty((self.capacity, n_features), dtype=np.float32)
+        self.y = np.empty(self.capacity, dtype=np.int64)
+        self.size = 0
+        self.n_seen = 0
+        self._rng = np.random.default_rng(seed)
+
+    def add(self, X: np.ndarray, y: np.ndarray) -> None:
+        n = len(X)
+        fill = min(self.capacity - self.size, n)
+        if fill > 0:
+            self.X[self.size:self.size + fill] = X[:fill]
+            self.y[self.size:self.size + fill] = y[:fill]
+            self.size += fill
+        if fill < n:
+            t = self.n_seen + np.arange(fill, n)
+            slot = (self._rng.random(n - fill) * (t + 1)).astype(np.int64)
+            keep = slot < self.capacity
+            self.X[slot[keep]] = X[fill:][keep]
+            self.y[slot[keep]] = y[fill:][keep]
+        self.n_seen += n
+
+    def data(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self.X[:self.size], self.y[:self.size]
+
+
+# ---------------- 落地的訓練資料 ----------------
+def _make_xgb_iter(store: "SpilledTrainSet"):
+    """xgboost DataIter：依序餵入落地的 memmap chunk（xgboost 為選用依賴，延後 import）。"""
+    import xgboost as xgb
+
+    class _ChunkIter(xgb.DataIter):
+        def __init__(self) -> None:
+            self._i = 0
+            super().__init__(cache_prefix=os.path.join(store.cache_dir, "xgb_cache"))
+
+        def next(self, input_data) -> bool:
+            if self._i >= len(store.paths):
+                return False
+            X = np.load(store.paths[self._i], mmap_mode="r")
+            y = np.load(store.label_paths[self._i])
+            input_data(data=np.asarray(X), label=y)
+            self._i += 1
+            return True
+
+        def reset(self) -> None:
+            self._i = 0
+
+    return _ChunkIter()
+
+
+class SpilledTrainSet:
+    """訓練側 chunk 以 float32 .npy 落地；標籤另存，方便 XGB/LGB 重複走訪。"""
+
+    def __init__(self, cache_dir: str) -> None:
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.paths: List[str] = []
+        self.label_paths: List[str] = []
+        self.n_rows = 0
+
+    def append(self, X: np.ndarray, y: np.ndarray) -> None:
+        i = len(self.paths)
+        xp = os.path.join(self.cache_dir, f"train_{i:05d}.npy")
+        yp = os.path.join(self.cache_dir, f"label_{i:05d}.npy")
+        np.save(xp, np.ascontiguousarray(X, dtype=np.float32))
+        np.save(yp, np.asarray(y))
+        self.paths.append(xp)
+        self.label_paths.append(yp)
+        self.n_rows += len(X)
+
+    def labels(self) -> np.ndarray:
+        return np.concatenate([np.load(p) for p in self.label_paths]) if self.label_paths else np.empty(0, np.int64)
+
+    def cleanup(self) -> None:
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+class OutOfCoreDataset:
+    """
+    單趟讀檔完成：特徵欄位決定、雜湊 hold-out、訓練 chunk 落地、reservoir 抽樣。
+    plan_columns(sample) → 回傳特徵欄位（與一般模式的 prepare_xy_with_report 同邏輯）
+    encode_y(series) → 轉成整數標籤（多分類時為 crlevel 編碼）
+    """
+
+    def __init__(self, path: str, settings: Dict[str, Any], config: Dict[str, Any], cache_dir: str,
+                 plan_columns: Callable[[pd.DataFrame], List[str]],
+                 encode_y: Callable[[pd.Series], pd.Series]) -> None:
+        self.path = path
+        self.settings = settings
+        self.config = config
+        self.target = config["TARGET_COLUMN"]
+        self.seed = int(config.get("RANDOM_STATE", 42))
+        self.valid_size = float(config.get("VALID_SIZE", 0.2))
+        self.store = SpilledTrainSet(cache_dir)
+        self.plan_columns = plan_columns
+        self.encode_y = encode_y
+        self.feature_cols: List[str] = []
+        self.classes_: np.ndarray = np.empty(0)
+        self.sample: Optional[Reservoir] = None
+        self.holdout: Optional[Reservoir] = None
+
+    def prepare(self) -> "OutOfCoreDataset":
+        s = self.settings
+        head = read_head(self.path, int(s["SAMPLE_ROWS"]))
+        self.feature_cols = list(self.plan_columns(head))
+        # bool 欄不指定 dtype（CSV 中為 True/False 字串），投影後再統一轉 float32
+        numeric = [c for c in self.feature_cols
+                   if pd.api.types.is_numeric_dtype(head[c]) and not pd.api.types.is_bool_dtype(head[c])]
+        del head
+
+        key = s.get("HOLDOUT_KEY")
+        columns = list(dict.fromkeys(self.feature_cols + [self.target] + ([key] if key else [])))
+        dtype = {c: "float32" for c in numeric if c != key}
+        nf = len(self.feature_cols)
+        self.sample = Reservoir(int(s["RESERVOIR_ROWS"]), nf, self.seed)
+        self.holdout = Reservoir(int(s["HOLDOUT_MAX_ROWS"]), nf, self.seed + 1)
+        classes = set()
+
+        for chunk in iter_frame_chunks(self.path, columns=[c for c in columns if c], dtype=dtype,
+                                       chunk_rows=int(s["CHUNK_ROWS"]),
+                                       chunk_bytes=int(self.config.get("CSV_CHUNK_BYTES", DEFAULT_CHUNK_BYTES))):
+            if key and key not in chunk.columns:
+                key = None
+            hold = holdout_mask(chunk, key, self.valid_size, self.seed)
+            X = chunk.reindex(columns=self.feature_cols).astype(np.float32).to_numpy()
+            X[~np.isfinite(X)] = 0.0
+            y = self.encode_y(chunk[self.target]).to_numpy()
+            del chunk
+            classes.update(np.unique(y).tolist())
+            self.holdout.add(X[hold], y[hold])
+            X_tr, y_tr = X[~hold], y[~hold]
+            if len(X_tr):
+                self.store.append(X_tr, y_tr)
+                self.sample.add(X_tr, y_tr)
+
+        self.classes_ = np.array(sorted(classes))
+        print(f"✅ Out-of-core 讀取完成：訓練 {self.store.n_rows}（{len(self.store.paths)} chunks 落地），"
+              f"hold-out {self.holdout.n_seen}（保留 {self.holdout.size}），訓練樣本 {self.sample.size}")
+        return self
+
+    def frame(self, which: str) -> Tuple[pd.DataFrame, pd.Series]:
+        res = self.sample if which == "sample" else self.holdout
+        X, y = res.data()
+        return pd.DataFrame(X, columns=self.feature_cols), pd.Series(y.astype(np.int32), name=self.target)
+
+    @property
+    def task_multiclass(self) -> bool:
+        return len(self.classes_) > 2
+
+    def label_index(self) -> np.ndarray:
+        """原始標籤 → 0..K-1 的查表（與 LGBMClassifier 內部的標籤編碼一致）。"""
+        lut = np.zeros(int(self.classes_.max()) + 1, dtype=np.int32)
+        lut[self.classes_.astype(np.int64)] = np.arange(len(self.classes_), dtype=np.int32)
+        return lut
+
+    # ---------------- 外部記憶體訓練 ----------------
+    def train_xgb(self, est):
+        import xgboost as xgb
+
+        params = {k: v for k, v in est.get_xgb_params().items() if v is not None}
+        # 與 XGBClassifier 一致：標籤即類別編號（多分類 num_class 取最大標籤 + 1）
+        if self.task_multiclass:
+            params.update(objective="multi:softprob", num_class=int(self.classes_.max()) + 1)
+        rounds = int(est.get_params().get("n_estimators") or 100)
+        max_bin = int(params.get("max_bin", 256))
+        params["max_bin"] = max_bin
+
+        def _train(p):
+            it = _make_xgb_iter(self.store)
+            if hasattr(xgb, "ExtMemQuantileDMatrix"):
+                dtrain = xgb.ExtMemQuantileDMatrix(it, max_bin=max_bin)
+            else:  # 舊版 xgboost：外部記憶體 DMatrix
+                dtrain = xgb.DMatrix(it)
+            return xgb.train(p, dtrain, num_boost_round=rounds)
+
+        try:
+            booster = _train(params)
+        except xgb.core.XGBoostError:
+            if params.get("device", "cpu") == "cpu":
+                raise
+            print("⚠️  XGBoost GPU 外部記憶體訓練失敗，改用 CPU。")
+            booster = _train({**params, "device": "cpu"})
+
+        model = type(est)(**est.get_params())
+        model.load_model(bytearray(booster.save_raw("json")))
+        # load_model 會把 booster 的 base_score 寫回 sklearn 參數；還原，避免集成階段 clone 後重訓沿用
+        model.set_params(base_score=est.get_params().get("base_score"))
+        return model
+
+    def train_lgb(self, est):
+        import lightgbm as lgb
+        from lightgbm.basic import LightGBMError
+
+        class _MemmapSeq(lgb.Sequence):
+            def __init__(self, path: str) -> None:
+                self.arr = np.load(path, mmap_mode="r")
+                self.batch_size = 65536
+
+            def __getitem__(self, idx):
+                # LightGBM 取樣分箱時要求 float64；每次只轉一個 batch
+                return np.asarray(self.arr[idx], dtype=np.float64)
+
+            def __len__(self) -> int:
+                return self.arr.shape[0]
+
+        gp = est.get_params()
+        params = {k: v for k, v in gp.items() if k not in _LGB_SKLEARN_ONLY and v is not None}
+        if self.task_multiclass:
+            params.update(objective="multiclass", num_class=len(self.classes_))
+        else:
+            params.update(objective="binary")
+        params.setdefault("verbosity", -1)
+        rounds = int(gp.get("n_estimators") or 100)
+        label = self.label_index()[self.store.labels()]
+
+        def _train(p):
+            ds = lgb.Dataset([_MemmapSeq(pth) for pth in self.store.paths], label=label,
+                             params={"max_bin": p.get("max_bin", 255), "verbosity": -1})
+            return lgb.train(p, ds, num_boost_round=rounds)
+
+        try:
+            booster = _train(params)
+        except LightGBMError:
+            print("⚠️  LightGBM GPU 失敗，改用 CPU 重新訓練。")
+            booster = _train({**params, "device_type": "cpu"})
+
+        # classes_ 取自完整 chunk 串流（reservoir 樣本可能缺少稀有類別）
+        return ExternalBoosterClassifier.from_booster(est, booster, self.classes_)
+
+
+class ExternalBoosterClassifier(ClassifierMixin, BaseEstimator):
+    """
+    外部記憶體訓練的 LightGBM booster 的 sklearn 風格預測包裝（不替換 LGBMClassifier 的內部屬性）。
+    booster 的標籤為 classes_ 的索引 0..K-1；可被 clone／重新 fit（集成階段以記憶體內樣本重訓 estimator）。
+    """
+
+    def __init__(self, estimator=None) -> None:
+        self.estimator = estimator
+
+    @classmethod
+    def from_booster(cls, estimator, booster, classes) -> "ExternalBoosterClassifier":
+        wrapper = cls(estimator=estimator)
+        wrapper.booster_ = booster
+        wrapper.classes_ = np.asarray(classes)
+        wrapper.n_features_in_ = int(booster.num_feature())
+        return wrapper
+
+    def fit(self, X, y, sample_weight=None):
+        est = clone(self.estimator)
+        if sample_weight is None:
+            est.fit(X, y)
+        else:
+            est.fit(X, y, sample_weight=sample_weight)
+        self.estimator_ = est
+        self.booster_ = est.booster_
+        self.classes_ = np.asarray(est.classes_)
+        self.n_features_in_ = int(est.n_features_in_)
+        return self
+
+    def predict_proba(self, X) -> np.ndarray:
+        inner = self.__dict__.get("estimator_")
+        if inner is not None:
+            return inner.predict_proba(X)
+        X_np = X.to_numpy() if hasattr(X, "to_numpy") else np.asarray(X)
+        raw = np.asarray(self.booster_.predict(X_np))
+        if raw.ndim == 1:  # binary：booster 輸出正類（索引 1）機率
+            return np.column_stack([1.0 - raw, raw])
+        return raw
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    @property
+    def feature_importances_(self) -> np.ndarray:
+        return self.booster_.feature_importance(importance_type="split")
+
+
+__all__ = [
+    "DEFAULT_OUT_OF_CORE_SETTINGS",
+    "ExternalBoosterClassifier",
+    "OutOfCoreDataset",
+    "PeakRSS",
+    "Reservoir",
+    "holdout_mask",
+    "iter_frame_chunks",
+    "resolve_out_of_core_settings",
+]
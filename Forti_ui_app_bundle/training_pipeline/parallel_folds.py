@@ -0,0 +1,159 @@
+# training_pipeline/parallel_folds.py
+"""
+交叉驗證折的平行訓練（DynamicSoftVoter OOF 初始化、DWBWrapper 共用）：
+- 以 joblib（loky 行程池）平行執行「模型 × 折」的 fit
+- X / y 只傳一次：大於 max_nbytes（預設 1M）的陣列由 joblib memmap 成唯讀共享檔，各 worker 以索引切片
+- 每個折模型的執行緒數 = CPU 數 / worker 數，避免 worker × 模型內部執行緒超量
+- 平行時折模型一律改用 CPU（GPU 參數改回 CPU），避免多個 worker 同時在同一張 GPU 上訓練
+- 預設 N_JOBS=1（依序執行、沿用模型原本的裝置設定）；需要時在 PARALLEL_FOLDS 設定 worker 數
+- 結果依任務順序放回（與完成先後無關），fold 切分與模型 random_state 固定 → 輸出可重現
+- progress(done, total, label) 在主行程、每完成一個折呼叫一次，供訓練 UI 顯示
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.base import clone
+
+ProgressCallback = Callable[[int, int, str], None]
+
+DEFAULT_PARALLEL_FOLD_SETTINGS: Dict[str, Any] = {
+    "N_JOBS": 1,             # worker 數；1 表示依序執行（與舊行為相同），-1 為 CPU 數
+}
+
+# 各函式庫表示「執行緒數」的參數名
+_THREAD_PARAMS = ("n_jobs", "thread_count", "nthread")
+# 各函式庫的 GPU 參數：(參數名, 判斷是否為 GPU 的函式, CPU 值)
+_GPU_PARAMS = (
+    ("device", lambda v: str(v).lower().startswith(("cuda", "gpu")), "cpu"),            # XGBoost ≥ 2
+    ("tree_method", lambda v: str(v).lower().startswith("gpu"), "hist"),                # XGBoost < 2
+    ("predictor", lambda v: str(v).lower().startswith("gpu"), "auto"),
+    ("device_type", lambda v: str(v).lower() in ("gpu", "cuda"), "cpu"),                # LightGBM
+    ("task_type", lambda v: str(v).upper() == "GPU", "CPU"),                           # CatBoost
+)
+
+
+def resolve_parallel_fold_settings(config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    user = (config or {}).get("PARALLEL_FOLDS") or {}
+    out = dict(DEFAULT_PARALLEL_FOLD_SETTINGS)
+    if isinstance(user, dict):
+        out.update({k: v for k, v in user.items() if k in DEFAULT_PARALLEL_FOLD_SETTINGS})
+    return out
+
+
+def effective_workers(n_jobs: Optional[int], n_tasks: int) -> int:
+    cpus = os.cpu_count() or 1
+    if n_jobs is None or n_jobs == 0:
+        n = 1
+    elif n_jobs < 0:
+        n = max(1, cpus + 1 + n_jobs)
+    else:
+        n = int(n_jobs)
+    return max(1, min(n, n_tasks))
+
+
+def limit_threads(est, n_threads: int):
+    """把估計器（與巢狀子模型）的執行緒參數設為 n_threads；不支援的參數略過。"""
+    try:
+        params = est.get_params(deep=True)
+    except Exception:
+        return est
+    update = {k: n_threads for k in params if k.rsplit("__", 1)[-1] in _THREAD_PARAMS}
+    if not update and type(est).__module__.startswith("catboost"):
+        # CatBoost 的 get_params 只列出使用者設定過的參數
+        update = {"thread_count": n_threads}
+    for key, value in update.items():
+        try:
+            est.set_params(**{key: value})
+        except Exception:
+            pass
+    return est
+
+
+def force_cpu(est):
+    """把估計器（與巢狀子模型）的 GPU 參數改回 CPU；未使用 GPU 的參數不變。"""
+    try:
+        params = est.get_params(deep=True)
+    except Exception:
+        return est
+    for key, value in params.items():
+        name = key.rsplit("__", 1)[-1]
+        for param, is_gpu, cpu_value in _GPU_PARAMS:
+            if name == param and value is not None and is_gpu(value):
+                try:
+                    est.set_params(**{key: cpu_value})
+                except Exception:
+                    pass
+    return est
+
+
+def _run_fold(fn: Callable, est, X, y, tr, va, sample_weight, n_threads: Optional[int], extra: Any):
+    est = clone(est)
+    if n_threads is not None:
+        # 平行執行：限制執行緒數，並避免多個 worker 同時使用同一張 GPU
+        est = force_cpu(limit_threads(est, n_threads))
+    return fn(est, X, y, tr, va, sample_weight, extra)
+
+
+def _run_indexed(i: int, *args):
+    # X / y 以參數傳入（而非閉包），joblib 才能對大陣列做 memmap 共享
+    return i, _run_fold(*args)
+
+
+def run_folds(
+    fn: Callable,
+    tasks: Sequence[Tuple[Any, np.ndarray, np.ndarray, Any]],
+    X: np.ndarray,
+    y: np.ndarray,
+    sample_weight: Optional[np.ndarray] = None,
+    n_jobs: Optional[int] = 1,
+    progress: Optional[ProgressCallback] = None,
+    labels: Optional[Sequence[str]] = None,
+    max_nbytes: Any = "1M",
+) -> List[Any]:
+    """
+    平行執行 fn(est, X, y, tr, va, sample_weight, extra)，tasks 為 (est, tr, va, extra) 清單。
+    est 在 worker 內 clone（呼叫端的物件不被修改）；回傳值順序與 tasks 相同。
+    """
+    total = len(tasks)
+    labels = list(labels) if labels is not None else [f"fold {i + 1}/{total}" for i in range(total)]
+    workers = effective_workers(n_jobs, total)
+    results: List[Any] = [None] * total
+
+    if workers == 1:
+        # 依序執行：不改動模型的執行緒設定
+        for i, (est, tr, va, extra) in enumerate(tasks):
+            results[i] = _run_fold(fn, est, X, y, tr, va, sample_weight, None, extra)
+            if progress:
+                progress(i + 1, total, labels[i])
+        return results
+
+    n_threads = max(1, (os.cpu_count() or 1) // workers)
+    par = Parallel(n_jobs=workers, backend="loky", max_nbytes=max_nbytes, mmap_mode="r",
+                   return_as="generator_unordered")
+    jobs = (
+        delayed(_run_indexed)(i, fn, est, X, y, tr, va, sample_weight, n_threads, extra)
+        for i, (est, tr, va, extra) in enumerate(tasks)
+    )
+    done = 0
+    for i, res in par(jobs):
+        results[i] = res
+        done += 1
+        if progress:
+            progress(done, total, labels[i])
+    return results
+
+
+__all__ = [
+    "DEFAULT_PARALLEL_FOLD_SETTINGS",
+    "ProgressCallback",
+    "effective_workers",
+    "force_cpu",
+    "limit_threads",
+    "resolve_parallel_fold_settings",
+    "run_folds",
+]
@@ -23,6 +23,17 @@ try:
     from .model_builder import ModelBuilder          # build_models(X, y, task=...)
     from .trainer import Trainer                     # train(models, X, y) -> dict
     from .evaluator import Evaluator                 # evaluate(...)
+    from .warm_start import feature_set_hash, find_warm_start, resolve_warm_start_settings, write_run_meta
+    from .out_of_core import OutOfCoreDataset, PeakRSS, resolve_out_of_core_settings
+    from .incremental import (check_compatible, continue_training, find_continue_source, load_base_models,
+                              resolve_continue_training_settings, save_base_models)
+    from .dedup import compress_duplicates, resolve_dedup_settings
+    from .parallel_folds import resolve_parallel_fold_settings
+    from .eval_context import EvalContext
+    from .distillation import distill, resolve_distillation_settings
+    from .cascade import build_cascade, resolve_cascade_settings
+    from .downsampling import (PriorCorrectedClassifier, binary_metrics, downsample_negatives,
+                               resolve_downsampling_settings)
 except ModuleNotFoundError as exc:  # pragma: no cover - package-relative fallback
     if exc.name != "training_pipeline":
         raise
@@ -32,6 +43,17 @@ except ModuleNotFoundError as exc:  # pragma: no cover - package-relative fallba
     from .model_builder import ModelBuilder
     from .trainer import Trainer
     from .evaluator import Evaluator
+    from .warm_start import feature_set_hash, find_warm_start, resolve_warm_start_settings, write_run_meta
+    from .out_of_core import OutOfCoreDataset, PeakRSS, resolve_out_of_core_settings
+    from .incremental import (check_compatible, continue_training, find_continue_source, load_base_models,
+                              resolve_continue_training_settings, save_base_models)
+    from .dedup import compress_duplicates, resolve_dedup_settings
+    from .parallel_folds import resolve_parallel_fold_settings
+    from .eval_context import EvalContext
+    from .distillation import distill, resolve_distillation_settings
+    from .cascade import build_cascade, resolve_cascade_settings
+    from .downsampling import (PriorCorrectedClassifier, binary_metrics, downsample_negatives,
+                               resolve_downsampling_settings)
 
 # config：載入預設組態
 try:
@@ -129,6 +151,14 @@ class TrainingPipeline:
 
         self.evaluator = Evaluator(task=("binary" if task_type == "binary" else "multiclass"))
         self.out_dir: str | None = None
+        self.feature_cols: List[str] = []
+        self.tuned_params: Dict[str, dict] | None = None
+        self.dedup_stats: Dict[str, Any] | None = None
+        self.downsampling_stats: Dict[str, Any] | None = None
+        self.train_weight = None              # 負樣本降採樣（MODE="weight"）的 importance weight
+        self._full_train: Tuple[Any, Any] | None = None
+        # 折平行訓練進度回呼 (done, total, label)；訓練 UI 可設定以顯示進度
+        self.progress_callback = None
 
     # ---------- helpers ----------
     def _say(self, msg: str) -> None:
@@ -206,12 +236,16 @@ class TrainingPipeline:
         print("📝 超參數覆寫片段已輸出：optuna/overwrite_config_MODEL_PARAMS.txt")
 
     # ---------- 資料處理 ----------
-    def _load_and_split(self, file_path: str):
-        dl = DataLoader(self.config)
+    def _load_and_split(self, file_path: str, rolling: bool = False):
+        dl = DataLoader({**self.config, "QUARANTINE_DIR": os.path.join(self.out_dir, "reports")})
         df = dl.load_data(file_path)  # ✅ 第一次訊息在 DataLoader 內印
+        if dl.ingest_report:
+            self._dump_json(os.path.join(self.out_dir, "reports", "ingest_report.json"), dl.ingest_report)
 
         # 取得欄位差異報告並顯示（第二次訊息同時在 DataLoader 內印摘要）
         X, y, report = DataLoader.prepare_xy_with_report(df, self.config, self.task_type)
+        self.feature_cols = list(report.get("final_cols", X.columns))
+        del df  # 原始寬表不再需要，及早釋放
         if self.task_type == "multiclass":
             y = encode_crlevel_series(y)
             save_label_mapping(self.out_dir)
@@ -220,9 +254,13 @@ class TrainingPipeline:
 
         test_size = float(self.config.get("VALID_SIZE", 0.2))
         random_state = int(self.config.get("RANDOM_STATE", 42))
-        X_tr, X_va, y_tr, y_va = train_test_split(
-            X, y, test_size=test_size, random_state=random_state, stratify=y
-        )
+        if rolling:
+            # 滾動 hold-out：不打亂，取檔案最後（最新）的 VALID_SIZE 比例做驗證
+            X_tr, X_va, y_tr, y_va = train_test_split(X, y, test_size=test_size, shuffle=False)
+        else:
+            X_tr, X_va, y_tr, y_va = train_test_split(
+                X, y, test_size=test_size, random_state=random_state, stratify=y
+            )
 
         # 第三次訊息：分集完成
         print(f"✅ 分割完成：訓練 {len(X_tr)}、驗證 {len(X_va)}")
@@ -232,31 +270,254 @@ class TrainingPipeline:
         y_tr = y_tr.reset_index(drop=True)
         y_va = y_va.reset_index(drop=True)
 
+        # 負樣本降採樣：只作用在訓練集（分割後），驗證集保持原始分布
+        ds = resolve_downsampling_settings(self.config)
+        if ds["ENABLED"] and self.task_type == "binary":
+            if ds["COMPARE_FULL"]:
+                self._full_train = (X_tr, y_tr)
+            X_tr, y_tr, self.train_weight, stats = downsample_negatives(
+                X_tr, y_tr, ds["RATE"], seed=random_state, mode=ds["MODE"],
+                negative_label=int(ds["NEGATIVE_LABEL"]),
+            )
+            self.downsampling_stats = stats
+            print(f"🔻 負樣本降採樣（{stats['mode']}，RATE={stats['rate']}）：訓練 {stats['rows_before']} → "
+                  f"{stats['rows_after']} 列（負樣本 {stats['negatives_before']} → {stats['negatives_after']}）")
+
         return X_tr, X_va, y_tr, y_va
 
-    def _build_models(self, X_train, y_train) -> Dict[str, Any]:
+    def _train_out_of_core(self, file_path: str, settings: Dict[str, Any]):
+        """
+        資料大於記憶體時的訓練流程：
+        - 單趟讀檔：idseq 雜湊切 hold-out、訓練 chunk 落地、reservoir 抽樣
+        - XGB/LGB 以外部記憶體訓練全量訓練資料；RF/ET/CAT 與尋參用 reservoir 樣本
+        - 每個模型回報訓練期間的峰值 RSS（reports/out_of_core_report.json）
+        """
+        def _plan(sample):
+            X, _, report = DataLoader.prepare_xy_with_report(sample, self.config, self.task_type)
+            return list(report.get("final_cols", X.columns))
+
+        if self.task_type == "multiclass":
+            encode_y = encode_crlevel_series
+            save_label_mapping(self.out_dir)
+        else:
+            encode_y = lambda s: s.astype("int32")  # noqa: E731
+
+        ds = OutOfCoreDataset(file_path, settings, self.config, os.path.join(self.out_dir, "ooc_cache"),
+                              plan_columns=_plan, encode_y=encode_y).prepare()
+        self.feature_cols = ds.feature_cols
+        X_train, y_train = ds.frame("sample")
+        X_valid, y_valid = ds.frame("holdout")
+
+        models = self._build_models(X_train, y_train)
+        external = {m.upper() for m in settings["EXTERNAL_MODELS"]}
+        on_sample = {m.upper() for m in settings["SAMPLE_MODELS"]}
+        trainer = Trainer()
+        trained: Dict[str, Any] = {}
+        per_model: Dict[str, Any] = {}
+        try:
+            for name, est in models.items():
+                key = name.upper()
+                if key in external and key in ("XGB", "LGB"):
+                    mode, rows = "external_memory", ds.store.n_rows
+                elif key in on_sample or key in external:
+                    mode, rows = "reservoir_sample", len(X_train)
+                else:
+                    print(f"⏭️  Out-of-core：略過 {name}（未列於 EXTERNAL_MODELS / SAMPLE_MODELS）")
+                    continue
+                print(f"🏋️  訓練模型：{name}（{mode}，{rows} 筆）")
+                t0 = time.time()
+                with PeakRSS() as rss:
+                    if mode == "reservoir_sample":
+                        trained[name] = trainer._fit_one(name, est, X_train, y_train)
+                    elif key == "XGB":
+                        trained[name] = ds.train_xgb(est)
+                    else:
+                        trained[name] = ds.train_lgb(est)
+                per_model[name] = {"mode": mode, "rows": int(rows),
+                                   "peak_rss_mb": round(rss.peak_mb, 1), "seconds": round(time.time() - t0, 2)}
+                print(f"   ↳ 峰值 RSS {rss.peak_mb:.1f} MB")
+        finally:
+            if not settings["KEEP_CACHE"]:
+                ds.store.cleanup()
+
+        self._dump_json(os.path.join(self.out_dir, "reports", "out_of_core_report.json"), {
+            "train_rows": int(ds.store.n_rows),
+            "train_chunks": len(ds.store.paths),
+            "holdout_rows": int(ds.holdout.n_seen),
+            "holdout_kept": int(ds.holdout.size),
+            "reservoir_rows": int(ds.sample.size),
+            "models": per_model,
+        })
+        return X_train, X_valid, y_train, y_valid, trained
+
+    def _find_continue_source(self, settings: Dict[str, Any]) -> str | None:
+        """續訓來源：指定的 SOURCE_DIR（須同任務＋同特徵集），否則自 OUTPUT_DIR 找最近一次相容產出。"""
+        fhash = feature_set_hash(self.feature_cols)
+        src = settings.get("SOURCE_DIR")
+        if src:
+            if check_compatible(src, self.task_type, fhash):
+                return src
+            print(f"⚠️  續訓來源 {src} 與本次任務／特徵集不相容，改為完整訓練。")
+            return None
+        found = find_continue_source(self.config.get("OUTPUT_DIR", "./artifacts"), self.task_type, fhash,
+                                     exclude_dir=self.out_dir)
+        if not found:
+            print("🔁 續訓：找不到相容且含基模型的上次產出，改為完整訓練。")
+        return found
+
+    def _find_warm_start(self) -> Dict[str, dict] | None:
+        """找最近一次同任務、同特徵集的產出，回傳其最佳參數（未啟用或找不到則 None）。"""
+        if not (self.optuna_enabled and self.optimize_base):
+            return None
+        if not resolve_warm_start_settings(self.config)["ENABLED"]:
+            return None
+        found = find_warm_start(
+            self.config.get("OUTPUT_DIR", "./artifacts"),
+            self.task_type,
+            feature_set_hash(self.feature_cols),
+            exclude_dir=self.out_dir,
+        )
+        if not found:
+            print("♨️  Warm-start：找不到相容的上次產出（同任務＋同特徵集），改為冷啟動。")
+            return None
+        print(f"♨️  Warm-start 來源：{found['dir']}")
+        return found["params"]
+
+    def _compress_duplicates(self, X_train, y_train, sample_weight=None):
+        """DEDUP 啟用時合併訓練集中完全相同的列，回傳 (X, y, sample_weight)；未啟用或效益不足時沿用傳入的 sample_weight。"""
+        settings = resolve_dedup_settings(self.config)
+        if not settings["ENABLED"]:
+            return X_train, y_train, sample_weight
+        X_c, y_c, weight, stats = compress_duplicates(X_train, y_train, sample_weight)
+        stats["applied"] = stats["ratio"] >= float(settings["MIN_RATIO"])
+        self.dedup_stats = stats
+        if not stats["applied"]:
+            print(f"🧮 重複列壓縮：{stats['rows_before']} → {stats['rows_after']}（效益不足，不套用）")
+            return X_train, y_train, sample_weight
+        print(f"🧮 重複列壓縮：{stats['rows_before']} → {stats['rows_after']} 列"
+              f"（×{stats['ratio']:.1f}，最大權重 {stats['max_weight']}）")
+        return X_c, y_c, weight
+
+    def _prior_correct(self, trained: Dict[str, Any]) -> Dict[str, Any]:
+        """MODE="prior" 時把降採樣資料上訓練的模型包成 PriorCorrectedClassifier（已包過的不重複包）。"""
+        ds = resolve_downsampling_settings(self.config)
+        if not self.downsampling_stats or ds["MODE"] != "prior":
+            return trained
+        return {
+            n: m if isinstance(m, PriorCorrectedClassifier)
+            else PriorCorrectedClassifier.from_fitted(m, ds["RATE"], int(ds["NEGATIVE_LABEL"]))
+            for n, m in trained.items()
+        }
+
+    def _compare_full_training(self, models: Dict[str, Any], trained: Dict[str, Any],
+                               X_valid, y_valid) -> Dict[str, Any]:
+        """COMPARE_FULL：以未降採樣的訓練集重訓同組模型，記錄訓練加速倍率與驗證指標差異。"""
+        from sklearn.base import clone
+
+        thr = float(self.config.get("ENSEMBLE_SETTINGS", {}).get("THRESHOLD", 0.5))
+        X_full, y_full = self._full_train
+        print(f"\n=== 降採樣對照：全量訓練（{len(X_full)} 列）===")
+        t0 = time.perf_counter()
+        full = Trainer().train({n: clone(m) for n, m in models.items()}, X_full, y_full)
+        full_seconds = time.perf_counter() - t0
+
+        per_model = {}
+        for name, model in trained.items():
+            if name not in full:
+                continue
+            ds_m = binary_metrics(model, X_valid, y_valid, thr)
+            full_m = binary_metrics(full[name], X_valid, y_valid, thr)
+            per_model[name] = {
+                "downsampled": ds_m,
+                "full": full_m,
+                "delta": {k: ds_m[k] - full_m[k] for k in ds_m if k != "positive_rate"},
+            }
+            print(f"   {name}：AUC {full_m['auc']:.4f} → {ds_m['auc']:.4f}，"
+                  f"F1@{thr} {full_m['f1']:.4f} → {ds_m['f1']:.4f}")
+        self._full_train = None
+        return {"full_train_seconds": full_seconds, "metrics": per_model}
+
+    def _distill(self, teacher, X_train, y_train, X_valid, y_valid, sample_weight,
+                 eval_ctx: "EvalContext") -> Tuple[Any, Dict[str, Any] | None]:
+        """DISTILLATION 啟用時把最終集成蒸餾成單一 GBDT，另存為 models/student_<KIND>.joblib。"""
+        settings = resolve_distillation_settings(self.config)
+        if not settings["ENABLED"] or teacher is None or not hasattr(teacher, "predict_proba"):
+            return None, None
+        from joblib import dump
+
+        print("\n=== 集成蒸餾（Distillation）===")
+        try:
+            out = distill(teacher, X_train, y_train, X_valid, y_valid, self.task_type, settings,
+                          sample_weight=sample_weight, teacher_valid_proba=eval_ctx.proba(teacher),
+                          seed=int(self.config.get("RANDOM_STATE", 42)))
+        except Exception as e:
+            print(f"⚠️ 蒸餾失敗，略過：{e}")
+            return None, {"error": str(e)}
+        report = out["report"]
+        if out["student"] is not None:
+            path = os.path.join(self.out_dir, "models", f"student_{str(settings['STUDENT']).upper()}.joblib")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            dump(out["student"], path)
+            report["artifact"] = path
+            print(f"💾 學生模型已保存：{path}")
+        self._dump_json(os.path.join(self.out_dir, "reports", "distillation_report.json"), self._np_to_py(report))
+        return out["student"], report
+
+    def _cascade(self, model, X_train, y_train, X_valid, y_valid, sample_weight,
+                 eval_ctx: "EvalContext") -> Tuple[Any, Dict[str, Any] | None]:
+        """CASCADE 啟用時訓練 gate 模型並在驗證集校準分流門檻，另存為 models/cascade.joblib。"""
+        settings = resolve_cascade_settings(self.config)
+        if not settings["ENABLED"] or model is None:
+            return None, None
+        from joblib import dump
+
+        print("\n=== 串接推論（Cascade gate）===")
+        try:
+            out = build_cascade(model, X_train, y_train, X_valid, y_valid, self.task_type, settings,
+                                sample_weight=sample_weight, heavy_valid_labels=eval_ctx.labels(model),
+                                seed=int(self.config.get("RANDOM_STATE", 42)))
+        except Exception as e:
+            print(f"⚠️ 串接推論建立失敗，略過：{e}")
+            return None, {"error": str(e)}
+        report = out["report"]
+        path = os.path.join(self.out_dir, "models", "cascade.joblib")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        dump(out["cascade"], path)
+        report["artifact"] = path
+        print(f"💾 串接模型已保存：{path}")
+        self._dump_json(os.path.join(self.out_dir, "reports", "cascade_report.json"), self._np_to_py(report))
+        return out["cascade"], report
+
+    def _build_models(self, X_train, y_train, sample_weight=None) -> Dict[str, Any]:
         mb = ModelBuilder(
             config=self.config,
             use_optuna=(self.optuna_enabled and self.optimize_base and self.use_tuned_for_training),
             max_trials_xgb=int(self.config.get("MAX_TRIALS_XGB", 15)),
             max_trials_others=int(self.config.get("MAX_TRIALS_OTHERS", 10)),
             enable_pruner=True,
+            warm_start=self._find_warm_start(),
         )
 
         # Case 1：使用 Optuna 結果建模（內部自動 run_optuna）
         task_name = "binary" if self.task_type == "binary" else "multiclass"
 
         if self.optuna_enabled and self.optimize_base and self.use_tuned_for_training:
-            models = mb.build_models(X_train, y_train, task=task_name)
+            models = mb.build_models(X_train, y_train, task=task_name, sample_weight=sample_weight)
+            self.tuned_params = mb.study_params_ or None  # 只記錄 study 實際產出的參數
             return models
 
         # Case 2：執行 Optuna（僅記錄、不套用），再用 config 建模
         if self.optuna_enabled and self.optimize_base and (not self.use_tuned_for_training):
+            # ModelBuilder 以 use_optuna=False 建立（建模用 config）；尋參期間暫時開啟，否則 run_optuna 只會回傳 config 參數
+            mb.use_optuna = True
             try:
-                _ = mb.run_optuna(X_train, y_train, self.task_type)  # 產出 best_params（僅紀錄）
+                mb.run_optuna(X_train, y_train, self.task_type, sample_weight=sample_weight)
+                self.tuned_params = mb.study_params_ or None  # 僅紀錄
                 print("🧪 Optuna 已執行（僅記錄結果，不套用於後續訓練）。")
             except Exception as e:
                 print(f"⚠️ Optuna 執行失敗（僅記錄階段），將跳過：{e}")
+            finally:
+                mb.use_optuna = False
             models = mb.build_models(X_train, y_train, task=task_name)
             return models
 
@@ -272,17 +533,49 @@ class TrainingPipeline:
     def run(self, file_path: str) -> Dict[str, Any]:
         self.out_dir = self._prepare_artifacts_dir()
 
-        X_train, X_valid, y_train, y_valid = self._load_and_split(file_path)
-
-        models = self._build_models(X_train, y_train)
-
-        trainer = Trainer()
-        trained = trainer.train(models, X_train, y_train)
+        sample_weight = None
+        ooc = resolve_out_of_core_settings(self.config)
+        if ooc["ENABLED"]:
+            # 集成階段與單模型評估改用 reservoir 樣本與 hold-out 樣本
+            X_train, X_valid, y_train, y_valid, trained = self._train_out_of_core(file_path, ooc)
+        else:
+            cont = resolve_continue_training_settings(self.config)
+            X_train, X_valid, y_train, y_valid = self._load_and_split(file_path, rolling=cont["ENABLED"])
+            # 只壓縮訓練集；驗證集維持原樣
+            X_train, y_train, sample_weight = self._compress_duplicates(X_train, y_train, self.train_weight)
+
+            source = self._find_continue_source(cont) if cont["ENABLED"] else None
+            if source:
+                print(f"🔁 續訓來源：{source}")
+                trained, decisions = continue_training(
+                    load_base_models(source), X_train, y_train, X_valid, y_valid, self.task_type, cont,
+                    sample_weight=sample_weight,
+                )
+                self._dump_json(os.path.join(self.out_dir, "reports", "continue_training.json"),
+                                {"source": source, "settings": cont, "decisions": self._np_to_py(decisions)})
+            else:
+                models = self._build_models(X_train, y_train, sample_weight)
+
+                trainer = Trainer()
+                t0 = time.perf_counter()
+                trained = trainer.train(models, X_train, y_train, sample_weight=sample_weight)
+                if self.downsampling_stats:
+                    self.downsampling_stats["train_seconds"] = time.perf_counter() - t0
+                trained = self._prior_correct(trained)
+                if self._full_train is not None:
+                    cmp = self._compare_full_training(models, trained, X_valid, y_valid)
+                    cmp["speedup"] = cmp["full_train_seconds"] / max(self.downsampling_stats["train_seconds"], 1e-9)
+                    self.downsampling_stats.update(cmp)
+
+        if self.config.get("SAVE_BASE_MODELS") or resolve_continue_training_settings(self.config)["ENABLED"]:
+            save_base_models(self.out_dir, trained)
 
         print("\n=== 單模型評估 ===\n")
+        # 同一份驗證集的機率快取：單模型評估、集成搜尋、子模型報告共用，每個模型只推論一次
+        eval_ctx = EvalContext(X_valid, y_valid)
         single_results = {}
         for name, model in trained.items():
-            res = self.evaluator.evaluate(model, X_valid, y_valid, name=name)
+            res = self.evaluator.evaluate(model, X_valid, y_valid, name=name, context=eval_ctx)
             single_results[name] = res
         single_results_py = {n: self._np_to_py(r) for n, r in single_results.items()}
         self._dump_json(os.path.join(self.out_dir, "reports", "single_model_results.json"), single_results_py)
@@ -290,6 +583,8 @@ class TrainingPipeline:
         # 保存基模型（依設定；預設不存）與最佳參數覆寫片段（若啟用基模型優化）
         if self.optuna_enabled and self.optimize_base:
             self._export_config_overwrite_snippet(trained)
+        # 任務／特徵集雜湊／尋參結果：供下次訓練判斷能否 warm-start
+        write_run_meta(self.out_dir, self.task_type, self.feature_cols, self.tuned_params)
 
         # === 集成（Ensemble） ===
         print("\n=== 集成（Ensemble）階段 ===")
@@ -304,6 +599,9 @@ class TrainingPipeline:
                 out_dir=self.out_dir,
                 # ★ 傳遞旗標（目前 ComboOptimizer 未實作 Optuna 介面，照實提示）
                 use_optuna=(self.optuna_enabled and self.optimize_ensemble and self.use_tuned_for_training),
+                sample_weight=sample_weight,
+                eval_context=eval_ctx,
+                progress_callback=self.progress_callback,
             )
             if self.optuna_enabled and self.optimize_ensemble:
                 if self.use_tuned_for_training:
@@ -320,17 +618,32 @@ class TrainingPipeline:
                 init_cv=int(self.config.get("STACK_CV", 5)),
                 eta=0.2,
                 verbose=False,
-                n_jobs=None
+                n_jobs=None,
+                fold_n_jobs=resolve_parallel_fold_settings(self.config)["N_JOBS"],
             )
-            dmw.fit(X_train, y_train)
-            _ = self.evaluator.evaluate(dmw, X_valid, y_valid, name="DMW-Ensemble")
+            dmw.fit(X_train, y_train, sample_weight=sample_weight, progress_callback=self.progress_callback)
+            _ = self.evaluator.evaluate(dmw, X_valid, y_valid, name="DMW-Ensemble", context=eval_ctx)
             ensemble_results = {"model": dmw, "settings": {"DMW": True}, "metrics": {}}
+        student, distill_report = self._distill(ensemble_results.get("model"), X_train, y_train,
+                                                X_valid, y_valid, sample_weight, eval_ctx)
+        cascade, cascade_report = self._cascade(ensemble_results.get("model"), X_train, y_train,
+                                                X_valid, y_valid, sample_weight, eval_ctx)
+        ctx_stats = eval_ctx.stats()
+        print(f"🧠 驗證集機率快取：推論 {ctx_stats['misses']} 次、重用 {ctx_stats['hits']} 次")
         ensemble_metrics_py = self._np_to_py(ensemble_results.get("metrics", {}))
         summary = {
             "task_type": self.task_type,
             "single_models": single_results_py,
             "ensemble": ensemble_metrics_py,
         }
+        if self.dedup_stats:
+            summary["dedup"] = self.dedup_stats
+        if self.downsampling_stats:
+            summary["downsampling"] = self._np_to_py(self.downsampling_stats)
+        if distill_report:
+            summary["distillation"] = self._np_to_py({k: v for k, v in distill_report.items() if k != "candidates"})
+        if cascade_report:
+            summary["cascade"] = self._np_to_py(cascade_report)
         self._dump_json(os.path.join(self.out_dir, "reports", "evaluation_summary.json"), summary)
 
         print(f"📦 產出已保存於：{self.out_dir}")
@@ -339,5 +652,7 @@ class TrainingPipeline:
             "single_models": trained,
             "single_results": single_results,
             "ensemble": ensemble_results,
+            "student": student,
+            "cascade": cascade,
             "artifacts_dir": self.out_dir,
         }
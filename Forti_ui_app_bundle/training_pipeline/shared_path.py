@@ -0,0 +1,29 @@
+# training_pipeline/shared_path.py
+"""
+ui_shared 模組路徑的唯一設定點：
+- ui_shared 的模組（csv_ingest、cascade_inference 等）兩個品牌的監控端都以頂層名稱匯入
+  （例如 ``import cascade_inference``），由各自的 monitor_jobs / notifier 把 ui_shared 加入 sys.path
+- 訓練端必須用同一個頂層名稱匯入：pickle 依類別的 __module__ 記錄路徑，訓練時存成
+  ``cascade_inference.CascadeClassifier``，推論端才能以相同名稱載回；改用
+  ``ui_shared.cascade_inference`` 匯入會讓兩端各有一份類別、模型檔也無法互通
+- 需要 ui_shared 的訓練模組一律 ``from .shared_path import ensure_ui_shared_path`` 後再匯入，
+  不要在各模組各自改寫 sys.path
+"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+UI_SHARED_DIR = Path(__file__).resolve().parents[2] / "ui_shared"
+
+
+def ensure_ui_shared_path() -> None:
+    """把 ui_shared 加入 sys.path（已存在時不重複加入）。"""
+    if str(UI_SHARED_DIR) not in sys.path:
+        sys.path.insert(0, str(UI_SHARED_DIR))
+
+
+ensure_ui_shared_path()
+
+__all__ = ["UI_SHARED_DIR", "ensure_ui_shared_path"]
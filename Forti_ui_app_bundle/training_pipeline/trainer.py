@@ -27,32 +27,34 @@ class Trainer:
         pass
 
     # ===================== Public API =====================
-    def train(self, models: Dict[str, Any], X, y) -> Dict[str, Any]:
+    def train(self, models: Dict[str, Any], X, y, sample_weight=None) -> Dict[str, Any]:
         fitted = {}
         for name, est in models.items():
             print(f"🏋️  訓練模型：{name}")
-            fitted[name] = self._fit_one(name, est, X, y)
+            fitted[name] = self._fit_one(name, est, X, y, sample_weight=sample_weight)
         return fitted
 
     # ===================== Internal Helpers =====================
-    def _fit_one(self, name: str, est, X, y):
+    def _fit_one(self, name: str, est, X, y, sample_weight=None):
         """
         - 統一先做資料健檢與清理（對所有模型一致）。
+        - sample_weight：重複列壓縮後的出現次數（None 表示每列權重 1）。
         """
         X_pre, y_clean = self._sanitize_xy(X, y)
-        return self._fit_silent(est, X_pre, y_clean)
+        return self._fit_silent(est, X_pre, y_clean, sample_weight)
 
-    def _fit_silent(self, est, X, y):
+    def _fit_silent(self, est, X, y, sample_weight=None):
         # 維持 sklearn 風格，避免雜訊輸出
+        fit_kw = {} if sample_weight is None else {"sample_weight": np.asarray(sample_weight)}
         try:
-            est.fit(X, y)
+            est.fit(X, y, **fit_kw)
             return est
         except LightGBMError:
             if hasattr(est, "set_params"):
                 try:
                     print("⚠️  LightGBM GPU 失敗，改用 CPU 重新訓練。")
                     est.set_params(device_type="cpu")
-                    est.fit(X, y)
+                    est.fit(X, y, **fit_kw)
                     return est
                 except LightGBMError:
                     pass
@@ -77,6 +79,9 @@ class Trainer:
         # dtype 處理
         if Xv.dtype != np.float32:
             Xv = Xv.astype(np.float32, copy=False)
+        elif not Xv.flags.writeable:
+            # pandas copy-on-write 下 .values 為唯讀視圖，下方原地清理前先複製
+            Xv = Xv.copy()
 
         # 無窮值 -> NaN -> 0
         Xv[~np.isfinite(Xv)] = np.nan
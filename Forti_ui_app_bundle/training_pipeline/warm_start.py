@@ -0,0 +1,199 @@
+# training_pipeline/warm_start.py
+"""
+Warm-start 尋參工具：
+- 每次訓練在 optuna/run_meta.json 記錄 task_type、特徵集雜湊與尋參結果
+- 下一次訓練自 OUTPUT_DIR 找出「最近一次、同任務、同特徵集」的產出
+- WarmSearchSpace：以上次最佳參數為中心縮小搜尋範圍，先 enqueue 中心點，
+  第一個 trial 結束後再 enqueue 鄰近點，讓每週重訓只需少量 trial
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+RUN_META_FILE = "run_meta.json"
+COMPACT_PARAMS_FILE = "best_params_compact.json"
+
+DEFAULT_WARM_START_SETTINGS: Dict[str, Any] = {
+    "ENABLED": False,
+    "TRIALS": 8,          # warm-start 時每個模型的 trial 上限（仍不超過 MAX_TRIALS_*）
+    "N_NEIGHBOURS": 3,    # 中心點之外額外 enqueue 的鄰近點數
+    "SHRINK": 0.25,       # 搜尋範圍縮為原範圍的比例（log 尺度則以倍率計）
+    "JITTER": 0.3,        # 鄰近點相對於縮小後範圍的擾動幅度
+}
+
+
+def resolve_warm_start_settings(config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    user = (config or {}).get("WARM_START") or {}
+    out = dict(DEFAULT_WARM_START_SETTINGS)
+    if isinstance(user, dict):
+        out.update({k: v for k, v in user.items() if k in DEFAULT_WARM_START_SETTINGS})
+    return out
+
+
+def feature_set_hash(columns: Iterable[str]) -> str:
+    """特徵欄位（含順序）的 SHA1，用來判斷兩次訓練是否可互相沿用參數。"""
+    payload = json.dumps([str(c) for c in columns], ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def write_run_meta(out_dir: str, task_type: str, feature_cols: List[str],
+                   tuned_params: Optional[Dict[str, dict]] = None) -> str:
+    path = os.path.join(out_dir, "optuna", RUN_META_FILE)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    meta = {
+        "task_type": task_type,
+        "feature_hash": feature_set_hash(feature_cols),
+        "feature_count": len(feature_cols),
+        "tuned_params": _jsonable(tuned_params) if tuned_params else None,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def find_warm_start(root: str, task_type: str, feature_hash: str,
+                    exclude_dir: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    由新到舊（時間戳目錄名排序）尋找相容的上次產出：
+    回傳 {"dir": ..., "params": {"XGB": {...}, ...}}；找不到則 None。
+    """
+    if not root or not os.path.isdir(root):
+        return None
+    exclude = os.path.abspath(exclude_dir) if exclude_dir else None
+    for name in sorted(os.listdir(root), reverse=True):
+        run_dir = os.path.join(root, name)
+        if exclude and os.path.abspath(run_dir) == exclude:
+            continue
+        meta_path = os.path.join(run_dir, "optuna", RUN_META_FILE)
+        if not os.path.isfile(meta_path):
+            continue
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except Exception:
+            continue
+        if meta.get("task_type") != task_type or meta.get("feature_hash") != feature_hash:
+            continue
+
+        # 優先使用完整尋參結果；舊產出僅有 compact 片段時退而求其次
+        params = meta.get("tuned_params")
+        compact_path = os.path.join(run_dir, "optuna", COMPACT_PARAMS_FILE)
+        if not params and os.path.isfile(compact_path):
+            try:
+                with open(compact_path, "r", encoding="utf-8") as f:
+                    params = json.load(f)
+            except Exception:
+                params = None
+        if params:
+            return {"dir": run_dir, "params": params}
+    return None
+
+
+def _jsonable(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return {str(k): _jsonable(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_jsonable(v) for v in obj]
+    if isinstance(obj, (np.floating, np.integer)):
+        return obj.item()
+    if isinstance(obj, (str, int, float, bool)) or obj is None:
+        return obj
+    return str(obj)
+
+
+class WarmSearchSpace:
+    """
+    包一層 trial.suggest_*：
+    - 無中心點時完全等同原本的 suggest（不改變冷啟動行為）
+    - 有中心點時把 [low, high] 縮到中心附近，並記錄實際範圍供鄰近點取樣
+    """
+
+    def __init__(self, center: Optional[Dict[str, Any]] = None,
+                 settings: Optional[Dict[str, Any]] = None, seed: int = 42,
+                 names: Optional[Iterable[str]] = None) -> None:
+        self.settings = dict(DEFAULT_WARM_START_SETTINGS, **(settings or {}))
+        # names：實際搜尋的參數；n_jobs/random_state/num_class 等固定參數不可當成 trial 參數 enqueue
+        allowed = None if names is None else set(names)
+        self.center = {
+            k: v for k, v in (center or {}).items()
+            if isinstance(v, (int, float, np.integer, np.floating)) and not isinstance(v, bool)
+            and (allowed is None or k in allowed)
+        }
+        self.bounds: Dict[str, Tuple[str, float, float, Optional[int], bool]] = {}
+        self._rng = np.random.default_rng(seed)
+        self._neighbours_enqueued = False
+
+    @property
+    def active(self) -> bool:
+        return bool(self.center)
+
+    def _narrow(self, name: str, low: float, high: float, log: bool) -> Tuple[float, float]:
+        c = self.center.get(name)
+        if c is None or not (low <= c <= high):
+            return low, high
+        shrink = float(self.settings["SHRINK"])
+        if log and low > 0:
+            factor = (high / low) ** (shrink / 2.0)
+            return max(low, c / factor), min(high, c * factor)
+        half = (high - low) * shrink / 2.0
+        return max(low, c - half), min(high, c + half)
+
+    def suggest_int(self, trial, name: str, low: int, high: int, step: int = 1, log: bool = False) -> int:
+        lo, hi = self._narrow(name, low, high, log)
+        lo = low + int(math.floor((lo - low) / step)) * step
+        hi = min(high, low + int(math.ceil((hi - low) / step)) * step)
+        self.bounds[name] = ("int", lo, hi, step, log)
+        return trial.suggest_int(name, int(lo), int(hi), step=step, log=log)
+
+    def suggest_float(self, trial, name: str, low: float, high: float, log: bool = False) -> float:
+        lo, hi = self._narrow(name, low, high, log)
+        self.bounds[name] = ("float", lo, hi, None, log)
+        return trial.suggest_float(name, lo, hi, log=log)
+
+    # ---- enqueue ----
+    def enqueue_center(self, study) -> None:
+        if self.active:
+            study.enqueue_trial(dict(self.center), skip_if_exists=True)
+
+    def _neighbour(self) -> Dict[str, Any]:
+        jitter = float(self.settings["JITTER"])
+        out: Dict[str, Any] = {}
+        for name, (kind, lo, hi, step, log) in self.bounds.items():
+            c = self.center.get(name)
+            if c is None:
+                continue
+            if log and lo > 0:
+                span = math.log(hi) - math.log(lo)
+                v = math.exp(math.log(max(c, lo)) + self._rng.normal(0.0, jitter) * span)
+            else:
+                v = c + self._rng.normal(0.0, jitter) * (hi - lo)
+            v = min(max(v, lo), hi)
+            if kind == "int":
+                v = int(lo + round((v - lo) / step) * step)
+            out[name] = v
+        return out
+
+    def enqueue_neighbours_callback(self, study, trial) -> None:
+        """optuna callback：中心點跑完後（此時已知各參數範圍）再 enqueue 鄰近點。"""
+        if self._neighbours_enqueued or not self.active or not self.bounds:
+            return
+        self._neighbours_enqueued = True
+        for _ in range(int(self.settings["N_NEIGHBOURS"])):
+            study.enqueue_trial(self._neighbour(), skip_if_exists=True)
+
+
+__all__ = [
+    "DEFAULT_WARM_START_SETTINGS",
+    "WarmSearchSpace",
+    "feature_set_hash",
+    "find_warm_start",
+    "resolve_warm_start_settings",
+    "write_run_meta",
+]
@@ -1,13 +1,13 @@
+import functools
+import hashlib
 import os
+import sys
+import tempfile
 import time
-import io
-import re
-import contextlib
 import threading
 from pathlib import Path
 
 import pandas as pd
-import joblib
 import streamlit as st
 from . import apply_dark_theme  # [ADDED]
 
@@ -16,9 +16,19 @@ try:
 except ModuleNotFoundError:  # pragma: no cover - optional dependency
     st_autorefresh = None
 
-from ..etl_pipeliner import run_pipeline
-from ..etl_pipeline import log_cleaning as LC
-from ..notifier import notify_from_csv
+from ..monitor_jobs import process_monitored_file, save_notify_settings
+
+# 添加 ui_shared 模組路徑
+_ROOT = Path(__file__).resolve().parents[2]
+if str(_ROOT / "ui_shared") not in sys.path:
+    sys.path.insert(0, str(_ROOT / "ui_shared"))
+
+import file_lease
+import file_ledger
+import file_stability
+import job_queue
+import model_registry
+import tail_follow
 
 
 def _rerun() -> None:
@@ -58,6 +68,7 @@ class _FileMonitorHandler(FileSystemEventHandler):
         "_processed.csv",
         "_output.csv",
         "_report.csv",
+        "_critical.csv",
         "_mapping_report.json",
         # 也過濾壓縮版本
         "_clean.csv.gz",
@@ -71,8 +82,10 @@ class _FileMonitorHandler(FileSystemEventHandler):
 
     def __init__(self):
         self.events = []
-        self.processed_files = set()  # 已處理的檔案集合
-        self.event_signatures = set()  # 追蹤事件簽章避免重複
+        self.ledger = _ledger()  # 已排入／處理過的檔案版本（SQLite 持久化）
+        self._tracked = {}  # 路徑 -> 最近一次加入事件時的 (大小, 修改時間)，避免同一版本重複加入
+        self.stability = file_stability.StabilityTracker()  # 事件驅動的穩定度判斷，不阻塞
+        self._index = None  # 輪詢模式的資料夾快照（file_stability.DirectoryIndex）
         self.monitor_thread = None
         self.stop_event = threading.Event()
         self.folder_path = None
@@ -90,22 +103,12 @@ class _FileMonitorHandler(FileSystemEventHandler):
     
     def _is_already_processed(self, path: str) -> bool:
         """檢查檔案是否已被處理過"""
-        # 使用檔案路徑和修改時間作為唯一標識
-        try:
-            stat = os.stat(path)
-            file_key = f"{path}_{stat.st_mtime}_{stat.st_size}"
-            return file_key in self.processed_files
-        except OSError:
-            return False
+        # 帳本以路徑、inode、大小、修改時間與內容指紋識別檔案版本
+        return self.ledger.is_processed(path)
     
     def _mark_as_processed(self, path: str) -> None:
         """標記檔案為已處理"""
-        try:
-            stat = os.stat(path)
-            file_key = f"{path}_{stat.st_mtime}_{stat.st_size}"
-            self.processed_files.add(file_key)
-        except OSError:
-            pass
+        self.ledger.mark(path, file_ledger.DONE)
 
     def _should_process_file(self, path: str) -> bool:
         """判斷檔案是否應該被處理"""
@@ -125,18 +128,19 @@ class _FileMonitorHandler(FileSystemEventHandler):
 
     def _track(self, event_type: str, path: str) -> None:
         """Record events for supported files that should be processed."""
-        # 建立事件簽章避免短時間內的重複事件
-        event_sig = f"{event_type}:{path}"
-        if event_sig in self.event_signatures:
+        # 同一檔案版本（大小與修改時間未變）的重複事件只加入一次；排入工作後由帳本擋下
+        try:
+            stat = os.stat(path)
+        except OSError:
             return
-            
+        version = (stat.st_size, stat.st_mtime_ns)
+        if self._tracked.get(path) == version:
+            return
+
         if self._should_process_file(path):
             self.events.append((event_type, path))
-            self._mark_as_processed(path)
-            self.event_signatures.add(event_sig)
-            # 定期清理舊的事件簽章（保留最近 1000 個）
-            if len(self.event_signatures) > 1000:
-                self.event_signatures = set(list(self.event_signatures)[-500:])
+            self._tracked[path] = version
+            self.stability.observe(path)
 
     def on_created(self, event):  # pragma: no cover - filesystem events
         if not event.is_directory:
@@ -209,15 +213,23 @@ class _FileMonitorHandler(FileSystemEventHandler):
         if not self.events:
             return
         
-        new_events = [event for event in self.events if self._should_process_event(event)]
+        new_events = []
+        for event in self.events:
+            if self._should_process_event(event):
+                new_events.append(event)
+            else:
+                # 已處理（帳本擋下）或已刪除的檔案不再追蹤穩定度
+                self.stability.discard(event[1])
         
-        for event_type, path in new_events:
+        for event in new_events:
             if self.stop_event.is_set():
                 break
+            path = event[1]
                 
             try:
                 if os.path.exists(path) and self._is_file_stable(path):
                     self._process_single_file(path)
+                    self.stability.discard(path)
             except Exception as e:
                 self.log_messages.append(f"處理檔案錯誤 {path}: {e}")
 
@@ -227,32 +239,33 @@ class _FileMonitorHandler(FileSystemEventHandler):
             return
         
         try:
-            for file_path in Path(self.folder_path).rglob("*"):
+            # 只重新列出 mtime 有變動的資料夾；新增或變動的檔案交給穩定度追蹤
+            if self._index is None or self._index.root != os.path.abspath(self.folder_path):
+                self._index = file_stability.DirectoryIndex(self.folder_path)
+            for path in self._index.scan():
+                if self._should_process_file(path):
+                    self.stability.observe(path)
+
+            for path in self.stability.ready():
                 if self.stop_event.is_set():
                     break
-                    
-                if (file_path.is_file() and 
-                    self._should_process_file(str(file_path)) and
-                    self._is_file_stable(str(file_path))):
-                    
-                    self._process_single_file(str(file_path))
+                if self._should_process_file(path):
+                    self._process_single_file(path)
+                self.stability.discard(path)
                     
         except Exception as e:
             self.log_messages.append(f"資料夾掃描錯誤：{e}")
 
     def _should_process_event(self, event):
         """檢查事件是否應該處理"""
-        event_type, path = event
+        path = event[1]
         return (os.path.exists(path) and 
                 self._should_process_file(path) and
                 not self._is_already_processed(path))
 
-    def _is_file_stable(self, path: str, stable_seconds: int = 3) -> bool:
-        """檢查檔案是否穩定（未在寫入中）"""
-        try:
-            return time.time() - os.path.getmtime(path) > stable_seconds
-        except OSError:
-            return False
+    def _is_file_stable(self, path: str) -> bool:
+        """檢查檔案是否穩定（大小與修改時間已維持一段安靜期，不阻塞）"""
+        return self.stability.is_ready(path)
 
     def _process_single_file(self, path: str):
         """處理單個檔案 - 添加到事件佇列供外部處理"""
@@ -287,15 +300,14 @@ class _FileMonitorHandler(FileSystemEventHandler):
             current_time - event[2] < 86400
         ] if hasattr(self.events[0] if self.events else None, '__len__') else self.events
         
-        # 保留最近 1000 個處理記錄
-        if len(self.processed_files) > 1000:
-            processed_list = list(self.processed_files)
-            self.processed_files = set(processed_list[-1000:])
+        # 淘汰超過保留期限的帳本紀錄（依最後更新時間）
+        self.ledger.evict()
         
-        # 保留最近 500 個事件簽章
-        if len(self.event_signatures) > 500:
-            signatures_list = list(self.event_signatures)
-            self.event_signatures = set(signatures_list[-500:])
+        # 已不存在或已排入的檔案不必再記錄事件版本
+        self._tracked = {
+            path: version for path, version in self._tracked.items()
+            if os.path.exists(path) and not self._is_already_processed(path)
+        }
         
         # 保留最近 100 條日誌訊息
         if len(self.log_messages) > 100:
@@ -311,14 +323,22 @@ class _FileMonitorHandler(FileSystemEventHandler):
             'is_running': is_running,
             'folder_path': self.folder_path or 'N/A',
             'use_watchdog': self.use_watchdog,
-            'processed_count': len(self.processed_files),
+            'processed_count': self.ledger.counts()["total"],
             'pending_events': len(self.events),
             'method': 'Watchdog (即時)' if self.use_watchdog else '輪詢 (定期)',
             'last_messages': self.log_messages[-5:] if self.log_messages else []
         }
 
 
-ANSI_RE = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+# 背景工作佇列（SQLite 持久化）：ETL 與推論在工作行程中執行，頁面只排入工作並輪詢狀態
+JOB_DB_PATH = "forti_monitor_jobs.db"
+# 上傳的模型以內容雜湊存檔，工作行程以路徑載入
+MODEL_STORE = Path(tempfile.gettempdir()) / "forti_model_store"
+# 增量追蹤（tail）：每個檔案已處理的位元組位置與微批次暫存資料夾
+TAIL_STATE_PATH = "forti_tail_offsets.json"
+TAIL_BATCH_DIR = Path(tempfile.gettempdir()) / "forti_tail_batches"
+# 已處理檔案帳本：重啟後已處理的檔案不會重新排入、重複推播
+LEDGER_DB_PATH = "forti_file_ledger.db"
 
 
 def _log_toast(msg: str) -> None:
@@ -330,197 +350,232 @@ def _log_toast(msg: str) -> None:
         st.write(msg)
 
 
-def _run_etl_and_infer(
-    path: str, progress_bar, status_placeholder, 
-    handler: _FileMonitorHandler = None
-) -> None:
-    """Run ETL pipeline and model inference on *path*.
-
-    Parameters
-    ----------
-    path: str
-        The path to the file being processed.
-    progress_bar: streamlit.delta_generator.DeltaGenerator
-        Progress bar widget used for simple progress feedback.
-    status_placeholder: streamlit.delta_generator.DeltaGenerator
-        Placeholder used to display textual status updates to the user.
-    handler: _FileMonitorHandler, optional
-        The file monitor handler to mark generated files as processed.
+def _job_queue() -> job_queue.JobQueue:
+    """Process-wide job queue shared by every session and rerun."""
+    return job_queue.get_queue(JOB_DB_PATH, process_monitored_file)
+
+
+def _ledger() -> file_ledger.FileLedger:
+    """Process-wide ledger of queued and processed file versions."""
+    return file_ledger.get_ledger(LEDGER_DB_PATH)
+
+
+def _leases() -> file_lease.LeaseManager:
+    """Lease manager of the monitored folder (lease files live in <folder>/.dflare_leases/)."""
+    return file_lease.get_manager(st.session_state.folder)
+
+
+def _tail_enabled() -> bool:
+    """Tail offsets are kept per host, so tail mode is off while the folder is shared."""
+    return bool(st.session_state.get("tail_mode")) and not st.session_state.get("shared_mode")
+
+
+def _persist_model(uploaded, session_key: str) -> None:
+    """Store an uploaded model by content hash so worker processes can load it."""
+    data = uploaded.getvalue()
+    MODEL_STORE.mkdir(parents=True, exist_ok=True)
+    suffix = Path(uploaded.name).suffix or ".joblib"
+    target = MODEL_STORE / f"{hashlib.sha256(data).hexdigest()}{suffix}"
+    if not target.exists():
+        tmp = target.with_suffix(target.suffix + ".tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, target)
+    st.session_state[session_key] = str(target)
+
+
+def _enqueue_file(path: str, key: str = None, group: str = None, append_report: str = None) -> bool:
+    """Queue *path* for ETL and inference; False when it should be retried later.
+
+    Whole-file jobs (no *group*) are recorded in the ledger as queued. In shared
+    mode the file is claimed with a lease first; files claimed by another
+    instance are skipped (True) and the lease becomes a done/failed marker when
+    the job ends. Outputs are already named after the input file.
     """
-    bin_model = st.session_state.get("binary_model")
-    mul_model = st.session_state.get("multi_model")
-    if not (bin_model and mul_model):
-        status_placeholder.text("Models not uploaded; skipping")
+    bin_path = st.session_state.get("binary_model_path")
+    mul_path = st.session_state.get("multi_model_path")
+    if not (bin_path and mul_path):
         st.session_state.log_lines.append("Models not uploaded; skipping")
-        return
+        return False
 
-    p = Path(path)
-    while p.suffix in {".gz", ".zip"}:
-        p = p.with_suffix("")
+    notify = None
+    if st.session_state.get("enable_notifications", True):
+        # 憑證寫入本機設定檔由工作行程讀取，不放進 payload（佇列資料庫與工作列表看不到）
+        save_notify_settings({
+            "webhook": st.session_state.get("discord_webhook", ""),
+            "gemini_key": st.session_state.get("gemini_key", ""),
+            "line_token": st.session_state.get("line_token", ""),
+        })
+        notify = {
+            "convergence": st.session_state.get(
+                "forti_convergence", {"window_minutes": 10, "group_fields": ["source", "destination"]}
+            ),
+        }
+    payload = {"path": path, "binary_model": bin_path, "multi_model": mul_path, "notify": notify}
+    if append_report:
+        payload["append_report"] = append_report
+
+    lease = None
+    if group is None and st.session_state.get("shared_mode"):
+        leases = _leases()
+        was_waiting = leases.is_waiting(path)
+        lease = leases.acquire(path)
+        if lease is None:
+            record = leases.status(path) or {}
+            if record.get("status") in file_lease.FINISHED_STATUSES:
+                _ledger().mark(path, file_ledger.DONE)
+                st.session_state.log_lines.append(f"Already processed by another instance: {path}")
+            elif not was_waiting:
+                st.session_state.log_lines.append(
+                    f"Claimed by another instance ({record.get('owner') or '-'}): {path}"
+                )
+            return True
+        # 行程重啟後由 _reattach_leases 依此接回租約
+        payload["lease"] = {"root": leases.root, "lease_path": lease.lease_path, "owner": lease.owner}
 
-    ext = p.suffix.lower()
-    stem = p.stem.lower()
+    queue = _job_queue()
+    try:
+        job_id = queue.submit(path, payload, key=key, group=group)
+    except job_queue.QueueFull as exc:
+        if lease is not None:
+            _leases().release(lease)
+        st.session_state.log_lines.append(f"Job queue full ({exc}); {path} will be queued later")
+        return False
+    if lease is not None:
+        lease.watch = functools.partial(queue.outcome, job_id)
+    if group is None:
+        _ledger().mark(path, file_ledger.QUEUED, job_id)
+    jobs = st.session_state.setdefault("queued_jobs", {})
+    if job_id not in jobs:
+        jobs[job_id] = path
+        _log_toast(f"Queued {path} as job #{job_id}")
+    return True
+
+
+def _reattach_leases() -> None:
+    """Re-attach leases of jobs queued before a restart; cancel jobs whose lease was taken over."""
+    queue = _job_queue()
+    for job in queue.jobs(limit=int(queue.settings["MAX_PENDING"]), statuses=job_queue.ACTIVE_STATUSES):
+        info = job["payload"].get("lease")
+        if not info:
+            continue
+        manager = file_lease.get_manager(info["root"])
+        if any(held.lease_path == info["lease_path"] for held in manager.held()):
+            continue
+        lease = manager.adopt(
+            job["path"], info["lease_path"], info["owner"], watch=functools.partial(queue.outcome, job["id"])
+        )
+        if lease is not None:
+            st.session_state.log_lines.append(f"Re-attached lease of job #{job['id']}: {job['path']}")
+        elif queue.cancel(job["id"], "lease was taken over by another instance"):
+            st.session_state.log_lines.append(
+                f"Lease of job #{job['id']} was taken over by another instance; job cancelled"
+            )
 
-    clean_csv = path
-    do_map = True
-    do_fe = True
 
-    if ext in {".txt", ".log"}:
-        clean_csv = str(p.with_name(p.stem + "_clean.csv"))
+def _retry_expired_leases() -> None:
+    """Queue files whose lease from another instance expired (e.g. that host went down)."""
+    for path in _leases().takeover_candidates():
+        st.session_state.log_lines.append(f"Lease expired, taking over {path}")
+        _enqueue_file(path)
+
+
+def _retry_failed_files(folder: str) -> None:
+    """Queue failed files whose ledger retry time has come (exponential backoff, limited retries)."""
+    for path in _ledger().retry_candidates(folder):
+        st.session_state.log_lines.append(f"Retrying previously failed file: {path}")
+        if not _enqueue_file(path):
+            break  # 佇列已滿：下次重跑再試
 
-        _log_toast("Running cleaning for raw log")
-        LC.clean_logs(quiet=True, paths=[path], clean_csv=clean_csv)
-    else:
-        clean_csv = path
-        if stem.endswith("_engineered"):
-            do_map = False
-            do_fe = False
-        elif stem.endswith("_preprocessed"):
-            do_map = False
-            do_fe = True
-
-    base = p.with_suffix("")
-    pre_csv = clean_csv if not do_map else f"{base}_preprocessed.csv"
-    fe_csv = pre_csv if not do_fe else f"{base}_engineered.csv"
 
+def _tail_folder(folder: str, handler: _FileMonitorHandler) -> None:
+    """Queue newly appended complete lines of every tailable file as micro-batches."""
+    reader = tail_follow.get_reader(TAIL_STATE_PATH)
     try:
-        status_placeholder.text(f"Detected new file: {path}")
-        _log_toast(f"Detected new file: {path}")
-        buf = io.StringIO()
-        status_placeholder.text("Running ETL pipeline...")
-        with contextlib.redirect_stdout(buf):
-            run_pipeline(
-                do_clean=False,
-                do_map=do_map,
-                do_fe=do_fe,
-                clean_out=clean_csv,
-                preproc_out=pre_csv,
-                fe_out=fe_csv,
+        entries = sorted(Path(folder).iterdir())
+    except OSError as exc:
+        st.session_state.log_lines.append(f"Tail scan failed: {exc}")
+        return
+    for entry in entries:
+        path = str(entry)
+        if (not entry.is_file() or entry.name.startswith((".", "~"))
+                or not tail_follow.is_tailable(path) or handler._is_etl_generated_file(path)):
+            continue
+        # 每個來源的微批次依序處理，附加到同一份累積報告
+        cumulative = f"{entry.with_suffix('')}_report.csv"
+        for _ in range(int(reader.settings["MAX_BATCHES_PER_POLL"])):
+            batch = reader.poll(path)
+            if batch is None:
+                break
+            target = str(TAIL_BATCH_DIR / f"{entry.stem}_{batch.tag}{entry.suffix}")
+            batch.write(target)
+            if not _enqueue_file(target, key=f"tail|{batch.key}|{batch.tag}", group=batch.key,
+                                 append_report=cumulative):
+                break  # 佇列已滿：不推進位置，下次重跑再讀同一段
+            reader.commit(batch)
+            st.session_state.generated_files.update({target, cumulative})
+            st.session_state.log_lines.append(
+                f"Tail {entry.name}: queued {batch.lines} new line(s) (bytes {batch.start}-{batch.end})"
             )
-        for line in ANSI_RE.sub("", buf.getvalue()).splitlines():
-            if line.strip():
-                st.session_state.log_lines.append(line.strip())
-
-
-
-        # feature engineered data for model inference
-
-        df = pd.read_csv(fe_csv)
-        if df.isna().any().any():
-            _log_toast("Detected NaNs; filling with 0")
-            df.fillna(0, inplace=True)
-
-
-        # original data retained for notification context
-        raw_df = pd.read_csv(clean_csv)
-        if raw_df.isna().any().any():
-            fill_values = {
-                col: 0 if pd.api.types.is_numeric_dtype(raw_df[col]) else ""
-                for col in raw_df.columns
-            }
-            raw_df.fillna(value=fill_values, inplace=True)
-
-
-        features = [c for c in df.columns if c not in {"is_attack", "crlevel"}]
-
-        bin_clf = bin_model
-        bin_features = list(getattr(bin_clf, "feature_names_in_", features))
-        missing = [f for f in bin_features if f not in df.columns]
-        if missing:
-            _log_toast(f"Missing features for binary model: {missing}; filling with 0")
-        df_bin = df.reindex(columns=bin_features, fill_value=0)
-
-        status_placeholder.text("Running binary classification...")
-        _log_toast("Running binary classification")
-        bin_pred = bin_clf.predict(df_bin)
-        result = raw_df.copy()
-
-        result["is_attack"] = bin_pred
-        result["crlevel"] = 0
-        mask = result["is_attack"] == 1
-        _log_toast(f"Binary classification found {mask.sum()} attack rows")
-        if mask.any():
-            mul_clf = mul_model
-            mul_features = list(getattr(mul_clf, "feature_names_in_", features))
-            missing_mul = [f for f in mul_features if f not in df.columns]
-            if missing_mul:
-                _log_toast(
-                    f"Missing features for multiclass model: {missing_mul}; filling with 0"
-                )
-            df_mul = df.loc[mask].reindex(columns=mul_features, fill_value=0)
 
-            status_placeholder.text(
-                "Running multiclass classification for attack rows..."
-            )
-            _log_toast("Running multiclass classification for attack rows")
-            result.loc[mask, "crlevel"] = mul_clf.predict(df_mul)
-        else:
-            status_placeholder.text(
-                "No attacks detected; skipping multiclass classification"
-            )
-            _log_toast("No attacks detected; skipping multiclass classification")
-
-
-        report_path = f"{base}_report.csv"
-        result.to_csv(report_path, index=False)
-        gen_files = {report_path}
-        for f in (clean_csv, pre_csv, fe_csv):
-            if f != path:
-                gen_files.add(f)
-        st.session_state.generated_files.update(gen_files)
-        webhook = st.session_state.get("discord_webhook", "")
-        gemini_key = st.session_state.get("gemini_key", "")
-        line_token = st.session_state.get("line_token", "")
-        convergence = st.session_state.get(
-            "forti_convergence", {"window_minutes": 10, "group_fields": ["source", "destination"]}
+
+def _apply_job_result(result: dict, handler: _FileMonitorHandler = None) -> None:
+    """Update session state from a finished job summary."""
+    st.session_state.log_lines.extend(result.get("log_lines", []))
+    gen_files = set(result.get("generated_files", []))
+    st.session_state.generated_files.update(gen_files)
+
+    # store counts for visualization（JSON 的整數鍵會變成字串，轉回整數索引）
+    st.session_state.last_counts = {
+        key: pd.Series({int(k): int(v) for k, v in result[key].items()}, dtype="int64")
+        for key in ("is_attack", "crlevel")
+    }
+    critical_path = result.get("critical_path")
+    try:
+        st.session_state.last_critical = (
+            pd.read_csv(critical_path) if critical_path else pd.DataFrame()
         )
+    except (OSError, pd.errors.ParserError):
+        st.session_state.last_critical = pd.DataFrame()
+    st.session_state.last_report_path = result["report_path"]
 
+    # 觸發視覺化同步更新
+    if st.session_state.get("enable_visualization_sync", True):
+        st.session_state.visualization_needs_update = True
+        st.session_state.visualization_last_update = time.time()
 
-        def _log(msg: str) -> None:
-            st.session_state.log_lines.append(msg)
-            st.write(msg)
+    # 如果有 handler，將 ETL 產生的檔案標記為已處理，避免重複處理
+    if handler:
+        for generated_file in gen_files:
+            handler._mark_as_processed(generated_file)
 
-        # 根據用戶設定決定是否啟用通知和視覺化更新
-        enable_notifications = st.session_state.get("enable_notifications", True)
-        enable_visualization_sync = st.session_state.get("enable_visualization_sync", True)
-        
-        if enable_notifications:
-            notify_from_csv(
-                report_path,
-                webhook,
-                gemini_key,
-                risk_levels={"3", "4"},
-                ui_log=_log,
-                line_token=line_token,
-                convergence=convergence,
-            )
 
-        # store counts for visualization
-        st.session_state.last_counts = {
-            "is_attack": result["is_attack"].value_counts().reindex([0, 1], fill_value=0),
-            "crlevel": result["crlevel"].value_counts().reindex([0, 1, 2, 3, 4], fill_value=0),
-        }
-        st.session_state.last_critical = result[result["crlevel"] >= 4]
-        st.session_state.last_report_path = report_path
-        
-        # 觸發視覺化同步更新
-        if enable_visualization_sync:
-            st.session_state.visualization_needs_update = True
-            st.session_state.visualization_last_update = time.time()
+def _collect_jobs(handler: _FileMonitorHandler = None) -> None:
+    """Apply finished jobs from the queue database, including jobs queued before a restart.
 
-        status_placeholder.text(f"Processed {path} -> {report_path}")
-        _log_toast(f"Processed {path} -> {report_path}")
-        
-        # 如果有 handler，將 ETL 產生的檔案標記為已處理，避免重複處理
-        if handler:
-            for generated_file in gen_files:
-                handler._mark_as_processed(generated_file)
-        
-        for pct in range(0, 101, 20):
-            progress_bar.progress(pct)
-            time.sleep(0.05)
-    except Exception as exc:  # pragma: no cover - processing errors
-        _log_toast(f"Processing failed {path}: {exc}")
+    take_finished marks each job as delivered, so a job is applied once even when
+    several reruns or sessions poll at the same time.
+    """
+    jobs = st.session_state.setdefault("queued_jobs", {})
+    queue = _job_queue()
+    for job in queue.jobs(limit=int(queue.settings["MAX_PENDING"]), statuses=(job_queue.RUNNING,)):
+        _ledger().update_job(job["id"], file_ledger.RUNNING)
+    for job in queue.take_finished():
+        path = jobs.pop(job["id"], None) or job["path"]
+        _ledger().update_job(job["id"], job["status"])
+        info = job["payload"].get("lease")
+        if info:
+            # 重啟前排入、結束前未接回的租約：補寫完成標記（心跳已寫過時 adopt 回傳 None）
+            manager = file_lease.get_manager(info["root"])
+            lease = manager.adopt(job["path"], info["lease_path"], info["owner"])
+            if lease is not None:
+                manager.release(lease, job["status"])
+        if job["status"] == job_queue.DONE:
+            _apply_job_result(job["result"] or {}, handler)
+            _log_toast(f"Processed {path} -> {(job['result'] or {}).get('report_path', '-')}")
+        else:
+            _log_toast(f"Processing failed {path}: {job['error']}")
+    # 帳本中仍為 queued／running、但工作已結束或已被佇列清除的紀錄（例如行程重啟前的工作）
+    _ledger().reconcile(queue.outcome)
 
 
 def _cleanup_generated(hours: int, *, force: bool = False) -> None:
@@ -539,8 +594,8 @@ def _cleanup_generated(hours: int, *, force: bool = False) -> None:
         st.session_state.log_lines.append(f"Removed {f}")
 
 
-def _process_events(handler: _FileMonitorHandler, progress_bar, status_placeholder) -> None:
-    """Process newly detected files."""
+def _process_events(handler: _FileMonitorHandler, status_placeholder) -> None:
+    """Queue newly detected files for the background workers."""
     # 獲取上次處理的事件數量
     last_processed_count = len(st.session_state.get("processed_events", []))
     new_events = handler.events[last_processed_count:]
@@ -549,46 +604,82 @@ def _process_events(handler: _FileMonitorHandler, progress_bar, status_placehold
     if not new_events:
         return
     
-    processed_in_this_batch = 0
-    for event_type, path in new_events:
+    queued_in_this_batch = 0
+    handled = len(handler.events)
+    for offset, event in enumerate(new_events):
+        path = event[1]
         # 多層檢查避免重複處理
         
         # 1. 檢查是否為 ETL 產生的檔案
         if handler._is_etl_generated_file(path):
             continue
+
+        # 增量追蹤模式下，未壓縮的檔案由 _tail_folder 依位元組位置處理
+        if _tail_enabled() and tail_follow.is_tailable(path):
+            continue
         
         # 2. 檢查是否在 generated_files 集合中
         if path in st.session_state.get("generated_files", set()):
             continue
         
-        # 3. 檢查是否在 processed_files 集合中
-        if path in st.session_state.get("processed_files", set()):
+        # 3. 檢查帳本：這個檔案版本已排入或處理過（重啟後仍有效）
+        if handler._is_already_processed(path):
             continue
         
         # 4. 檢查檔案是否存在且穩定（避免處理正在寫入的檔案）
         try:
             if not os.path.exists(path):
                 continue
-            # 等待檔案穩定（最近 5 秒內未修改）
+            # 尚未穩定（最近 5 秒內有修改）：保留此事件，下次重跑再排入
             if time.time() - os.path.getmtime(path) < 5:
-                continue
+                handled = last_processed_count + offset
+                break
         except OSError:
             continue
         
-        # 處理檔案
-        try:
-            _run_etl_and_infer(path, progress_bar, status_placeholder, handler)
-            st.session_state.setdefault("processed_files", set()).add(path)
-            processed_in_this_batch += 1
-        except Exception as exc:
-            _log_toast(f"Error processing {path}: {exc}")
+        # 排入背景工作佇列；佇列已滿時保留此事件與其後的事件（背壓），下次重跑再排入
+        if not _enqueue_file(path):
+            handled = last_processed_count + offset
+            break
+        queued_in_this_batch += 1
     
     # 更新已處理事件記錄
-    st.session_state.processed_events = handler.events[:]
+    st.session_state.processed_events = handler.events[:handled]
     
     # 記錄處理統計
-    if processed_in_this_batch > 0:
-        _log_toast(f"Processed {processed_in_this_batch} new file(s) in this batch")
+    if queued_in_this_batch > 0:
+        status_placeholder.text(f"Queued {queued_in_this_batch} new file(s)")
+        _log_toast(f"Queued {queued_in_this_batch} new file(s) in this batch")
+
+def _render_job_status() -> None:
+    """Show queue counts and the most recent jobs."""
+    queue = _job_queue()
+    counts = queue.counts()
+    st.markdown("**🧵 背景工作佇列**")
+    job_cols = st.columns(4)
+    job_cols[0].metric("排隊中", f"{counts[job_queue.QUEUED] + counts[job_queue.RETRY]} 個")
+    job_cols[1].metric("執行中", f"{counts[job_queue.RUNNING]} 個")
+    job_cols[2].metric("已完成", f"{counts[job_queue.DONE]} 個")
+    job_cols[3].metric("失敗", f"{counts[job_queue.FAILED]} 個")
+    if counts["active"] >= counts["capacity"]:
+        st.warning(f"⚠️ 工作佇列已滿（{counts['active']}/{counts['capacity']}），新檔案將稍後排入")
+
+    recent = queue.jobs(limit=10)
+    if recent:
+        st.dataframe(
+            pd.DataFrame(
+                {
+                    "工作": [f"#{job['id']}" for job in recent],
+                    "檔案": [os.path.basename(job["path"]) for job in recent],
+                    "狀態": [job["status"] for job in recent],
+                    "嘗試次數": [job["attempts"] for job in recent],
+                    "進度／錯誤": [job["error"] or job["progress"] or "" for job in recent],
+                }
+            ),
+            use_container_width=True,
+            hide_index=True,
+        )
+
 
 def app() -> None:
     apply_dark_theme()  # [ADDED]
@@ -737,8 +828,6 @@ def app() -> None:
         if folder_valid:  # [ADDED]
             processed_uploads = st.session_state.get("folder_uploads", set())  # [ADDED]
             saved_count = 0  # [ADDED]
-            progress_bar_upload = st.progress(0)
-            status_placeholder_upload = st.empty()
             
             for uploaded in uploaded_logs:  # [ADDED]
                 signature = (uploaded.name, uploaded.size)  # [ADDED]
@@ -751,27 +840,14 @@ def app() -> None:
                 saved_count += 1  # [ADDED]
                 _log_toast(f"Uploaded {destination}")  # [ADDED]
                 
-                # 立即處理上傳的檔案，不等待 watchdog 事件
-                has_models = (st.session_state.get("binary_model") and
-                              st.session_state.get("multi_model"))
+                # 立即排入背景工作佇列，不等待 watchdog 事件
+                has_models = (st.session_state.get("binary_model_path") and
+                              st.session_state.get("multi_model_path"))
                 if has_models:
-                    try:
-                        status_placeholder_upload.text(
-                            f"Processing uploaded file: {uploaded.name}")
-                        # 嘗試獲取當前的 handler，用於標記產生檔案
-                        current_handler = st.session_state.get("handler")
-                        _run_etl_and_infer(str(destination), 
-                                           progress_bar_upload, 
-                                           status_placeholder_upload,
-                                           current_handler)
-                        processed_files = st.session_state.setdefault(
-                            "processed_files", set())
-                        processed_files.add(str(destination))
-                        _log_toast(
-                            f"Immediately processed uploaded file: {uploaded.name}")
-                    except Exception as exc:
+                    if not _enqueue_file(str(destination)):
                         _log_toast(
-                            f"Failed to process uploaded file {uploaded.name}: {exc}")
+                            f"Job queue is full, {uploaded.name} will be queued "
+                            "by the folder monitor")
                 else:
                     _log_toast(
                         f"Models not loaded, {uploaded.name} will be processed "
@@ -779,7 +855,7 @@ def app() -> None:
                     
             st.session_state.folder_uploads = processed_uploads  # [ADDED]
             if saved_count:  # [ADDED]
-                st.success(f"Saved and processed {saved_count} file(s) to {folder_path}")  # [ADDED]
+                st.success(f"Saved and queued {saved_count} file(s) to {folder_path}")  # [ADDED]
             else:  # [ADDED]
                 st.info("Uploaded files are already available in the monitored folder.")  # [ADDED]
         else:  # [ADDED]
@@ -799,7 +875,9 @@ def app() -> None:
         )
         if bin_upload is not None:
             try:
-                st.session_state.binary_model = joblib.load(bin_upload)
+                # 經行程共用快取：Streamlit 每次重跑與其他 session 不再重複反序列化
+                st.session_state.binary_model = model_registry.load_model(bin_upload)
+                _persist_model(bin_upload, "binary_model_path")
                 st.success("✅ 二元分類模型已載入")
             except Exception:
                 st.error("❌ 二元分類模型載入失敗")
@@ -814,7 +892,8 @@ def app() -> None:
         )
         if mul_upload is not None:
             try:
-                st.session_state.multi_model = joblib.load(mul_upload)
+                st.session_state.multi_model = model_registry.load_model(mul_upload)
+                _persist_model(mul_upload, "multi_model_path")
                 st.success("✅ 多元分類模型已載入")
             except Exception:
                 st.error("❌ 多元分類模型載入失敗")
@@ -849,6 +928,20 @@ def app() -> None:
             _cleanup_generated(0, force=True)
             st.success("已清理所有生成檔案")
 
+    st.checkbox(
+        "📈 增量追蹤模式 (tail)",
+        key="tail_mode",
+        disabled=bool(st.session_state.get("shared_mode")),
+        help="持續寫入的 CSV/TXT/log 只處理新增的完整列：記住每個檔案的讀取位置"
+             "（支援輪替與截斷），以微批次推論並附加到 *_report.csv，不必等檔案停止成長",
+    )
+    st.checkbox(
+        "🤝 多主機共用資料夾 (lease)",
+        key="shared_mode",
+        help="多台主機監控同一個資料夾時，處理前先在 .dflare_leases/ 建立租約檔認領檔案，"
+             "其他主機略過；主機當機、租約過期後由其他主機接手（增量追蹤會停用）",
+    )
+
     # 控制按鈕區域
     st.subheader("🎛️ 監控控制")
     action_cols = st.columns(2)
@@ -877,6 +970,8 @@ def app() -> None:
         ):
             # 建立增強版的處理器
             handler = _FileMonitorHandler()
+            if st.session_state.get("shared_mode"):
+                _leases().purge()  # 清掉超過保留期限的完成標記
             
             # 啟動 Watchdog 觀察器
             observer = Observer()
@@ -955,12 +1050,18 @@ def app() -> None:
             for msg in status_info['last_messages']:
                 st.text(f"• {msg}")
     
-    progress_bar = st.progress(0)
-
     if st.session_state.observer is not None:
-        _process_events(st.session_state.handler, progress_bar, 
-                        status_placeholder)
+        _process_events(st.session_state.handler, status_placeholder)
+        if st.session_state.get("shared_mode"):
+            _reattach_leases()
+            _retry_expired_leases()
+        else:
+            _retry_failed_files(folder)
+        if _tail_enabled():
+            _tail_folder(folder, st.session_state.handler)
         _cleanup_generated(retention)
+    _collect_jobs(st.session_state.get("handler"))
+    _render_job_status()
 
     # 報告結果顯示
     report_path = st.session_state.get("last_report_path")
@@ -1037,4 +1138,11 @@ def app() -> None:
                 # 監控停止時，使用較長間隔檢查
                 if st_autorefresh is not None:
                     st_autorefresh(interval=5000, key="monitor_idle_check")
+    elif st.session_state.get("queued_jobs"):
+        # 未監控但仍有排入的工作（例如上傳的檔案）：輪詢工作狀態
+        if st_autorefresh is not None:
+            st_autorefresh(interval=2000, key="job_queue_refresh")
+        else:  # pragma: no cover - fallback when autorefresh missing
+            time.sleep(1)
+            _rerun()
 
@@ -2,14 +2,23 @@ import threading
 import time
 import tempfile
 import os
+import sys
 from contextlib import suppress
+from pathlib import Path
 import streamlit as st
 import pandas as pd
-import joblib
 import xgboost as xgb
 import numpy as np
 from . import _ensure_module, apply_dark_theme  # [MODIFIED]
 
+# 添加 ui_shared 模組路徑
+_ROOT = Path(__file__).resolve().parents[2]
+if str(_ROOT / "ui_shared") not in sys.path:
+    sys.path.insert(0, str(_ROOT / "ui_shared"))
+
+import model_registry
+from feature_alignment import FeatureMatrix, compile_plan
+
 _ensure_module("numpy", "numpy_stub")
 _ensure_module("pandas", "pandas_stub")
 
@@ -25,9 +34,6 @@ def _load_model_safe(uploaded_file):
     def _reset_file_pointer(file):
         file.seek(0)
 
-    def _load_with_joblib(file):
-        return joblib.load(file)
-
     def _handle_xgboost_model(model):
         if hasattr(model, 'get_booster'):
             model = _fix_xgboost_compatibility(model)
@@ -67,11 +73,14 @@ def _load_model_safe(uploaded_file):
                 setattr(new_model, attr, getattr(old_model, attr))
         return new_model
 
+    def _prepare(model):
+        if hasattr(model, 'get_booster'):
+            model = _handle_xgboost_model(model)
+        return model
+
+    # 經行程共用的模型快取：同一份模型檔只在第一次按下按鈕時反序列化與修復
     _reset_file_pointer(uploaded_file)
-    model = _load_with_joblib(uploaded_file)
-    if hasattr(model, 'get_booster'):
-        model = _handle_xgboost_model(model)
-    return model
+    return model_registry.load_model(uploaded_file, prepare=_prepare)
 
 
 def _get_feature_names(model):
@@ -89,19 +98,10 @@ def _get_feature_names(model):
     return features
 
 
-def _prepare_df(df, features):
-    if features is not None:
-        df = df.reindex(columns=features)
-    for col in df.columns:
-        if pd.api.types.is_bool_dtype(df[col].dtype):
-            df[col] = df[col].fillna(False).astype("int8", copy=False)
-        else:
-            df[col] = (
-                pd.to_numeric(df[col], errors="coerce")
-                .fillna(0)
-                .astype("float32", copy=False)
-            )
-    return df
+def _prepare_df(base, features, rows=None):
+    """以預先編譯的對齊計畫從 float32 基底矩陣取出模型輸入（缺欄補 0）"""
+    target = list(features) if features is not None else list(base.columns)
+    return compile_plan(target, base.columns, fill_value=0.0).align(base, rows=rows)
 
 
 def app() -> None:
@@ -141,8 +141,10 @@ def app() -> None:
                     result_holder["error"] = Exception("二元分類模型載入失敗")
                     return
                 
+                # 一次轉成 float32 基底矩陣（缺值補 0），二元／多元模型共用
+                base = FeatureMatrix.from_frame(df, na_value=0.0)
                 features = _get_feature_names(bin_clf)
-                df_bin = _prepare_df(df.copy(), features)
+                df_bin = _prepare_df(base, features)
                 
                 # 安全執行預測
                 def _safe_predict(model, data, model_name="模型"):
@@ -184,22 +186,8 @@ def app() -> None:
                         print(f"{model_name} 預測失敗: {str(e)}")
                         raise e
                 
-                try:
-                    bin_pred = _safe_predict(bin_clf, df_bin, "二元分類模型")
-                except Exception as e:
-                    # 如果預測失敗，嘗試轉換數據類型
-                    print(f"預測遇到問題，嘗試數據類型轉換: {str(e)}")
-                    # 確保所有數值列為 float32
-                    df_converted = df_bin.copy()
-                    for col in df_converted.columns:
-                        if df_converted[col].dtype == 'object':
-                            df_converted[col] = pd.to_numeric(
-                                df_converted[col], errors='coerce')
-                        df_converted[col] = df_converted[col].astype('float32')
-                    df_converted = df_converted.fillna(0)
-                    model_name = "二元分類模型（轉換後）"
-                    bin_pred = _safe_predict(bin_clf, df_converted, model_name)
-                    df_bin = df_converted  # 使用轉換後的數據
+                # 基底矩陣已是 float32 且無缺值，不需再逐欄轉型重試
+                bin_pred = _safe_predict(bin_clf, df_bin, "二元分類模型")
                 
                 result = pd.DataFrame({"is_attack": bin_pred})
                 
@@ -213,29 +201,9 @@ def app() -> None:
                             return
                         
                         m_features = _get_feature_names(mul_clf)
-                        df_mul = _prepare_df(df_bin.copy(), m_features)
-                        
-                        # 安全執行多元預測
-                        try:
-                            model_name = "多元分類模型"
-                            data_subset = df_mul.loc[mask]
-                            cr_pred = _safe_predict(
-                                mul_clf, data_subset, model_name
-                            )
-                        except Exception as e:
-                            print(f"多元預測遇到問題，嘗試數據類型轉換: {str(e)}")
-                            df_mul_converted = df_mul.loc[mask].copy()
-                            for col in df_mul_converted.columns:
-                                if df_mul_converted[col].dtype == 'object':
-                                    df_mul_converted[col] = pd.to_numeric(
-                                        df_mul_converted[col], errors='coerce')
-                                df_mul_converted[col] = (
-                                    df_mul_converted[col].astype('float32'))
-                            df_mul_converted = df_mul_converted.fillna(0)
-                            model_name = "多元分類模型（轉換後）"
-                            cr_pred = _safe_predict(
-                                mul_clf, df_mul_converted, model_name
-                            )
+                        # 從同一基底直接取攻擊列與多元模型欄位
+                        df_mul = _prepare_df(base, m_features, rows=mask.to_numpy())
+                        cr_pred = _safe_predict(mul_clf, df_mul, "多元分類模型")
                         
                         result.loc[mask, "crlevel"] = cr_pred
                         
@@ -96,9 +96,9 @@ def app() -> None:
     st.subheader("1️⃣ 上傳訓練資料")
     uploaded_files = st.file_uploader(
         "選擇訓練資料檔案 (支援多檔案選擇)",
-        type=["csv", "txt", "log", "gz", "zip"],
+        type=["csv", "txt", "log", "gz", "zip", "parquet", "feather", "arrow"],
         accept_multiple_files=True,
-        help="支援格式：CSV, TXT, LOG 及壓縮檔 (.gz, .zip) | "
+        help="支援格式：CSV, TXT, LOG, Parquet, Arrow/Feather 及壓縮檔 (.gz, .zip) | "
              "請上傳包含特徵和標籤（is_attack 或 crlevel）的資料檔案"
     )
     
@@ -169,6 +169,8 @@ def app() -> None:
         optimize_ensemble = False
         use_tuned_for_training = False
         ensemble_mode = "free"
+        multi_fidelity = False
+        warm_start = False
 
         if optuna_enabled:
             st.markdown("**Optuna 優化設定**")
@@ -180,6 +182,18 @@ def app() -> None:
             with col4:
                 optimize_ensemble = st.checkbox("Optimize ensemble", value=False)
 
+            if optimize_base:
+                multi_fidelity = st.checkbox(
+                    "Multi-fidelity tuning",
+                    value=False,
+                    help="以子樣本逐步放大 + early stopping 評估 trial，差的組合在 5~10% 資料時即淘汰",
+                )
+                warm_start = st.checkbox(
+                    "Warm-start from previous run",
+                    value=False,
+                    help="沿用輸出目錄中最近一次同任務、同特徵集的最佳參數，只需少量 trial",
+                )
+
             if optimize_base or optimize_ensemble:
                 use_tuned_for_training = st.checkbox(
                     "Use tuned params for training", 
@@ -248,6 +262,9 @@ def app() -> None:
             pipeline.config["RANDOM_STATE"] = random_state
             pipeline.config.setdefault("ENSEMBLE_SETTINGS", {})["MODE"] = ensemble_mode
             pipeline.config.setdefault("ENSEMBLE_SETTINGS", {})["THRESHOLD"] = threshold
+            pipeline.config.setdefault("MULTI_FIDELITY", {})["ENABLED"] = multi_fidelity
+            pipeline.config.setdefault("WARM_START", {})["ENABLED"] = warm_start
+            pipeline.config["OUTPUT_DIR"] = output_dir
         progress = st.progress(0)
         status = st.empty()
         log_box = st.empty()
@@ -255,6 +272,13 @@ def app() -> None:
         result = {"error": None, "output": None}
 
         log_queue: "queue.Queue[str]" = queue.Queue()
+        fold_progress: dict = {}
+
+        def _on_fold_progress(done: int, total: int, label: str) -> None:
+            fold_progress.update(done=done, total=total, label=label)
+
+        if hasattr(pipeline, "progress_callback"):
+            pipeline.progress_callback = _on_fold_progress
 
         class _QueueStream(io.TextIOBase):
             def write(self, buf: str) -> int:
@@ -282,7 +306,11 @@ def app() -> None:
             if pct < 95:
                 pct += 5
             progress.progress(pct)
-            status.text(f"Training in progress... {pct}%")
+            if fold_progress:
+                status.text(f"Training in progress... {pct}% "
+                            f"({fold_progress['label']}，{fold_progress['done']}/{fold_progress['total']})")
+            else:
+                status.text(f"Training in progress... {pct}%")
             while not log_queue.empty():
                 log_text += log_queue.get()
             log_box.code(log_text)
@@ -345,6 +373,15 @@ def app() -> None:
                 else:
                     st.warning("Model file not found in artifacts directory.")
 
+                # 蒸餾學生模型（DISTILLATION 啟用時才會產生）
+                for student_path in sorted((Path(artifacts_dir) / "models").glob("student_*.joblib")):
+                    with open(student_path, "rb") as f:
+                        st.download_button(
+                            f"Download distilled student ({student_path.stem})",
+                            f.read(),
+                            file_name=student_path.name,
+                        )
+
             else:
                 st.warning("No artifacts directory returned.")
 
@@ -415,6 +452,8 @@ def app() -> None:
         #### Optuna 優化
         - **Optimize base models**: 自動調整單一模型參數
         - **Optimize ensemble**: 自動調整集成策略
+        - **Multi-fidelity tuning**: 基模型尋參改用子樣本 rung + early stopping，大幅縮短搜尋時間
+        - **Warm-start**: 以上次相容訓練的最佳參數為起點，縮小搜尋範圍並減少 trial 數
         - **Free mode**: 靈活的集成搜尋
         - **Fixed mode**: 固定的集成結構
         
@@ -431,6 +470,7 @@ def app() -> None:
         - `models/`: 訓練好的模型檔案 (.joblib)
         - `reports/`: 詳細的評估報告和指標
         - `ensemble_best.joblib`: 最佳集成模型
+        - `student_LGB.joblib` / `student_XGB.joblib`: 集成蒸餾後的單一學生模型（啟用 DISTILLATION 時）
         
         ### 注意事項
         - 確保資料集大小足夠（建議 > 10,000 筆）
@@ -14,7 +14,7 @@ INV_CRLEVEL_MAP = {v: k for k, v in CRLEVEL_MAP.items()}
 
 def encode_crlevel_series(y: pd.Series) -> pd.Series:
     """將字串 crlevel 統一映射為 0..4，回傳 int32 Series。"""
-    if y.dtype == object:
+    if y.dtype == object or pd.api.types.is_string_dtype(y.dtype):
         y2 = y.str.lower().map(CRLEVEL_MAP)
         if y2.isna().any():
             bad = sorted(y[y2.isna()].unique().tolist())
@@ -0,0 +1,8 @@
+"""Shared pytest setup: make ui_shared modules and repo packages importable."""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, "ui_shared")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
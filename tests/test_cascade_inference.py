@@ -0,0 +1,125 @@
+"""Tests for cascaded inference (ui_shared/cascade_inference.py)."""
+import pickle
+
+import numpy as np
+import pandas as pd
+
+import cascade_inference
+from cascade_inference import CascadeClassifier, CascadeStats, cascade_stats
+from dedup_inference import DedupPredictor
+
+
+class _FixedProba:
+    """回傳預先指定機率的假模型，記錄實際收到的列數。"""
+
+    def __init__(self, proba, classes=(0, 1)):
+        self.proba = np.asarray(proba, dtype=np.float64)
+        self.classes_ = np.asarray(classes)
+        self.seen = 0
+
+    def predict_proba(self, X):
+        idx = np.asarray(X, dtype=np.int64)[:, 0]
+        self.seen += len(idx)
+        return self.proba[idx]
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+class _CountingModel:
+    """以列總和判斷類別的假模型，記錄實際送進模型的列數。"""
+
+    classes_ = np.array([0, 1])
+
+    def __init__(self, threshold=5.0):
+        self.threshold = threshold
+        self.seen = 0
+
+    def predict_proba(self, X):
+        values = np.asarray(X, dtype=np.float64)
+        self.seen += len(values)
+        p = 1.0 / (1.0 + np.exp(self.threshold - values.sum(axis=1)))
+        return np.column_stack([1 - p, p])
+
+    def predict(self, X):
+        return (self.predict_proba(X)[:, 1] >= 0.5).astype(int)
+
+
+def _index_rows(n):
+    # 第一欄是列號，假模型依列號取對應的機率
+    return np.arange(n).reshape(-1, 1)
+
+
+def test_binary_route_uses_low_and_high_thresholds():
+    pos = np.array([0.05, 0.2, 0.5, 0.79, 0.8, 0.95])
+    gate = _FixedProba(np.column_stack([1 - pos, pos]))
+    cascade = CascadeClassifier(gate, model=None, low=0.2, high=0.8)
+    labels, band = cascade._route(gate.proba)
+    np.testing.assert_array_equal(band, [False, True, True, True, False, False])
+    np.testing.assert_array_equal(labels[~band], [0, 1, 1])
+
+
+def test_multiclass_route_uses_confidence():
+    proba = np.array([[0.9, 0.05, 0.05], [0.4, 0.35, 0.25], [0.1, 0.1, 0.8], [0.3, 0.6, 0.1]])
+    gate = _FixedProba(proba, classes=("a", "b", "c"))
+    cascade = CascadeClassifier(gate, model=None, task="multiclass", confidence=0.7)
+    labels, band = cascade._route(proba)
+    np.testing.assert_array_equal(band, [False, True, False, True])
+    np.testing.assert_array_equal(labels, ["a", "a", "c", "b"])
+
+
+def test_only_uncertain_rows_reach_the_full_model():
+    pos = np.array([0.05, 0.5, 0.95, 0.3])
+    gate = _FixedProba(np.column_stack([1 - pos, pos]))
+    model = _FixedProba(np.array([[0.0, 1.0], [1.0, 0.0], [0.0, 1.0], [1.0, 0.0]]))
+    cascade = CascadeClassifier(gate, model, low=0.2, high=0.8)
+    X = _index_rows(4)
+
+    stats = CascadeStats()
+    np.testing.assert_array_equal(cascade.predict(X, stats=stats), [0, 0, 1, 0])
+    assert model.seen == 2
+    assert (stats.rows, stats.heavy) == (4, 2)
+
+    proba = cascade.predict_proba(X)
+    np.testing.assert_allclose(proba[[0, 2]], gate.proba[[0, 2]])
+    np.testing.assert_allclose(proba[[1, 3]], model.proba[[1, 3]])
+    assert cascade.stats() == {"rows": 8, "heavy": 4, "gated_ratio": 0.5}
+
+
+def test_row_counts_weight_the_stats():
+    pos = np.array([0.05, 0.5, 0.95])
+    gate = _FixedProba(np.column_stack([1 - pos, pos]))
+    cascade = CascadeClassifier(gate, _FixedProba(np.full((3, 2), 0.5)), low=0.2, high=0.8)
+    stats = CascadeStats()
+    cascade.predict(_index_rows(3), stats=stats, row_counts=np.array([10, 3, 1]))
+    assert (stats.rows, stats.heavy) == (14, 3)
+    assert cascade_stats(cascade) == CascadeStats()
+    assert cascade_stats(gate) is None
+
+
+def test_dedup_cascade_stats_count_original_rows():
+    rng = np.random.default_rng(1)
+    X = pd.DataFrame(rng.integers(0, 4, size=(500, 3)).astype(np.float32), columns=["a", "b", "c"])
+    cascade = CascadeClassifier(_CountingModel(threshold=4.0), _CountingModel(), low=0.2, high=0.8)
+    reference = CascadeStats()
+    expected = cascade.predict(X, stats=reference)
+
+    stats = CascadeStats()
+    out = DedupPredictor(cascade, lru_size=0).predict(X, cascade=stats)
+    np.testing.assert_array_equal(out, expected)
+    assert stats.rows == len(X)
+    assert 0 < stats.heavy < stats.rows
+    assert (stats.rows, stats.heavy) == (reference.rows, reference.heavy)
+
+
+def test_training_side_pickles_under_the_inference_module_name():
+    # 訓練端與推論端必須是同一個頂層模組，pickle 才能在監控端載回
+    from Forti_ui_app_bundle.training_pipeline import cascade as training_cascade
+
+    assert training_cascade.CascadeClassifier is cascade_inference.CascadeClassifier
+    cascade = CascadeClassifier(_CountingModel(threshold=4.0), _CountingModel(), low=0.2, high=0.8)
+    blob = pickle.dumps(cascade)
+    assert b"cascade_inference" in blob and b"ui_shared.cascade_inference" not in blob
+    restored = pickle.loads(blob)
+    assert isinstance(restored, cascade_inference.CascadeClassifier)
+    assert restored.stats() == {"rows": 0, "heavy": 0, "gated_ratio": 0.0}
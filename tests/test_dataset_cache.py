@@ -0,0 +1,57 @@
+"""Tests for the binned dataset cache (training_pipeline/dataset_cache.py)."""
+import numpy as np
+import pytest
+from sklearn.model_selection import StratifiedKFold
+
+from Forti_ui_app_bundle.training_pipeline.dataset_cache import BinnedDatasetCache
+
+xgb = pytest.importorskip("xgboost")
+lgb = pytest.importorskip("lightgbm")
+
+
+def _cache(sample_weight=None):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(400, 5))
+    y = (X[:, 0] + 0.5 * X[:, 1] > 0).astype(int)
+    folds = list(StratifiedKFold(n_splits=3, shuffle=True, random_state=0).split(X, y))
+    return BinnedDatasetCache(X, y, folds, sample_weight=sample_weight), X, y, folds
+
+
+def test_xgb_datasets_are_shared_per_max_bin():
+    cache, X, y, folds = _cache()
+    params = {"n_estimators": 20, "max_depth": 3, "objective": "binary:logistic", "random_state": 0}
+    scores = cache.xgb_cv_accuracy(params)
+    assert len(scores) == 3 and min(scores) > 0.8
+    first = cache.xgb_fold(0, 256)
+    cache.xgb_cv_accuracy(dict(params, max_depth=4))
+    assert cache.xgb_fold(0, 256) is first
+    assert cache.xgb_fold(0, 64) is not first
+    assert len(cache.xgb_cv_accuracy(dict(params, max_bin=64))) == 3
+
+
+def test_lgb_datasets_free_raw_data_and_are_reused_across_trials():
+    cache, X, y, folds = _cache()
+    params = {"n_estimators": 20, "num_leaves": 7, "min_data_in_leaf": 5, "objective": "binary",
+              "max_bin": 127, "verbosity": -1}
+    scores = cache.lgb_cv_accuracy(params)
+    assert len(scores) == 3 and min(scores) > 0.8
+    ds = cache.lgb_fold(0, params)
+    assert ds.data is None  # 快取只保留分箱結果
+    assert ds.num_data() == len(folds[0][0])
+    # 非分箱參數改變：沿用同一個 Dataset
+    cache.lgb_cv_accuracy(dict(params, min_data_in_leaf=30, learning_rate=0.05))
+    assert cache.lgb_fold(0, params) is ds
+    assert cache.lgb_fold(0, dict(params, max_bin=255)) is not ds
+    assert len(cache._lgb) == 4
+
+
+def test_weighted_accuracy_matches_expanded_rows():
+    weights = np.ones(400)
+    weights[::2] = 3
+    cache, X, y, folds = _cache(sample_weight=weights)
+    params = {"n_estimators": 10, "num_leaves": 7, "objective": "binary", "verbosity": -1}
+    scores = cache.lgb_cv_accuracy(params)
+    va = folds[0][1]
+    booster = lgb.train(params, cache.lgb_fold(0, params), num_boost_round=10)
+    pred = (booster.predict(X[va]) > 0.5).astype(int)
+    assert scores[0] == pytest.approx(np.average(pred == y[va], weights=weights[va]))
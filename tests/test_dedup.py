@@ -0,0 +1,36 @@
+"""Tests for duplicate-row compression before training (training_pipeline/dedup.py)."""
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+
+from Forti_ui_app_bundle.training_pipeline.dedup import compress_duplicates
+
+
+def test_duplicates_merge_into_counts_in_first_seen_order():
+    X = pd.DataFrame({"a": [1.0, 2.0, 1.0, -0.0, 0.0, 2.0], "b": [5.0, 6.0, 5.0, 1.0, 1.0, 6.0]})
+    y = pd.Series([0, 1, 0, 1, 1, 0])
+    X_c, y_c, w, stats = compress_duplicates(X, y)
+    # 同特徵不同標籤（第 2、6 列）不合併；-0.0 與 0.0 視為相同
+    assert X_c.to_dict("list") == {"a": [1.0, 2.0, 0.0, 2.0], "b": [5.0, 6.0, 1.0, 6.0]}
+    assert y_c.tolist() == [0, 1, 1, 0]
+    np.testing.assert_array_equal(w, [2, 1, 2, 1])
+    assert stats == {"rows_before": 6, "rows_after": 4, "ratio": 1.5, "max_weight": 2}
+
+
+def test_existing_weights_are_summed():
+    X = np.array([[1.0], [1.0], [2.0]])
+    _, y_c, w, _ = compress_duplicates(X, np.array([0, 0, 1]), sample_weight=[10.0, 10.0, 1.0])
+    np.testing.assert_array_equal(y_c, [0, 1])
+    np.testing.assert_array_equal(w, [20.0, 1.0])
+
+
+def test_weighted_model_matches_model_on_full_data():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.integers(0, 3, size=(3000, 3)).astype(np.float32), columns=["a", "b", "c"])
+    y = (X.sum(axis=1) + rng.normal(size=len(X)) > 3).astype(int)
+    X_c, y_c, w, stats = compress_duplicates(X, y)
+    assert stats["ratio"] > 10
+    full = LogisticRegression(tol=1e-8, max_iter=5000).fit(X, y)
+    compressed = LogisticRegression(tol=1e-8, max_iter=5000).fit(X_c, y_c, sample_weight=w)
+    np.testing.assert_allclose(compressed.coef_, full.coef_, rtol=1e-3, atol=1e-4)
+    np.testing.assert_allclose(compressed.intercept_, full.intercept_, rtol=1e-3, atol=1e-4)
@@ -0,0 +1,70 @@
+"""Tests for deduplicated inference (ui_shared/dedup_inference.py)."""
+import numpy as np
+import pandas as pd
+
+from dedup_inference import DedupPredictor, DedupStats, dedup_predictor
+
+
+class _CountingModel:
+    """以列總和判斷類別的假模型，記錄實際送進模型的列數。"""
+
+    classes_ = np.array([0, 1])
+
+    def __init__(self, threshold=5.0):
+        self.threshold = threshold
+        self.seen = 0
+
+    def predict_proba(self, X):
+        values = np.asarray(X, dtype=np.float64)
+        self.seen += len(values)
+        p = 1.0 / (1.0 + np.exp(self.threshold - values.sum(axis=1)))
+        return np.column_stack([1 - p, p])
+
+    def predict(self, X):
+        return (self.predict_proba(X)[:, 1] >= 0.5).astype(int)
+
+
+def _features(n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(rng.integers(0, 4, size=(n, 3)).astype(np.float32), columns=["a", "b", "c"])
+
+
+def test_results_match_model_and_only_unique_rows_are_predicted():
+    X = _features()
+    model = _CountingModel()
+    expected = model.predict_proba(X)
+    model.seen = 0
+    stats = DedupStats()
+    out = DedupPredictor(model, lru_size=0).predict_proba(X, stats)
+    np.testing.assert_array_equal(out, expected)
+    unique = len(X.drop_duplicates())
+    assert model.seen == unique
+    assert stats.rows == len(X) and stats.unique == unique and stats.predicted == unique
+    assert stats.saved_ratio == 1 - unique / len(X)
+
+
+def test_lru_is_shared_across_calls_for_the_same_model():
+    X = _features()
+    model = _CountingModel()
+    first = dedup_predictor(model).predict(X)
+    model.seen = 0
+    stats = DedupStats()
+    second = dedup_predictor(model).predict(X, stats)
+    np.testing.assert_array_equal(first, second)
+    assert model.seen == 0
+    assert stats.lru_hits == stats.unique and stats.predicted == 0
+    assert dedup_predictor(model).totals.rows == 2 * len(X)
+
+
+def test_object_columns_fall_back_to_plain_prediction():
+    X = np.array([[1, "a"], [1, "a"]], dtype=object)
+
+    class _Echo:
+        def predict(self, rows):
+            return np.arange(len(rows))
+
+    stats = DedupStats()
+    out = DedupPredictor(_Echo()).predict(X, stats)
+    np.testing.assert_array_equal(out, [0, 1])
+    assert stats.predicted == 2
+
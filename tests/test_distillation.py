@@ -0,0 +1,45 @@
+"""Tests for soft-label expansion used by distillation (training_pipeline/distillation.py)."""
+import numpy as np
+
+from Forti_ui_app_bundle.training_pipeline.distillation import soft_label_expand
+
+
+def _soft_labels(n=50, k=3, seed=0):
+    rng = np.random.default_rng(seed)
+    logits = rng.normal(size=(n, k)) * 3
+    proba = np.exp(logits) / np.exp(logits).sum(axis=1, keepdims=True)
+    X = rng.normal(size=(n, 2)).astype(np.float32)
+    return X, proba
+
+
+def test_rows_are_expanded_per_class_with_probability_weights():
+    X = np.array([[0.0], [1.0]], dtype=np.float32)
+    proba = np.array([[0.7, 0.3, 0.0], [0.0005, 0.0, 0.9995]])
+    X_exp, cls, w = soft_label_expand(X, proba)
+    np.testing.assert_array_equal(X_exp[:, 0], [0.0, 0.0, 1.0])
+    np.testing.assert_array_equal(cls, [0, 1, 2])
+    np.testing.assert_allclose(w, [0.7, 0.3, 0.9995], rtol=1e-6)
+    assert cls.dtype == np.int32 and w.dtype == np.float32
+
+
+def test_weighted_cross_entropy_equals_soft_cross_entropy():
+    X, proba = _soft_labels()
+    rows = np.repeat(np.arange(len(X)), proba.shape[1])
+    student = np.random.default_rng(1).dirichlet(np.ones(proba.shape[1]), size=len(X))
+
+    X_exp, cls, w = soft_label_expand(np.arange(len(X)), proba, min_proba=0.0)
+    np.testing.assert_array_equal(X_exp, rows)
+    soft_ce = -(proba * np.log(student)).sum()
+    weighted_ce = -(w * np.log(student[X_exp, cls])).sum()
+    np.testing.assert_allclose(weighted_ce, soft_ce, rtol=1e-5)
+
+
+def test_sample_weight_scales_each_expanded_row():
+    X, proba = _soft_labels(n=20)
+    sw = np.arange(1, 21, dtype=np.float64)
+    idx, cls, w = soft_label_expand(np.arange(len(X)), proba, sample_weight=sw)
+    _, _, base = soft_label_expand(np.arange(len(X)), proba)
+    np.testing.assert_allclose(w, base * sw[idx], rtol=1e-6)
+    # 去掉的極小機率只佔每列總權重的一小部分
+    per_row = np.bincount(idx, weights=base, minlength=len(X))
+    assert np.all(per_row > 1 - 2e-3)
@@ -0,0 +1,82 @@
+"""Tests for negative downsampling and prior correction (training_pipeline/downsampling.py)."""
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.base import clone
+from sklearn.linear_model import LogisticRegression
+
+from Forti_ui_app_bundle.training_pipeline.downsampling import (
+    PriorCorrectedClassifier,
+    correct_proba,
+    downsample_negatives,
+)
+from Forti_ui_app_bundle.training_pipeline.pipeline_main import TrainingPipeline
+
+
+def _data(n=20000, pos_rate=0.05, seed=0):
+    rng = np.random.default_rng(seed)
+    y = (rng.random(n) < pos_rate).astype(int)
+    X = pd.DataFrame({"a": rng.normal(size=n) + 1.5 * y, "b": rng.normal(size=n)})
+    return X, pd.Series(y, name="is_attack")
+
+
+def test_downsample_keeps_positives_and_rate_of_negatives():
+    X, y = _data()
+    X_ds, y_ds, weight, stats = downsample_negatives(X, y, rate=0.2, seed=1)
+    assert weight is None
+    assert stats["positives"] == int(y.sum()) == int(y_ds.sum())
+    assert stats["rows_after"] == len(X_ds) == len(y_ds)
+    assert abs(stats["negatives_after"] / stats["negatives_before"] - 0.2) < 0.02
+
+    _, y_w, weight, _ = downsample_negatives(X, y, rate=0.2, seed=1, mode="weight")
+    np.testing.assert_array_equal(weight, np.where(y_w.to_numpy() == 0, 5.0, 1.0))
+    with pytest.raises(ValueError):
+        downsample_negatives(X, y, rate=0.0)
+
+
+def test_correct_proba_inverts_the_prior_shift():
+    p = np.array([0.01, 0.1, 0.5, 0.9])
+    # 降採樣資料上的機率 q = p / (p + (1 - p) * rate)，修正後應回到 p
+    rate = 0.1
+    q = p / (p + (1 - p) * rate)
+    out = correct_proba(np.column_stack([1 - q, q]), rate)
+    np.testing.assert_allclose(out[:, 1], p)
+    np.testing.assert_allclose(out.sum(axis=1), 1.0)
+    flipped = correct_proba(np.column_stack([q, 1 - q]), rate, negative_index=1)
+    np.testing.assert_allclose(flipped[:, 0], p)
+
+
+def test_prior_corrected_model_is_calibrated_on_the_full_distribution():
+    X, y = _data(seed=2)
+    X_ds, y_ds, _, _ = downsample_negatives(X, y, rate=0.1, seed=3)
+    raw = LogisticRegression().fit(X_ds, y_ds)
+    wrapped = PriorCorrectedClassifier.from_fitted(raw, rate=0.1)
+    # 未修正的機率明顯高估正例率，修正後平均機率接近實際正例率
+    assert raw.predict_proba(X)[:, 1].mean() > 2 * y.mean()
+    assert abs(wrapped.predict_proba(X)[:, 1].mean() - y.mean()) < 0.01
+    assert wrapped.coef_.shape == raw.coef_.shape  # 屬性透傳到內部模型
+
+    refit = clone(wrapped).fit(X_ds, y_ds)
+    np.testing.assert_allclose(refit.predict_proba(X), wrapped.predict_proba(X))
+
+
+def _pipeline(mode, stats):
+    return SimpleNamespace(config={"NEG_DOWNSAMPLING": {"ENABLED": True, "RATE": 0.25, "MODE": mode}},
+                           downsampling_stats=stats)
+
+
+def test_prior_correct_wraps_only_in_prior_mode():
+    X, y = _data(n=2000)
+    lr = LogisticRegression().fit(X, y)
+    already = PriorCorrectedClassifier.from_fitted(LogisticRegression().fit(X, y), rate=0.5)
+    trained = {"LR": lr, "DONE": already}
+
+    out = TrainingPipeline._prior_correct(_pipeline("prior", {"rate": 0.25}), trained)
+    assert isinstance(out["LR"], PriorCorrectedClassifier)
+    assert out["LR"].estimator_ is lr and out["LR"].rate == 0.25
+    assert out["DONE"] is already
+
+    assert TrainingPipeline._prior_correct(_pipeline("weight", {"rate": 0.25}), trained) is trained
+    assert TrainingPipeline._prior_correct(_pipeline("prior", None), trained) is trained
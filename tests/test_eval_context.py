@@ -0,0 +1,87 @@
+"""Tests for the shared validation-set evaluation context (training_pipeline/eval_context.py)."""
+import gc
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import VotingClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.naive_bayes import GaussianNB
+from sklearn.tree import DecisionTreeClassifier
+
+from Forti_ui_app_bundle.training_pipeline.downsampling import PriorCorrectedClassifier
+from Forti_ui_app_bundle.training_pipeline.eval_context import EvalContext
+from Forti_ui_app_bundle.training_pipeline.oof_cache import CachedStackingClassifier
+
+
+class _Counting:
+    """包裝模型並記錄 predict_proba 呼叫次數。"""
+
+    def __init__(self, model):
+        self.model = model
+        self.classes_ = model.classes_
+        self.calls = 0
+
+    def predict_proba(self, X):
+        self.calls += 1
+        return self.model.predict_proba(X)
+
+
+def _data(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(size=(n, 3)), columns=["a", "b", "c"])
+    y = (X["a"] + 0.5 * rng.normal(size=n) > 0).astype(int)
+    return X, y
+
+
+def test_probabilities_are_computed_once_per_model():
+    X, y = _data()
+    model = _Counting(LogisticRegression().fit(X.to_numpy(), y))
+    ctx = EvalContext(X, y)
+    first = ctx.proba(model)
+    np.testing.assert_array_equal(ctx.proba(model), first)
+    ctx.labels(model)
+    ctx.labels(model, threshold=0.3)
+    assert model.calls == 1
+    assert ctx.stats() == {"hits": 3, "misses": 1}
+    assert ctx.matches(X) and ctx.matches(ctx.X_np) and not ctx.matches(X.copy())
+
+
+def test_labels_follow_argmax_and_threshold():
+    X, y = _data()
+    lr = LogisticRegression().fit(X, y)
+    ctx = EvalContext(X, y)
+    np.testing.assert_array_equal(ctx.labels(lr), lr.predict(X))
+    p = lr.predict_proba(X)[:, 1]
+    np.testing.assert_array_equal(ctx.labels(lr, threshold=0.8), (p >= 0.8).astype(int))
+
+
+def test_ensembles_reuse_member_probabilities():
+    X, y = _data()
+    Xn = X.to_numpy()
+    members = [("lr", LogisticRegression()), ("nb", GaussianNB()), ("dt", DecisionTreeClassifier(max_depth=3))]
+    soft = VotingClassifier(members, voting="soft").fit(Xn, y)
+    hard = VotingClassifier(members, voting="hard").fit(Xn, y)
+    ctx = EvalContext(X, y)
+    np.testing.assert_allclose(ctx.proba(soft), soft.predict_proba(Xn))
+    np.testing.assert_array_equal(ctx.labels(hard), hard.predict(Xn))
+    misses = ctx.misses
+    for est in soft.estimators_:
+        ctx.proba(est)
+    assert ctx.misses == misses  # 子模型機率已在集成評估時算過
+
+    fitted = [(n, e) for n, e in zip(("lr", "nb", "dt"), soft.estimators_)]
+    stack = CachedStackingClassifier(fitted).fit_from_oof([e.predict_proba(Xn) for _, e in fitted], y)
+    np.testing.assert_allclose(ctx.proba(stack), stack.predict_proba(Xn))
+    prior = PriorCorrectedClassifier.from_fitted(soft.estimators_[0], rate=0.5)
+    np.testing.assert_allclose(ctx.proba(prior), prior.predict_proba(Xn))
+
+
+def test_entries_are_dropped_when_the_model_is_released():
+    X, y = _data()
+    ctx = EvalContext(X, y)
+    model = LogisticRegression().fit(X, y)
+    ctx.proba(model)
+    assert len(ctx._proba) == 1
+    del model
+    gc.collect()
+    assert len(ctx._proba) == 0
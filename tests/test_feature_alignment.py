@@ -0,0 +1,70 @@
+"""Tests for precompiled feature alignment plans (ui_shared/feature_alignment.py)."""
+import numpy as np
+import pandas as pd
+
+from feature_alignment import FeatureMatrix, compile_plan, model_features, plan_for
+
+
+def _frame():
+    return pd.DataFrame(
+        {"a": [1.7, None, 3.2], "b": ["4", "x", "6"], "c": [True, False, True]},
+        index=[10, 11, 12],
+    )
+
+
+def test_from_frame_converts_once_to_float32():
+    base = FeatureMatrix.from_frame(_frame(), na_value=-1)
+    assert base.values.dtype == np.float32
+    assert base.values.flags["C_CONTIGUOUS"]
+    assert base.had_na
+    np.testing.assert_allclose(base.values[:, 0], [1.7, -1, 3.2], rtol=1e-6)
+    np.testing.assert_array_equal(base.values[:, 1], [4, -1, 6])
+    np.testing.assert_array_equal(base.values[:, 2], [1, 0, 1])
+    truncated = FeatureMatrix.from_frame(_frame(), integer=True)
+    np.testing.assert_array_equal(truncated.values[:, 0], [1, 0, 3])
+
+
+def test_align_matches_reindex_fillna():
+    df = _frame()
+    base = FeatureMatrix.from_frame(df)
+    target = ["c", "missing", "a"]
+    plan = compile_plan(target, base.columns, fill_value=9)
+    assert plan.missing == ["missing"]
+    expected = (
+        df.apply(pd.to_numeric, errors="coerce").astype("float32").fillna(0)
+        .reindex(columns=target, fill_value=9).to_numpy(dtype=np.float32)
+    )
+    np.testing.assert_array_equal(plan.gather(base), expected)
+    aligned = plan.align(base, rows=np.array([True, False, True]))
+    assert list(aligned.columns) == target
+    np.testing.assert_array_equal(aligned.to_numpy(), expected[[0, 2]])
+
+
+def test_identity_plan_and_cache():
+    base = FeatureMatrix.from_frame(_frame())
+    plan = compile_plan(list(base.columns), base.columns)
+    assert plan.identity
+    assert compile_plan(list(base.columns), base.columns) is plan
+    assert compile_plan(list(base.columns), base.columns, fill_value=1) is not plan
+    np.testing.assert_array_equal(plan.gather(base), base.values)
+
+
+def test_take_and_select_index():
+    base = FeatureMatrix.from_frame(_frame())
+    picked = base.select_index([12, 10])
+    assert list(picked.index) == [12, 10]
+    np.testing.assert_array_equal(picked.values, base.values[[2, 0]])
+    assert base.select_index([99]) is None
+    assert len(base.take(np.array([True, False, False]))) == 1
+
+
+class _Model:
+    feature_names_in_ = np.array(["b", "a"], dtype=object)
+
+
+def test_plan_for_uses_model_features_or_fallback():
+    base = FeatureMatrix.from_frame(_frame())
+    assert model_features(_Model()) == ["b", "a"]
+    assert plan_for(_Model(), base).target == ("b", "a")
+    assert plan_for(object(), base, fallback=["c"]).target == ("c",)
+    assert plan_for(object(), base).target == base.columns
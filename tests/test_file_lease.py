@@ -0,0 +1,162 @@
+"""Tests for shared-folder file leases (ui_shared/file_lease.py)."""
+import json
+import multiprocessing
+import os
+
+import pytest
+
+import file_lease as fl
+from file_lease import ACTIVE, DONE, LeaseManager
+
+SETTINGS = {"TTL_SECONDS": 30, "HEARTBEAT_SECONDS": 10}
+
+
+def _file(root, name, text="x"):
+    path = os.path.join(str(root), name)
+    with open(path, "w") as fh:
+        fh.write(text)
+    return path
+
+
+def _expire(lease_path):
+    record = fl._read(lease_path)
+    record["expires"] = 0
+    fl._write(lease_path, record)
+
+
+@pytest.fixture
+def managers(tmp_path):
+    created = []
+
+    def make(owner):
+        manager = LeaseManager(str(tmp_path), SETTINGS, owner=owner)
+        created.append(manager)
+        return manager
+
+    yield make
+    for manager in created:
+        manager._stop.set()
+
+
+def test_acquire_is_exclusive(tmp_path, managers):
+    a, b = managers("host-a"), managers("host-b")
+    path = _file(tmp_path, "a.csv")
+    lease = a.acquire(path)
+    assert lease is not None
+    assert a.acquire(path) is lease
+    assert b.acquire(path) is None
+    assert b.is_waiting(path)
+    assert b.takeover_candidates() == []
+    assert a.status(path)["owner"] == "host-a"
+
+
+def test_expired_lease_is_taken_over(tmp_path, managers):
+    a, b = managers("host-a"), managers("host-b")
+    path = _file(tmp_path, "a.csv")
+    lease = a.acquire(path)
+    assert b.acquire(path) is None
+    _expire(lease.lease_path)
+
+    assert b.takeover_candidates() == [path]
+    taken = b.acquire(path)
+    assert taken is not None
+    assert b.status(path)["owner"] == "host-b"
+    assert not a.renew(lease)  # 原擁有者發現租約已被接手
+    assert a.held() == []
+
+
+def test_done_marker_blocks_reprocessing(tmp_path, managers):
+    a, b = managers("host-a"), managers("host-b")
+    path = _file(tmp_path, "a.csv")
+    a.release(a.acquire(path), DONE)
+    assert a.status(path)["status"] == DONE
+    assert b.acquire(path) is None
+    assert not b.is_waiting(path)
+
+
+def test_release_without_status_lets_others_claim(tmp_path, managers):
+    a, b = managers("host-a"), managers("host-b")
+    path = _file(tmp_path, "a.csv")
+    a.release(a.acquire(path))
+    assert a.status(path) is None
+    assert b.acquire(path) is not None
+
+
+def test_new_file_version_gets_a_new_lease(tmp_path, managers):
+    a, b = managers("host-a"), managers("host-b")
+    path = _file(tmp_path, "a.csv")
+    a.release(a.acquire(path), DONE)
+    _file(tmp_path, "a.csv", "changed")
+    assert b.acquire(path) is not None
+
+
+def test_adopt_reattaches_lease_of_previous_instance(tmp_path, managers):
+    before, after, other = managers("host-a:1"), managers("host-a:2"), managers("host-b")
+    path = _file(tmp_path, "a.csv")
+    lease = before.acquire(path)
+
+    assert other.adopt(path, lease.lease_path, "host-x") is None  # 不是前一個擁有者
+    adopted = after.adopt(path, lease.lease_path, "host-a:1")
+    assert adopted is not None
+    assert after.status(path)["owner"] == "host-a:2"
+    after.release(adopted, DONE)
+    assert after.adopt(path, lease.lease_path, "host-a:2") is None  # 已完成
+
+
+def test_adopt_expired_lease(tmp_path, managers):
+    before, after = managers("host-a:1"), managers("host-a:2")
+    path = _file(tmp_path, "a.csv")
+    lease = before.acquire(path)
+    _expire(lease.lease_path)
+    adopted = after.adopt(path, lease.lease_path, "host-a:1")
+    assert adopted is not None
+    record = after.status(path)
+    assert record["owner"] == "host-a:2" and record["status"] == ACTIVE
+
+
+def test_purge_removes_expired_done_markers(tmp_path, managers):
+    a = managers("host-a")
+    path = _file(tmp_path, "a.csv")
+    lease = a.acquire(path)
+    a.release(lease, DONE)
+    assert a.purge() == 0
+    record = fl._read(lease.lease_path)
+    record["expires"] = 0
+    fl._write(lease.lease_path, record)
+    assert a.purge() == 1
+
+
+def _claim_all(root, paths, out_path):
+    """在另一個行程中（模擬另一台主機）逐一嘗試取得租約，記錄取得的檔案。"""
+    manager = LeaseManager(root, SETTINGS)
+    claimed = []
+    for path in paths:
+        lease = manager.acquire(path)
+        if lease is not None:
+            claimed.append(path)
+            manager.release(lease, DONE)
+    with open(out_path, "w") as fh:
+        json.dump(claimed, fh)
+
+
+def test_each_file_is_claimed_by_exactly_one_process(tmp_path):
+    root = tmp_path / "drop"
+    root.mkdir()
+    paths = [_file(root, f"f{i}.csv", str(i)) for i in range(120)]
+    ctx = multiprocessing.get_context("spawn")
+    procs = []
+    for k in range(4):
+        order = paths if k % 2 else paths[::-1]
+        proc = ctx.Process(target=_claim_all, args=(str(root), order, str(tmp_path / f"{k}.json")))
+        proc.start()
+        procs.append(proc)
+    for proc in procs:
+        proc.join(timeout=60)
+        assert proc.exitcode == 0
+
+    claimed = []
+    for k in range(4):
+        with open(tmp_path / f"{k}.json") as fh:
+            claimed.extend(json.load(fh))
+    assert len(claimed) == len(paths)
+    assert sorted(claimed) == sorted(paths)
@@ -0,0 +1,106 @@
+"""Tests for the processed-file ledger (ui_shared/file_ledger.py)."""
+import os
+import time
+
+import pytest
+
+from file_ledger import DONE, FAILED, QUEUED, FileLedger
+
+
+def _write(path, text):
+    with open(path, "w") as fh:
+        fh.write(text)
+    return str(path)
+
+
+def _ledger(tmp_path, **settings):
+    return FileLedger(str(tmp_path / "ledger.db"), settings)
+
+
+def test_mark_and_lookup_current_version(tmp_path):
+    ledger = _ledger(tmp_path)
+    path = _write(tmp_path / "a.csv", "1,2\n")
+    assert not ledger.is_processed(path)
+    assert ledger.mark(path, QUEUED, job_id=7)
+    row = ledger.lookup(path)
+    assert row["status"] == QUEUED and row["job_id"] == 7
+    assert ledger.is_processed(path)
+
+    _write(path, "1,2\n3,4\n")  # 內容變動：視為新版本
+    assert not ledger.is_processed(path)
+    assert not ledger.mark(str(tmp_path / "missing.csv"))
+
+
+def test_touch_without_content_change_is_still_processed(tmp_path):
+    ledger = _ledger(tmp_path)
+    path = _write(tmp_path / "a.csv", "1,2\n")
+    ledger.mark(path, DONE)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5_000_000_000))
+    assert ledger.is_processed(path)  # 以指紋命中並更新唯一鍵
+    assert ledger.lookup(path)["mtime_ns"] == os.stat(path).st_mtime_ns
+
+
+def test_failed_file_is_retried_with_backoff_until_limit(tmp_path):
+    ledger = _ledger(tmp_path, MAX_RETRIES=2, RETRY_BACKOFF_SECONDS=100, RETRY_BACKOFF_MAX_SECONDS=150)
+    path = _write(tmp_path / "a.csv", "x\n")
+    ledger.mark(path, FAILED)
+    row = ledger.lookup(path)
+    assert row["failures"] == 1
+    assert row["retry_after"] - row["updated"] == pytest.approx(100, abs=1)
+    assert ledger.is_processed(path)  # 退避期間不重試
+    assert ledger.retry_candidates(now=time.time() + 101) == [path]
+
+    ledger.mark(path, FAILED)
+    row = ledger.lookup(path)
+    assert row["failures"] == 2
+    assert row["retry_after"] - row["updated"] == pytest.approx(150, abs=1)  # 200 被上限截斷
+
+    ledger.mark(path, FAILED)
+    assert ledger.retry_candidates(now=time.time() + 10_000) == []  # 超過 MAX_RETRIES
+
+
+def test_retry_candidates_filter_by_folder(tmp_path):
+    ledger = _ledger(tmp_path, RETRY_BACKOFF_SECONDS=0)
+    (tmp_path / "in").mkdir()
+    (tmp_path / "input2").mkdir()
+    inside = _write(tmp_path / "in" / "a.csv", "a\n")
+    sibling = _write(tmp_path / "input2" / "b.csv", "b\n")
+    ledger.mark(inside, FAILED)
+    ledger.mark(sibling, FAILED)
+    assert ledger.retry_candidates(str(tmp_path / "in")) == [inside]
+    assert sorted(ledger.retry_candidates()) == sorted([inside, sibling])
+    assert not ledger.is_processed(inside)
+
+
+def test_update_job_and_reconcile(tmp_path):
+    ledger = _ledger(tmp_path)
+    a = _write(tmp_path / "a.csv", "a\n")
+    b = _write(tmp_path / "b.csv", "b\n")
+    c = _write(tmp_path / "c.csv", "c\n")
+    ledger.mark(a, QUEUED, job_id=1)
+    ledger.mark(b, QUEUED, job_id=2)
+    ledger.mark(c, QUEUED, job_id=3)
+
+    assert ledger.update_job(1, DONE) == 1
+    outcomes = {2: FAILED, 3: None}
+    assert ledger.reconcile(outcomes.get) == 1
+    assert ledger.lookup(a)["status"] == DONE
+    assert ledger.lookup(b)["status"] == FAILED
+    assert ledger.lookup(b)["failures"] == 1
+    assert ledger.lookup(c)["status"] == QUEUED
+    assert ledger.update_job(2, FAILED) == 0  # 已是 failed：不重複計算失敗次數
+    assert ledger.lookup(b)["failures"] == 1
+
+
+def test_forget_and_evict(tmp_path):
+    ledger = _ledger(tmp_path)
+    a = _write(tmp_path / "a.csv", "a\n")
+    b = _write(tmp_path / "b.csv", "b\n")
+    ledger.mark(a)
+    ledger.mark(b)
+    assert ledger.forget(a) == 1
+    assert ledger.lookup(a) is None
+    assert ledger.evict(max_age_seconds=3600) == 0
+    assert ledger.evict(max_age_seconds=-1) == 1
+    assert ledger.counts()["total"] == 0
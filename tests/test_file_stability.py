@@ -0,0 +1,79 @@
+"""Tests for non-blocking stability tracking and directory indexing (ui_shared/file_stability.py)."""
+import os
+
+from file_stability import DirectoryIndex, StabilityTracker, resolve_stability_settings
+
+
+def test_ready_after_quiet_period(tmp_path):
+    path = str(tmp_path / "a.csv")
+    with open(path, "w") as fh:
+        fh.write("1\n")
+    tracker = StabilityTracker(quiet_seconds=3)
+    assert tracker.observe(path, now=100.0)
+    assert not tracker.is_ready(path, now=101.0)
+    assert tracker.is_ready(path, now=103.0)
+    assert tracker.ready(now=103.0) == [path]
+
+
+def test_change_restarts_timer(tmp_path):
+    path = str(tmp_path / "a.csv")
+    with open(path, "w") as fh:
+        fh.write("1\n")
+    tracker = StabilityTracker(quiet_seconds=3)
+    tracker.observe(path, now=100.0)
+    with open(path, "a") as fh:
+        fh.write("2\n")
+    assert not tracker.is_ready(path, now=104.0)  # 版本變動：重新計時
+    assert tracker.is_ready(path, now=107.0)
+
+
+def test_missing_and_discarded_paths_are_dropped(tmp_path):
+    path = str(tmp_path / "a.csv")
+    with open(path, "w") as fh:
+        fh.write("1\n")
+    tracker = StabilityTracker(quiet_seconds=0)
+    tracker.observe(path, now=1.0)
+    tracker.discard(path)
+    assert tracker.pending() == []
+    tracker.observe(path, now=1.0)
+    os.remove(path)
+    assert not tracker.is_ready(path, now=10.0)
+    assert len(tracker) == 0
+
+
+def test_directory_index_reports_new_and_changed_files(tmp_path):
+    sub = tmp_path / "sub"
+    sub.mkdir()
+    (tmp_path / "a.csv").write_text("1")
+    (sub / "b.csv").write_text("2")
+    index = DirectoryIndex(str(tmp_path), full_rescan_seconds=3600)
+
+    first = index.scan(now=1000.0)
+    assert sorted(first) == sorted([str(tmp_path / "a.csv"), str(sub / "b.csv")])
+    assert index.scan(now=1001.0) == []
+
+    (sub / "c.csv").write_text("3")
+    assert index.scan(now=1002.0) == [str(sub / "c.csv")]
+    assert set(index.files(str(sub))) == {str(sub / "b.csv"), str(sub / "c.csv")}
+
+
+def test_directory_index_full_rescan_catches_in_place_appends(tmp_path):
+    target = tmp_path / "a.csv"
+    target.write_text("1")
+    index = DirectoryIndex(str(tmp_path), full_rescan_seconds=60)
+    index.scan(now=1000.0)
+    folder_mtime = os.stat(tmp_path).st_mtime_ns
+    with open(target, "a") as fh:
+        fh.write("22")
+    os.utime(tmp_path, ns=(folder_mtime, folder_mtime))
+    assert index.scan(now=1010.0) == []  # 資料夾 mtime 未變：沿用快照
+    assert index.scan(now=1061.0) == [str(target)]
+
+
+def test_non_recursive_index_skips_subfolders(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "b.csv").write_text("2")
+    (tmp_path / "a.csv").write_text("1")
+    index = DirectoryIndex(str(tmp_path), recursive=False)
+    assert index.scan(now=1.0) == [str(tmp_path / "a.csv")]
+    assert resolve_stability_settings({"STABILITY": {"QUIET_SECONDS": 1}})["QUIET_SECONDS"] == 1
@@ -0,0 +1,88 @@
+"""Tests for warm-start continue-training (training_pipeline/incremental.py)."""
+import warnings
+
+import numpy as np
+import pytest
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier
+
+from Forti_ui_app_bundle.training_pipeline.downsampling import PriorCorrectedClassifier
+from Forti_ui_app_bundle.training_pipeline.incremental import continue_fit, continue_training
+
+xgb = pytest.importorskip("xgboost")
+lgb = pytest.importorskip("lightgbm")
+cb = pytest.importorskip("catboost")
+
+
+def _data(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, 4)).astype(np.float32)
+    y = (X[:, 0] + 0.3 * rng.normal(size=n) > 0).astype(int)
+    return X, y
+
+
+def _tree_count(model):
+    if hasattr(model, "tree_count_"):
+        return int(model.tree_count_)
+    if hasattr(model, "get_booster"):
+        return int(model.get_booster().num_boosted_rounds())
+    return int(model.booster_.current_iteration())
+
+
+def _size_param(model):
+    params = model.get_params()
+    return params["iterations"] if "iterations" in params else params["n_estimators"]
+
+
+MODELS = [
+    lambda: xgb.XGBClassifier(n_estimators=30, max_depth=3),
+    lambda: lgb.LGBMClassifier(n_estimators=30, num_leaves=7, verbose=-1),
+    lambda: cb.CatBoostClassifier(iterations=30, depth=3, verbose=False, allow_writing_files=False),
+]
+
+
+@pytest.mark.parametrize("make", MODELS, ids=["XGB", "LGB", "CAT"])
+def test_continue_fit_adds_trees_and_keeps_total_for_refits(make):
+    X, y = _data()
+    prev = make().fit(X, y)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        cont = continue_fit(prev, X, y, extra_trees=10)
+
+    assert _tree_count(prev) == 30  # 上次的模型不被修改（回滾用）
+    assert _tree_count(cont) == 40
+    assert _size_param(cont) == 40
+    # 集成階段 clone 後重訓的模型與續訓後的模型同樣大小
+    assert _tree_count(clone(cont).fit(X, y)) == 40
+
+
+def test_continue_fit_keeps_prior_correction_wrapper():
+    X, y = _data()
+    inner = xgb.XGBClassifier(n_estimators=20, max_depth=3).fit(X, y)
+    prev = PriorCorrectedClassifier.from_fitted(inner, rate=0.5)
+    cont = continue_fit(prev, X, y, extra_trees=5)
+    assert isinstance(cont, PriorCorrectedClassifier)
+    assert cont.rate == 0.5
+    assert _tree_count(cont.estimator_) == 25
+    assert _size_param(clone(cont).estimator) == 25
+
+
+def test_continue_training_reuses_rolls_back_and_continues():
+    X, y = _data(400)
+    X_tr, y_tr, X_va, y_va = X[:300], y[:300], X[300:], y[300:]
+    previous = {
+        "XGB": xgb.XGBClassifier(n_estimators=20, max_depth=3).fit(X_tr, y_tr),
+        "RF": RandomForestClassifier(n_estimators=10, random_state=0).fit(X_tr, y_tr),
+    }
+    settings = {"MODELS": ["XGB"], "EXTRA_TREES": 5, "METRIC": None, "TOLERANCE": 1.0}
+    trained, decisions = continue_training(previous, X_tr, y_tr, X_va, y_va, "binary", settings)
+    actions = {row["model"]: row["action"] for row in decisions}
+    assert actions == {"XGB": "continued", "RF": "reused"}
+    assert trained["RF"] is previous["RF"]
+    assert _tree_count(trained["XGB"]) == 25
+
+    # 容許退步量為負：任何結果都視為退步，回滾為上次的模型
+    trained, decisions = continue_training(previous, X_tr, y_tr, X_va, y_va, "binary",
+                                           dict(settings, TOLERANCE=-1.0))
+    assert decisions[0]["action"] == "rolled_back"
+    assert trained["XGB"] is previous["XGB"]
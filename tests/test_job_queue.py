@@ -0,0 +1,157 @@
+"""Tests for the persistent job queue (ui_shared/job_queue.py)."""
+import sqlite3
+import time
+
+import pytest
+
+import job_queue as jq
+from job_queue import DONE, FAILED, QUEUED, RETRY, JobQueue, PermanentJobError, QueueFull
+
+CALLS = []
+
+
+def ok_handler(payload):
+    CALLS.append(payload["path"])
+    return {"path": payload["path"], "value": payload.get("value")}
+
+
+def flaky_handler(payload):
+    raise RuntimeError("boom")
+
+
+def permanent_handler(payload):
+    raise PermanentJobError("bad config")
+
+
+def slow_handler(payload):
+    time.sleep(0.05)
+    CALLS.append(payload["path"])
+    return payload["path"]
+
+
+def _queue(tmp_path, handler, **settings):
+    base = {"USE_PROCESSES": False, "WORKERS": 1, "POLL_SECONDS": 0.05}
+    base.update(settings)
+    return JobQueue(str(tmp_path / "jobs.db"), handler, base)
+
+
+def _idle_queue(tmp_path, **settings):
+    """不啟動分派執行緒的佇列：排入的工作一直停在 queued，只測試排入與取消。"""
+    queue = _queue(tmp_path, ok_handler, **settings)
+    queue.start = lambda: None
+    return queue
+
+
+@pytest.fixture(autouse=True)
+def _reset_calls():
+    CALLS.clear()
+
+
+def test_submit_is_idempotent_per_key(tmp_path):
+    queue = _idle_queue(tmp_path)
+    first = queue.submit("a.csv", key="k1")
+    again = queue.submit("a.csv", key="k1")
+    other = queue.submit("b.csv", key="k2")
+    assert first == again
+    assert other != first
+
+
+def test_queue_full_raises(tmp_path):
+    queue = _idle_queue(tmp_path, MAX_PENDING=2)
+    queue.submit("a.csv", key="a")
+    queue.submit("b.csv", key="b")
+    with pytest.raises(QueueFull):
+        queue.submit("c.csv", key="c")
+    assert not queue.has_capacity()
+
+
+def test_job_completes_and_is_taken_once(tmp_path):
+    queue = _queue(tmp_path, ok_handler)
+    try:
+        job_id = queue.submit("a.csv", payload={"value": 3}, key="a")
+        job = queue.wait(job_id, timeout=5)
+        assert job["status"] == DONE
+        assert job["result"] == {"path": "a.csv", "value": 3}
+        taken = queue.take_finished()
+        assert [j["id"] for j in taken] == [job_id]
+        assert queue.take_finished() == []
+        assert queue.outcome(job_id) == DONE
+    finally:
+        queue.stop()
+
+
+def test_retry_with_backoff_then_failed(tmp_path):
+    queue = _queue(tmp_path, flaky_handler, MAX_ATTEMPTS=2, BACKOFF_SECONDS=0.1, BACKOFF_MAX_SECONDS=0.1)
+    try:
+        job_id = queue.submit("a.csv", key="a")
+        deadline = time.time() + 5
+        seen_retry = False
+        while time.time() < deadline:
+            job = queue.get(job_id)
+            seen_retry = seen_retry or job["status"] == RETRY
+            if job["status"] == FAILED:
+                break
+            time.sleep(0.02)
+        assert seen_retry
+        assert job["status"] == FAILED
+        assert job["attempts"] == 2
+        assert "RuntimeError: boom" in job["error"]
+    finally:
+        queue.stop()
+
+
+def test_permanent_error_is_not_retried(tmp_path):
+    queue = _queue(tmp_path, permanent_handler, MAX_ATTEMPTS=5)
+    try:
+        job = queue.wait(queue.submit("a.csv", key="a"), timeout=5)
+        assert job["status"] == FAILED
+        assert job["attempts"] == 1
+    finally:
+        queue.stop()
+
+
+def test_group_runs_in_submit_order(tmp_path):
+    queue = _queue(tmp_path, slow_handler, WORKERS=3)
+    try:
+        ids = [queue.submit(f"{i}.csv", key=str(i), group="same-output") for i in range(5)]
+        for job_id in ids:
+            assert queue.wait(job_id, timeout=10)["status"] == DONE
+        assert CALLS == [f"{i}.csv" for i in range(5)]
+    finally:
+        queue.stop()
+
+
+def test_cancel_only_pending_jobs(tmp_path):
+    queue = _idle_queue(tmp_path)
+    job_id = queue.submit("a.csv", key="a")
+    assert queue.cancel(job_id, "lease lost")
+    job = queue.get(job_id)
+    assert job["status"] == FAILED
+    assert job["error"] == "Cancelled: lease lost"
+    assert not queue.cancel(job_id, "again")
+
+
+def test_finished_rows_of_old_database_are_marked_notified(tmp_path):
+    db = tmp_path / "jobs.db"
+    conn = sqlite3.connect(db)
+    conn.execute(
+        "CREATE TABLE jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, path TEXT NOT NULL, "
+        "payload TEXT NOT NULL, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, next_run REAL NOT NULL, "
+        "created REAL NOT NULL, updated REAL NOT NULL, owner TEXT, progress TEXT, error TEXT, result TEXT)"
+    )
+    conn.execute("INSERT INTO jobs (key, path, payload, status, next_run, created, updated) "
+                 "VALUES ('k', 'a.csv', '{}', ?, 0, 0, 0)", (DONE,))
+    conn.commit()
+    conn.close()
+
+    queue = JobQueue(str(db), ok_handler, {"USE_PROCESSES": False})
+    assert queue.take_finished() == []
+    assert queue.counts()[DONE] == 1
+
+
+def test_resolve_settings_ignores_unknown_keys():
+    settings = jq.resolve_job_queue_settings({"JOB_QUEUE": {"WORKERS": 7, "BOGUS": 1}})
+    assert settings["WORKERS"] == 7
+    assert "BOGUS" not in settings
+    assert settings["MAX_ATTEMPTS"] == jq.DEFAULT_JOB_QUEUE_SETTINGS["MAX_ATTEMPTS"]
+    assert QUEUED in jq.ACTIVE_STATUSES
@@ -0,0 +1,107 @@
+"""Tests for the process-wide model cache (ui_shared/model_registry.py)."""
+import io
+import json
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+
+import model_registry as mr
+from model_registry import ModelRegistry
+
+
+def _fitted_model():
+    X = np.array([[0.0, 1.0], [1.0, 0.0], [0.5, 0.5], [1.0, 1.0]])
+    return LogisticRegression().fit(X, [0, 1, 0, 1])
+
+
+@pytest.fixture
+def model_file(tmp_path):
+    path = tmp_path / "model.pkl"
+    joblib.dump(_fitted_model(), path)
+    return path
+
+
+def test_path_and_bytes_share_one_entry(model_file):
+    registry = ModelRegistry()
+    first = registry.get(str(model_file))
+    assert registry.get(str(model_file)) is first
+    assert registry.get(model_file.read_bytes()) is first  # 內容相同：同一個快取鍵
+    assert registry.get(io.BytesIO(model_file.read_bytes())) is first
+    stats = registry.stats()
+    assert (stats["models"], stats["hits"], stats["misses"]) == (1, 3, 1)
+    assert stats["entries"][0]["type"] == "LogisticRegression"
+    assert stats["entries"][0]["warmup_seconds"] is not None
+
+
+def test_prepare_is_part_of_the_key(model_file):
+    registry = ModelRegistry()
+
+    def tag(model):
+        model.tagged = True
+        return model
+
+    plain = registry.get(str(model_file))
+    tagged = registry.get(str(model_file), prepare=tag)
+    assert tagged is not plain and tagged.tagged
+    assert registry.get(str(model_file), prepare=tag) is tagged
+    registry.clear()
+    assert registry.stats()["models"] == 0
+    assert registry.get(str(model_file)) is not plain
+
+
+def test_rewritten_file_is_reloaded(model_file):
+    registry = ModelRegistry()
+    first = registry.get(str(model_file), warm=False)
+    model = _fitted_model()
+    model.extra = 1
+    joblib.dump(model, model_file)
+    assert registry.get(str(model_file), warm=False) is not first
+
+
+def test_lru_eviction_keeps_latest(tmp_path):
+    registry = ModelRegistry(max_bytes=1)
+    paths = []
+    for i in range(2):
+        model = _fitted_model()
+        model.tag = i
+        paths.append(tmp_path / f"m{i}.pkl")
+        joblib.dump(model, paths[-1])
+    registry.get(str(paths[0]), warm=False)
+    registry.get(str(paths[1]), warm=False)
+    stats = registry.stats()
+    assert stats["models"] == 1 and stats["evictions"] == 1
+
+
+def test_failed_load_releases_key_lock(tmp_path):
+    registry = ModelRegistry()
+    bad = tmp_path / "bad.pkl"
+    bad.write_bytes(b"not a model")
+    for _ in range(2):
+        with pytest.raises(Exception):
+            registry.get(str(bad))
+    assert registry._key_locks == {}
+    assert registry.stats()["models"] == 0
+
+
+def test_load_model_respects_feature_flag(model_file, monkeypatch):
+    monkeypatch.setattr(mr, "_REGISTRY", ModelRegistry())
+    monkeypatch.delenv("DFLARE_FEATURE_FLAGS", raising=False)
+    assert mr.model_caching_enabled()
+    assert mr.load_model(str(model_file)) is mr.load_model(str(model_file))
+
+    monkeypatch.setenv("DFLARE_FEATURE_FLAGS", json.dumps({"enable_model_caching": False}))
+    assert not mr.model_caching_enabled()
+    assert mr.load_model(str(model_file)) is not mr.load_model(str(model_file))
+    monkeypatch.setenv("DFLARE_FEATURE_FLAGS", "not json")
+    assert mr.model_caching_enabled()
+
+
+def test_xgboost_compatibility_attribute_is_removed():
+    class XGBClassifier:
+        def __init__(self):
+            self.use_label_encoder = False
+
+    model = mr.fix_xgboost_compatibility(XGBClassifier())
+    assert not hasattr(model, "use_label_encoder")
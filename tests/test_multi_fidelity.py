@@ -0,0 +1,70 @@
+"""Tests for multi-fidelity tuning helpers (training_pipeline/multi_fidelity.py)."""
+import numpy as np
+import optuna
+import pytest
+from sklearn.tree import DecisionTreeClassifier
+
+from Forti_ui_app_bundle.training_pipeline.multi_fidelity import (
+    BEST_N_TREES_ATTR,
+    FidelityPlan,
+    fidelity_schedule,
+    fit_with_early_stopping,
+    resolve_fidelity_settings,
+    stratified_prefix_order,
+)
+
+optuna.logging.set_verbosity(optuna.logging.WARNING)
+
+
+def _data(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, 4)).astype(np.float32)
+    y = (X[:, 0] + 0.5 * rng.normal(size=n) > 1.0).astype(int)
+    return X, y
+
+
+def test_schedule_grows_by_reduction_factor_and_ends_at_full_data():
+    assert fidelity_schedule(0.05, 3) == pytest.approx([0.05, 0.15, 0.45, 1.0])
+    assert fidelity_schedule(1.0, 3) == [1.0]
+    assert resolve_fidelity_settings({"MULTI_FIDELITY": {"MIN_FRACTION": 0.1, "BOGUS": 1}})["MIN_FRACTION"] == 0.1
+
+
+def test_prefixes_are_stratified():
+    _, y = _data()
+    order = stratified_prefix_order(y, seed=1)
+    assert sorted(order.tolist()) == list(range(len(y)))
+    rate = y.mean()
+    for size in (100, 300, 900):
+        assert abs(y[order[:size]].mean() - rate) < 0.02
+
+
+def test_plan_rungs_are_nested_and_eval_sets_disjoint():
+    X, y = _data()
+    plan = FidelityPlan(X, y, resolve_fidelity_settings({"MIN_FRACTION": 0.1}), seed=0)
+    assert plan.sizes[-1] == len(plan.y_tr) and plan.sizes == sorted(plan.sizes)
+    assert len(plan.y_tr) + len(plan.y_es) + len(plan.y_ev) == len(y)
+
+    seen = []
+
+    def fit_and_score(X_tr, y_tr, X_es, y_es, X_ev, y_ev, w_tr, w_es, w_ev):
+        seen.append(X_tr)
+        assert w_tr is None and w_es is None and w_ev is None
+        return float(len(X_tr)), 17
+
+    study = optuna.create_study(direction="maximize", pruner=optuna.pruners.NopPruner())
+    study.optimize(lambda t: plan.evaluate(t, fit_and_score), n_trials=1)
+    assert len(seen) == plan.n_rungs
+    for small, large in zip(seen, seen[1:]):
+        np.testing.assert_array_equal(large[:len(small)], small)
+    assert study.best_trial.user_attrs[BEST_N_TREES_ATTR] == 17
+
+
+def test_early_stopping_returns_tree_count():
+    lgb = pytest.importorskip("lightgbm")
+    X, y = _data()
+    est = lgb.LGBMClassifier(n_estimators=500, learning_rate=0.3, verbose=-1)
+    est, n_trees = fit_with_early_stopping(est, X[:1500], y[:1500], X[1500:], y[1500:], rounds=10)
+    assert 1 <= n_trees < 500
+    assert n_trees == est.best_iteration_
+    _, none = fit_with_early_stopping(DecisionTreeClassifier(max_depth=2), X, y, X, y, rounds=10)
+    assert none is None
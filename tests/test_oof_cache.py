@@ -0,0 +1,64 @@
+"""Tests for the OOF probability cache and cached stacking (training_pipeline/oof_cache.py)."""
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import StratifiedKFold
+from sklearn.tree import DecisionTreeClassifier
+
+from Forti_ui_app_bundle.training_pipeline.oof_cache import CachedStackingClassifier, OOFCache
+
+
+def _data(n=240, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, 4))
+    y = (X[:, 0] - X[:, 1] + 0.5 * rng.normal(size=n) > 0).astype(int)
+    return X, y
+
+
+def _estimators():
+    return {
+        "LR": LogisticRegression(max_iter=1000),
+        "DT": DecisionTreeClassifier(max_depth=3, random_state=0),
+    }
+
+
+def test_each_model_is_fitted_once_per_fold():
+    X, y = _data()
+    cache = OOFCache(X, y, n_splits=4, seed=7)
+    cache.compute(_estimators())
+    assert cache.fits == 8
+    cache.compute(_estimators())
+    cache.oof_matrix("LR")
+    assert cache.fits == 8
+    assert cache.matches(4, 7, len(y))
+    assert not cache.matches(5, 7, len(y))
+    with pytest.raises(KeyError):
+        cache.fold_proba("RF", 0)
+
+
+def test_oof_matrix_matches_manual_cross_validation():
+    X, y = _data()
+    cache = OOFCache(X, y, n_splits=4, seed=7)
+    oof = cache.oof_matrix("LR", LogisticRegression(max_iter=1000))
+
+    expected = np.zeros((len(y), 2))
+    for tr, va in StratifiedKFold(n_splits=4, shuffle=True, random_state=7).split(X, y):
+        expected[va] = LogisticRegression(max_iter=1000).fit(X[tr], y[tr]).predict_proba(X[va])
+    np.testing.assert_allclose(oof, expected)
+    assert cache.fits == 4
+
+
+def test_cached_stacking_uses_fitted_bases():
+    X, y = _data()
+    cache = OOFCache(X, y, n_splits=4, seed=7)
+    bases = {name: est.fit(X, y) for name, est in _estimators().items()}
+    oof = [cache.oof_matrix(name, est) for name, est in _estimators().items()]
+
+    stack = CachedStackingClassifier(list(bases.items())).fit_from_oof(oof, y)
+    assert stack.meta_feature_names_ == ["LR::class_1", "DT::class_1"]
+    assert stack.transform(X).shape == (len(y), 2)
+    np.testing.assert_array_equal(stack.classes_, [0, 1])
+
+    base_probas = [est.predict_proba(X) for est in bases.values()]
+    np.testing.assert_allclose(stack.predict_proba_from(base_probas), stack.predict_proba(X))
+    np.testing.assert_array_equal(stack.predict(X), stack.predict_proba(X).argmax(axis=1))
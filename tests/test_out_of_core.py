@@ -0,0 +1,59 @@
+"""Tests for out-of-core training helpers (training_pipeline/out_of_core.py)."""
+import numpy as np
+import pandas as pd
+
+from Forti_ui_app_bundle.training_pipeline.out_of_core import Reservoir, holdout_mask
+
+
+def _chunk(n=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({"idseq": np.arange(n), "a": rng.normal(size=n), "b": rng.integers(0, 5, size=n)})
+
+
+def test_holdout_mask_ignores_chunking():
+    df = _chunk()
+    whole = holdout_mask(df, "idseq", 0.2, seed=42)
+    parts = np.concatenate([holdout_mask(df.iloc[i:i + 3001], "idseq", 0.2, seed=42) for i in range(0, len(df), 3001)])
+    np.testing.assert_array_equal(whole, parts)
+    # 同一個 key 在不同 chunk、不同欄位順序下都落在同一側
+    shuffled = df.sample(frac=1.0, random_state=1)[["b", "a", "idseq"]]
+    np.testing.assert_array_equal(holdout_mask(shuffled, "idseq", 0.2, seed=42), whole[shuffled.index.to_numpy()])
+
+
+def test_holdout_mask_fraction_and_seed():
+    df = _chunk()
+    mask = holdout_mask(df, "idseq", 0.2, seed=42)
+    assert abs(mask.mean() - 0.2) < 0.015
+    assert (mask != holdout_mask(df, "idseq", 0.2, seed=7)).any()
+    # 沒有 key 欄時以整列內容雜湊，仍然可重現
+    no_key = df.drop(columns="idseq")
+    np.testing.assert_array_equal(holdout_mask(no_key, "idseq", 0.2, 42), holdout_mask(no_key, None, 0.2, 42))
+    assert abs(holdout_mask(no_key, None, 0.2, 42).mean() - 0.2) < 0.015
+
+
+def test_reservoir_fills_then_keeps_capacity():
+    res = Reservoir(capacity=50, n_features=2, seed=0)
+    X = np.arange(60, dtype=np.float32).reshape(30, 2)
+    res.add(X, np.arange(30))
+    Xs, ys = res.data()
+    np.testing.assert_array_equal(ys, np.arange(30))
+    np.testing.assert_array_equal(Xs, X)
+
+    res.add(np.zeros((200, 2), dtype=np.float32), np.full(200, -1))
+    Xs, ys = res.data()
+    assert len(ys) == res.capacity == 50
+    assert res.n_seen == 230
+
+
+def test_reservoir_sample_is_uniform_across_chunks():
+    n, capacity = 40000, 2000
+    res = Reservoir(capacity=capacity, n_features=1, seed=3)
+    ids = np.arange(n)
+    for start in range(0, n, 1500):
+        part = ids[start:start + 1500]
+        res.add(part.reshape(-1, 1).astype(np.float32), part)
+    _, kept = res.data()
+    assert len(np.unique(kept)) == capacity
+    # 前後兩半被保留的比例應接近 1:1（只偏向最後幾個 chunk 代表抽樣不均勻）
+    assert abs((kept < n // 2).mean() - 0.5) < 0.05
+    np.testing.assert_array_equal(res.data()[0][:, 0].astype(np.int64), kept)
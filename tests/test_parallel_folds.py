@@ -0,0 +1,69 @@
+"""Tests for parallel fold fitting (training_pipeline/parallel_folds.py)."""
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+
+from Forti_ui_app_bundle.training_pipeline.downsampling import PriorCorrectedClassifier
+from Forti_ui_app_bundle.training_pipeline.parallel_folds import (DEFAULT_PARALLEL_FOLD_SETTINGS, effective_workers,
+                                                                  force_cpu, limit_threads, run_folds)
+
+
+def _fold_score(est, X, y, tr, va, sample_weight, extra):
+    est.fit(X[tr], y[tr])
+    return extra, float(est.score(X[va], y[va])), est.get_params().get("n_jobs")
+
+
+def _tasks(n_tasks=6):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(120, 3))
+    y = (X[:, 0] > 0).astype(int)
+    idx = np.arange(len(y))
+    tasks = [(LogisticRegression(n_jobs=None), idx[idx % n_tasks != k], idx[idx % n_tasks == k], k)
+             for k in range(n_tasks)]
+    return tasks, X, y
+
+
+def test_default_is_sequential():
+    assert DEFAULT_PARALLEL_FOLD_SETTINGS["N_JOBS"] == 1
+    assert effective_workers(None, 5) == 1
+    assert effective_workers(-1, 1) == 1
+    assert effective_workers(8, 3) == 3
+
+
+def test_sequential_run_keeps_model_settings():
+    tasks, X, y = _tasks()
+    seen = []
+    results = run_folds(_fold_score, tasks, X, y, n_jobs=1, progress=lambda d, t, label: seen.append((d, t)))
+    assert [r[0] for r in results] == list(range(6))
+    assert all(r[2] is None for r in results)
+    assert seen == [(i, 6) for i in range(1, 7)]
+    assert tasks[0][0].get_params()["n_jobs"] is None  # 呼叫端的物件不被修改
+
+
+def test_parallel_run_returns_results_in_task_order():
+    tasks, X, y = _tasks()
+    sequential = run_folds(_fold_score, tasks, X, y, n_jobs=1)
+    seen = []
+    parallel = run_folds(_fold_score, tasks, X, y, n_jobs=2, progress=lambda d, t, label: seen.append(d))
+    assert [r[:2] for r in parallel] == [r[:2] for r in sequential]
+    assert all(r[2] is not None for r in parallel)  # 平行時限制執行緒數
+    assert seen == list(range(1, 7))
+
+
+def test_force_cpu_resets_gpu_params():
+    xgb = pytest.importorskip("xgboost")
+    cb = pytest.importorskip("catboost")
+    gpu_xgb = force_cpu(xgb.XGBClassifier(device="cuda", tree_method="gpu_hist"))
+    assert gpu_xgb.get_params()["device"] == "cpu"
+    assert gpu_xgb.get_params()["tree_method"] == "hist"
+    gpu_cat = force_cpu(cb.CatBoostClassifier(task_type="GPU", verbose=False))
+    assert gpu_cat.get_params()["task_type"] == "CPU"
+    wrapped = force_cpu(PriorCorrectedClassifier(xgb.XGBClassifier(device="cuda:1"), rate=0.5))
+    assert wrapped.estimator.get_params()["device"] == "cpu"
+    cpu = force_cpu(xgb.XGBClassifier(device="cpu", tree_method="approx"))
+    assert cpu.get_params()["tree_method"] == "approx"
+
+
+def test_limit_threads_sets_catboost_thread_count():
+    cb = pytest.importorskip("catboost")
+    assert limit_threads(cb.CatBoostClassifier(verbose=False), 2).get_params()["thread_count"] == 2
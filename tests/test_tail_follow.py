@@ -0,0 +1,97 @@
+"""Tests for incremental tail-follow reading (ui_shared/tail_follow.py)."""
+import os
+
+from tail_follow import TailReader, is_tailable, resolve_tail_settings
+
+
+def _append(path, text):
+    with open(path, "ab") as fh:
+        fh.write(text.encode("utf-8"))
+
+
+def test_is_tailable_and_settings():
+    assert is_tailable("a.CSV")
+    assert not is_tailable("a.csv.gz")
+    settings = resolve_tail_settings({"TAIL": {"MAX_BATCH_BYTES": 10, "OTHER": 1}})
+    assert settings["MAX_BATCH_BYTES"] == 10
+    assert "OTHER" not in settings
+
+
+def test_poll_returns_complete_lines_and_commit_advances(tmp_path):
+    log = tmp_path / "fw.csv"
+    _append(log, "a,b\n1,2\n3,")
+    reader = TailReader(str(tmp_path / "offsets.json"))
+
+    batch = reader.poll(str(log))
+    assert batch.header == b"a,b\n"
+    assert batch.data == b"1,2\n"
+    assert batch.lines == 1
+    # 尚未 commit：再讀一次仍是同一批
+    assert reader.poll(str(log)).data == b"1,2\n"
+
+    reader.commit(batch)
+    assert reader.poll(str(log)) is None  # 最後一列還沒寫完
+
+    _append(log, "4\n5,6\n")
+    batch = reader.poll(str(log))
+    assert batch.header == b"a,b\n"
+    assert batch.data == b"3,4\n5,6\n"
+    assert batch.tag == f"{batch.ino}_{batch.start}-{batch.end}"
+
+
+def test_offsets_survive_a_new_reader(tmp_path):
+    log = tmp_path / "fw.csv"
+    state = str(tmp_path / "offsets.json")
+    _append(log, "a\n1\n")
+    reader = TailReader(state)
+    reader.commit(reader.poll(str(log)))
+    _append(log, "2\n")
+
+    batch = TailReader(state).poll(str(log))
+    assert batch.header == b"a\n"
+    assert batch.data == b"2\n"
+
+
+def test_truncation_restarts_from_beginning(tmp_path):
+    log = tmp_path / "fw.log"
+    reader = TailReader(str(tmp_path / "offsets.json"))
+    _append(log, "line one\nline two\n")
+    reader.commit(reader.poll(str(log)))
+    with open(log, "wb") as fh:
+        fh.write(b"new\n")
+    assert reader.poll(str(log)).data == b"new\n"
+
+
+def test_rotation_drains_old_file_first(tmp_path):
+    log = tmp_path / "fw.log"
+    reader = TailReader(str(tmp_path / "offsets.json"))
+    _append(log, "1\n")
+    reader.commit(reader.poll(str(log)))
+    _append(log, "2\n3")  # 最後一列沒有換行就被輪替
+    os.rename(log, tmp_path / "fw.log.1")
+    _append(log, "4\n")
+
+    batch = reader.poll(str(log))
+    assert batch.rotated
+    assert batch.data == b"2\n3\n"
+    reader.commit(batch)
+    batch = reader.poll(str(log))
+    assert not batch.rotated
+    assert batch.data == b"4\n"
+
+
+def test_batch_write_includes_header(tmp_path):
+    log = tmp_path / "fw.csv"
+    _append(log, "a,b\n1,2\n")
+    batch = TailReader(str(tmp_path / "offsets.json")).poll(str(log))
+    target = batch.write(str(tmp_path / "out" / "part.csv"))
+    with open(target, "rb") as fh:
+        assert fh.read() == b"a,b\n1,2\n"
+
+
+def test_oversized_line_is_not_stuck(tmp_path):
+    log = tmp_path / "fw.log"
+    _append(log, "x" * 20)
+    reader = TailReader(str(tmp_path / "offsets.json"), {"MAX_BATCH_BYTES": 8})
+    batch = reader.poll(str(log))
+    assert batch.data == b"x" * 8
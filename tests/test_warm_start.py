@@ -0,0 +1,109 @@
+"""Tests for warm-start search helpers (training_pipeline/warm_start.py)."""
+import optuna
+
+from Forti_ui_app_bundle.training_pipeline.multi_fidelity import BEST_N_TREES_ATTR, best_tree_count
+from Forti_ui_app_bundle.training_pipeline.warm_start import (
+    WarmSearchSpace,
+    feature_set_hash,
+    find_warm_start,
+    write_run_meta,
+)
+
+optuna.logging.set_verbosity(optuna.logging.WARNING)
+
+XGB_NAMES = ("n_estimators", "max_depth", "learning_rate", "subsample", "colsample_bytree")
+
+
+def _study_with_tree_count(n_trees):
+    study = optuna.create_study(direction="maximize")
+
+    def objective(trial):
+        trial.suggest_int("max_depth", 3, 8)
+        trial.set_user_attr(BEST_N_TREES_ATTR, n_trees)
+        return 1.0
+
+    study.optimize(objective, n_trials=1)
+    return study
+
+
+def test_center_keeps_only_searched_numeric_params():
+    center = {"max_depth": 5, "learning_rate": 0.1, "n_jobs": -1, "device": "cuda", "flag": True}
+    space = WarmSearchSpace(center, names=XGB_NAMES)
+    assert space.center == {"max_depth": 5, "learning_rate": 0.1}
+    assert space.active
+
+
+def test_early_stopped_tree_count_is_not_enqueued():
+    # multi-fidelity 的 early stopping 樹數另存 best_n_trees，下一輪（即使關掉 multi-fidelity）不可被當成 n_estimators enqueue
+    study = _study_with_tree_count(937)
+    tuned = {**study.best_params, **best_tree_count(study, BEST_N_TREES_ATTR)}
+    assert tuned == {"max_depth": study.best_params["max_depth"], BEST_N_TREES_ATTR: 937}
+
+    space = WarmSearchSpace(tuned, names=XGB_NAMES)
+    target = optuna.create_study(direction="maximize")
+    space.enqueue_center(target)
+    seen = {}
+
+    def objective(trial):
+        seen["max_depth"] = space.suggest_int(trial, "max_depth", 3, 8)
+        seen["n_estimators"] = space.suggest_int(trial, "n_estimators", 80, 220)
+        return 1.0
+
+    target.optimize(objective, n_trials=1)
+    assert seen["max_depth"] == tuned["max_depth"]
+    assert 80 <= seen["n_estimators"] <= 220
+
+
+def test_suggest_narrows_around_center():
+    space = WarmSearchSpace({"max_depth": 6, "learning_rate": 0.1}, settings={"SHRINK": 0.25}, names=XGB_NAMES)
+    study = optuna.create_study(direction="maximize")
+
+    def objective(trial):
+        space.suggest_int(trial, "max_depth", 2, 10)
+        space.suggest_float(trial, "learning_rate", 0.01, 1.0, log=True)
+        return 1.0
+
+    study.optimize(objective, n_trials=3)
+    _, lo, hi, _, _ = space.bounds["max_depth"]
+    assert 2 <= lo <= 6 <= hi <= 10 and hi - lo <= 2
+    _, lo, hi, _, _ = space.bounds["learning_rate"]
+    assert 0.01 < lo < 0.1 < hi < 1.0
+
+
+def test_neighbours_stay_inside_bounds():
+    space = WarmSearchSpace({"max_depth": 6}, settings={"N_NEIGHBOURS": 5, "JITTER": 2.0}, names=XGB_NAMES)
+    study = optuna.create_study(direction="maximize")
+    depths = []
+
+    def objective(trial):
+        depths.append(space.suggest_int(trial, "max_depth", 2, 10))
+        return 1.0
+
+    space.enqueue_center(study)
+    study.optimize(objective, n_trials=6, callbacks=[space.enqueue_neighbours_callback])
+    _, lo, hi, _, _ = space.bounds["max_depth"]
+    assert depths[0] == 6
+    assert all(lo <= d <= hi for d in depths)
+
+
+def test_run_meta_round_trip(tmp_path):
+    cols = ["a", "b", "c"]
+    old_dir = tmp_path / "20240101_000000"
+    new_dir = tmp_path / "20240108_000000"
+    write_run_meta(str(old_dir), "binary", cols, {"XGB": {"max_depth": 4, BEST_N_TREES_ATTR: 120}})
+    write_run_meta(str(new_dir), "binary", ["a", "b"], {"XGB": {"max_depth": 7}})
+
+    found = find_warm_start(str(tmp_path), "binary", feature_set_hash(cols))
+    assert found is not None
+    assert found["dir"] == str(old_dir)
+    assert found["params"]["XGB"] == {"max_depth": 4, BEST_N_TREES_ATTR: 120}
+    assert find_warm_start(str(tmp_path), "multiclass", feature_set_hash(cols)) is None
+    assert find_warm_start(str(tmp_path), "binary", feature_set_hash(cols), exclude_dir=str(old_dir)) is None
+
+
+def test_best_tree_count_without_attr():
+    study = optuna.create_study(direction="maximize")
+    assert best_tree_count(study, "n_estimators") == {}
+    study.optimize(lambda t: t.suggest_int("x", 0, 1), n_trials=1)
+    assert best_tree_count(study, "n_estimators") == {}
+
@@ -0,0 +1,177 @@
+"""Streaming reader for compressed training files without extracting them to disk."""
+from __future__ import annotations
+
+import bz2
+import gzip
+import io
+import os
+import tarfile
+import zipfile
+from typing import IO, Iterator, List, Optional
+
+# ============================================================================
+# 壓縮檔串流讀取（不解壓到暫存目錄）
+# ============================================================================
+# - .gz / .bz2：gzip.open / bz2.open（多段串接的 .gz 本身即為單一串流）
+# - .zip：依序以 zipfile.open 讀取每個檔案成員
+# - .tar / .tgz / .tar.gz / .tar.bz2：以串流模式 tarfile.open("r|*") 逐一 extractfile
+# - 多成員壓縮檔視為「一個邏輯串流」：成員間自動補換行，
+#   後續成員若以與第一個成員相同的標題列開頭（多個 CSV 分片），該標題列會被略過
+# - .7z / .rar 標準函式庫無法串流解壓：不算壓縮檔，開啟時拋出 UnsupportedArchiveError（不會被當成 CSV 讀入）
+COMPRESSED_EXTENSIONS = (".gz", ".zip", ".tar", ".bz2", ".tgz", ".tbz2")
+UNSUPPORTED_ARCHIVE_EXTENSIONS = (".7z", ".rar")
+_TAR_SUFFIXES = (".tar", ".tgz", ".tar.gz", ".tbz2", ".tar.bz2")
+_READ_SIZE = 1024 * 1024
+
+
+class UnsupportedArchiveError(ValueError):
+    """無法串流讀取的壓縮格式。"""
+
+
+def is_compressed(path: str) -> bool:
+    return str(path).lower().endswith(COMPRESSED_EXTENSIONS)
+
+
+def ensure_supported(path: str) -> None:
+    """.7z / .rar 等無法串流的壓縮檔拋出 UnsupportedArchiveError（訊息可直接顯示給使用者）。"""
+    lower = str(path).lower()
+    if lower.endswith(UNSUPPORTED_ARCHIVE_EXTENSIONS):
+        raise UnsupportedArchiveError(
+            f"不支援的壓縮格式 {os.path.splitext(lower)[1]}：請解壓縮後上傳，或改用 .zip / .gz / .bz2 / .tar"
+        )
+
+
+class _MultiMemberRaw(io.RawIOBase):
+    """把多個二進位 file object 接成單一串流（只讀、不可 seek）。"""
+
+    def __init__(self, members: Iterator[IO[bytes]], closers: List) -> None:
+        super().__init__()
+        self._members = members
+        self._closers = closers
+        self._current: Optional[IO[bytes]] = None
+        self._pending = b""
+        self._header: Optional[bytes] = None
+        self._last_byte = b"\n"
+        self._index = 0
+        self.members_read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def _next_member(self) -> bool:
+        if self._current is not None:
+            self._current.close()
+        self._current = next(self._members, None)
+        if self._current is None:
+            return False
+        self.members_read += 1
+        first = self._current.readline()
+        if self._index == 0:
+            self._header = first
+        elif first == self._header:
+            first = b""
+        self._index += 1
+        # 前一個成員沒有以換行結尾時補上，避免兩個成員的行黏在一起
+        prefix = b"\n" if self._last_byte != b"\n" else b""
+        self._pending = prefix + first
+        return True
+
+    def readinto(self, b) -> int:
+        while True:
+            if self._pending:
+                n = min(len(b), len(self._pending))
+                b[:n] = self._pending[:n]
+                self._pending = self._pending[n:]
+                self._last_byte = bytes(b[n - 1:n])
+                return n
+            if self._current is not None:
+                data = self._current.read(min(len(b), _READ_SIZE))
+                if data:
+                    self._pending = data
+                    continue
+            if not self._next_member():
+                return 0
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        if self._current is not None:
+            self._current.close()
+        for c in reversed(self._closers):
+            try:
+                c.close()
+            except Exception:
+                pass
+        super().close()
+
+
+def _zip_members(zf: zipfile.ZipFile) -> Iterator[IO[bytes]]:
+    for info in zf.infolist():
+        if not info.is_dir():
+            yield zf.open(info, "r")
+
+
+def _tar_members(tf: tarfile.TarFile) -> Iterator[IO[bytes]]:
+    for member in tf:
+        if member.isfile():
+            fh = tf.extractfile(member)
+            if fh is not None:
+                yield fh
+
+
+def open_archive_stream(path: str) -> io.BufferedReader:
+    """
+    開啟壓縮檔為單一二進位串流（支援 readline / read / with 語法）。
+    不支援的格式（.7z / .rar）拋出 UnsupportedArchiveError。
+    """
+    lower = str(path).lower()
+    closers: List = []
+    if lower.endswith(_TAR_SUFFIXES):
+        tf = tarfile.open(path, mode="r|*")
+        closers.append(tf)
+        members: Iterator[IO[bytes]] = _tar_members(tf)
+    elif lower.endswith(".zip"):
+        zf = zipfile.ZipFile(path, "r")
+        closers.append(zf)
+        members = _zip_members(zf)
+    elif lower.endswith(".gz"):
+        members = iter([gzip.open(path, "rb")])
+    elif lower.endswith(".bz2"):
+        members = iter([bz2.open(path, "rb")])
+    else:
+        ensure_supported(path)
+        raise UnsupportedArchiveError(f"不支援的壓縮格式: {os.path.splitext(lower)[1]}")
+
+    raw = _MultiMemberRaw(members, closers)
+    raw.name = str(path)  # BufferedReader.name 會轉查 raw.name
+    return io.BufferedReader(raw, buffer_size=_READ_SIZE)
+
+
+def open_source(path: str) -> IO[bytes]:
+    """一般檔案直接以 rb 開啟；壓縮檔回傳解壓串流。"""
+    ensure_supported(path)
+    return open_archive_stream(path) if is_compressed(path) else open(path, "rb")
+
+
+def read_head_lines(path: str, n: int = 10, encoding: str = "utf-8") -> List[str]:
+    """讀取（解壓後的）前 n 行，供格式偵測使用；只解壓開頭少量資料。"""
+    lines: List[str] = []
+    with open_source(path) as fh:
+        for _ in range(n):
+            raw = fh.readline()
+            if not raw:
+                break
+            lines.append(raw.decode(encoding, errors="ignore").strip())
+    return lines
+
+
+__all__ = [
+    "COMPRESSED_EXTENSIONS",
+    "UNSUPPORTED_ARCHIVE_EXTENSIONS",
+    "UnsupportedArchiveError",
+    "ensure_supported",
+    "is_compressed",
+    "open_archive_stream",
+    "open_source",
+    "read_head_lines",
+]
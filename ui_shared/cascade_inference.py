@@ -0,0 +1,146 @@
+"""Cascaded inference: a cheap gate model in front of the full ensemble."""
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+# ============================================================================
+# 串接推論（gate → 完整集成）
+# ============================================================================
+# - 第一階段：小而快的 gate 模型對所有列算機率
+# - 二元：gate 正類機率 < low 直接判 0、>= high 直接判 1，其餘（不確定帶）才送完整集成
+# - 多元：gate 最大機率 >= confidence 直接採用 gate 類別，其餘送完整集成
+# - low／high／confidence 由訓練管線在驗證集上校準（召回率損失 ≤ 目標值），存於模型內
+# - 對外介面與一般分類器相同（predict／predict_proba／classes_／feature_names_in_），
+#   兩個品牌的監控流程載入後不需改動即可使用
+# - 分流統計由呼叫端傳入 CascadeStats 逐次累計（每個檔案各自一份，並行工作互不干擾）；
+#   搭配去重推論時以 row_counts 傳入每個唯一列代表的原始列數，統計仍以原始列數計
+
+
+@dataclass
+class CascadeStats:
+    """單次（或單一檔案）的分流統計：總列數與送完整模型的列數。"""
+
+    rows: int = 0
+    heavy: int = 0
+
+    def merge(self, other: "CascadeStats") -> "CascadeStats":
+        self.rows += other.rows
+        self.heavy += other.heavy
+        return self
+
+    @property
+    def gated_ratio(self) -> float:
+        """gate 直接決定的列數比例。"""
+        return 1.0 - self.heavy / self.rows if self.rows else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"rows": self.rows, "heavy": self.heavy, "gated_ratio": round(self.gated_ratio, 4)}
+
+
+def _take(X, mask: np.ndarray):
+    return X.iloc[mask] if hasattr(X, "iloc") else X[mask]
+
+
+class CascadeClassifier:
+    """gate 模型 + 完整模型的串接分類器。"""
+
+    def __init__(
+        self,
+        gate: Any,
+        model: Any,
+        task: str = "binary",
+        low: float = 0.0,
+        high: float = float("inf"),
+        confidence: float = float("inf"),
+        positive_label: Any = 1,
+    ) -> None:
+        self.gate = gate
+        self.model = model
+        self.task = task
+        self.low = float(low)
+        self.high = float(high)
+        self.confidence = float(confidence)
+        self.positive_label = positive_label
+        self.classes_ = np.asarray(getattr(model, "classes_", getattr(gate, "classes_", [])))
+        names = getattr(model, "feature_names_in_", getattr(gate, "feature_names_in_", None))
+        if names is not None:
+            self.feature_names_in_ = np.asarray(list(names), dtype=object)
+            self.n_features_in_ = len(self.feature_names_in_)
+        self._lock = threading.Lock()
+        self._counts = {"rows": 0, "heavy": 0}
+
+    # 執行緒鎖不可序列化：存檔時略過、載入時重建
+    def __getstate__(self) -> Dict[str, Any]:
+        state = dict(self.__dict__)
+        state.pop("_lock", None)
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._counts = {"rows": 0, "heavy": 0}
+
+    # ---------------- 分流 ----------------
+    def _route(self, gate_proba: np.ndarray):
+        """回傳 (gate 決定的標籤, 需送完整模型的遮罩)。"""
+        gate_classes = np.asarray(self.gate.classes_)
+        if self.task == "binary":
+            pos = gate_proba[:, list(gate_classes).index(self.positive_label)]
+            negative = gate_classes[gate_classes != self.positive_label][0]
+            labels = np.where(pos >= self.high, self.positive_label, negative)
+            band = (pos >= self.low) & (pos < self.high)
+        else:
+            labels = gate_classes[np.argmax(gate_proba, axis=1)]
+            band = gate_proba.max(axis=1) < self.confidence
+        return labels, band
+
+    def _count(self, band: np.ndarray, stats: Optional[CascadeStats],
+               row_counts: Optional[np.ndarray]) -> None:
+        """row_counts：每一列代表的原始列數（去重後的唯一列），省略時每列算一列。"""
+        if row_counts is None:
+            run = CascadeStats(rows=len(band), heavy=int(band.sum()))
+        else:
+            row_counts = np.asarray(row_counts, dtype=np.int64)
+            run = CascadeStats(rows=int(row_counts.sum()), heavy=int(row_counts[band].sum()))
+        with self._lock:
+            self._counts["rows"] += run.rows
+            self._counts["heavy"] += run.heavy
+        if stats is not None:
+            stats.merge(run)
+
+    def predict(self, X, stats: Optional[CascadeStats] = None,
+                row_counts: Optional[np.ndarray] = None) -> np.ndarray:
+        labels, band = self._route(np.asarray(self.gate.predict_proba(X)))
+        out = labels.astype(self.classes_.dtype, copy=True)
+        if band.any():
+            out[band] = np.asarray(self.model.predict(_take(X, band))).reshape(-1)
+        self._count(band, stats, row_counts)
+        return out
+
+    def predict_proba(self, X, stats: Optional[CascadeStats] = None,
+                      row_counts: Optional[np.ndarray] = None) -> np.ndarray:
+        gate_proba = np.asarray(self.gate.predict_proba(X), dtype=np.float64)
+        _, band = self._route(gate_proba)
+        out = gate_proba.copy()
+        if band.any():
+            out[band] = np.asarray(self.model.predict_proba(_take(X, band)), dtype=np.float64)
+        self._count(band, stats, row_counts)
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        """自載入以來（所有呼叫合計）的分流統計：總列數、送完整模型的列數與 gate 直接決定的比例。"""
+        with self._lock:
+            total = CascadeStats(rows=self._counts["rows"], heavy=self._counts["heavy"])
+        return total.to_dict()
+
+
+def cascade_stats(model: Any) -> Optional[CascadeStats]:
+    """模型為 CascadeClassifier 時回傳一份新的 CascadeStats 供單一檔案累計，否則回傳 None。"""
+    return CascadeStats() if isinstance(model, CascadeClassifier) else None
+
+
+__all__ = ["CascadeClassifier", "CascadeStats", "cascade_stats"]
@@ -0,0 +1,294 @@
+"""Single-pass, fault-tolerant CSV streaming reader shared by the training pipelines."""
+from __future__ import annotations
+
+import csv
+import io
+import os
+from dataclasses import asdict, dataclass, field
+from typing import IO, Any, Dict, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+# ============================================================================
+# 單趟、容錯的 CSV 串流讀取（取代「整檔讀取失敗 → 換參數再整檔重讀」）
+# ============================================================================
+# - 以固定大小的位元組區塊讀檔，numpy 向量化計算每行分隔符數量
+# - 欄位數與標題不符的行寫入 quarantine 檔（含行號與原因），其餘行整塊交給 pandas C 引擎
+# - 只讀一次檔案；不依賴 pandas 已移除的 error_bad_lines / warn_bad_lines
+# - source 可為路徑或任何二進位 file object（例如 gzip.open(...) 的串流）
+# - 未指定 dtype 時以第一個區塊推斷的型別固定後續區塊（文字欄維持文字、數值欄出現非數值時轉為缺值並計數），
+#   避免各區塊各自推斷造成同一欄型別漂移
+# 限制：引號內含換行的欄位會被切成多行而判定為格式錯誤（整筆進 quarantine）。
+DEFAULT_CHUNK_BYTES = 16 * 1024 * 1024
+_NL = ord("\n")
+_CR = ord("\r")
+_QUOTE = ord('"')
+
+
+@dataclass
+class CsvIngestReport:
+    source: str = ""
+    total_lines: int = 0          # 含標題
+    good_rows: int = 0
+    bad_rows: int = 0
+    blank_lines: int = 0
+    coerced_chunks: int = 0       # 指定 dtype 解析失敗、改以 to_numeric(coerce) 轉換的區塊數
+    coerced_cells: int = 0        # 無法轉為數值而被視為缺值的儲存格數
+    coerced_columns: Dict[str, int] = field(default_factory=dict)  # 各欄被轉為缺值的儲存格數
+    quarantine_path: Optional[str] = None
+    bad_line_numbers: List[int] = field(default_factory=list)  # 只保留前幾筆供報告
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def summary(self) -> str:
+        msg = f"{self.good_rows} 筆有效"
+        if self.bad_rows:
+            msg += f"｜格式錯誤 {self.bad_rows} 行 → {self.quarantine_path}"
+        if self.blank_lines:
+            msg += f"｜空行 {self.blank_lines}"
+        if self.coerced_cells:
+            msg += f"｜非數值儲存格 {self.coerced_cells} 格已轉為缺值 {self.coerced_columns}"
+        return msg
+
+
+def _guess_sep(header: str) -> str:
+    """標題列沒有逗號時，依序嘗試 tab / 分號 / 直線。"""
+    if "," in header:
+        return ","
+    for cand in ("\t", ";", "|"):
+        if cand in header:
+            return cand
+    return ","
+
+
+class StreamingCsvReader:
+    def __init__(
+        self,
+        chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+        quarantine_path: Optional[str] = None,
+        sep: Optional[str] = None,
+        encoding: str = "utf-8",
+        usecols: Optional[Sequence[str]] = None,
+        dtype: Optional[Dict[str, Any]] = None,
+        nrows: Optional[int] = None,
+        max_bad_samples: int = 20,
+    ) -> None:
+        self.chunk_bytes = int(chunk_bytes)
+        self.quarantine_path = quarantine_path
+        self.sep = sep
+        self.encoding = encoding
+        self.usecols = list(usecols) if usecols is not None else None
+        self.dtype = dict(dtype) if dtype else None
+        self.nrows = nrows
+        self.max_bad_samples = max_bad_samples
+        self.report = CsvIngestReport()
+        self.columns: List[str] = []
+        self._qfh: Optional[IO[str]] = None
+        self._locked: Optional[Dict[str, Any]] = None  # 未指定 dtype 時由第一個區塊決定的欄位型別
+
+    # ------------------------------------------------------------------
+    def read(self, source: Union[str, IO[bytes]]) -> pd.DataFrame:
+        chunks = list(self.iter_chunks(source))
+        if not chunks:
+            cols = self.usecols if self.usecols is not None else self.columns
+            return pd.DataFrame(columns=cols)
+        df = chunks[0] if len(chunks) == 1 else pd.concat(chunks, ignore_index=True, copy=False)
+        return df
+
+    def iter_chunks(self, source: Union[str, IO[bytes]]) -> Iterator[pd.DataFrame]:
+        fh, owns = (open(source, "rb"), True) if isinstance(source, (str, os.PathLike)) else (source, False)
+        self.report = CsvIngestReport(source=str(source) if owns else getattr(source, "name", "<stream>"))
+        self._locked = None
+        try:
+            header_raw = fh.readline()
+            if not header_raw:
+                return
+            self.report.total_lines = 1
+            header = header_raw.decode(self.encoding, errors="replace").rstrip("\r\n").lstrip("﻿")
+            sep = self.sep or _guess_sep(header)
+            self.columns = next(csv.reader([header], delimiter=sep))
+            n_fields = len(self.columns)
+            sep_byte = ord(sep)
+
+            carry = b""
+            produced = 0
+            while True:
+                block = fh.read(self.chunk_bytes)
+                eof = not block
+                data = carry + block if carry else block
+                if not eof:
+                    cut = data.rfind(b"\n")
+                    if cut < 0:
+                        carry = data
+                        continue
+                    carry, data = data[cut + 1:], data[:cut + 1]
+                else:
+                    carry = b""
+                    if not data:
+                        break
+                    if not data.endswith(b"\n"):
+                        data += b"\n"
+
+                good = self._filter_block(data, n_fields, sep, sep_byte)
+                df = self._parse(good, sep)
+                if df is not None and len(df):
+                    if self.nrows is not None and produced + len(df) > self.nrows:
+                        df = df.iloc[: self.nrows - produced]
+                    produced += len(df)
+                    self.report.good_rows = produced
+                    yield df
+                if eof or (self.nrows is not None and produced >= self.nrows):
+                    break
+        finally:
+            if owns:
+                fh.close()
+            if self._qfh is not None:
+                self._qfh.close()
+                self._qfh = None
+
+    # ------------------------------------------------------------------
+    def _filter_block(self, data: bytes, n_fields: int, sep: str, sep_byte: int) -> bytes:
+        """向量化檢查每行欄位數；不符者寫入 quarantine，回傳只含有效行的位元組。"""
+        buf = np.frombuffer(data, dtype=np.uint8)
+        ends = np.flatnonzero(buf == _NL)
+        starts = np.empty_like(ends)
+        starts[0] = 0
+        starts[1:] = ends[:-1] + 1
+        first_line_no = self.report.total_lines + 1
+        self.report.total_lines += len(ends)
+
+        lengths = ends - starts
+        has_cr = lengths > 0
+        has_cr[has_cr] = buf[ends[has_cr] - 1] == _CR
+        blank = (lengths - has_cr) == 0
+
+        fields = np.add.reduceat(buf == sep_byte, starts, dtype=np.int64) + 1
+        if b'"' in data:
+            # 含引號的行才用 csv 模組精算（引號內的分隔符不算）
+            quoted = np.flatnonzero(np.add.reduceat(buf == _QUOTE, starts, dtype=np.int64) > 0)
+            for i in quoted:
+                line = data[starts[i]:ends[i]].decode(self.encoding, errors="replace").rstrip("\r")
+                try:
+                    rows = list(csv.reader([line], delimiter=sep, strict=True))
+                    fields[i] = len(rows[0]) if len(rows) == 1 else -1
+                except csv.Error:
+                    fields[i] = -1
+
+        self.report.blank_lines += int(blank.sum())
+        bad = np.flatnonzero(~blank & (fields != n_fields))
+        if not len(bad):
+            return data
+
+        view = memoryview(data)
+        pieces = []
+        prev = 0
+        for i in bad:
+            pieces.append(view[prev:starts[i]])
+            prev = int(ends[i]) + 1
+            raw = data[starts[i]:ends[i]].decode(self.encoding, errors="replace").rstrip("\r")
+            reason = f"expected {n_fields} fields, saw {fields[i]}" if fields[i] > 0 else "unbalanced quotes"
+            self._quarantine(first_line_no + int(i), reason, raw)
+        pieces.append(view[prev:])
+        return b"".join(pieces)
+
+    def _parse(self, good: bytes, sep: str) -> Optional[pd.DataFrame]:
+        kw = dict(
+            sep=sep,
+            header=None,
+            names=self.columns,
+            usecols=self.usecols,
+            encoding=self.encoding,
+            encoding_errors="replace",
+        )
+        dtype = self.dtype
+        if dtype is None and self._locked is not None:
+            # 第一個區塊是文字的欄位固定以文字讀入（避免後續區塊剛好全是數字而變成數值欄）
+            dtype = {c: dt for c, dt in self._locked.items() if not pd.api.types.is_numeric_dtype(dt)} or None
+        try:
+            df = pd.read_csv(io.BytesIO(good), dtype=dtype, **kw)
+        except pd.errors.EmptyDataError:
+            return None
+        except (ValueError, TypeError) as e:
+            if isinstance(e, pd.errors.ParserError) or not self.dtype:
+                return self._lock_dtypes(self._parse_tolerant(good, kw))
+            # 指定 dtype 的欄位出現非數值 → 該區塊改為 coerce（無法轉換者視為缺值並計入報告）
+            df = pd.read_csv(io.BytesIO(good), **kw)
+            self._coerce(df, self.dtype)
+            self.report.coerced_chunks += 1
+            return df
+        return self._lock_dtypes(df)
+
+    def _lock_dtypes(self, df: Optional[pd.DataFrame]) -> Optional[pd.DataFrame]:
+        """未指定 dtype 時：第一個區塊決定欄位型別，後續區塊的數值欄依此轉換。"""
+        if df is None or self.dtype or not len(df):
+            return df
+        if self._locked is None:
+            self._locked = df.dtypes.to_dict()
+            return df
+        numeric = {}
+        for c, dt in self._locked.items():
+            if c not in df.columns or df[c].dtype == dt:
+                continue
+            if pd.api.types.is_bool_dtype(dt) or not pd.api.types.is_numeric_dtype(dt):
+                continue
+            # 整數欄在後續區塊出現缺值時維持浮點數（與整檔讀取的結果一致）
+            numeric[c] = dt if pd.api.types.is_float_dtype(dt) else None
+        if numeric:
+            self._coerce(df, numeric)
+        return df
+
+    def _coerce(self, df: pd.DataFrame, dtypes: Dict[str, Any]) -> None:
+        """以 to_numeric(coerce) 轉換指定欄位，並記錄原本有值卻被轉為缺值的儲存格數。"""
+        for c, dt in dtypes.items():
+            if c not in df.columns:
+                continue
+            raw = df[c]
+            num = pd.to_numeric(raw, errors="coerce")
+            lost = int((num.isna() & raw.notna()).sum())
+            if lost:
+                self.report.coerced_cells += lost
+                self.report.coerced_columns[c] = self.report.coerced_columns.get(c, 0) + lost
+            df[c] = num if dt is None else num.astype(dt)
+
+    def _parse_tolerant(self, good: bytes, kw: Dict[str, Any]) -> Optional[pd.DataFrame]:
+        """極少數 pandas tokenizer 仍拒絕的行：以 python 引擎逐行回呼送入 quarantine（無行號）。"""
+        sep = kw["sep"]
+
+        def _bad(fields: List[str]):
+            self._quarantine(0, "parser error", sep.join(fields))
+            return None
+
+        try:
+            df = pd.read_csv(io.BytesIO(good), engine="python", on_bad_lines=_bad, **kw)
+        except pd.errors.EmptyDataError:
+            return None
+        if self.dtype:
+            self._coerce(df, self.dtype)
+        return df
+
+    def _quarantine(self, line_no: int, reason: str, raw: str) -> None:
+        self.report.bad_rows += 1
+        if len(self.report.bad_line_numbers) < self.max_bad_samples:
+            self.report.bad_line_numbers.append(line_no)
+        if not self.quarantine_path:
+            return
+        if self._qfh is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.quarantine_path)), exist_ok=True)
+            self._qfh = open(self.quarantine_path, "w", encoding="utf-8")
+            self._qfh.write("line_no\treason\traw\n")
+            self.report.quarantine_path = self.quarantine_path
+        self._qfh.write(f"{line_no}\t{reason}\t{raw}\n")
+
+
+def read_csv_tolerant(source: Union[str, IO[bytes]], quarantine_path: Optional[str] = None,
+                      **kwargs) -> pd.DataFrame:
+    """便利函式：單趟容錯讀取並印出摘要。"""
+    reader = StreamingCsvReader(quarantine_path=quarantine_path, **kwargs)
+    df = reader.read(source)
+    print(f"✅ CSV 串流讀取完成：{reader.report.summary()}")
+    return df
+
+
+__all__ = ["CsvIngestReport", "StreamingCsvReader", "read_csv_tolerant"]
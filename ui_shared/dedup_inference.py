@@ -0,0 +1,185 @@
+"""Predict once per unique feature vector, shared by the brand monitors."""
+from __future__ import annotations
+
+import threading
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+# ============================================================================
+# 去重推論設定
+# ============================================================================
+# - 對齊後的特徵矩陣逐列取位元組為鍵，np.unique 找出唯一列，只對唯一列呼叫模型，
+#   再以 inverse 索引把結果散回原列（數值完全相同，僅少算重複列）
+# - 可選的跨檔案 LRU：最近看過的「特徵向量 → 預測」直接取用，預設保留 100,000 筆
+# - 每個模型的 LRU 以弱參照對應，模型被釋放時一併移除
+# - 串接模型：傳入 cascade（CascadeStats）時連同每個唯一列代表的原始列數一起交給模型，
+#   分流統計仍以原始列數計（LRU 命中的列沒有經過模型，不計入分流）
+DEFAULT_LRU_SIZE = 100_000
+
+
+@dataclass
+class DedupStats:
+    """單次（或累計）去重推論的統計。"""
+
+    rows: int = 0
+    unique: int = 0
+    lru_hits: int = 0
+    predicted: int = 0
+
+    def merge(self, other: "DedupStats") -> "DedupStats":
+        self.rows += other.rows
+        self.unique += other.unique
+        self.lru_hits += other.lru_hits
+        self.predicted += other.predicted
+        return self
+
+    @property
+    def saved_ratio(self) -> float:
+        """省下的模型推論列數比例（重複列 + LRU 命中）。"""
+        return 1.0 - self.predicted / self.rows if self.rows else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "rows": self.rows,
+            "unique": self.unique,
+            "lru_hits": self.lru_hits,
+            "predicted": self.predicted,
+            "saved_ratio": round(self.saved_ratio, 4),
+        }
+
+    def summary(self) -> str:
+        return (
+            f"{self.rows} 列 → 唯一 {self.unique}，LRU 命中 {self.lru_hits}，"
+            f"實際推論 {self.predicted}（省下 {self.saved_ratio:.1%}）"
+        )
+
+
+def _row_keys(values: np.ndarray) -> Optional[np.ndarray]:
+    """把每一列轉成等長位元組（void dtype）；物件欄位無法直接比對時回傳 None。"""
+    if values.ndim != 2 or values.dtype == object:
+        return None
+    values = np.ascontiguousarray(values)
+    return values.view(np.dtype((np.void, values.dtype.itemsize * values.shape[1]))).reshape(-1)
+
+
+def _take(X, index: np.ndarray):
+    return X.iloc[index] if hasattr(X, "iloc") else X[index]
+
+
+class _SharedState:
+    """同一模型跨呼叫共用的 LRU 與累計統計（不持有模型本身，避免弱參照失效）。"""
+
+    def __init__(self) -> None:
+        self.lru: Dict[str, "OrderedDict[bytes, Any]"] = {"predict": OrderedDict(), "predict_proba": OrderedDict()}
+        self.lock = threading.Lock()
+        self.totals = DedupStats()
+
+
+class DedupPredictor:
+    """包裝已訓練模型：predict／predict_proba 只計算唯一特徵向量。"""
+
+    def __init__(self, model: Any, lru_size: int = DEFAULT_LRU_SIZE,
+                 state: Optional["_SharedState"] = None) -> None:
+        self.model = model
+        self.lru_size = int(lru_size)
+        self._state = state if state is not None else _SharedState()
+        self._lru = self._state.lru
+        self._lock = self._state.lock
+
+    @property
+    def totals(self) -> DedupStats:
+        """此模型自行程啟動以來的累計統計。"""
+        return self._state.totals
+
+    def predict(self, X, stats: Optional[DedupStats] = None, cascade: Any = None) -> np.ndarray:
+        return self._run("predict", X, stats, cascade)
+
+    def predict_proba(self, X, stats: Optional[DedupStats] = None, cascade: Any = None) -> np.ndarray:
+        return self._run("predict_proba", X, stats, cascade)
+
+    def _run(self, method: str, X, stats: Optional[DedupStats], cascade: Any = None) -> np.ndarray:
+        model_call = getattr(self.model, method)
+        n = len(X)
+
+        def call(rows, row_counts=None):
+            if cascade is None:
+                return model_call(rows)
+            return model_call(rows, stats=cascade, row_counts=row_counts)
+
+        values = X.to_numpy() if hasattr(X, "to_numpy") else np.asarray(X)
+        keys = _row_keys(values) if n else None
+        if keys is None:
+            out = np.asarray(call(X))
+            self._record(stats, DedupStats(rows=n, unique=n, predicted=n))
+            return out
+
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        unique_keys = [keys[i].tobytes() for i in first] if self.lru_size > 0 else None
+        cached: Dict[int, Any] = {}
+        if unique_keys is not None:
+            with self._lock:
+                lru = self._lru[method]
+                for j, key in enumerate(unique_keys):
+                    hit = lru.get(key)
+                    if hit is not None:
+                        lru.move_to_end(key)
+                        cached[j] = hit
+        miss = np.array([j for j in range(len(first)) if j not in cached], dtype=np.intp)
+
+        fresh = None
+        if len(miss):
+            counts = np.bincount(inverse, minlength=len(first))[miss]
+            fresh = np.asarray(call(_take(X, first[miss]), counts))
+        sample = fresh if fresh is not None else np.asarray(next(iter(cached.values())))
+        shape = (len(first),) + (sample.shape[1:] if fresh is not None else sample.shape)
+        unique_out = np.empty(shape, dtype=sample.dtype)
+        if fresh is not None:
+            unique_out[miss] = fresh
+        for j, value in cached.items():
+            unique_out[j] = value
+
+        if unique_keys is not None and fresh is not None:
+            with self._lock:
+                lru = self._lru[method]
+                for j, value in zip(miss, fresh):
+                    lru[unique_keys[j]] = value
+                while len(lru) > self.lru_size:
+                    lru.popitem(last=False)
+
+        self._record(stats, DedupStats(rows=n, unique=len(first), lru_hits=len(cached), predicted=len(miss)))
+        return unique_out[inverse]
+
+    def _record(self, stats: Optional[DedupStats], run: DedupStats) -> None:
+        with self._lock:
+            self.totals.merge(run)
+        if stats is not None:
+            stats.merge(run)
+
+
+_STATES: "weakref.WeakKeyDictionary[Any, _SharedState]" = weakref.WeakKeyDictionary()
+_STATES_LOCK = threading.Lock()
+
+
+def dedup_predictor(model: Any, lru_size: int = DEFAULT_LRU_SIZE) -> DedupPredictor:
+    """取得模型的 DedupPredictor；同一模型跨檔案共用 LRU（模型被釋放時一併移除）。"""
+    with _STATES_LOCK:
+        try:
+            state = _STATES.get(model)
+            if state is None:
+                state = _STATES[model] = _SharedState()
+        except TypeError:  # 不可弱參照的模型：不共用 LRU，仍有單次去重
+            state = None
+    return DedupPredictor(model, lru_size=lru_size, state=state)
+
+
+__all__ = [
+    "DEFAULT_LRU_SIZE",
+    "DedupPredictor",
+    "DedupStats",
+    "dedup_predictor",
+]
@@ -0,0 +1,162 @@
+"""Precompiled feature alignment plans shared by the brand inference paths."""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# ============================================================================
+# 特徵對齊計畫
+# ============================================================================
+# - FeatureMatrix：輸入資料只轉換一次成連續 float32 基底矩陣（非數值欄以 to_numeric 轉換、
+#   缺值補 na_value），二元與多元模型共用同一個基底
+# - AlignmentPlan：依 (模型欄位, 輸入欄位, 補值) 編譯一次，保存來源欄索引陣列、補值向量與目標 dtype；
+#   對齊時以一次向量化 gather 產生模型輸入，不經過 reindex／fillna／astype 的中間 DataFrame
+# - 計畫以 LRU 快取（同一模型處理同一種檔案格式時只編譯一次）
+_PLAN_CACHE_SIZE = 64
+
+
+class FeatureMatrix:
+    """連續 float32 基底矩陣與其欄名／列索引。"""
+
+    __slots__ = ("values", "columns", "index", "had_na")
+
+    def __init__(self, values: np.ndarray, columns: Sequence[str], index: Optional[pd.Index] = None,
+                 had_na: bool = False) -> None:
+        self.values = values
+        self.columns = tuple(str(c) for c in columns)
+        self.index = index
+        self.had_na = had_na  # 原始資料是否含缺值（已補為 na_value）
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, na_value: float = 0.0, integer: bool = False) -> "FeatureMatrix":
+        """DataFrame → float32 矩陣；integer=True 時截去小數（與 astype(int) 相同）。"""
+        values = np.empty((len(df), df.shape[1]), dtype=np.float32)
+        for j, col in enumerate(df.columns):
+            series = df[col]
+            if pd.api.types.is_bool_dtype(series.dtype):
+                values[:, j] = series.fillna(False).to_numpy(dtype=np.float32)
+            elif pd.api.types.is_numeric_dtype(series.dtype):
+                values[:, j] = series.to_numpy(dtype=np.float32, na_value=np.nan)
+            else:
+                values[:, j] = pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float32, na_value=np.nan)
+        had_na = bool(np.isnan(values).any())
+        np.nan_to_num(values, copy=False, nan=na_value, posinf=na_value, neginf=na_value)
+        if integer:
+            np.trunc(values, out=values)
+        return cls(values, df.columns, df.index, had_na)
+
+    def take(self, rows) -> "FeatureMatrix":
+        """以位置（整數陣列或布林遮罩）取列。"""
+        rows = np.asarray(rows)
+        index = self.index[rows] if self.index is not None else None
+        return FeatureMatrix(self.values[rows], self.columns, index)
+
+    def select_index(self, labels: Iterable[Any]) -> Optional["FeatureMatrix"]:
+        """以列標籤取列；任一標籤不存在時回傳 None（呼叫端改為重新建立基底）。"""
+        if self.index is None:
+            return None
+        pos = self.index.get_indexer(pd.Index(labels))
+        if (pos < 0).any():
+            return None
+        return self.take(pos)
+
+    def __len__(self) -> int:
+        return self.values.shape[0]
+
+
+class AlignmentPlan:
+    """把基底矩陣對齊成模型輸入欄位的預先編譯計畫。"""
+
+    def __init__(self, target: Sequence[str], source: Sequence[str], fill_value: float = 0.0,
+                 dtype=np.float32) -> None:
+        self.target = tuple(str(c) for c in target)
+        self.source = tuple(str(c) for c in source)
+        self.dtype = np.dtype(dtype)
+        lookup = {name: i for i, name in enumerate(self.source)}
+        src = np.array([lookup.get(name, -1) for name in self.target], dtype=np.intp)
+        self.missing_pos = np.flatnonzero(src < 0)
+        self.missing = [self.target[i] for i in self.missing_pos]
+        # 缺少的欄位先指向第 0 欄（gather 後再以補值覆寫），整個對齊只需一次 take
+        self.src_index = np.where(src < 0, 0, src)
+        self.fill = np.full(len(self.missing_pos), fill_value, dtype=self.dtype)
+        self.identity = not len(self.missing_pos) and np.array_equal(self.src_index, np.arange(len(self.source)))
+
+    def gather(self, base: FeatureMatrix, rows=None) -> np.ndarray:
+        """產生 (列數, 目標欄數) 的連續矩陣；rows 為位置或布林遮罩。"""
+        values = base.values
+        if rows is not None:
+            rows = np.asarray(rows)
+            if rows.dtype == bool:
+                rows = np.flatnonzero(rows)
+            out = values[np.ix_(rows, self.src_index)]
+        elif self.identity:
+            out = values
+        else:
+            out = np.take(values, self.src_index, axis=1)
+        if len(self.missing_pos):
+            out[:, self.missing_pos] = self.fill
+        if out.dtype != self.dtype:
+            out = out.astype(self.dtype)
+        return np.ascontiguousarray(out)
+
+    def frame(self, matrix: np.ndarray, index: Optional[pd.Index] = None) -> pd.DataFrame:
+        """以目標欄名包裝矩陣（單一 block，不複製），供以 DataFrame 訓練的模型保留欄名檢查。"""
+        return pd.DataFrame(matrix, columns=list(self.target), index=index, copy=False)
+
+    def align(self, base: FeatureMatrix, rows=None) -> pd.DataFrame:
+        matrix = self.gather(base, rows)
+        return self.frame(matrix)
+
+
+_PLANS: "OrderedDict[tuple, AlignmentPlan]" = OrderedDict()
+_PLANS_LOCK = threading.Lock()
+
+
+def compile_plan(target: Sequence[str], source: Sequence[str], fill_value: float = 0.0,
+                 dtype=np.float32) -> AlignmentPlan:
+    """取得（或編譯）對齊計畫；相同 (目標欄, 來源欄, 補值, dtype) 共用同一份計畫。"""
+    key = (tuple(str(c) for c in target), tuple(str(c) for c in source), float(fill_value), np.dtype(dtype).str)
+    with _PLANS_LOCK:
+        plan = _PLANS.get(key)
+        if plan is not None:
+            _PLANS.move_to_end(key)
+            return plan
+    plan = AlignmentPlan(key[0], key[1], fill_value, dtype)
+    with _PLANS_LOCK:
+        _PLANS[key] = plan
+        while len(_PLANS) > _PLAN_CACHE_SIZE:
+            _PLANS.popitem(last=False)
+    return plan
+
+
+def model_features(model: Any) -> Optional[list]:
+    """模型訓練時的特徵欄位（feature_names_in_ 或 XGBoost booster 的 feature_names）。"""
+    names = getattr(model, "feature_names_in_", None)
+    if names is None and hasattr(model, "get_booster"):
+        try:
+            names = model.get_booster().feature_names
+        except Exception:
+            names = None
+    return list(names) if names is not None else None
+
+
+def plan_for(model: Any, base: FeatureMatrix, fill_value: float = 0.0,
+             fallback: Optional[Sequence[str]] = None) -> AlignmentPlan:
+    """依模型欄位（沒有時用 fallback，再沒有則用全部輸入欄）編譯對齊計畫。"""
+    target = model_features(model)
+    if target is None:
+        target = list(fallback) if fallback is not None else list(base.columns)
+    return compile_plan(target, base.columns, fill_value)
+
+
+__all__ = [
+    "AlignmentPlan",
+    "FeatureMatrix",
+    "compile_plan",
+    "model_features",
+    "plan_for",
+]
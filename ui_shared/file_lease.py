@@ -0,0 +1,365 @@
+"""Cooperative lease files so several monitor instances can share one watched folder."""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+# ============================================================================
+# 多主機共用資料夾：租約檔設定
+# ============================================================================
+# - 多台主機監控同一個共用資料夾時，處理檔案前先在 <資料夾>/.dflare_leases/ 以 O_CREAT|O_EXCL
+#   原子建立租約檔（內容為擁有者、心跳時間與到期時間），建立成功的主機才排入工作，其他主機略過
+# - 租約鍵為 (相對路徑, 大小, 修改時間) 的雜湊：各主機掛載路徑不同也能對上，檔案內容變動則是新的租約
+# - 擁有者的心跳執行緒每 HEARTBEAT_SECONDS 更新到期時間（TTL_SECONDS）；主機當機後租約過期，
+#   其他主機以「改名移走過期租約 → 重新原子建立」接手
+# - 工作結束後租約改寫為 done／failed 完成標記並保留 DONE_RETENTION_HOURS，其他主機看到就不再處理（也不重複推播）
+# - 租約路徑與擁有者隨工作 payload 保存：行程重啟後以 adopt 接回前一個執行個體的租約並恢復心跳，
+#   租約已被其他主機接手時回傳 None（呼叫端應取消重複的工作）
+DEFAULT_LEASE_SETTINGS: Dict[str, Any] = {
+    "TTL_SECONDS": 120.0,
+    "HEARTBEAT_SECONDS": 30.0,
+    "DONE_RETENTION_HOURS": 24 * 7,
+}
+LEASE_DIR_NAME = ".dflare_leases"
+
+ACTIVE = "active"
+DONE = "done"
+FAILED = "failed"
+FINISHED_STATUSES = (DONE, FAILED)
+
+
+def resolve_lease_settings(config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    user = (config or {}).get("LEASE") or {}
+    out = dict(DEFAULT_LEASE_SETTINGS)
+    if isinstance(user, dict):
+        out.update({k: v for k, v in user.items() if k in DEFAULT_LEASE_SETTINGS})
+    return out
+
+
+def instance_id() -> str:
+    """本執行個體的識別（主機名稱:行程:隨機碼），寫入租約的 owner 欄位。"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _read(lease_path: str) -> Optional[Dict[str, Any]]:
+    """讀取租約；剛建立、內容尚未寫入的租約以檔案修改時間當作心跳。"""
+    try:
+        with open(lease_path, "r", encoding="utf-8") as fh:
+            text = fh.read()
+        mtime = os.path.getmtime(lease_path)
+    except OSError:
+        return None
+    try:
+        record = json.loads(text)
+        if isinstance(record, dict):
+            return record
+    except ValueError:
+        pass
+    return {"owner": None, "status": ACTIVE, "heartbeat": mtime, "expires": None}
+
+
+def _write(lease_path: str, record: Dict[str, Any]) -> None:
+    tmp = f"{lease_path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(record, fh, ensure_ascii=False)
+    os.replace(tmp, lease_path)
+
+
+@dataclass
+class Lease:
+    """本執行個體持有的租約；watch 回傳 done／failed 時由心跳執行緒寫入完成標記。"""
+
+    path: str
+    lease_path: str
+    owner: str
+    acquired: float
+    watch: Optional[Callable[[], Optional[str]]] = field(default=None, repr=False, compare=False)
+
+
+class LeaseManager:
+    """管理單一共用資料夾的租約：取得、心跳續約、完成標記與接手過期租約。"""
+
+    def __init__(self, root: str, settings: Optional[Dict[str, Any]] = None, owner: Optional[str] = None) -> None:
+        self.root = os.path.abspath(root)
+        self.lease_dir = os.path.join(self.root, LEASE_DIR_NAME)
+        self.settings = dict(DEFAULT_LEASE_SETTINGS)
+        self.settings.update({k: v for k, v in (settings or {}).items() if k in DEFAULT_LEASE_SETTINGS})
+        self.owner = owner or instance_id()
+        self._lock = threading.Lock()
+        self._held: Dict[str, Lease] = {}
+        self._waiting: Dict[str, float] = {}  # 由其他執行個體持有、等待完成或過期的檔案
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------------- 租約鍵 ----------------
+    def lease_path(self, path: str) -> Optional[str]:
+        """檔案目前版本的租約檔路徑；檔案不存在時回傳 None。"""
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        rel = os.path.relpath(path, self.root).replace(os.sep, "/")
+        digest = hashlib.sha1(f"{rel}|{stat.st_size}|{stat.st_mtime_ns}".encode("utf-8")).hexdigest()
+        return os.path.join(self.lease_dir, f"{digest}.lease")
+
+    def _record(self, path: str, status: str, now: float) -> Dict[str, Any]:
+        record = {
+            "owner": self.owner,
+            "path": os.path.relpath(path, self.root).replace(os.sep, "/"),
+            "status": status,
+            "heartbeat": now,
+        }
+        if status == ACTIVE:
+            record["expires"] = now + float(self.settings["TTL_SECONDS"])
+        else:
+            record["expires"] = now + float(self.settings["DONE_RETENTION_HOURS"]) * 3600
+        return record
+
+    def _expired(self, record: Dict[str, Any], now: float) -> bool:
+        if record.get("status") in FINISHED_STATUSES:
+            return False
+        expires = record.get("expires")
+        if expires is None:
+            expires = float(record.get("heartbeat") or 0) + float(self.settings["TTL_SECONDS"])
+        return now >= float(expires)
+
+    # ---------------- 取得與釋放 ----------------
+    def acquire(self, path: str, watch: Optional[Callable[[], Optional[str]]] = None) -> Optional[Lease]:
+        """原子建立租約；其他執行個體持有中或已完成時回傳 None（過期的租約會先接手）。"""
+        path = os.path.abspath(path)
+        lease_path = self.lease_path(path)
+        if lease_path is None:
+            return None
+        os.makedirs(self.lease_dir, exist_ok=True)
+        with self._lock:
+            held = self._held.get(lease_path)
+            if held is not None:
+                return held
+        now = time.time()
+        for _ in range(2):
+            try:
+                fd = os.open(lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                seen = _read(lease_path)
+                if seen is None:
+                    continue  # 剛好被移走：再試一次
+                if not self._expired(seen, now) or not self._take_over(lease_path, seen):
+                    if seen.get("status") not in FINISHED_STATUSES:
+                        with self._lock:
+                            self._waiting.setdefault(path, now)
+                    return None
+                continue
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump(self._record(path, ACTIVE, now), fh, ensure_ascii=False)
+            lease = Lease(path=path, lease_path=lease_path, owner=self.owner, acquired=now, watch=watch)
+            with self._lock:
+                self._held[lease_path] = lease
+                self._waiting.pop(path, None)
+            self._start_heartbeat()
+            return lease
+        return None
+
+    def adopt(self, path: str, lease_path: str, previous_owner: str,
+              watch: Optional[Callable[[], Optional[str]]] = None) -> Optional[Lease]:
+        """接回前一個執行個體（例如重啟前的本機行程）為某個工作取得的租約，改為本執行個體持有並恢復心跳。
+
+        租約仍屬於 previous_owner 且未過期時直接改寫擁有者；已過期時依接手流程重新建立；
+        已完成、已由其他執行個體持有或接手時回傳 None。
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            held = self._held.get(lease_path)
+            if held is not None:
+                if watch is not None:
+                    held.watch = watch
+                return held
+        now = time.time()
+        seen = _read(lease_path)
+        if seen is None or seen.get("status") != ACTIVE or seen.get("owner") not in (previous_owner, self.owner):
+            return None
+        if self._expired(seen, now):
+            if not self._take_over(lease_path, seen):
+                return None
+            try:
+                fd = os.open(lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except OSError:
+                return None
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump(self._record(path, ACTIVE, now), fh, ensure_ascii=False)
+        else:
+            _write(lease_path, self._record(path, ACTIVE, now))
+        lease = Lease(path=path, lease_path=lease_path, owner=self.owner, acquired=now, watch=watch)
+        with self._lock:
+            self._held[lease_path] = lease
+            self._waiting.pop(path, None)
+        self._start_heartbeat()
+        return lease
+
+    def _take_over(self, lease_path: str, seen: Dict[str, Any]) -> bool:
+        """把過期租約改名移走（只有一台主機會成功）；移走的若不是剛才讀到的那份就放回去。"""
+        stale = f"{lease_path}.{uuid.uuid4().hex[:8]}.stale"
+        try:
+            os.rename(lease_path, stale)
+        except OSError:
+            return False
+        try:
+            if _read(stale) != seen and not os.path.exists(lease_path):
+                os.rename(stale, lease_path)  # 移走的是別人剛建立的新租約
+                return False
+            return True
+        except OSError:
+            return False
+        finally:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+    def renew(self, lease: Lease) -> bool:
+        """延長到期時間；租約已不屬於本執行個體時回傳 False 並停止追蹤。"""
+        record = _read(lease.lease_path)
+        if record is None or record.get("owner") != self.owner or record.get("status") != ACTIVE:
+            with self._lock:
+                self._held.pop(lease.lease_path, None)
+            return False
+        _write(lease.lease_path, self._record(lease.path, ACTIVE, time.time()))
+        return True
+
+    def release(self, lease: Lease, status: Optional[str] = None) -> None:
+        """釋放租約：status 為 done／failed 時改寫為完成標記，否則刪除讓其他執行個體立即接手。"""
+        with self._lock:
+            self._held.pop(lease.lease_path, None)
+        record = _read(lease.lease_path)
+        if record is None or record.get("owner") != self.owner:
+            return
+        try:
+            if status in FINISHED_STATUSES:
+                _write(lease.lease_path, self._record(lease.path, status, time.time()))
+            else:
+                os.remove(lease.lease_path)
+        except OSError:
+            pass
+
+    # ---------------- 查詢 ----------------
+    def status(self, path: str) -> Optional[Dict[str, Any]]:
+        """檔案目前版本的租約內容（沒有租約時回傳 None）。"""
+        lease_path = self.lease_path(path)
+        return _read(lease_path) if lease_path else None
+
+    def is_waiting(self, path: str) -> bool:
+        with self._lock:
+            return os.path.abspath(path) in self._waiting
+
+    def takeover_candidates(self) -> List[str]:
+        """等待中的檔案裡，租約已過期或消失（擁有者當機或放棄）而可以重新取得的檔案。"""
+        now = time.time()
+        with self._lock:
+            waiting = list(self._waiting)
+        ready = []
+        for path in waiting:
+            record = self.status(path)
+            if not os.path.exists(path) or (record and record.get("status") in FINISHED_STATUSES):
+                with self._lock:
+                    self._waiting.pop(path, None)  # 已由其他執行個體完成，或檔案已刪除
+            elif record is None or self._expired(record, now):
+                ready.append(path)
+        return ready
+
+    def held(self) -> List[Lease]:
+        with self._lock:
+            return list(self._held.values())
+
+    def purge(self) -> int:
+        """刪除已超過保留期限的完成標記與殘留的暫存檔，回傳刪除數。"""
+        now = time.time()
+        removed = 0
+        try:
+            names = os.listdir(self.lease_dir)
+        except OSError:
+            return 0
+        for name in names:
+            full = os.path.join(self.lease_dir, name)
+            try:
+                if name.endswith(".lease"):
+                    record = _read(full)
+                    if (record and record.get("status") in FINISHED_STATUSES
+                            and now >= float(record.get("expires") or 0)):
+                        os.remove(full)
+                        removed += 1
+                elif now - os.path.getmtime(full) > float(self.settings["TTL_SECONDS"]):
+                    os.remove(full)  # 中斷留下的 .tmp／.stale
+                    removed += 1
+            except OSError:
+                continue
+        return removed
+
+    # ---------------- 心跳 ----------------
+    def _start_heartbeat(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._heartbeat_loop, daemon=True, name="LeaseHeartbeat")
+            self._thread.start()
+
+    def _heartbeat_loop(self) -> None:
+        interval = float(self.settings["HEARTBEAT_SECONDS"])
+        last_renew = time.time()
+        while not self._stop.wait(min(interval, 2.0)):
+            renew_due = time.time() - last_renew >= interval
+            for lease in self.held():
+                try:
+                    outcome = lease.watch() if lease.watch is not None else None
+                    if outcome in FINISHED_STATUSES:
+                        self.release(lease, outcome)
+                    elif renew_due:
+                        self.renew(lease)
+                except Exception:  # pragma: no cover - 心跳不可中斷
+                    continue
+            if renew_due:
+                last_renew = time.time()
+
+    def close(self) -> None:
+        """停止心跳並刪除仍持有的租約，讓其他執行個體立即接手。"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        for lease in self.held():
+            self.release(lease)
+
+
+_MANAGERS: Dict[str, LeaseManager] = {}
+_MANAGERS_LOCK = threading.Lock()
+
+
+def get_manager(root: str, settings: Optional[Dict[str, Any]] = None) -> LeaseManager:
+    """取得該共用資料夾的租約管理器；同一行程內共用一個擁有者識別與心跳執行緒。"""
+    key = os.path.abspath(root)
+    with _MANAGERS_LOCK:
+        manager = _MANAGERS.get(key)
+        if manager is None:
+            manager = _MANAGERS[key] = LeaseManager(key, settings)
+        return manager
+
+
+__all__ = [
+    "ACTIVE",
+    "DEFAULT_LEASE_SETTINGS",
+    "DONE",
+    "FAILED",
+    "FINISHED_STATUSES",
+    "LEASE_DIR_NAME",
+    "Lease",
+    "LeaseManager",
+    "get_manager",
+    "instance_id",
+    "resolve_lease_settings",
+]
@@ -0,0 +1,287 @@
+"""Persistent ledger of monitored files that were already queued or processed."""
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+# ============================================================================
+# 已處理檔案帳本設定
+# ============================================================================
+# - 取代監控端的記憶體集合（processed_files／event_signatures）：存成 SQLite（WAL），重啟後不會整個資料夾重跑、重複推播
+# - 每筆以 (路徑, inode, 大小, 修改時間) 為唯一鍵並附內容指紋（大小 + 開頭與結尾各 FINGERPRINT_BYTES 的 SHA-1）；
+#   唯一鍵查不到時再以 (路徑, 大小, 指紋) 比對，檔案被複製還原或只改了修改時間不會被當成新檔案
+# - status 記錄 queued／running／done／failed：有紀錄的檔案版本就不再排入；
+#   失敗的版本依 RETRY_BACKOFF_SECONDS × 2^(失敗次數-1)（上限 RETRY_BACKOFF_MAX_SECONDS）延後，
+#   最多再重試 MAX_RETRIES 次（retry_candidates 列出到期的檔案），之後要內容變動才會重新處理
+# - reconcile 依工作佇列的狀態修正 queued／running 紀錄：行程重啟後才結束、或已被佇列清除的工作不會讓檔案永遠卡住
+# - 依最後更新時間淘汰超過 RETENTION_HOURS 的紀錄，不再以無序集合任意截斷
+DEFAULT_LEDGER_SETTINGS: Dict[str, Any] = {
+    "RETENTION_HOURS": 24 * 7,
+    "FINGERPRINT_BYTES": 64 * 1024,
+    "MAX_RETRIES": 3,
+    "RETRY_BACKOFF_SECONDS": 600.0,
+    "RETRY_BACKOFF_MAX_SECONDS": 6 * 3600.0,
+}
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+STATUSES = (QUEUED, RUNNING, DONE, FAILED)
+
+
+def resolve_ledger_settings(config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    user = (config or {}).get("FILE_LEDGER") or {}
+    out = dict(DEFAULT_LEDGER_SETTINGS)
+    if isinstance(user, dict):
+        out.update({k: v for k, v in user.items() if k in DEFAULT_LEDGER_SETTINGS})
+    return out
+
+
+def fingerprint(path: str, size: int, nbytes: int = DEFAULT_LEDGER_SETTINGS["FINGERPRINT_BYTES"]) -> str:
+    """內容指紋：大小 + 開頭與結尾各 nbytes 的 SHA-1（大檔案也只讀兩小段）。"""
+    digest = hashlib.sha1(str(size).encode("ascii"))
+    with open(path, "rb") as fh:
+        digest.update(fh.read(nbytes))
+        if size > nbytes:
+            fh.seek(max(size - nbytes, nbytes))
+            digest.update(fh.read(nbytes))
+    return digest.hexdigest()
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+class FileLedger:
+    """SQLite 持久化的已處理檔案帳本。"""
+
+    def __init__(self, db_path: str, settings: Optional[Dict[str, Any]] = None) -> None:
+        self.db_path = os.path.abspath(db_path)
+        self.settings = dict(DEFAULT_LEDGER_SETTINGS)
+        self.settings.update({k: v for k, v in (settings or {}).items() if k in DEFAULT_LEDGER_SETTINGS})
+        self._init_database()
+
+    def _init_database(self) -> None:
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        with contextlib.closing(_connect(self.db_path)) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS files (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    path TEXT NOT NULL,
+                    ino INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    job_id INTEGER,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL,
+                    failures INTEGER NOT NULL DEFAULT 0,
+                    retry_after REAL
+                )
+            """)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(files)")}
+            if "failures" not in columns:  # 舊版資料庫補上重試欄位
+                conn.execute("ALTER TABLE files ADD COLUMN failures INTEGER NOT NULL DEFAULT 0")
+                conn.execute("ALTER TABLE files ADD COLUMN retry_after REAL")
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_files_key ON files(path, ino, size, mtime_ns)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_files_content ON files(path, size, fingerprint)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_files_job ON files(job_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_files_updated ON files(updated)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_files_status ON files(status, retry_after)")
+
+    def _identify(self, path: str):
+        """回傳 (絕對路徑, stat)；檔案不存在時回傳 (絕對路徑, None)。"""
+        key = os.path.abspath(path)
+        try:
+            return key, os.stat(key)
+        except OSError:
+            return key, None
+
+    # ---------------- 查詢 ----------------
+    def lookup(self, path: str) -> Optional[Dict[str, Any]]:
+        """目前版本的檔案紀錄；沒有紀錄（或檔案不存在）時回傳 None。"""
+        key, stat = self._identify(path)
+        if stat is None:
+            return None
+        with contextlib.closing(_connect(self.db_path)) as conn:
+            row = conn.execute(
+                "SELECT * FROM files WHERE path=? AND ino=? AND size=? AND mtime_ns=?",
+                (key, stat.st_ino, stat.st_size, stat.st_mtime_ns),
+            ).fetchone()
+            if row is not None:
+                return dict(row)
+            if not conn.execute("SELECT 1 FROM files WHERE path=? AND size=? LIMIT 1",
+                                (key, stat.st_size)).fetchone():
+                return None  # 同路徑沒有相同大小的紀錄：不必讀檔算指紋
+            try:
+                digest = fingerprint(key, stat.st_size, int(self.settings["FINGERPRINT_BYTES"]))
+            except OSError:
+                return None
+            row = conn.execute(
+                "SELECT * FROM files WHERE path=? AND size=? AND fingerprint=? ORDER BY updated DESC LIMIT 1",
+                (key, stat.st_size, digest),
+            ).fetchone()
+            if row is None:
+                return None
+            # 內容相同、只有 inode／修改時間變動：更新唯一鍵，下次直接命中
+            conn.execute(
+                "UPDATE OR IGNORE files SET ino=?, mtime_ns=?, updated=? WHERE id=?",
+                (stat.st_ino, stat.st_mtime_ns, time.time(), row["id"]),
+            )
+            return dict(row)
+
+    def _retry_due(self, row: Dict[str, Any], now: float) -> bool:
+        return (
+            row["status"] == FAILED
+            and int(row["failures"]) <= int(self.settings["MAX_RETRIES"])
+            and (row["retry_after"] or 0) <= now
+        )
+
+    def is_processed(self, path: str) -> bool:
+        """目前版本已排入或處理過即為 True；失敗且已到重試時間（未超過 MAX_RETRIES）的版本為 False。"""
+        row = self.lookup(path)
+        return row is not None and not self._retry_due(row, time.time())
+
+    def retry_candidates(self, folder: Optional[str] = None, now: Optional[float] = None) -> List[str]:
+        """已到重試時間的失敗檔案（指定 folder 時只列該資料夾底下的檔案；檔案版本已變動者略過）。"""
+        now = time.time() if now is None else now
+        query = "SELECT path FROM files WHERE status=? AND failures<=? AND COALESCE(retry_after, 0)<=?"
+        params: List[Any] = [FAILED, int(self.settings["MAX_RETRIES"]), now]
+        if folder is not None:
+            prefix = os.path.join(os.path.abspath(folder), "")
+            query += " AND substr(path, 1, ?)=?"
+            params.extend([len(prefix), prefix])
+        with contextlib.closing(_connect(self.db_path)) as conn:
+            paths = [row["path"] for row in conn.execute(query + " ORDER BY updated", params).fetchall()]
+        due = []
+        for path in dict.fromkeys(paths):
+            row = self.lookup(path)
+            if row is not None and self._retry_due(row, now):
+                due.append(path)
+        return due
+
+    def counts(self) -> Dict[str, int]:
+        """各狀態紀錄數，另含 total。"""
+        with contextlib.closing(_connect(self.db_path)) as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM files GROUP BY status").fetchall()
+        out = {status: 0 for status in STATUSES}
+        out.update({row[0]: int(row[1]) for row in rows})
+        out["total"] = sum(out.values())
+        return out
+
+    # ---------------- 寫入 ----------------
+    def mark(self, path: str, status: str = DONE, job_id: Optional[int] = None) -> bool:
+        """記錄檔案目前版本的狀態；檔案不存在時回傳 False。"""
+        key, stat = self._identify(path)
+        if stat is None:
+            return False
+        try:
+            digest = fingerprint(key, stat.st_size, int(self.settings["FINGERPRINT_BYTES"]))
+        except OSError:
+            return False
+        now = time.time()
+        with contextlib.closing(_connect(self.db_path)) as conn:
+            conn.execute(
+                "INSERT INTO files (path, ino, size, mtime_ns, fingerprint, status, job_id, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(path, ino, size, mtime_ns) DO UPDATE SET "
+                "fingerprint=excluded.fingerprint, status=excluded.status, "
+                "job_id=COALESCE(excluded.job_id, files.job_id), updated=excluded.updated",
+                (key, stat.st_ino, stat.st_size, stat.st_mtime_ns, digest, status, job_id, now, now),
+            )
+            if status == FAILED:
+                self._record_failure(conn, "path=? AND ino=? AND size=? AND mtime_ns=?",
+                                     (key, stat.st_ino, stat.st_size, stat.st_mtime_ns), now)
+        return True
+
+    def _record_failure(self, conn: sqlite3.Connection, where: str, params: tuple, now: float) -> None:
+        """失敗次數 +1，並依次數設定下次可重試的時間（指數退避）。"""
+        conn.execute(
+            f"UPDATE files SET failures=failures+1, "
+            f"retry_after=? + MIN(?, ? * (1 << MIN(failures, 30))) WHERE {where}",
+            (now, float(self.settings["RETRY_BACKOFF_MAX_SECONDS"]),
+             float(self.settings["RETRY_BACKOFF_SECONDS"]), *params),
+        )
+
+    def update_job(self, job_id: int, status: str) -> int:
+        """工作狀態變動時同步到對應的檔案紀錄，回傳更新筆數（改為 failed 時排定下次重試）。"""
+        now = time.time()
+        with contextlib.closing(_connect(self.db_path)) as conn:
+            if status == FAILED:
+                # 先排定重試時間（只針對這次才轉為失敗的紀錄），再更新狀態
+                self._record_failure(conn, "job_id=? AND status<>?", (int(job_id), FAILED), now)
+            cur = conn.execute(
+                "UPDATE files SET status=?, updated=? WHERE job_id=? AND status<>?",
+                (status, now, int(job_id), status),
+            )
+            return cur.rowcount
+
+    def reconcile(self, job_outcome: Callable[[int], Optional[str]]) -> int:
+        """依工作佇列修正 queued／running 紀錄，回傳修正筆數。
+
+        job_outcome(job_id) 回傳 done／failed（工作已不存在視為 failed），尚未結束回傳 None，
+        例如 JobQueue.outcome。
+        """
+        with contextlib.closing(_connect(self.db_path)) as conn:
+            rows = conn.execute(
+                "SELECT DISTINCT job_id FROM files WHERE status IN (?, ?) AND job_id IS NOT NULL",
+                (QUEUED, RUNNING),
+            ).fetchall()
+        changed = 0
+        for row in rows:
+            outcome = job_outcome(int(row["job_id"]))
+            if outcome in (DONE, FAILED):
+                changed += self.update_job(int(row["job_id"]), outcome)
+        return changed
+
+    def forget(self, path: str) -> int:
+        """刪除該路徑的所有紀錄（例如要強制重新處理），回傳刪除筆數。"""
+        with contextlib.closing(_connect(self.db_path)) as conn:
+            return conn.execute("DELETE FROM files WHERE path=?", (os.path.abspath(path),)).rowcount
+
+    def evict(self, max_age_seconds: Optional[float] = None) -> int:
+        """淘汰最後更新早於 max_age_seconds（預設 RETENTION_HOURS）的紀錄，回傳刪除筆數。"""
+        if max_age_seconds is None:
+            max_age_seconds = float(self.settings["RETENTION_HOURS"]) * 3600
+        cutoff = time.time() - float(max_age_seconds)
+        with contextlib.closing(_connect(self.db_path)) as conn:
+            return conn.execute("DELETE FROM files WHERE updated < ?", (cutoff,)).rowcount
+
+
+_LEDGERS: Dict[str, FileLedger] = {}
+_LEDGERS_LOCK = threading.Lock()
+
+
+def get_ledger(db_path: str, settings: Optional[Dict[str, Any]] = None) -> FileLedger:
+    """取得該資料庫的帳本；同一行程內共用，Streamlit 重跑與監控執行緒不會重複建立。"""
+    key = os.path.abspath(db_path)
+    with _LEDGERS_LOCK:
+        ledger = _LEDGERS.get(key)
+        if ledger is None:
+            ledger = _LEDGERS[key] = FileLedger(key, settings)
+        return ledger
+
+
+__all__ = [
+    "DEFAULT_LEDGER_SETTINGS",
+    "DONE",
+    "FAILED",
+    "FileLedger",
+    "QUEUED",
+    "RUNNING",
+    "STATUSES",
+    "fingerprint",
+    "get_ledger",
+    "resolve_ledger_settings",
+]
@@ -0,0 +1,168 @@
+"""Non-blocking file-stability tracking and directory snapshot indexing for folder monitors."""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# ============================================================================
+# 檔案穩定度與資料夾快照設定
+# ============================================================================
+# - StabilityTracker：事件進來時記錄每個路徑的 (大小, 修改時間)，版本變動就重新計時；
+#   同一版本維持 QUIET_SECONDS 沒變化即視為寫入完成，檢查時只 stat 一次，不在監控執行緒中 sleep
+# - DirectoryIndex：保存資料夾快照（每個資料夾的 mtime 與其中檔案的 (大小, 修改時間)）；
+#   輪詢時只重新列出 mtime 有變動的資料夾（新增／刪除／改名），其餘沿用快照，不再每次 rglob 並 stat 全部檔案
+# - 原地追加寫入不會改變資料夾 mtime：每 FULL_RESCAN_SECONDS 完整重掃一次作為保險
+#   （持續成長的檔案請用增量追蹤模式）
+DEFAULT_STABILITY_SETTINGS: Dict[str, Any] = {
+    "QUIET_SECONDS": 3.0,
+    "FULL_RESCAN_SECONDS": 300.0,
+}
+
+Version = Tuple[int, int]  # (大小, 修改時間 ns)
+
+
+def resolve_stability_settings(config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    user = (config or {}).get("STABILITY") or {}
+    out = dict(DEFAULT_STABILITY_SETTINGS)
+    if isinstance(user, dict):
+        out.update({k: v for k, v in user.items() if k in DEFAULT_STABILITY_SETTINGS})
+    return out
+
+
+def _version(path: str) -> Optional[Version]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class StabilityTracker:
+    """記錄每個路徑最近一次看到的版本與時間，安靜期過後才判定為穩定。"""
+
+    def __init__(self, quiet_seconds: float = DEFAULT_STABILITY_SETTINGS["QUIET_SECONDS"]) -> None:
+        self.quiet_seconds = float(quiet_seconds)
+        self._lock = threading.Lock()
+        self._seen: Dict[str, Tuple[Version, float]] = {}
+
+    def observe(self, path: str, now: Optional[float] = None) -> bool:
+        """記錄目前版本；版本改變（或第一次看到）時回傳 True 並重新計時。檔案不存在時移除紀錄。"""
+        version = _version(path)
+        now = time.time() if now is None else now
+        with self._lock:
+            if version is None:
+                self._seen.pop(path, None)
+                return False
+            previous = self._seen.get(path)
+            if previous is not None and previous[0] == version:
+                return False
+            self._seen[path] = (version, now)
+            return True
+
+    def is_ready(self, path: str, now: Optional[float] = None) -> bool:
+        """同一版本已維持 quiet_seconds 沒變化；只 stat 一次，不會阻塞。"""
+        now = time.time() if now is None else now
+        if self.observe(path, now):
+            return False
+        with self._lock:
+            entry = self._seen.get(path)
+        return entry is not None and now - entry[1] >= self.quiet_seconds
+
+    def ready(self, now: Optional[float] = None) -> List[str]:
+        """目前所有已穩定的路徑（依最後變動時間排序）。"""
+        now = time.time() if now is None else now
+        with self._lock:
+            candidates = sorted(self._seen, key=lambda p: self._seen[p][1])
+        return [path for path in candidates if self.is_ready(path, now)]
+
+    def discard(self, path: str) -> None:
+        """已交給下游處理（或不需處理）的路徑不再追蹤。"""
+        with self._lock:
+            self._seen.pop(path, None)
+
+    def pending(self) -> List[str]:
+        with self._lock:
+            return list(self._seen)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._seen)
+
+
+class DirectoryIndex:
+    """資料夾快照索引：只重新列出 mtime 有變動的資料夾，回傳新增或變動的檔案。"""
+
+    def __init__(self, root: str, recursive: bool = True,
+                 full_rescan_seconds: float = DEFAULT_STABILITY_SETTINGS["FULL_RESCAN_SECONDS"]) -> None:
+        self.root = os.path.abspath(root)
+        self.recursive = recursive
+        self.full_rescan_seconds = float(full_rescan_seconds)
+        # 資料夾 -> (資料夾 mtime ns, {檔案路徑: 版本}, [子資料夾])
+        self._dirs: Dict[str, Tuple[int, Dict[str, Version], List[str]]] = {}
+        self._last_full = 0.0
+
+    def scan(self, now: Optional[float] = None) -> List[str]:
+        """更新快照並回傳自上次掃描後新增或變動的檔案（第一次掃描回傳全部檔案）。"""
+        now = time.time() if now is None else now
+        full = now - self._last_full >= self.full_rescan_seconds
+        changed: List[str] = []
+        visited = set()
+        stack = [self.root]
+        while stack:
+            folder = stack.pop()
+            try:
+                folder_mtime = os.stat(folder).st_mtime_ns
+            except OSError:
+                continue
+            visited.add(folder)
+            cached = self._dirs.get(folder)
+            if cached is not None and cached[0] == folder_mtime and not full:
+                stack.extend(cached[2])  # 資料夾內容未變：只需檢查子資料夾本身的 mtime
+                continue
+
+            previous = cached[1] if cached is not None else {}
+            files: Dict[str, Version] = {}
+            subdirs: List[str] = []
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if self.recursive:
+                                    subdirs.append(entry.path)
+                            elif entry.is_file():
+                                stat = entry.stat()
+                                files[entry.path] = (stat.st_size, stat.st_mtime_ns)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+            changed.extend(sorted(path for path, version in files.items() if previous.get(path) != version))
+            self._dirs[folder] = (folder_mtime, files, subdirs)
+            stack.extend(subdirs)
+
+        for folder in [d for d in self._dirs if d not in visited]:
+            del self._dirs[folder]  # 已刪除的資料夾
+        if full:
+            self._last_full = now
+        return changed
+
+    def files(self, folder: Optional[str] = None) -> Dict[str, Version]:
+        """快照中的檔案與版本（指定 folder 時只回傳該資料夾本身的檔案）。"""
+        if folder is not None:
+            cached = self._dirs.get(os.path.abspath(folder))
+            return dict(cached[1]) if cached is not None else {}
+        out: Dict[str, Version] = {}
+        for _, files, _ in self._dirs.values():
+            out.update(files)
+        return out
+
+
+__all__ = [
+    "DEFAULT_STABILITY_SETTINGS",
+    "DirectoryIndex",
+    "StabilityTracker",
+    "resolve_stability_settings",
+]
@@ -0,0 +1,505 @@
+"""Persistent, bounded job queue with a worker pool for monitored-file processing."""
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# ============================================================================
+# 背景工作佇列設定
+# ============================================================================
+# - 偵測到的檔案寫入 SQLite（WAL）佇列，UI／監控執行緒只負責排入與輪詢狀態，不再自己執行 ETL 與推論
+# - 佇列有上限（MAX_PENDING，計入排隊中／重試中／執行中）：滿載時 submit 拋出 QueueFull，
+#   呼叫端保留檔案待下次再排入（背壓），不會像舊版一樣直接略過觸發
+# - 分派執行緒把可執行的工作交給 WORKERS 個工作行程（spawn，與 Streamlit 的執行緒隔離）；
+#   失敗時依 BACKOFF_SECONDS × 2^(次數-1)（上限 BACKOFF_MAX_SECONDS）延後重試，超過 MAX_ATTEMPTS 標記失敗
+# - 行程中止時仍為 running 的工作（擁有者行程已不存在）在下次開啟佇列時重新排入
+# - 同一 group（例如同一個被追蹤檔案的增量批次）的工作依排入順序逐一執行，不會並行
+# - 已結束的工作以 notified 欄位記錄是否已交付給監控端：take_finished 取出並標記，
+#   UI 重跑或行程重啟後仍會交付尚未處理的結果，且同一工作只交付一次
+# - WORKERS／MAX_PENDING 可由 DFLARE_JOB_WORKERS／DFLARE_JOB_MAX_PENDING 環境變數覆寫
+DEFAULT_JOB_QUEUE_SETTINGS: Dict[str, Any] = {
+    "WORKERS": int(os.environ.get("DFLARE_JOB_WORKERS", "2")),
+    "MAX_PENDING": int(os.environ.get("DFLARE_JOB_MAX_PENDING", "100")),
+    "MAX_ATTEMPTS": 3,
+    "BACKOFF_SECONDS": 5.0,
+    "BACKOFF_MAX_SECONDS": 300.0,
+    "USE_PROCESSES": True,   # False 時改用執行緒池（除錯或無法 spawn 的環境）
+    "POLL_SECONDS": 1.0,
+    "KEEP_FINISHED": 1000,   # 保留最近完成／失敗的工作筆數
+}
+
+QUEUED = "queued"
+RUNNING = "running"
+RETRY = "retry"
+DONE = "done"
+FAILED = "failed"
+ACTIVE_STATUSES = (QUEUED, RETRY, RUNNING)
+FINISHED_STATUSES = (DONE, FAILED)
+
+Handler = Callable[[Dict[str, Any]], Any]
+
+
+class QueueFull(RuntimeError):
+    """佇列已達 MAX_PENDING，呼叫端應保留檔案稍後再排入。"""
+
+
+class PermanentJobError(RuntimeError):
+    """工作內容本身有問題（例如缺少設定），重試也不會成功：直接標記失敗。"""
+
+
+def resolve_job_queue_settings(config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    user = (config or {}).get("JOB_QUEUE") or {}
+    out = dict(DEFAULT_JOB_QUEUE_SETTINGS)
+    if isinstance(user, dict):
+        out.update({k: v for k, v in user.items() if k in DEFAULT_JOB_QUEUE_SETTINGS})
+    return out
+
+
+def file_signature(path: str) -> str:
+    """以 (路徑, 修改時間, 大小) 作為工作去重鍵：同一版本的檔案只會排入一次。"""
+    try:
+        stat = os.stat(path)
+        return f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}"
+    except OSError:
+        return os.path.abspath(path)
+
+
+def _json_default(obj: Any) -> Any:
+    """工作結果轉 JSON：numpy 純量／陣列、pandas 物件、集合與路徑。"""
+    if hasattr(obj, "item") and not hasattr(obj, "__len__"):
+        return obj.item()
+    if hasattr(obj, "to_dict"):
+        try:
+            return obj.to_dict(orient="records")
+        except TypeError:
+            return obj.to_dict()
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, Path):
+        return str(obj)
+    return str(obj)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+# ---------------- 工作行程端 ----------------
+_CURRENT = threading.local()
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _execute(handler: Handler, db_path: str, job_id: int, payload: Dict[str, Any]) -> Any:
+    """在工作行程中執行 handler；期間 report_progress() 會寫回這筆工作的進度欄位。"""
+    _CURRENT.job = (db_path, job_id)
+    try:
+        return handler(payload)
+    finally:
+        _CURRENT.job = None
+
+
+def report_progress(message: str) -> None:
+    """由 handler 呼叫：更新目前工作的進度文字（不在佇列工作中呼叫時不做任何事）。"""
+    current = getattr(_CURRENT, "job", None)
+    if not current:
+        return
+    db_path, job_id = current
+    try:
+        with contextlib.closing(_connect(db_path)) as conn:
+            conn.execute("UPDATE jobs SET progress=?, updated=? WHERE id=?", (str(message), time.time(), job_id))
+    except sqlite3.Error:
+        pass  # 進度只是提示，寫入失敗不影響工作本身
+
+
+# ---------------- 佇列本體 ----------------
+class JobQueue:
+    """SQLite 持久化的有界工作佇列 + 工作行程池。
+
+    handler 必須是模組層級函式（工作行程以 spawn 啟動，以模組路徑重新匯入），
+    接收排入時的 payload（dict），回傳值以 JSON 存入工作結果。
+    """
+
+    def __init__(self, db_path: str, handler: Handler, settings: Optional[Dict[str, Any]] = None) -> None:
+        self.db_path = os.path.abspath(db_path)
+        self.handler = handler
+        self.settings = dict(DEFAULT_JOB_QUEUE_SETTINGS)
+        self.settings.update({k: v for k, v in (settings or {}).items() if k in DEFAULT_JOB_QUEUE_SETTINGS})
+        self.owner = str(os.getpid())
+        self._running: Dict[int, Future] = {}
+        self._executor = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._init_database()
+
+    # ---------------- 資料庫 ----------------
+    @contextlib.contextmanager
+    def _transaction(self):
+        with contextlib.closing(_connect(self.db_path)) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _init_database(self) -> None:
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        with contextlib.closing(_connect(self.db_path)) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    key TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_run REAL NOT NULL,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL,
+                    owner TEXT,
+                    progress TEXT,
+                    error TEXT,
+                    result TEXT,
+                    grp TEXT,
+                    notified INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "grp" not in columns:  # 舊版資料庫補上 group 欄位
+                conn.execute("ALTER TABLE jobs ADD COLUMN grp TEXT")
+            if "notified" not in columns:  # 舊版資料庫補上交付欄位：既有的已結束工作視為已交付
+                conn.execute("ALTER TABLE jobs ADD COLUMN notified INTEGER NOT NULL DEFAULT 0")
+                conn.execute("UPDATE jobs SET notified=1 WHERE status IN (?, ?)", FINISHED_STATUSES)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, next_run)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_key ON jobs(key)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_grp ON jobs(grp, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_notified ON jobs(notified, status)")
+        self._recover_orphans()
+
+    def _recover_orphans(self) -> None:
+        """擁有者行程已結束（或就是本行程的前一個實例）的 running 工作重新排入。"""
+        with self._transaction() as conn:
+            rows = conn.execute("SELECT id, owner FROM jobs WHERE status=?", (RUNNING,)).fetchall()
+            for row in rows:
+                owner = row["owner"] or ""
+                if owner.isdigit() and owner != self.owner and _pid_alive(int(owner)):
+                    continue
+                conn.execute(
+                    "UPDATE jobs SET status=?, attempts=MAX(attempts-1, 0), owner=NULL, progress=NULL, "
+                    "next_run=?, updated=? WHERE id=?",
+                    (QUEUED, time.time(), time.time(), row["id"]),
+                )
+
+    # ---------------- 排入與查詢 ----------------
+    def submit(self, path: str, payload: Optional[Dict[str, Any]] = None, key: Optional[str] = None,
+               group: Optional[str] = None) -> int:
+        """排入一個檔案，回傳工作編號；同一檔案版本已在佇列中時回傳既有編號。
+
+        佇列已滿時拋出 QueueFull（背壓），呼叫端應保留檔案稍後重試。
+        指定 group 時，同 group 的工作依排入順序逐一執行。
+        """
+        key = key or file_signature(path)
+        body = dict(payload or {})
+        body.setdefault("path", path)
+        now = time.time()
+        placeholders = ",".join("?" * len(ACTIVE_STATUSES))
+        with self._transaction() as conn:
+            row = conn.execute(
+                f"SELECT id FROM jobs WHERE key=? AND status IN ({placeholders})", (key, *ACTIVE_STATUSES)
+            ).fetchone()
+            if row is not None:
+                return int(row["id"])
+            pending = conn.execute(
+                f"SELECT COUNT(*) FROM jobs WHERE status IN ({placeholders})", ACTIVE_STATUSES
+            ).fetchone()[0]
+            if pending >= int(self.settings["MAX_PENDING"]):
+                raise QueueFull(f"工作佇列已滿（{pending}/{self.settings['MAX_PENDING']}）")
+            cur = conn.execute(
+                "INSERT INTO jobs (key, path, payload, status, attempts, next_run, created, updated, grp) "
+                "VALUES (?, ?, ?, ?, 0, ?, ?, ?, ?)",
+                (key, str(path), json.dumps(body, ensure_ascii=False, default=_json_default), QUEUED, now, now, now,
+                 group),
+            )
+            job_id = int(cur.lastrowid)
+        self.start()
+        self._wake.set()
+        return job_id
+
+    def cancel(self, job_id: int, reason: str) -> bool:
+        """取消尚未開始執行（排隊中或等待重試）的工作並標記為失敗；已在執行或已結束時回傳 False。"""
+        with self._transaction() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET status=?, error=?, owner=NULL, updated=? WHERE id=? AND status IN (?, ?)",
+                (FAILED, f"Cancelled: {reason}", time.time(), int(job_id), QUEUED, RETRY),
+            )
+        return cur.rowcount > 0
+
+    def has_capacity(self) -> bool:
+        return self.counts()["active"] < int(self.settings["MAX_PENDING"])
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"]) if job.get("payload") else {}
+        job["result"] = json.loads(job["result"]) if job.get("result") else None
+        return job
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        with contextlib.closing(_connect(self.db_path)) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id=?", (int(job_id),)).fetchone()
+        return self._row_to_job(row) if row is not None else None
+
+    def outcome(self, job_id: int) -> Optional[str]:
+        """工作結束時回傳 done／failed（工作已被清除視為 failed），尚未結束回傳 None。"""
+        with contextlib.closing(_connect(self.db_path)) as conn:
+            row = conn.execute("SELECT status FROM jobs WHERE id=?", (int(job_id),)).fetchone()
+        if row is None:
+            return FAILED
+        return row["status"] if row["status"] in FINISHED_STATUSES else None
+
+    def jobs(self, limit: int = 50, statuses: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """最近的工作（新到舊），可依狀態篩選。"""
+        query, params = "SELECT * FROM jobs", []
+        statuses = tuple(statuses or ())
+        if statuses:
+            query += f" WHERE status IN ({','.join('?' * len(statuses))})"
+            params.extend(statuses)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(int(limit))
+        with contextlib.closing(_connect(self.db_path)) as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def take_finished(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """取出尚未交付的已結束工作（舊到新）並標記為已交付；同一工作只會被取出一次。"""
+        placeholders = ",".join("?" * len(FINISHED_STATUSES))
+        with self._transaction() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM jobs WHERE notified=0 AND status IN ({placeholders}) ORDER BY id LIMIT ?",
+                (*FINISHED_STATUSES, int(limit)),
+            ).fetchall()
+            if rows:
+                ids = [row["id"] for row in rows]
+                conn.execute(f"UPDATE jobs SET notified=1 WHERE id IN ({','.join('?' * len(ids))})", ids)
+        return [self._row_to_job(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        """各狀態工作數，另含 active（排隊＋重試＋執行中）與上限 capacity。"""
+        with contextlib.closing(_connect(self.db_path)) as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        out = {status: 0 for status in ACTIVE_STATUSES + FINISHED_STATUSES}
+        out.update({row[0]: int(row[1]) for row in rows})
+        out["active"] = sum(out[s] for s in ACTIVE_STATUSES)
+        out["capacity"] = int(self.settings["MAX_PENDING"])
+        return out
+
+    # ---------------- 分派 ----------------
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, daemon=True, name="JobQueueDispatcher")
+            self._thread.start()
+
+    def stop(self, wait: bool = True) -> None:
+        """停止分派；尚未完成的工作放回佇列，下次啟動時重新執行。"""
+        self._stop.set()
+        self._wake.set()
+        if wait and self._thread is not None:
+            self._thread.join(timeout=10)
+        with self._lock:
+            executor, self._executor = self._executor, None
+            running, self._running = self._running, {}
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if running:
+            with self._transaction() as conn:
+                for job_id in running:
+                    conn.execute(
+                        "UPDATE jobs SET status=?, attempts=MAX(attempts-1, 0), owner=NULL, next_run=?, updated=? "
+                        "WHERE id=? AND status=?",
+                        (QUEUED, time.time(), time.time(), job_id, RUNNING),
+                    )
+
+    def _get_executor(self):
+        if self._executor is None:
+            workers = max(1, int(self.settings["WORKERS"]))
+            if self.settings["USE_PROCESSES"]:
+                self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="JobWorker")
+        return self._executor
+
+    def _reset_executor(self) -> None:
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._reap()
+                self._claim()
+            except sqlite3.Error:
+                time.sleep(1)  # 資料庫暫時被鎖定：下一輪再試
+            self._wake.wait(float(self.settings["POLL_SECONDS"]))
+            self._wake.clear()
+
+    def _claim(self) -> None:
+        free = max(1, int(self.settings["WORKERS"])) - len(self._running)
+        if free <= 0:
+            return
+        now = time.time()
+        with self._transaction() as conn:
+            # 同 group 只取最早一筆，且前面沒有尚未結束的工作
+            rows = conn.execute(
+                "SELECT id, payload FROM jobs WHERE status IN (?, ?) AND next_run<=? AND (grp IS NULL OR NOT EXISTS "
+                "(SELECT 1 FROM jobs AS prev WHERE prev.grp=jobs.grp AND prev.id<jobs.id AND prev.status IN (?, ?, ?))) "
+                "ORDER BY next_run, id LIMIT ?",
+                (QUEUED, RETRY, now, *ACTIVE_STATUSES, free),
+            ).fetchall()
+            for row in rows:
+                conn.execute(
+                    "UPDATE jobs SET status=?, attempts=attempts+1, owner=?, progress=NULL, updated=? WHERE id=?",
+                    (RUNNING, self.owner, now, row["id"]),
+                )
+        for row in rows:
+            job_id = int(row["id"])
+            try:
+                future = self._get_executor().submit(
+                    _execute, self.handler, self.db_path, job_id, json.loads(row["payload"])
+                )
+            except (BrokenProcessPool, RuntimeError) as exc:
+                self._reset_executor()
+                self._fail(job_id, exc)
+                continue
+            future.add_done_callback(lambda _f: self._wake.set())
+            self._running[job_id] = future
+
+    def _reap(self) -> None:
+        for job_id, future in list(self._running.items()):
+            if not future.done():
+                continue
+            del self._running[job_id]
+            try:
+                result = future.result()
+            except PermanentJobError as exc:
+                self._fail(job_id, exc, retry=False)
+            except BrokenProcessPool as exc:  # 工作行程意外結束（例如記憶體不足被終止）
+                self._reset_executor()
+                self._fail(job_id, exc)
+            except BaseException as exc:  # noqa: BLE001 - 任何錯誤都記錄到工作上
+                self._fail(job_id, exc)
+            else:
+                self._complete(job_id, result)
+
+    def _complete(self, job_id: int, result: Any) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status=?, result=?, error=NULL, owner=NULL, updated=? WHERE id=?",
+                (DONE, json.dumps(result, ensure_ascii=False, default=_json_default), time.time(), job_id),
+            )
+        self._purge()
+
+    def _fail(self, job_id: int, exc: BaseException, retry: bool = True) -> None:
+        error = f"{type(exc).__name__}: {exc}"
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT attempts FROM jobs WHERE id=?", (job_id,)).fetchone()
+            attempts = int(row["attempts"]) if row is not None else 0
+            if retry and attempts < int(self.settings["MAX_ATTEMPTS"]):
+                delay = min(
+                    float(self.settings["BACKOFF_MAX_SECONDS"]),
+                    float(self.settings["BACKOFF_SECONDS"]) * 2 ** max(attempts - 1, 0),
+                )
+                conn.execute(
+                    "UPDATE jobs SET status=?, error=?, owner=NULL, next_run=?, updated=? WHERE id=?",
+                    (RETRY, error, now + delay, now, job_id),
+                )
+            else:
+                conn.execute(
+                    "UPDATE jobs SET status=?, error=?, owner=NULL, updated=? WHERE id=?",
+                    (FAILED, error, now, job_id),
+                )
+        self._purge()
+
+    def _purge(self) -> None:
+        keep = int(self.settings["KEEP_FINISHED"])
+        with self._transaction() as conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND notified=1 AND id NOT IN "
+                "(SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY id DESC LIMIT ?)",
+                (*FINISHED_STATUSES, *FINISHED_STATUSES, keep),
+            )
+
+    def wait(self, job_id: int, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """等待工作結束（完成或失敗），逾時回傳目前狀態。"""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job["status"] in FINISHED_STATUSES:
+                return job
+            if deadline is not None and time.time() >= deadline:
+                return job
+            time.sleep(0.1)
+
+
+_QUEUES: Dict[str, JobQueue] = {}
+_QUEUES_LOCK = threading.Lock()
+
+
+def get_queue(db_path: str, handler: Handler, settings: Optional[Dict[str, Any]] = None) -> JobQueue:
+    """取得（或建立並啟動）該資料庫的佇列；同一行程內共用，Streamlit 重跑不會重複建立工作池。"""
+    key = os.path.abspath(db_path)
+    with _QUEUES_LOCK:
+        queue = _QUEUES.get(key)
+        if queue is None:
+            queue = _QUEUES[key] = JobQueue(key, handler, settings)
+    queue.start()
+    return queue
+
+
+__all__ = [
+    "ACTIVE_STATUSES",
+    "DEFAULT_JOB_QUEUE_SETTINGS",
+    "DONE",
+    "FAILED",
+    "FINISHED_STATUSES",
+    "JobQueue",
+    "PermanentJobError",
+    "QUEUED",
+    "QueueFull",
+    "RETRY",
+    "RUNNING",
+    "file_signature",
+    "get_queue",
+    "report_progress",
+    "resolve_job_queue_settings",
+]
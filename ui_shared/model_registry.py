@@ -0,0 +1,304 @@
+"""Process-wide model registry shared by Streamlit sessions and monitor threads."""
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import joblib
+
+# ============================================================================
+# 模型快取設定
+# ============================================================================
+# - 以「檔案內容 SHA-256」為鍵：同一份模型不論來自路徑或上傳位元組，每個行程只反序列化一次
+# - 載入時只做一次 XGBoost 相容性修正與 warm-up 預測（以 feature_names_in_ 建立一列全 0 資料）
+# - 以序列化大小估計記憶體，超過上限時依 LRU 淘汰（仍被呼叫端持有的模型不受影響）
+# - StartupContext.feature_flags["enable_model_caching"]（經 DFLARE_FEATURE_FLAGS 傳入）為 False 時
+#   每次都直接載入，行為與舊版相同
+DEFAULT_MAX_BYTES: int = int(float(os.environ.get("DFLARE_MODEL_CACHE_MB", "2048")) * 1024 * 1024)
+_HASH_CHUNK = 4 * 1024 * 1024
+
+Prepare = Callable[[Any], Any]
+
+
+def model_caching_enabled() -> bool:
+    """讀取 DFLARE_FEATURE_FLAGS 中的 enable_model_caching（未設定時預設啟用）。"""
+    raw = os.environ.get("DFLARE_FEATURE_FLAGS")
+    if not raw:
+        return True
+    try:
+        flags = json.loads(raw)
+    except (TypeError, ValueError):
+        return True
+    return bool(flags.get("enable_model_caching", True)) if isinstance(flags, dict) else True
+
+
+def _iter_estimators(model: Any):
+    """走訪模型本身與 VotingClassifier／Stacking／包裝器內的子模型。"""
+    seen = set()
+    stack = [model]
+    while stack:
+        est = stack.pop()
+        if est is None or id(est) in seen:
+            continue
+        seen.add(id(est))
+        yield est
+        for attr in ("estimators_", "fitted_"):
+            subs = est.__dict__.get(attr) if hasattr(est, "__dict__") else None
+            if isinstance(subs, (list, tuple)):
+                stack.extend(subs)
+        for attr in ("estimator_", "final_estimator_", "model"):
+            sub = est.__dict__.get(attr) if hasattr(est, "__dict__") else None
+            if sub is not None and hasattr(sub, "predict"):
+                stack.append(sub)
+
+
+def fix_xgboost_compatibility(model: Any) -> Any:
+    """移除舊版 XGBoost 序列化留下的 use_label_encoder 屬性（含集成內的子模型）。"""
+    for est in _iter_estimators(model):
+        if "XGB" in type(est).__name__ and "use_label_encoder" in getattr(est, "__dict__", {}):
+            try:
+                delattr(est, "use_label_encoder")
+            except AttributeError:
+                pass
+    return model
+
+
+def _dummy_row(model: Any):
+    names = getattr(model, "feature_names_in_", None)
+    if names is not None:
+        import pandas as pd
+
+        return pd.DataFrame([[0.0] * len(names)], columns=list(names), dtype="float32")
+    n_features = getattr(model, "n_features_in_", None)
+    if n_features:
+        import numpy as np
+
+        return np.zeros((1, int(n_features)), dtype=np.float32)
+    return None
+
+
+def warm_up(model: Any) -> Optional[float]:
+    """以一列全 0 資料執行一次預測，回傳耗時秒數；無欄位資訊或預測失敗時回傳 None。"""
+    row = _dummy_row(model)
+    if row is None:
+        return None
+    start = time.perf_counter()
+    try:
+        if hasattr(model, "predict_proba"):
+            model.predict_proba(row)
+        else:
+            model.predict(row)
+    except Exception:
+        return None
+    return time.perf_counter() - start
+
+
+def _read_source(source: Any) -> Tuple[Optional[str], Optional[bytes]]:
+    """回傳 (路徑, 位元組)；路徑來源不先讀入記憶體，由雜湊與載入各自串流讀取。"""
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source), None
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return None, bytes(source)
+    if hasattr(source, "getvalue"):  # Streamlit UploadedFile／BytesIO
+        return None, bytes(source.getvalue())
+    if hasattr(source, "read"):
+        if hasattr(source, "seek"):
+            source.seek(0)
+        data = source.read()
+        if hasattr(source, "seek"):
+            source.seek(0)
+        return None, bytes(data)
+    raise TypeError(f"不支援的模型來源型別：{type(source).__name__}")
+
+
+def _load_path(path: str) -> Any:
+    if path.endswith(".pkl"):
+        try:
+            return joblib.load(path)
+        except Exception:
+            with open(path, "rb") as fh:
+                return pickle.load(fh)
+    return joblib.load(path)
+
+
+def _load_bytes(data: bytes) -> Any:
+    try:
+        return joblib.load(io.BytesIO(data))
+    except Exception:
+        return pickle.loads(data)
+
+
+@dataclass
+class _Entry:
+    model: Any
+    nbytes: int
+    loaded_at: float
+    load_seconds: float
+    warmup_seconds: Optional[float]
+    hits: int = 0
+    sources: set = field(default_factory=set)
+
+
+class ModelRegistry:
+    """以內容雜湊為鍵的執行緒安全模型快取；一個行程共用一個實例（見 get_registry）。"""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.max_bytes = int(max_bytes)
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        # 路徑 → (mtime_ns, size, sha256)：未變動的檔案不必每次重算雜湊
+        self._path_hashes: Dict[str, Tuple[int, int, str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ---------------- 雜湊 ----------------
+    def _hash_path(self, path: str) -> Tuple[str, int]:
+        real = os.path.realpath(path)
+        st = os.stat(real)
+        with self._lock:
+            memo = self._path_hashes.get(real)
+        if memo is not None and memo[0] == st.st_mtime_ns and memo[1] == st.st_size:
+            return memo[2], st.st_size
+        digest = hashlib.sha256()
+        with open(real, "rb") as fh:
+            for chunk in iter(lambda: fh.read(_HASH_CHUNK), b""):
+                digest.update(chunk)
+        value = digest.hexdigest()
+        with self._lock:
+            self._path_hashes[real] = (st.st_mtime_ns, st.st_size, value)
+        return value, st.st_size
+
+    # ---------------- 載入 ----------------
+    def get(self, source: Any, prepare: Optional[Prepare] = None, warm: bool = True) -> Any:
+        """
+        取得模型：source 可為檔案路徑、位元組或檔案物件（Streamlit UploadedFile）。
+        prepare 為載入後的額外修正（例如模型修復），與內容雜湊一起作為快取鍵，只執行一次。
+        """
+        path, data = _read_source(source)
+        if path is not None:
+            digest, nbytes = self._hash_path(path)
+        else:
+            digest, nbytes = hashlib.sha256(data).hexdigest(), len(data)
+        key = (digest, getattr(prepare, "__qualname__", "") if prepare is not None else "")
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry.hits += 1
+                self.hits += 1
+                return entry.model
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # 同一模型同時被多個 session／執行緒要求時只載入一次，其餘等待結果
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    entry.hits += 1
+                    self.hits += 1
+                    return entry.model
+            try:
+                start = time.perf_counter()
+                model = _load_path(path) if path is not None else _load_bytes(data)
+                model = fix_xgboost_compatibility(model)
+                if prepare is not None:
+                    model = prepare(model)
+                load_seconds = time.perf_counter() - start
+                warmup_seconds = warm_up(model) if warm else None
+                entry = _Entry(model=model, nbytes=int(nbytes), loaded_at=time.time(),
+                               load_seconds=load_seconds, warmup_seconds=warmup_seconds)
+                if path is not None:
+                    entry.sources.add(os.path.realpath(path))
+                with self._lock:
+                    self.misses += 1
+                    self._entries[key] = entry
+                    self._evict()
+            finally:
+                # 載入或 prepare 失敗也要移除，避免壞檔案的鎖永久留在 _key_locks
+                with self._lock:
+                    if self._key_locks.get(key) is key_lock:
+                        del self._key_locks[key]
+        return model
+
+    def _evict(self) -> None:
+        # 呼叫端需持有 self._lock；至少保留最新載入的一個模型
+        total = sum(e.nbytes for e in self._entries.values())
+        while total > self.max_bytes and len(self._entries) > 1:
+            _, old = self._entries.popitem(last=False)
+            total -= old.nbytes
+            self.evictions += 1
+
+    # ---------------- 管理 ----------------
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._path_hashes.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "models": len(self._entries),
+                "bytes": sum(e.nbytes for e in self._entries.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": [
+                    {
+                        "sha256": key[0][:12],
+                        "prepare": key[1],
+                        "type": type(e.model).__name__,
+                        "bytes": e.nbytes,
+                        "hits": e.hits,
+                        "load_seconds": round(e.load_seconds, 4),
+                        "warmup_seconds": None if e.warmup_seconds is None else round(e.warmup_seconds, 4),
+                    }
+                    for key, e in self._entries.items()
+                ],
+            }
+
+
+_REGISTRY: Optional[ModelRegistry] = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_registry() -> ModelRegistry:
+    global _REGISTRY
+    if _REGISTRY is None:
+        with _REGISTRY_LOCK:
+            if _REGISTRY is None:
+                _REGISTRY = ModelRegistry()
+    return _REGISTRY
+
+
+def load_model(source: Any, prepare: Optional[Prepare] = None, warm: bool = True) -> Any:
+    """經由行程共用的模型快取載入；enable_model_caching 關閉時每次直接載入。"""
+    if model_caching_enabled():
+        return get_registry().get(source, prepare=prepare, warm=warm)
+    path, data = _read_source(source)
+    model = _load_path(path) if path is not None else _load_bytes(data)
+    model = fix_xgboost_compatibility(model)
+    return prepare(model) if prepare is not None else model
+
+
+__all__ = [
+    "DEFAULT_MAX_BYTES",
+    "ModelRegistry",
+    "fix_xgboost_compatibility",
+    "get_registry",
+    "load_model",
+    "model_caching_enabled",
+    "warm_up",
+]
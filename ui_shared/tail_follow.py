@@ -0,0 +1,233 @@
+"""Incremental tail-follow of growing log files with persisted byte offsets."""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+# ============================================================================
+# 增量追蹤（tail）設定
+# ============================================================================
+# - 每個檔案記錄 (裝置, inode, 已處理位元組位置, CSV 表頭)，存成 JSON（先寫暫存檔再 os.replace）
+# - 每次只讀取位置之後「完整的列」（到最後一個換行為止），每批最多 MAX_BATCH_BYTES；
+#   未寫完的最後一列留到下次
+# - CSV 來源：第一次讀取時記住表頭，之後每個微批次都帶上表頭，下游 ETL 不需改動
+# - inode 改變（輪替）：先在同資料夾找回舊 inode 的檔案讀完剩餘內容，再從新檔案開頭開始；
+#   檔案變小（被截斷）時從頭開始
+# - 位置在呼叫端 commit() 後才寫入（例如排入持久化工作佇列成功後），中途失敗會重讀同一段
+DEFAULT_TAIL_SETTINGS: Dict[str, Any] = {
+    "MAX_BATCH_BYTES": 8 * 1024 * 1024,
+    "MAX_BATCHES_PER_POLL": 10,
+}
+TAILABLE_EXTS = (".csv", ".txt", ".log")
+
+
+def resolve_tail_settings(config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    user = (config or {}).get("TAIL") or {}
+    out = dict(DEFAULT_TAIL_SETTINGS)
+    if isinstance(user, dict):
+        out.update({k: v for k, v in user.items() if k in DEFAULT_TAIL_SETTINGS})
+    return out
+
+
+def is_tailable(path: str) -> bool:
+    """只有未壓縮的文字檔能以位元組位置續讀（.gz／.zip 仍走整檔處理）。"""
+    return path.lower().endswith(TAILABLE_EXTS)
+
+
+@dataclass
+class TailBatch:
+    """一次讀到的完整列（含 CSV 表頭），commit 後才推進位置。"""
+
+    key: str                  # 追蹤的檔案路徑（輪替後仍為原路徑）
+    source: str               # 實際讀取的檔案（輪替時為改名後的舊檔）
+    ino: int
+    start: int
+    end: int
+    header: Optional[bytes]
+    data: bytes
+    rotated: bool = False
+    next_state: Dict[str, Any] = field(default_factory=dict, repr=False)
+
+    @property
+    def lines(self) -> int:
+        return self.data.count(b"\n")
+
+    @property
+    def tag(self) -> str:
+        """批次識別（inode 與位元組範圍），用於檔名與工作去重鍵。"""
+        return f"{self.ino}_{self.start}-{self.end}"
+
+    def write(self, target: str) -> str:
+        """把表頭 + 本批資料寫成獨立檔案，供既有 ETL 以檔案路徑處理。"""
+        os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+        tmp = f"{target}.tmp"
+        with open(tmp, "wb") as fh:
+            if self.header:
+                fh.write(self.header)
+            fh.write(self.data)
+        os.replace(tmp, target)
+        return target
+
+
+class OffsetStore:
+    """以 JSON 檔保存每個檔案的追蹤狀態。"""
+
+    def __init__(self, path: str) -> None:
+        self.path = os.path.abspath(path)
+        self._lock = threading.Lock()
+        self._states: Dict[str, Dict[str, Any]] = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as fh:
+                loaded = json.load(fh)
+            if isinstance(loaded, dict):
+                self._states = loaded
+        except (OSError, ValueError):
+            self._states = {}
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            state = self._states.get(key)
+            return dict(state) if state is not None else None
+
+    def put(self, key: str, state: Dict[str, Any]) -> None:
+        with self._lock:
+            self._states[key] = dict(state, updated=time.time())
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump(self._states, fh, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.path)
+
+    def items(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {k: dict(v) for k, v in self._states.items()}
+
+
+def _fresh_state(stat: os.stat_result) -> Dict[str, Any]:
+    return {"dev": stat.st_dev, "ino": stat.st_ino, "offset": 0, "header": None}
+
+
+def _find_by_inode(folder: str, dev: int, ino: int) -> Optional[str]:
+    """在同資料夾找回輪替（改名）後的舊檔。"""
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                if st.st_ino == ino and st.st_dev == dev and entry.is_file(follow_symlinks=False):
+                    return entry.path
+    except OSError:
+        return None
+    return None
+
+
+class TailReader:
+    """依持久化位置讀取檔案新增的完整列。"""
+
+    def __init__(self, state_path: str, settings: Optional[Dict[str, Any]] = None) -> None:
+        self.store = OffsetStore(state_path)
+        self.settings = dict(DEFAULT_TAIL_SETTINGS)
+        self.settings.update({k: v for k, v in (settings or {}).items() if k in DEFAULT_TAIL_SETTINGS})
+
+    def poll(self, path: str) -> Optional[TailBatch]:
+        """回傳下一批完整列；沒有新資料時回傳 None。"""
+        key = os.path.abspath(path)
+        try:
+            stat = os.stat(key)
+        except OSError:
+            return None
+        state = self.store.get(key)
+        if state is None:
+            state = _fresh_state(stat)
+        elif (state.get("dev"), state.get("ino")) != (stat.st_dev, stat.st_ino):
+            # 輪替：舊檔還有沒讀完的內容時先讀舊檔，讀完後狀態切換到新檔
+            old = _find_by_inode(os.path.dirname(key), state["dev"], state["ino"])
+            if old is not None and os.path.getsize(old) > int(state.get("offset", 0)):
+                batch = self._read(key, old, state, rotated=True, after=_fresh_state(stat))
+                if batch is not None:
+                    return batch
+            state = _fresh_state(stat)
+            self.store.put(key, state)
+        elif stat.st_size < int(state.get("offset", 0)):
+            state = _fresh_state(stat)  # 截斷（copytruncate）：從頭開始
+            self.store.put(key, state)
+        return self._read(key, key, state)
+
+    def commit(self, batch: TailBatch) -> None:
+        """下游已接手本批（例如已排入工作佇列）後推進位置。"""
+        self.store.put(batch.key, batch.next_state)
+
+    def _read(self, key: str, source: str, state: Dict[str, Any], rotated: bool = False,
+              after: Optional[Dict[str, Any]] = None) -> Optional[TailBatch]:
+        offset = int(state.get("offset", 0))
+        limit = int(self.settings["MAX_BATCH_BYTES"])
+        try:
+            with open(source, "rb") as fh:
+                fh.seek(offset)
+                chunk = fh.read(limit)
+                at_eof = not fh.read(1)
+        except OSError:
+            return None
+
+        header = state["header"].encode("latin-1") if state.get("header") else None
+        body_start = offset
+        if header is None and offset == 0 and key.lower().endswith(".csv"):
+            newline = chunk.find(b"\n")
+            if newline < 0:
+                return None  # 表頭還沒寫完
+            header, chunk = chunk[: newline + 1], chunk[newline + 1:]
+            body_start = newline + 1
+
+        # 輪替後的舊檔不會再成長：讀到結尾時連同沒有換行的最後一列一起處理
+        final = rotated and at_eof
+        cut = len(chunk) if final else chunk.rfind(b"\n") + 1
+        if cut <= 0 and len(chunk) >= limit:
+            cut = len(chunk)  # 單列超過批次上限：整塊送出，避免卡住
+        data = chunk[:cut]
+        if final and data and not data.endswith(b"\n"):
+            data += b"\n"
+
+        next_state = {
+            "dev": state.get("dev"),
+            "ino": state.get("ino"),
+            "offset": body_start + cut,
+            "header": header.decode("latin-1") if header else None,
+        }
+        if final and after is not None:
+            next_state = dict(after)
+        if not data:
+            if next_state != {k: state.get(k) for k in next_state}:
+                self.store.put(key, next_state)  # 只有表頭或舊檔已讀完：直接推進
+            return None
+        return TailBatch(key=key, source=source, ino=int(state.get("ino") or 0), start=body_start, end=body_start + cut, header=header,
+                         data=data, rotated=rotated, next_state=next_state)
+
+
+_READERS: Dict[str, TailReader] = {}
+_READERS_LOCK = threading.Lock()
+
+
+def get_reader(state_path: str, settings: Optional[Dict[str, Any]] = None) -> TailReader:
+    """取得該狀態檔的 TailReader；同一行程內共用，Streamlit 重跑與監控執行緒不會各自覆寫位置。"""
+    key = os.path.abspath(state_path)
+    with _READERS_LOCK:
+        reader = _READERS.get(key)
+        if reader is None:
+            reader = _READERS[key] = TailReader(key, settings)
+        return reader
+
+
+__all__ = [
+    "DEFAULT_TAIL_SETTINGS",
+    "OffsetStore",
+    "TailBatch",
+    "TailReader",
+    "get_reader",
+    "is_tailable",
+    "resolve_tail_settings",
+]